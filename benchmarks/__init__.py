@@ -0,0 +1,14 @@
+"""Micro- and macro-benchmarks of the hot paths of DeePTB.
+
+The benchmarks run on synthetic silicon supercells of growing size and on models built from fixed seeds, on
+the cpu, so the results only depend on the code and the machine. Run them, and compare two result files or two
+git revisions, with::
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.compare base.json results.json --threshold 0.1
+    python -m benchmarks.compare main HEAD
+
+The package does not import dptb on import, so that ``benchmarks.run --dptb-path`` can benchmark the dptb of
+another checkout. The code that is not in every revision is imported in the setup of its benchmarks, whose cases
+are then recorded as missing from the older revisions, and only the cases present in both are compared.
+"""
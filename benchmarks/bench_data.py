@@ -0,0 +1,117 @@
+"""Benchmarks of the neighbor lists, the block conversion, the datasets and the collation."""
+
+import os
+import pickle
+import itertools
+import lmdb
+import numpy as np
+import torch
+
+from dptb.data import AtomicData, AtomicDataDict, block_to_feature
+from dptb.data.AtomicData import neighbor_list_and_relative_vec
+from dptb.data.dataset.lmdb_dataset import LMDBDataset
+from dptb.data.dataloader import Collater
+
+from .harness import benchmark
+from .structures import R_MAX, ER_MAX, OER_MAX, silicon, silicon_frames, nnsk_model, atomic_data, model_output, blocks, tmpdir
+
+# the number of structures of the dataset and batch benchmarks.
+NFRAMES = 8
+
+
+@benchmark(sizes=[8, 64, 216, 512])
+def neighbor_list(natoms: int):
+    atoms = silicon(natoms)
+    pos = torch.as_tensor(atoms.positions, dtype=torch.get_default_dtype())
+    cell = np.asarray(atoms.get_cell())
+    numbers = atoms.get_atomic_numbers()
+
+    def run():
+        neighbor_list_and_relative_vec(pos=pos, r_max=R_MAX, reduce=False, atomic_numbers=numbers, cell=cell, pbc=True)
+
+    return run
+
+
+@benchmark(sizes=[8, 64, 216], name="block_to_feature")
+def block_to_feature_setup(natoms: int):
+    model = nnsk_model()
+    atoms = silicon(natoms)
+    hamiltonian = blocks(model_output(atoms, model), model)
+    data = atomic_data(atoms)
+
+    def run():
+        block_to_feature(data, model.idp, hamiltonian)
+
+    return run
+
+
+def write_lmdb(path: str, natoms: int, nframes: int):
+    """An LMDB dataset of ``nframes`` structures with the Hamiltonian blocks of the nnsk model."""
+    model = nnsk_model()
+    os.makedirs(path, exist_ok=True)
+    env = lmdb.open(path, map_size=2**34)
+    with env.begin(write=True) as txn:
+        for idx, atoms in enumerate(silicon_frames(nframes, natoms)):
+            data_dict = {
+                AtomicDataDict.CELL_KEY: np.asarray(atoms.get_cell(), dtype=np.float32),
+                AtomicDataDict.POSITIONS_KEY: atoms.positions.astype(np.float32),
+                AtomicDataDict.ATOMIC_NUMBERS_KEY: atoms.get_atomic_numbers().astype(np.int32),
+                AtomicDataDict.PBC_KEY: np.array([True, True, True]),
+                "hamiltonian": blocks(model_output(atoms, model), model),
+            }
+            txn.put(idx.to_bytes(length=4, byteorder="big"), pickle.dumps(data_dict))
+    env.close()
+
+
+@benchmark(sizes=[8, 64, 216])
+def lmdb_get(natoms: int):
+    root = os.path.join(tmpdir(), f"lmdb_{natoms}")
+    write_lmdb(os.path.join(root, "data.lmdb"), natoms, NFRAMES)
+    dataset = LMDBDataset(
+        root=root,
+        info_files={"data.lmdb": {"r_max": R_MAX, "er_max": ER_MAX, "oer_max": OER_MAX}},
+        type_mapper=nnsk_model().idp,
+        get_Hamiltonian=True,
+        )
+    indices = itertools.cycle(range(NFRAMES))
+
+    def run():
+        dataset.get(next(indices))
+
+    return run
+
+
+@benchmark(sizes=[64, 512], unit="nframes")
+def processed_cache_load(nframes: int):
+    """Loading the processed cache of a dataset of 64 atoms frames, and fetching one of its frames."""
+    from dptb.data.dataset._processed_cache import build_cache, load_cache
+    processed_dir = os.path.join(tmpdir(), f"processed_{nframes}")
+    os.makedirs(processed_dir, exist_ok=True)
+    data_list = [atomic_data(atoms) for atoms in silicon_frames(nframes, 64)]
+    build_cache(processed_dir, data_list.__getitem__, list(range(nframes)))
+
+    def run():
+        shards, _ = load_cache(processed_dir)
+        shards[0].get_example(nframes // 2)
+
+    return run
+
+
+def _collate_setup(collater, natoms: int):
+    data_list = [atomic_data(atoms) for atoms in silicon_frames(NFRAMES, natoms)]
+
+    def run():
+        collater(data_list)
+
+    return run
+
+
+@benchmark(sizes=[8, 64, 216])
+def collater(natoms: int):
+    return _collate_setup(Collater(), natoms)
+
+
+@benchmark(sizes=[8, 64, 216])
+def atomic_data_collater(natoms: int):
+    from dptb.data.dataloader import AtomicDataCollater
+    return _collate_setup(AtomicDataCollater(), natoms)
@@ -0,0 +1,139 @@
+"""Benchmarks of the stages of the models, and of the models end to end."""
+
+import torch
+from e3nn.o3 import Irreps
+
+from dptb.data import AtomicDataDict
+from dptb.nn.hr2hk import HR2HK
+from dptb.nn.energy import Eigenvalues
+
+from .harness import benchmark
+from .structures import silicon, nnsk_model, e3_model, new_e3_model, model_input, model_output, capture_input, kpoints
+
+# the number of k-points of the k-space benchmarks.
+NK = 8
+
+
+@benchmark(sizes=[8, 64, 216])
+def hr2hk(natoms: int):
+    model = nnsk_model()
+    data = model_output(silicon(natoms), model)
+    data[AtomicDataDict.KPOINT_KEY] = kpoints(NK)
+    h2k = HR2HK(idp=model.idp, dtype=model.dtype, device=model.device)
+
+    def run():
+        with torch.no_grad():
+            h2k(dict(data))
+
+    return run
+
+
+@benchmark(sizes=[8, 64, 216])
+def sk_hamiltonian(natoms: int):
+    model = nnsk_model()
+    data = capture_input(model, model.hamiltonian, model_input(silicon(natoms), model))
+
+    def run():
+        with torch.no_grad():
+            model.hamiltonian(dict(data))
+
+    return run
+
+
+@benchmark(sizes=[8, 64])
+def e3_hamiltonian(natoms: int):
+    model = e3_model()
+    data = capture_input(model, model.hamiltonian, model_input(silicon(natoms), model))
+
+    def run():
+        with torch.no_grad():
+            model.hamiltonian(dict(data))
+
+    return run
+
+
+@benchmark(sizes=[1000, 10000], unit="nedges")
+def so2_linear(nedges: int):
+    """The SO(2) convolution of an update layer of the E3 embeddings, with radial weights."""
+    from dptb.nn.tensor_product import SO2_Linear
+    torch.manual_seed(0)
+    irreps = Irreps("32x0e+16x1o+8x2e")
+    layer = SO2_Linear(irreps, irreps, radial_emb=True, latent_dim=32, radial_channels=[32])
+    x = torch.randn(nedges, irreps.dim)
+    R = torch.nn.functional.normalize(torch.randn(nedges, 3), dim=1)
+    latents = torch.randn(nedges, 32)
+
+    def run():
+        with torch.no_grad():
+            layer(x, R, latents)
+
+    return run
+
+
+@benchmark(sizes=[8, 64, 216])
+def eigenvalues(natoms: int):
+    model = nnsk_model()
+    data = model_output(silicon(natoms), model)
+    data[AtomicDataDict.KPOINT_KEY] = kpoints(NK)
+    eigv = Eigenvalues(idp=model.idp, dtype=model.dtype, device=model.device)
+
+    def run():
+        with torch.no_grad():
+            eigv(dict(data))
+
+    return run
+
+
+@benchmark(sizes=[1, 4, 16, 64], unit="nworkers")
+def eigvalsh_workers(num_workers: int):
+    """The eigenvalues of H(k) of a 64 atoms cell at 256 k-points, split over a pool of threads. One worker is the
+    sequential path, with the threads of LAPACK."""
+    from dptb.nn.energy import parallel_eigvalsh
+    model = nnsk_model()
+    data = model_output(silicon(64), model)
+    data[AtomicDataDict.KPOINT_KEY] = kpoints(256)
+    with torch.no_grad():
+        h = HR2HK(idp=model.idp, dtype=model.dtype, device=model.device)(data)[AtomicDataDict.HAMILTONIAN_KEY]
+
+    def run():
+        parallel_eigvalsh(h, num_workers=num_workers)
+
+    return run
+
+
+@benchmark(sizes=[8, 64], kind="macro")
+def nnsk_bands(natoms: int):
+    """The bands of a structure: the graph, the nnsk model and the eigenvalues."""
+    model = nnsk_model()
+    atoms = silicon(natoms)
+    eigv = Eigenvalues(idp=model.idp, dtype=model.dtype, device=model.device)
+
+    def run():
+        with torch.no_grad():
+            data = model(model_input(atoms, model))
+            data[AtomicDataDict.KPOINT_KEY] = kpoints(NK)
+            eigv(data)
+
+    return run
+
+
+@benchmark(sizes=[8, 64], kind="macro")
+def e3_train_step(natoms: int):
+    """A training step of the E3 model on the blocks of a structure: forward, loss, backward and Adam."""
+    model = new_e3_model().train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    data = model_input(silicon(natoms), model)
+    with torch.no_grad():
+        ref = model(dict(data))
+        target_edge = ref[AtomicDataDict.EDGE_FEATURES_KEY] + 0.1 * torch.randn_like(ref[AtomicDataDict.EDGE_FEATURES_KEY])
+        target_node = ref[AtomicDataDict.NODE_FEATURES_KEY] + 0.1 * torch.randn_like(ref[AtomicDataDict.NODE_FEATURES_KEY])
+
+    def run():
+        optimizer.zero_grad(set_to_none=True)
+        out = model(dict(data))
+        loss = (out[AtomicDataDict.EDGE_FEATURES_KEY] - target_edge).abs().mean() + \
+            (out[AtomicDataDict.NODE_FEATURES_KEY] - target_node).abs().mean()
+        loss.backward()
+        optimizer.step()
+
+    return run
@@ -0,0 +1,58 @@
+"""Benchmarks of the postprocess of the bands: the Fermi surface."""
+
+import os
+import numpy as np
+import torch
+
+from dptb.data import AtomicDataDict
+from dptb.nn.energy import Eigenvalues
+from dptb.utils.make_kpoints import kmesh_fs
+
+from .harness import benchmark
+from .structures import silicon, nnsk_model, model_output, tmpdir
+
+# the coarse mesh of the Fermi surface benchmarks, and the smearing of the band window.
+NCOARSE = 20
+SIGMA = 0.1
+
+
+def coarse_bands():
+    """The bands of the 8 atoms cell on the coarse mesh, and an energy in the middle of the spectrum."""
+    model = nnsk_model()
+    data = model_output(silicon(8), model)
+    axes, klist = kmesh_fs(meshgrid=[NCOARSE] * 3)
+    data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([torch.as_tensor(klist, dtype=model.dtype)])
+    eigv = Eigenvalues(idp=model.idp, dtype=model.dtype, device=model.device)
+    with torch.no_grad():
+        eigenvalues = eigv(data)[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0].numpy().astype(np.float64)
+    return axes, eigenvalues, float(np.median(eigenvalues[:, eigenvalues.shape[1] // 2]))
+
+
+@benchmark(sizes=[50, 100], unit="nmesh")
+def fermi_surface(nmesh: int):
+    """The bands crossing the Fermi level, interpolated from the coarse mesh to a nmesh^3 one."""
+    from dptb.postprocess.bandstructure.fermisurface import select_bands, interpolate_bands
+    axes, eigenvalues, efermi = coarse_bands()
+    axes_intp, _ = kmesh_fs(meshgrid=[nmesh] * 3)
+
+    def run():
+        ist, ied = select_bands(eigenvalues, efermi - 10 * SIGMA, efermi + 10 * SIGMA)
+        interpolate_bands(axes, eigenvalues[:, ist:ied].reshape(NCOARSE, NCOARSE, NCOARSE, -1), axes_intp)
+
+    return run
+
+
+@benchmark(sizes=[50, 100], unit="nmesh")
+def bxsf_writer(nmesh: int):
+    """The bxsf file of the bands crossing the Fermi level on a nmesh^3 mesh."""
+    from dptb.postprocess.bandstructure.fermisurface import select_bands, interpolate_bands, write_bxsf
+    axes, eigenvalues, efermi = coarse_bands()
+    axes_intp, _ = kmesh_fs(meshgrid=[nmesh] * 3)
+    ist, ied = select_bands(eigenvalues, efermi - 10 * SIGMA, efermi + 10 * SIGMA)
+    bands = interpolate_bands(axes, eigenvalues[:, ist:ied].reshape(NCOARSE, NCOARSE, NCOARSE, -1), axes_intp)
+    filename = os.path.join(tmpdir(), "FS.bxsf")
+
+    def run():
+        write_bxsf(filename, bands.reshape(nmesh**3, -1) - efermi, [nmesh] * 3, np.eye(3))
+
+    return run
@@ -0,0 +1,128 @@
+"""Compare two benchmark results, and flag the cases slower than a threshold.
+
+    python -m benchmarks.compare base.json new.json --threshold 0.1
+    python -m benchmarks.compare main HEAD -- --quick -k hr2hk
+
+A result that is not a file is a git revision, whose dptb is benchmarked in a temporary worktree with the
+benchmarks of this checkout, and the arguments after ``--`` are passed to `benchmarks.run`. The exit status is
+1 when a case is slower than ``1 + threshold`` times the base.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+from .harness import format_time
+
+# the root of the checkout holding the benchmarks package.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def benchmark_revision(revision: str, run_args: List[str], workdir: str) -> dict:
+    """Run the benchmarks on the dptb of the git ``revision``."""
+    commit = subprocess.run(["git", "rev-parse", "--verify", f"{revision}^{{commit}}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout.strip()
+    worktree = os.path.join(workdir, commit)
+    output = os.path.join(workdir, f"{commit}.json")
+    subprocess.run(["git", "worktree", "add", "--detach", worktree, commit], cwd=ROOT, check=True, capture_output=True)
+    try:
+        print(f"Benchmark {revision} ({commit[:10]}).")
+        subprocess.run([sys.executable, "-m", "benchmarks.run", "--dptb-path", worktree, "-o", output, *run_args],
+                       cwd=ROOT, check=True)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT, check=False, capture_output=True)
+    with open(output) as f:
+        return json.load(f)
+
+
+def load_results(source: str, run_args: List[str], workdir: str) -> dict:
+    if os.path.isfile(source):
+        with open(source) as f:
+            return json.load(f)
+    return benchmark_revision(source, run_args, workdir)
+
+
+def compare(base: dict, new: dict, threshold: float=0.1, stat: str="median") -> List[Tuple[str, Optional[float], Optional[float], Optional[float], str]]:
+    """The ``(name, base, new, ratio, status)`` of every case, where the status is one of ``slower``, ``faster``,
+    ``same``, ``failed``, ``missing``, ``added`` and ``removed``.
+
+    A case is ``missing`` when the code it benchmarks is not in one of the revisions, only the cases present in
+    both are compared.
+    """
+    base, new = base["benchmarks"], new["benchmarks"]
+    rows = []
+    for name in list(base.keys()) + [name for name in new.keys() if name not in base]:
+        b, n = base.get(name), new.get(name)
+        if b is None or n is None:
+            rows.append((name, None, None, None, "added" if b is None else "removed"))
+            continue
+        if "missing" in b or "missing" in n:
+            rows.append((name, b.get(stat), n.get(stat), None, "missing"))
+            continue
+        if "error" in b or "error" in n:
+            rows.append((name, b.get(stat), n.get(stat), None, "failed"))
+            continue
+        ratio = n[stat] / b[stat]
+        if ratio > 1 + threshold:
+            status = "slower"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "same"
+        rows.append((name, b[stat], n[stat], ratio, status))
+    return rows
+
+
+def report(rows, base_info: dict, new_info: dict, stat: str) -> str:
+    def label(info):
+        commit = (info.get("commit") or "unknown")[:10]
+        return commit + (" (dirty)" if info.get("dirty") else "")
+
+    lines = [f"{stat} time per call, base {label(base_info)} -> new {label(new_info)}"]
+    for key in ["torch", "processor", "num_threads"]:
+        if base_info.get(key) != new_info.get(key):
+            lines.append(f"warning: the {key} differs, {base_info.get(key)} -> {new_info.get(key)}")
+    lines.append(f"{'benchmark':<48} {'base':>12} {'new':>12} {'ratio':>8}  status")
+    for name, b, n, ratio, status in rows:
+        b = format_time(b) if b is not None else "-"
+        n = format_time(n) if n is not None else "-"
+        ratio = f"{ratio:.3f}" if ratio is not None else "-"
+        lines.append(f"{name:<48} {b:>12} {n:>12} {ratio:>8}  {status}")
+    return "\n".join(lines)
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else list(args)
+    run_args = []
+    if "--" in args:
+        run_args = args[args.index("--") + 1:]
+        args = args[:args.index("--")]
+
+    parser = argparse.ArgumentParser(description="Compare two benchmark results, given as JSON files or git revisions.")
+    parser.add_argument("base", type=str, help="The results, or the git revision, to compare with.")
+    parser.add_argument("new", type=str, help="The new results, or git revision.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="The relative slowdown flagged as a regression, 0.1 for 10%%.")
+    parser.add_argument("--stat", choices=["min", "median", "mean"], default="median", help="The statistic compared.")
+    args = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory(prefix="dptb_bench_") as workdir:
+        base = load_results(args.base, run_args, workdir)
+        new = load_results(args.new, run_args, workdir)
+
+    rows = compare(base, new, threshold=args.threshold, stat=args.stat)
+    print(report(rows, base["machine"], new["machine"], args.stat))
+
+    slower = [row[0] for row in rows if row[4] == "slower"]
+    if len(slower) > 0:
+        print(f"{len(slower)} cases are more than {100 * args.threshold:.0f}% slower: {', '.join(slower)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
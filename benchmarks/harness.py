@@ -0,0 +1,164 @@
+"""Registry and timer of the benchmarks, and the JSON results."""
+
+import re
+import sys
+import time
+import platform
+import datetime
+import subprocess
+import statistics
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# the registered benchmarks, by name.
+BENCHMARKS: Dict[str, "Benchmark"] = {}
+
+
+@dataclass
+class Benchmark:
+    """A benchmark ``name`` of the code returned by ``setup(size)``, for each of ``sizes``.
+
+    ``setup`` builds the inputs, which are not timed, and returns the function to time.
+    """
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+    sizes: List[int]
+    kind: str = "micro"
+    unit: str = "natoms"
+
+    def cases(self, quick: bool=False) -> List[int]:
+        return self.sizes[:1] if quick else self.sizes
+
+
+def benchmark(sizes: List[int], kind: str="micro", unit: str="natoms", name: Optional[str]=None):
+    """Register the decorated setup function as a benchmark, named after the function by default."""
+    assert kind in ("micro", "macro"), f"The kind of a benchmark should be micro or macro, not {kind}."
+
+    def register(setup):
+        key = name or setup.__name__
+        assert key not in BENCHMARKS, f"The benchmark {key} is registered twice."
+        BENCHMARKS[key] = Benchmark(name=key, setup=setup, sizes=list(sizes), kind=kind, unit=unit)
+        return setup
+
+    return register
+
+
+def time_function(fn: Callable[[], object], repeat: int=7, min_time: float=0.1, warmup: int=1) -> Dict[str, float]:
+    """The statistics of the seconds per call of ``fn`` over ``repeat`` rounds.
+
+    Each round calls ``fn`` ``number`` times, with ``number`` grown until a round lasts ``min_time`` seconds,
+    as in `timeit.Timer.autorange`.
+    """
+    for _ in range(warmup):
+        fn()
+
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1e6:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": len(times),
+        "number": number,
+    }
+
+
+def case_name(bench: Benchmark, size: int) -> str:
+    return f"{bench.name}[{bench.unit}={size}]"
+
+
+def _git(*args: str, cwd: Optional[str]=None) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True, cwd=cwd).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_info(dptb_path: Optional[str]=None) -> dict:
+    """The revision of the benchmarked dptb, and the versions and the machine the results depend on."""
+    import torch
+    import numpy as np
+    import dptb
+
+    source = dptb_path or dptb.__path__[0]
+    return {
+        "commit": _git("rev-parse", "HEAD", cwd=source),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no", cwd=source)),
+        "dptb": getattr(dptb, "__version__", None),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "num_threads": torch.get_num_threads(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def run_benchmarks(
+        pattern: Optional[str]=None,
+        kinds: Optional[List[str]]=None,
+        quick: bool=False,
+        repeat: int=7,
+        min_time: float=0.1,
+        seed: int=0,
+        log=print,
+        ) -> Dict[str, dict]:
+    """Run the registered benchmarks whose case name matches the regular expression ``pattern``.
+
+    A case whose setup fails with an ImportError or an AttributeError, as the benchmarks of the code added
+    after the benchmarked revision, is recorded as missing instead of failed.
+    """
+    import torch
+
+    results = {}
+    for bench in BENCHMARKS.values():
+        if kinds is not None and bench.kind not in kinds:
+            continue
+        for size in bench.cases(quick):
+            name = case_name(bench, size)
+            if pattern is not None and re.search(pattern, name) is None:
+                continue
+            torch.manual_seed(seed)
+            try:
+                fn = bench.setup(size)
+                stats = time_function(fn, repeat=repeat, min_time=min_time)
+            except (ImportError, AttributeError) as e:
+                log(f"{name:<48} missing: {type(e).__name__}: {e}")
+                results[name] = {"benchmark": bench.name, "kind": bench.kind, bench.unit: size, "missing": f"{type(e).__name__}: {e}"}
+                continue
+            except Exception as e:
+                log(f"{name:<48} failed: {type(e).__name__}: {e}")
+                results[name] = {"benchmark": bench.name, "kind": bench.kind, bench.unit: size, "error": f"{type(e).__name__}: {e}"}
+                continue
+            results[name] = {"benchmark": bench.name, "kind": bench.kind, bench.unit: size, **stats}
+            log(f"{name:<48} {format_time(stats['median']):>10} median  {format_time(stats['min']):>10} min  "
+                f"(+-{100 * stats['stdev'] / stats['mean']:.1f}%, {stats['rounds']}x{stats['number']})")
+    return results
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in [("s", 1.0), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def command_line() -> str:
+    return " ".join([sys.executable] + sys.argv)
@@ -0,0 +1,78 @@
+"""Run the benchmarks and write the results as JSON.
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run -k "hr2hk|eigenvalues" --quick
+"""
+
+import os
+import sys
+import json
+import argparse
+import importlib
+
+# the modules of the benchmarks, imported after the dptb to benchmark is put on the path.
+MODULES = ["benchmarks.bench_nn", "benchmarks.bench_data", "benchmarks.bench_postprocess"]
+
+
+def load_benchmarks(dptb_path=None) -> dict:
+    """Import the benchmark modules, and return the errors of the modules that can not be imported."""
+    if dptb_path is not None:
+        sys.path.insert(0, os.path.abspath(dptb_path))
+    missing = {}
+    for module in MODULES:
+        try:
+            importlib.import_module(module)
+        except (ImportError, AttributeError) as e:
+            print(f"The benchmarks of {module} are missing: {type(e).__name__}: {e}")
+            missing[module] = f"{type(e).__name__}: {e}"
+    return missing
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the micro- and macro-benchmarks of DeePTB.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="The JSON file of the results, benchmarks_<commit>.json by default.")
+    parser.add_argument("-k", "--filter", type=str, default=None,
+                        help="Run the cases whose name, like hr2hk[natoms=64], matches this regular expression.")
+    parser.add_argument("--kind", choices=["micro", "macro"], action="append", default=None,
+                        help="Run only the micro or the macro benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Run only the smallest size of each benchmark.")
+    parser.add_argument("--repeat", type=int, default=7, help="The number of timed rounds of each case.")
+    parser.add_argument("--min-time", type=float, default=0.1, help="The least seconds of a timed round.")
+    parser.add_argument("--threads", type=int, default=1, help="The number of torch threads.")
+    parser.add_argument("--dptb-path", type=str, default=None,
+                        help="The root of the dptb checkout to benchmark, the installed dptb by default.")
+    parser.add_argument("--list", action="store_true", help="List the benchmark cases and exit.")
+    args = parser.parse_args(args)
+
+    missing = load_benchmarks(args.dptb_path)
+    import torch
+    from .harness import BENCHMARKS, case_name, machine_info, run_benchmarks, command_line
+
+    if args.list:
+        for bench in BENCHMARKS.values():
+            for size in bench.cases(args.quick):
+                print(f"{case_name(bench, size):<48} {bench.kind}")
+        return
+
+    torch.set_num_threads(args.threads)
+    info = machine_info(args.dptb_path)
+    info.update({"command": command_line(), "quick": args.quick, "repeat": args.repeat, "min_time": args.min_time})
+    print(f"Benchmark dptb {info['dptb']} at {info['commit']}{' (dirty)' if info['dirty'] else ''} with {info['num_threads']} threads.")
+
+    results = run_benchmarks(
+        pattern=args.filter,
+        kinds=args.kind,
+        quick=args.quick,
+        repeat=args.repeat,
+        min_time=args.min_time,
+        )
+
+    output = args.output or f"benchmarks_{(info['commit'] or 'unknown')[:10]}.json"
+    with open(output, "w") as f:
+        json.dump({"machine": info, "benchmarks": results, "missing_modules": missing}, f, indent=2)
+    print(f"The results are written to {output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Synthetic structures and models of the benchmarks, generated from fixed seeds."""
+
+import functools
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+import torch
+from ase import Atoms
+from ase.build import bulk
+
+from dptb.nn.build import build_model
+from dptb.data import AtomicData, AtomicDataDict
+
+# the cutoffs of the silicon structures, within the second shell of neighbors.
+R_MAX = 5.0
+ER_MAX = 5.0
+OER_MAX = 2.6
+
+NNSK_OPTIONS = {
+    "nnsk": {
+        "onsite": {"method": "uniform"},
+        "hopping": {"method": "powerlaw", "rs": R_MAX, "w": 0.3},
+        "freeze": False,
+        "push": False,
+    },
+}
+
+E3_OPTIONS = {
+    "embedding": {
+        "method": "slem",
+        "r_max": {"Si": R_MAX},
+        "irreps_hidden": "16x0e+8x1o+8x2e",
+        "n_layers": 2,
+        "avg_num_neighbors": 30,
+        "tp_radial_emb": True,
+    },
+    "prediction": {"method": "e3tb", "neurons": [32]},
+}
+
+COMMON_OPTIONS = {"device": "cpu", "dtype": "float32", "overlap": False, "seed": 0}
+
+_TMPDIR = None
+
+
+def tmpdir() -> str:
+    """A temporary directory removed at the exit of the process."""
+    global _TMPDIR
+    if _TMPDIR is None:
+        _TMPDIR = tempfile.TemporaryDirectory(prefix="dptb_bench_")
+    return _TMPDIR.name
+
+
+def silicon(natoms: int, seed: int=0) -> Atoms:
+    """A rattled supercell of diamond silicon with ``natoms`` atoms, a multiple of 8."""
+    n = round((natoms / 8) ** (1 / 3))
+    assert 8 * n**3 == natoms, f"The silicon supercells have 8 n^3 atoms, not {natoms}."
+    atoms = bulk("Si", "diamond", a=5.43, cubic=True).repeat(n)
+    atoms.rattle(0.05, seed=seed)
+    return atoms
+
+
+def silicon_frames(nframes: int, natoms: int) -> List[Atoms]:
+    return [silicon(natoms, seed=i) for i in range(nframes)]
+
+
+@functools.lru_cache(maxsize=None)
+def nnsk_model() -> torch.nn.Module:
+    torch.manual_seed(0)
+    return build_model(model_options=NNSK_OPTIONS, common_options={**COMMON_OPTIONS, "basis": {"Si": ["3s", "3p"]}}).eval()
+
+
+def new_e3_model() -> torch.nn.Module:
+    torch.manual_seed(0)
+    return build_model(model_options=E3_OPTIONS, common_options={**COMMON_OPTIONS, "basis": {"Si": "1s1p"}}).eval()
+
+
+# the E3 model shared by the inference benchmarks.
+e3_model = functools.lru_cache(maxsize=None)(new_e3_model)
+
+
+def atomic_data(atoms: Atoms) -> AtomicData:
+    return AtomicData.from_ase(atoms, r_max=R_MAX, er_max=ER_MAX, oer_max=OER_MAX)
+
+
+def model_input(atoms: Atoms, model: torch.nn.Module) -> AtomicDataDict.Type:
+    """The input of ``model`` on ``atoms``, with the atom types."""
+    return model.idp(AtomicData.to_AtomicDataDict(atomic_data(atoms)))
+
+
+def kpoints(nk: int) -> torch.Tensor:
+    """``nk`` k-points on the line from Gamma to X, in the nested format of the models."""
+    klist = np.zeros((nk, 3))
+    klist[:, 0] = np.linspace(0.0, 0.5, nk)
+    return torch.nested.as_nested_tensor([torch.as_tensor(klist, dtype=torch.float32)])
+
+
+def capture_input(model: torch.nn.Module, module: torch.nn.Module, data: AtomicDataDict.Type) -> AtomicDataDict.Type:
+    """The input of the submodule ``module`` in the forward of ``model`` on ``data``."""
+    captured = {}
+
+    def hook(module, args):
+        captured.update({key: value.clone() if isinstance(value, torch.Tensor) and not value.is_nested else value \
+                         for key, value in args[0].items()})
+
+    handle = module.register_forward_pre_hook(hook)
+    try:
+        with torch.no_grad():
+            model(dict(data))
+    finally:
+        handle.remove()
+    return captured
+
+
+def model_output(atoms: Atoms, model: torch.nn.Module) -> AtomicDataDict.Type:
+    with torch.no_grad():
+        return model(model_input(atoms, model))
+
+
+def blocks(data: AtomicDataDict.Type, model: torch.nn.Module) -> Dict[str, np.ndarray]:
+    """The Hamiltonian blocks of the output ``data`` of ``model``, as stored in the datasets."""
+    from dptb.data import feature_to_block
+    with torch.no_grad():
+        return {key: value.numpy() for key, value in feature_to_block(data=data, idp=model.idp).items()}
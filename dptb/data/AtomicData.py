@@ -23,6 +23,7 @@ from . import AtomicDataDict
 from .util import _TORCH_INTEGER_DTYPES
 from dptb.utils.torch_geometric.data import Data
 from dptb.utils.constants import atomic_num_dict
+from dptb.utils.profiling import profile_stage
 import logging
 
 log = logging.getLogger(__name__)
@@ -882,6 +883,7 @@ _ERROR_ON_NO_EDGES = os.environ.get("NEQUIP_ERROR_ON_NO_EDGES", "true").lower()
 assert _ERROR_ON_NO_EDGES in ("true", "false"), "NEQUIP_ERROR_ON_NO_EDGES must be 'true' or 'false'"
 _ERROR_ON_NO_EDGES = _ERROR_ON_NO_EDGES == "true"
 
+@profile_stage("neighbor_list")
 def neighbor_list_and_relative_vec(
     pos,
     r_max,
@@ -1,51 +1,31 @@
-from .AtomicData import (
-    AtomicData,
-    PBC,
-    register_fields,
-    deregister_fields,
-    _register_field_prefix,
-    _NODE_FIELDS,
-    _EDGE_FIELDS,
-    _GRAPH_FIELDS,
-    _LONG_FIELDS,
-)
-from .dataset import (
-    AtomicDataset,
-    AtomicInMemoryDataset,
-    NpzDataset,
-    ASEDataset,
-    ABACUSDataset,
-    ABACUSInMemoryDataset,
-    DefaultDataset
-)
-from .dataloader import DataLoader, Collater, PartialSampler
-from .build import build_dataset
-from .interfaces import block_to_feature, feature_to_block
-from .transforms import OrbitalMapper
+from dptb.utils.lazy_import import lazy_attach
 
-__all__ = [
-    AtomicData,
-    PBC,
-    register_fields,
-    deregister_fields,
-    block_to_feature,
-    feature_to_block,
-    _register_field_prefix,
-    feature_to_block,
-    AtomicDataset,
-    AtomicInMemoryDataset,
-    NpzDataset,
-    ASEDataset,
-    ABACUSDataset,
-    ABACUSInMemoryDataset,
-    DefaultDataset,
-    DataLoader,
-    Collater,
-    PartialSampler,
-    OrbitalMapper,
-    build_dataset,
-    _NODE_FIELDS,
-    _EDGE_FIELDS,
-    _GRAPH_FIELDS,
-    _LONG_FIELDS,
-]
+# resolved on first access, so that importing ``dptb.data`` does not pull in torch, h5py or lmdb.
+__getattr__, __dir__, __all__ = lazy_attach(__name__, {
+    "AtomicData": ".AtomicData",
+    "PBC": ".AtomicData",
+    "register_fields": ".AtomicData",
+    "deregister_fields": ".AtomicData",
+    "block_to_feature": ".interfaces",
+    "feature_to_block": ".interfaces",
+    "_register_field_prefix": ".AtomicData",
+    "AtomicDataset": ".dataset",
+    "AtomicInMemoryDataset": ".dataset",
+    "NpzDataset": ".dataset",
+    "ASEDataset": ".dataset",
+    "ABACUSDataset": ".dataset",
+    "ABACUSInMemoryDataset": ".dataset",
+    "DefaultDataset": ".dataset",
+    "DataLoader": ".dataloader",
+    "Collater": ".dataloader",
+    "AtomicDataCollater": ".dataloader",
+    "PartialSampler": ".dataloader",
+    "VerletNeighborList": ".neighborlist",
+    "iread_atomic_data": ".neighborlist",
+    "OrbitalMapper": ".transforms",
+    "build_dataset": ".build",
+    "_NODE_FIELDS": ".AtomicData",
+    "_EDGE_FIELDS": ".AtomicData",
+    "_GRAPH_FIELDS": ".AtomicData",
+    "_LONG_FIELDS": ".AtomicData",
+})
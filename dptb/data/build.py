@@ -16,8 +16,9 @@ from dptb import data
 from dptb.data import AtomicDataset, register_fields
 from dptb.data.dataset import DefaultDataset
 from dptb.data.dataset._deeph_dataset import DeePHE3Dataset
-from dptb.data.dataset._hdf5_dataset import HDF5Dataset
+from dptb.data.dataset._hdf5_dataset import HDF5Dataset, LazyHDF5Dataset
 from dptb.data.dataset.lmdb_dataset import LMDBDataset
+from dptb.data.manifest import load_manifest
 from dptb.data.transforms import TypeMapper, OrbitalMapper
 from dptb.utils import instantiate, get_w_prefix
 from dptb.utils.tools import j_loader
@@ -122,9 +123,9 @@ class DatasetBuilder:
 
     def __call__(self, 
         # set_options
-        root: str,
+        root: str = None,
         # dataset_options
-        r_max: Union[float, int, dict],
+        r_max: Union[float, int, dict] = None,
         er_max: Union[float, int, dict] = None,
         oer_max: Union[float, int, dict] = None,
         type: str = "DefaultDataset",
@@ -134,9 +135,14 @@ class DatasetBuilder:
         get_overlap: bool = False,
         get_DM: bool = False,
         get_eigenvalues: bool = False,
+        lazy: bool = False,
+        num_workers: int = 1,
         # common_options
         orthogonal: bool = False,
         basis: str = None, 
+        # manifest_options
+        manifest: str = None,
+        split: str = None,
         **kwargs,
         ):
     
@@ -145,16 +151,21 @@ class DatasetBuilder:
 
         Args:
             - type (str): The type of dataset to build. Default is "DefaultDataset".
-            - root (str): The main directory storing all trajectory folders.
+            - root (str): The main directory storing all trajectory folders, the root of the manifest by default.
             - prefix (str, optional): Load selected trajectory folders with the specified prefix.
             - get_Hamiltonian (bool, optional): Load the Hamiltonian file to edges of the graph or not.
             - get_eigenvalues (bool, optional): Load the eigenvalues to the graph or not.
+            - lazy (bool, optional): For HDF5Dataset, build the graph of each frame on demand instead of loading all frames in memory.
+            - num_workers (int, optional): The number of worker processes building the shards of the processed cache.
             e.g.     
             type = "DefaultDataset",
             root = "foo/bar/data_files_here",
             prefix = "set"
 
             - basis (str, optional): The basis for the OrbitalMapper.
+            - manifest (str, optional): A manifest of `dptb data --split` or `--collect`, listing the trajectory
+              folders (or LMDB records) to load in place of the root and the prefix.
+            - split (str, optional): The split of the manifest to load, all the folders of the manifest if None.
 
         Returns:
             dataset: The built dataset.
@@ -164,6 +175,7 @@ class DatasetBuilder:
             Exception: If the info.json file is not properly provided for a trajectory folder.
         """
         # set cutoff radius
+        assert r_max is not None, "The cutoff radius r_max is not provided."
         self.r_max   = r_max   # default cutoff
         self.er_max  = er_max  # env cutoff
         self.oer_max = oer_max 
@@ -181,14 +193,23 @@ class DatasetBuilder:
         idp = None if basis is None else OrbitalMapper(basis=basis)
 
         # filter to get the valid folders
-        assert prefix is not None, \
-            "The prefix is not provided. Please provide the prefix to select the trajectory folders."
-        valid_folders, delim = [], separator
-        for folder in Path(root).glob(f"{prefix}{delim}*"):
-            if folder.is_dir():
-                assert any(folder.glob(f'*.{ext}') for ext in ['dat', 'traj', 'h5', 'mdb']), \
-                    f'{folder} does not have the proper traj data files. Please check the data files.'
-                valid_folders.append(folder.name)
+        record_ids = None
+        if manifest is not None:
+            # the folders are listed by the manifest, with their absolute paths.
+            manifest_root, folders, record_ids = load_manifest(manifest, split=split)
+            root = root or manifest_root
+            folders = [Path(folder) for folder in folders]
+        else:
+            assert root is not None, \
+                "The root is not provided. Please provide the root of the dataset, or a manifest of its folders."
+            assert prefix is not None, \
+                "The prefix is not provided. Please provide the prefix to select the trajectory folders."
+            folders = [folder for folder in Path(root).glob(f"{prefix}{separator}*") if folder.is_dir()]
+        valid_folders = []
+        for folder in folders:
+            assert any(folder.glob(f'*.{ext}') for ext in ['dat', 'traj', 'h5', 'mdb']), \
+                f'{folder} does not have the proper traj data files. Please check the data files.'
+            valid_folders.append(str(folder) if manifest is not None else folder.name)
         assert isinstance(valid_folders, list) and len(valid_folders) > 0, \
             "No trajectory folders are found. Please check the prefix."
 
@@ -251,7 +272,8 @@ class DatasetBuilder:
                                   type_mapper=idp,
                                   get_Hamiltonian=get_Hamiltonian,
                                   get_eigenvalues=get_eigenvalues,
-                                  info_files=info_files)
+                                  info_files=info_files,
+                                  num_workers=num_workers)
         elif dataset_type == "DefaultDataset":
             return DefaultDataset(root=root,
                                   type_mapper=idp,
@@ -259,7 +281,16 @@ class DatasetBuilder:
                                   get_overlap=get_overlap,
                                   get_DM=get_DM,
                                   get_eigenvalues=get_eigenvalues,
-                                  info_files=info_files)
+                                  info_files=info_files,
+                                  num_workers=num_workers)
+        elif dataset_type == "HDF5Dataset" and lazy:
+            return LazyHDF5Dataset(root=root,
+                                   type_mapper=idp,
+                                   get_Hamiltonian=get_Hamiltonian,
+                                   get_overlap=get_overlap,
+                                   get_DM=get_DM,
+                                   get_eigenvalues=get_eigenvalues,
+                                   info_files=info_files)
         elif dataset_type == "HDF5Dataset":
             return HDF5Dataset(root=root,
                                type_mapper=idp,
@@ -267,7 +298,8 @@ class DatasetBuilder:
                                get_overlap=get_overlap,
                                get_DM=get_DM,
                                get_eigenvalues=get_eigenvalues,
-                               info_files=info_files)
+                               info_files=info_files,
+                               num_workers=num_workers)
         else:
             assert dataset_type == "LMDBDataset"
             return LMDBDataset(root=root,
@@ -277,11 +309,12 @@ class DatasetBuilder:
                                get_overlap=get_overlap,
                                get_DM=get_DM,
                                get_eigenvalues=get_eigenvalues,
-                               info_files=info_files)
+                               info_files=info_files,
+                               record_ids=record_ids)
     
     def from_model(self, 
                model, 
-               root: str,
+               root: str = None,
                type: str = "DefaultDataset",
                prefix: str = None,
                separator:str='.',
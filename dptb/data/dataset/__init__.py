@@ -1,7 +1,7 @@
 from ._base_datasets import AtomicDataset, AtomicInMemoryDataset
 from ._ase_dataset import ASEDataset
 from ._npz_dataset import NpzDataset
-from ._hdf5_dataset import HDF5Dataset
+from ._hdf5_dataset import HDF5Dataset, LazyHDF5Dataset, convert_hdf5_archive
 from ._abacus_dataset import ABACUSDataset, ABACUSInMemoryDataset
 from ._deeph_dataset import DeePHE3Dataset
 from ._default_dataset import DefaultDataset
@@ -18,6 +18,8 @@ __all__ = [
     AtomicDataset, 
     AtomicInMemoryDataset, 
     NpzDataset, 
-    HDF5Dataset
+    HDF5Dataset,
+    LazyHDF5Dataset,
+    convert_hdf5_archive
     ]
 
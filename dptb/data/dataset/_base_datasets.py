@@ -27,6 +27,7 @@ from dptb.utils.regressor import solver
 from dptb.utils.savenload import atomic_write
 from dptb.data.AtomicData import _NESTED_FIELDS
 from ..transforms import TypeMapper
+from ._processed_cache import INDEX_FILE, ShardIndex, build_cache, load_cache, migrate_legacy_cache
 
 
 class AtomicDataset(Dataset):
@@ -70,7 +71,9 @@ class AtomicDataset(Dataset):
             # the type mapper is applied after saving, not before, so doesn't matter to cache validity
             "type_mapper",
             # the root path of the dictionary is not important, as datasets can be transfered to anywhere
-            "root"
+            "root",
+            # the processes building the cache do not change its content
+            "num_workers",
         }
         params = {
             k: getattr(self, k)
@@ -119,8 +122,14 @@ class AtomicInMemoryDataset(AtomicDataset):
         AtomicData_options (dict, optional): extra key that are not stored in data but needed for AtomicData initialization
         include_frames (list, optional): the frames to process with the constructor.
         type_mapper (TypeMapper): the transformation to map atomic information to species index. Optional
+        num_workers (int, optional): the number of worker processes building the shards of the processed cache.
+
+    The processed frames are cached in shards of at most ``shard_frames`` frames, whose tensors are memory
+    mapped when loaded, see `dptb.data.dataset._processed_cache`.
     """
 
+    shard_frames: int = 1000
+
     def __init__(
         self,
         root: str,
@@ -129,6 +138,7 @@ class AtomicInMemoryDataset(AtomicDataset):
         AtomicData_options: Dict[str, Any] = {},
         include_frames: Optional[List[int]] = None,
         type_mapper: Optional[TypeMapper] = None,
+        num_workers: int = 1,
     ):
         # TO DO, this may be simplified
         # See if a subclass defines some inputs
@@ -139,7 +149,10 @@ class AtomicInMemoryDataset(AtomicDataset):
 
         self.AtomicData_options = AtomicData_options
         self.include_frames = include_frames
+        self.num_workers = num_workers
 
+        self.shards = None
+        self.shard_index = None
         self.data = None
 
         # !!! don't delete this block.
@@ -156,21 +169,40 @@ class AtomicInMemoryDataset(AtomicDataset):
         # See https://pytorch-geometric.readthedocs.io/en/latest/notes/create_dataset.html#creating-in-memory-datasets
         # Then pre-process the data if disk files are not found
         super().__init__(root=root, type_mapper=type_mapper)
-        if self.data is None:
-            self.data, include_frames = torch.load(self.processed_paths[0], weights_only=False)
-            for k,v in self.data:
-                if k in _NESTED_FIELDS:
-                    self.data[k] = torch.nested.as_nested_tensor(v)
-            if not np.all(include_frames == self.include_frames):
-                raise ValueError(
-                    f"the include_frames is changed. "
-                    f"please delete the processed folder and rerun {self.processed_paths[0]}"
-                )
+        if self.shards is None:
+            self._load_cache()
+
+    def _load_cache(self):
+        self.shards, include_frames = load_cache(self.processed_dir)
+        if not np.all(include_frames == self.include_frames):
+            raise ValueError(
+                f"the include_frames is changed. "
+                f"please delete the processed folder and rerun {self.processed_paths[0]}"
+            )
+        self.shard_index = ShardIndex(self.shards)
+
+    @property
+    def data(self) -> Optional[Batch]:
+        """All the processed frames in one batch.
+
+        The batch of a single shard is memory mapped, while the shards of a larger dataset are only batched
+        together on the first access, so that the frames can be fetched with `get` without loading them all.
+        """
+        if self._data is None and self.shards is not None:
+            if len(self.shards) == 1:
+                self._data = self.shards[0]
+            else:
+                self._data = Batch.from_data_list([frame for shard in self.shards for frame in shard.to_data_list()])
+        return self._data
+
+    @data.setter
+    def data(self, data: Optional[Batch]):
+        self._data = data
 
     def len(self):
-        if self.data is None:
+        if self.shards is None:
             return 0
-        return self.data.num_graphs
+        return len(self.shard_index)
 
     @property
     def raw_file_names(self):
@@ -178,7 +210,7 @@ class AtomicInMemoryDataset(AtomicDataset):
 
     @property
     def processed_file_names(self) -> List[str]:
-        return ["data.pth", "params.yaml"]
+        return [INDEX_FILE, "params.yaml"]
 
     def get_data(
         self,
@@ -206,17 +238,23 @@ class AtomicInMemoryDataset(AtomicDataset):
                 extract_zip(download_path, self.raw_dir)
 
     def process(self):
+        # a cache of the earlier `data.pth` format is converted instead of processed again.
+        if migrate_legacy_cache(self.processed_dir, _NESTED_FIELDS):
+            self._load_cache()
+            return
+
         data = self.get_data() ## get data returns either a list of AtomicData class or a data dict
         if isinstance(data, list):
 
             # It's a data list
             data_list = data
-            if not (self.include_frames is None or data_list is None):
-                data_list = [data_list[i] for i in self.include_frames] # 可以选择数据集中加载的序号
             assert all(isinstance(e, AtomicData) for e in data_list)
             assert all(AtomicDataDict.BATCH_KEY not in e for e in data_list)
 
-            fields = {}
+            include_frames = self.include_frames # 可以选择数据集中加载的序号
+            if include_frames is None:
+                include_frames = range(len(data_list))
+            frame = data_list.__getitem__
 
         elif isinstance(data, dict):
             # It's fields
@@ -251,60 +289,42 @@ class AtomicInMemoryDataset(AtomicDataset):
                 assert "r_max" in self.AtomicData_options
                 assert AtomicDataDict.POSITIONS_KEY in all_keys
 
-            data_list = [
-                constructor(
+            # the frames are constructed by the workers building the shards.
+            def frame(i):
+                return constructor(
                     **{
                         **{f: v[i] for f, v in fields.items()},
                         **self.AtomicData_options,
                     }
                 )
-                for i in include_frames
-            ]
-
 
         else:
             raise ValueError("Invalid return from `self.get_data()`")
 
-        # Batch it for efficient saving
-        # This limits an AtomicInMemoryDataset to a maximum of LONG_MAX atoms _overall_, but that is a very big number and any dataset that large is probably not "InMemory" anyway
-        data = Batch.from_data_list(data_list)
-        del data_list
-        del fields
-
-        total_MBs = sum(item.numel() * item.element_size() for _, item in data) / (
-            1024 * 1024
-        )
-        logging.info(
-            f"Loaded data: {data}\n    processed data size: ~{total_MBs:.2f} MB"
-        )
-        del total_MBs
-
+        # Batch the frames into shards of memory mapped files.
         # use atomic writes to avoid race conditions between
         # different trainings that use the same dataset
         # since those separate trainings should all produce the same results,
         # it doesn't matter if they overwrite each others cached'
         # datasets. It only matters that they don't simultaneously try
         # to write the _same_ file, corrupting it.
-        with atomic_write(self.processed_paths[0], binary=True) as f:
-            for k,v in data:
-                if k in _NESTED_FIELDS:
-                    # need to unbind the nested tensor before saving
-                    data[k] = list(v.unbind())
-            torch.save((data, self.include_frames), f)
+        self.shards = build_cache(
+            self.processed_dir,
+            frame,
+            list(include_frames),
+            include_frames=self.include_frames,
+            shard_frames=self.shard_frames,
+            num_workers=self.num_workers,
+        )
+        self.shard_index = ShardIndex(self.shards)
         with atomic_write(self.processed_paths[1], binary=False) as f:
             yaml.dump(self._get_parameters(), f)
 
         logging.info("Cached processed data to disk")
 
-        for k,v in data:
-            if k in _NESTED_FIELDS:
-                # need to nest the tensor after saving
-                data[k] = torch.nested.as_nested_tensor(v)
-
-        self.data = data
-
     def get(self, idx):
-        return self.data.get_example(idx)
+        ishard, idx = self.shard_index.locate(idx)
+        return self.shards[ishard].get_example(idx)
 
     def _selectors(
         self,
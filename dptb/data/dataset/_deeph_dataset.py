@@ -28,6 +28,7 @@ class DeePHE3Dataset(AtomicInMemoryDataset):
             type_mapper: TypeMapper = None,
             get_Hamiltonian: bool = False,
             get_eigenvalues: bool = False,
+            num_workers: int = 1,
     ):
         
         self.root = root
@@ -59,6 +60,7 @@ class DeePHE3Dataset(AtomicInMemoryDataset):
             AtomicData_options={},  # we do not pass anything here.
             include_frames=include_frames,
             type_mapper=type_mapper,
+            num_workers=num_workers,
         )
 
     def get_data(self):
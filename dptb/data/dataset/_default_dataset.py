@@ -15,11 +15,9 @@ from .. import (
 )
 from ..transforms import TypeMapper, OrbitalMapper
 from ._base_datasets import AtomicDataset, AtomicInMemoryDataset
-#from dptb.nn.hamiltonian import E3Hamiltonian
 from dptb.data.interfaces.ham_to_feature import block_to_feature
 from dptb.utils.tools import j_loader
-from dptb.data.AtomicDataDict import with_edge_vectors
-from dptb.nn.hamiltonian import E3Hamiltonian
+from dptb.data.e3_statistics import e3_statistics, statistics_cache_file, set_model_scale_shift
 from tqdm import tqdm
 import logging
 
@@ -366,7 +364,8 @@ class DefaultDataset(AtomicInMemoryDataset):
                  get_Hamiltonian: bool = False,
                  get_overlap: bool = False,
                  get_DM: bool = False,
-                 get_eigenvalues: bool = False):
+                 get_eigenvalues: bool = False,
+                 num_workers: int = 1):
         '''
         instantiate the default dataset.
 
@@ -392,6 +391,8 @@ class DefaultDataset(AtomicInMemoryDataset):
             whether to get the density matrix, by default False
         get_eigenvalues : bool, optional
             whether to get the eigenvalues, by default False
+        num_workers : int, optional
+            the number of worker processes building the shards of the processed cache, by default 1
         '''
         def build_data(pos_typ: str, **kwargs):
             builder = {'ase': _TrajData.from_ase_traj}
@@ -434,6 +435,7 @@ class DefaultDataset(AtomicInMemoryDataset):
             AtomicData_options={},  # we do not pass anything here.
             include_frames=include_frames,
             type_mapper=type_mapper,
+            num_workers=num_workers,
         )
 
     def get_data(self):
@@ -456,7 +458,13 @@ class DefaultDataset(AtomicInMemoryDataset):
         # TODO: this is not implemented.
         return self.root
     
-    def E3statistics(self, model: torch.nn.Module=None, decay=False):
+    def E3statistics(self, model: torch.nn.Module=None, decay=False, chunk_size: int=32, num_workers: int=1, use_cache: bool=True):
+        """Collect the E3 irreps statistics of the dataset, and initialize the model scale and shift with them.
+
+        The frames are processed in chunks of ``chunk_size`` frames, optionally by ``num_workers`` worker
+        processes, see `dptb.data.e3_statistics.e3_statistics`. With ``use_cache``, the statistics are
+        cached in the processed directory of the dataset and reused by the following trainings.
+        """
         assert self.transform is not None
         idp = self.transform
 
@@ -466,165 +474,12 @@ class DefaultDataset(AtomicInMemoryDataset):
         if model is not None:
             if not isinstance(model.node_prediction_h, torch.nn.Module):
                 return None
-        
-        typed_dataset = idp(self.data.clone().to_dict())
-        e3h = E3Hamiltonian(basis=idp.basis, decompose=True)
-        with torch.no_grad():
-            typed_dataset = e3h(typed_dataset)
 
-        stats = {}
-        stats["node"] =  self._E3nodespecies_stat(typed_dataset=typed_dataset)
-        stats["edge"] = self._E3edgespecies_stat(typed_dataset=typed_dataset, decay=decay)
+        cache_file = statistics_cache_file(self, idp, decay=decay) if use_cache else None
+        stats = e3_statistics(self, idp, decay=decay, chunk_size=chunk_size, num_workers=num_workers, cache_file=cache_file)
 
-        if model is not None:
+        if model is not None and stats is not None:
             # initilize the model param with statistics
-            scalar_mask = torch.BoolTensor([ir.dim==1 for ir in model.idp.orbpair_irreps])
-            node_shifts = stats["node"]["scalar_ave"]
-            node_scales = stats["node"]["norm_ave"]
-            node_scales[:,scalar_mask] = stats["node"]["scalar_std"]
-
-            edge_shifts = stats["edge"]["scalar_ave"]
-            edge_scales = stats["edge"]["norm_ave"]
-            edge_scales[:,scalar_mask] = stats["edge"]["scalar_std"]
-            model.node_prediction_h.set_scale_shift(scales=node_scales, shifts=node_shifts)
-            model.edge_prediction_h.set_scale_shift(scales=edge_scales, shifts=edge_shifts)
+            set_model_scale_shift(model, stats)
 
         return stats
-    
-    def _E3edgespecies_stat(self, typed_dataset, decay):
-        # we get the bond type marked dataset first
-        idp = self.transform
-
-        idp.get_irreps(no_parity=False)
-        irrep_slices = idp.orbpair_irreps.slices()
-
-        features = typed_dataset["edge_features"]
-        hopping_block_mask = idp.mask_to_erme[typed_dataset["edge_type"].flatten()]
-        typed_hopping = {}
-        for bt, tp in idp.bond_to_type.items():
-            hopping_tp_mask = hopping_block_mask[typed_dataset["edge_type"].flatten().eq(tp)]
-            hopping_tp = features[typed_dataset["edge_type"].flatten().eq(tp)]
-            filtered_vecs = torch.where(hopping_tp_mask, hopping_tp, torch.tensor(float('nan')))
-            typed_hopping[bt] = filtered_vecs
-
-        sorted_irreps = idp.orbpair_irreps.sort()[0].simplify()
-        n_scalar = sorted_irreps[0].mul if sorted_irreps[0].ir.l == 0 else 0
-        
-        # calculate norm & mean
-        typed_norm = {}
-        typed_norm_ave = torch.ones(len(idp.bond_to_type), idp.orbpair_irreps.num_irreps)
-        typed_norm_std = torch.zeros(len(idp.bond_to_type), idp.orbpair_irreps.num_irreps)
-        typed_scalar_ave = torch.ones(len(idp.bond_to_type), n_scalar)
-        typed_scalar_std = torch.zeros(len(idp.bond_to_type), n_scalar)
-        for bt, tp in idp.bond_to_type.items():
-            norms_per_irrep = []
-            count_scalar = 0
-            for ir, s in enumerate(irrep_slices):
-                sub_tensor = typed_hopping[bt][:, s]
-                # dump the nan blocks here
-                if sub_tensor.shape[-1] == 1:
-                    count_scalar += 1
-                if not torch.isnan(sub_tensor).all():
-                    # update the mean and ave
-                    norms = torch.norm(sub_tensor, p=2, dim=1) # shape: [n_edge]
-                    if sub_tensor.shape[-1] == 1:
-                        # it's a scalar
-                        typed_scalar_ave[tp][count_scalar-1] = sub_tensor.mean()
-                        typed_scalar_std[tp][count_scalar-1] = sub_tensor.std()
-                    typed_norm_ave[tp][ir] = norms.mean()
-                    typed_norm_std[tp][ir] = norms.std()
-                else:
-                    norms = torch.ones_like(sub_tensor[:, 0])
-
-                if decay:
-                    norms_per_irrep.append(norms)
-
-            assert count_scalar <= n_scalar
-            # shape of typed_norm: (n_irreps, n_edges)
-
-            if decay:
-                typed_norm[bt] = torch.stack(norms_per_irrep)
-
-        edge_stats = {
-            "norm_ave": typed_norm_ave,
-            "norm_std": typed_norm_std,
-            "scalar_ave": typed_scalar_ave,
-            "scalar_std": typed_scalar_std,
-        }
-        
-        if decay:
-            typed_dataset = with_edge_vectors(typed_dataset)
-            decay = {}
-            for bt, tp in idp.bond_to_type.items():
-                decay_bt = {}
-                lengths_bt = typed_dataset["edge_lengths"][typed_dataset["edge_type"].flatten().eq(tp)]
-                sorted_lengths, indices = lengths_bt.sort() # from small to large
-                # sort the norms by irrep l
-                sorted_norms = typed_norm[bt][idp.orbpair_irreps.sort().inv, :]
-                # sort the norms by edge length
-                sorted_norms = sorted_norms[:, indices]
-                decay_bt["edge_length"] = sorted_lengths
-                decay_bt["norm_decay"] = sorted_norms
-                decay[bt] = decay_bt
-            
-            edge_stats["decay"] = decay
-        
-        return edge_stats
-
-    def _E3nodespecies_stat(self, typed_dataset):
-        # we get the type marked dataset first
-        idp = self.transform
-        typed_dataset = typed_dataset
-
-        idp.get_irreps(no_parity=False)
-        irrep_slices = idp.orbpair_irreps.slices()
-
-        sorted_irreps = idp.orbpair_irreps.sort()[0].simplify()
-        n_scalar = sorted_irreps[0].mul if sorted_irreps[0].ir.l == 0 else 0
-
-        features = typed_dataset["node_features"]
-        onsite_block_mask = idp.mask_to_nrme[typed_dataset["atom_types"].flatten()]
-        typed_onsite = {}
-        for at, tp in idp.chemical_symbol_to_type.items():
-            onsite_tp_mask = onsite_block_mask[typed_dataset["atom_types"].flatten().eq(tp)]
-            onsite_tp = features[typed_dataset["atom_types"].flatten().eq(tp)]
-            filtered_vecs = torch.where(onsite_tp_mask, onsite_tp, torch.tensor(float('nan')))
-            typed_onsite[at] = filtered_vecs
-        
-        # calculate norm & mean
-        typed_norm_ave = torch.ones(len(idp.chemical_symbol_to_type), idp.orbpair_irreps.num_irreps)
-        typed_norm_std = torch.zeros(len(idp.chemical_symbol_to_type), idp.orbpair_irreps.num_irreps)
-        typed_scalar_ave = torch.ones(len(idp.chemical_symbol_to_type), n_scalar)
-        typed_scalar_std = torch.zeros(len(idp.chemical_symbol_to_type), n_scalar)
-        for at, tp in idp.chemical_symbol_to_type.items():
-            count_scalar = 0
-            for ir, s in enumerate(irrep_slices):
-                sub_tensor = typed_onsite[at][:, s]
-                # dump the nan blocks here
-                if sub_tensor.shape[-1] == 1:
-                    count_scalar += 1
-                if not torch.isnan(sub_tensor).all():
-
-                    norms = torch.norm(sub_tensor, p=2, dim=1)
-                    typed_norm_ave[tp][ir] = norms.mean()
-                    if norms.numel() > 1:
-                        typed_norm_std[tp][ir] = norms.std()
-                    else:
-                        typed_norm_std[tp][ir] = 1.0
-                    if s.stop - s.start == 1:
-                        # it's a scalar
-                        
-                        typed_scalar_ave[tp][count_scalar-1] = sub_tensor.mean()
-                        if sub_tensor.numel() > 1:
-                            typed_scalar_std[tp][count_scalar-1] = sub_tensor.std()
-                        else:
-                            typed_scalar_std[tp][count_scalar-1] = 1.0
-
-        edge_stats = {
-            "norm_ave": typed_norm_ave,
-            "norm_std": typed_norm_std,
-            "scalar_ave": typed_scalar_ave,
-            "scalar_std": typed_scalar_std,
-        }
-
-        return edge_stats
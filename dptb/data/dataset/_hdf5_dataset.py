@@ -1,6 +1,8 @@
 from typing import Dict, Any, List, Callable, Union, Optional
 import os
+import copy
 import glob
+from collections import OrderedDict
 
 import numpy as np
 import h5py
@@ -23,12 +25,134 @@ from dptb.nn.hamiltonian import E3Hamiltonian
 from tqdm import tqdm
 import logging
 from dptb.data.dataset._default_dataset import DefaultDataset
+from dptb.data.e3_statistics import e3_statistics, statistics_cache_file, set_model_scale_shift
 
 
 
 
 log = logging.getLogger(__name__)
 
+# the candidate names of the block files of a trajectory, the first existing one is used.
+BLOCK_FILES = {
+    "hamiltonian": ["hamiltonians.h5", "hamiltonian.h5"],
+    "overlap": ["overlaps.h5", "overlap.h5"],
+    "DM": ["density_matrices.h5", "DM.h5"],
+}
+
+
+def find_block_file(root: str, kind: str) -> Optional[str]:
+    """The path of the ``kind`` (hamiltonian, overlap or DM) block file in ``root``, None if not found."""
+    for name in BLOCK_FILES[kind]:
+        if os.path.exists(os.path.join(root, name)):
+            return os.path.join(root, name)
+    return None
+
+
+def pack_blocks(group: h5py.Group, blocks, compression: Optional[str] = "gzip", compression_opts=4, chunk_size: int = 2**20):
+    """Write the blocks ``{"i_j_Rx_Ry_Rz": array}`` of one frame into ``group`` in the packed layout.
+
+    All the blocks of the frame are flattened into a single ``values`` dataset, chunked along the
+    frame and optionally compressed, next to the ``keys`` [nblocks, 5], ``shapes`` [nblocks, 2] and
+    ``offsets`` [nblocks + 1] index arrays. A frame is then read with a few sequential chunk reads,
+    instead of one small dataset read per block.
+    """
+    keys = list(blocks.keys())
+    arrays = [np.asarray(blocks[k][:]) for k in keys]
+    shapes = np.array([a.shape for a in arrays], dtype=np.int32).reshape(-1, 2)
+    offsets = np.concatenate([[0], np.cumsum(shapes.prod(axis=1))]).astype(np.int64)
+    values = np.concatenate([a.ravel() for a in arrays]) if arrays else np.zeros(0)
+
+    group.create_dataset("keys", data=np.array([list(map(int, k.split("_"))) for k in keys], dtype=np.int32).reshape(-1, 5))
+    group.create_dataset("shapes", data=shapes)
+    group.create_dataset("offsets", data=offsets)
+    options = {}
+    if len(values) > 0:
+        options = {"chunks": (min(len(values), chunk_size),), "compression": compression}
+        if compression is not None:
+            options["compression_opts"] = compression_opts
+    group.create_dataset("values", data=values, **options)
+
+
+def unpack_blocks(group: h5py.Group):
+    """Read the blocks of one frame, as ``{"i_j_Rx_Ry_Rz": array}``.
+
+    Groups in the original layout, with one dataset per block, are returned as they are.
+    """
+    if "values" not in group:
+        return group
+    values = group["values"][:]
+    offsets = group["offsets"][:]
+    blocks = {}
+    for key, shape, start, stop in zip(group["keys"][:], group["shapes"][:], offsets[:-1], offsets[1:]):
+        blocks["_".join(map(str, key))] = values[start:stop].reshape(shape)
+    return blocks
+
+
+class PackedBlockWriter(object):
+    """Append the blocks of one frame into ``group`` in the packed layout of `pack_blocks`, a few at a time.
+
+    The index arrays and the ``values`` dataset are resized on each `append`, so that the blocks of a large
+    structure are written without holding all of them in memory.
+    """
+
+    def __init__(self, group: h5py.Group, dtype=np.float32, compression: Optional[str] = "gzip", compression_opts=4, chunk_size: int = 2**20):
+        options = {"compression": compression}
+        if compression is not None:
+            options["compression_opts"] = compression_opts
+        self.keys = group.create_dataset("keys", shape=(0, 5), maxshape=(None, 5), chunks=(4096, 5), dtype=np.int32)
+        self.shapes = group.create_dataset("shapes", shape=(0, 2), maxshape=(None, 2), chunks=(4096, 2), dtype=np.int32)
+        self.offsets = group.create_dataset("offsets", data=np.zeros(1, dtype=np.int64), maxshape=(None,), chunks=(4096,))
+        self.values = group.create_dataset("values", shape=(0,), maxshape=(None,), chunks=(chunk_size,), dtype=dtype, **options)
+
+    def append(self, keys: np.ndarray, shapes: np.ndarray, values: np.ndarray):
+        """Append the blocks with ``keys`` [n, 5] and ``shapes`` [n, 2], flattened and concatenated in ``values``."""
+        n, start, end = len(self.keys), self.offsets[-1], len(self.values)
+        assert start == end and len(values) == int(shapes.prod(axis=1).sum())
+        self.keys.resize(n + len(keys), axis=0)
+        self.keys[n:] = keys
+        self.shapes.resize(n + len(keys), axis=0)
+        self.shapes[n:] = shapes
+        self.offsets.resize(n + len(keys) + 1, axis=0)
+        self.offsets[n+1:] = start + np.cumsum(shapes.prod(axis=1))
+        self.values.resize(end + len(values), axis=0)
+        self.values[end:] = values
+
+
+def _build_atomic_data(structure, info: dict, idp: TypeMapper = None, features=False, overlaps=False) -> AtomicData:
+    """Build the AtomicData of one frame from its structure and (optional) Hamiltonian/DM and overlap blocks."""
+    if structure.get('cell', None) is None:
+        frame_cell = None
+    else:
+        frame_cell = structure['cell'][:]
+
+    atomic_data = AtomicData.from_points(
+        pos = structure["positions"][:],
+        cell = frame_cell,
+        atomic_numbers = structure["atomic_numbers"][:],
+        r_max = info["r_max"], 
+        er_max = info.get("er_max", None),
+        oer_max = info.get("oer_max", None),
+        pbc = info["pbc"], 
+    )
+
+    if features is not False or overlaps is not False:
+        block_to_feature(atomic_data, idp, features, overlaps)
+
+    if not hasattr(atomic_data, AtomicDataDict.EDGE_FEATURES_KEY):
+        # TODO: initialize the edge and node feature tempretely, there should be a better way.
+        atomic_data[AtomicDataDict.EDGE_FEATURES_KEY] = torch.zeros(atomic_data[AtomicDataDict.EDGE_INDEX_KEY].shape[1], 1)
+        atomic_data[AtomicDataDict.NODE_FEATURES_KEY] = torch.zeros(atomic_data[AtomicDataDict.POSITIONS_KEY].shape[0], 1)
+        # just temporarily initialize the edge and node feature to zeros, to let the batch collate work.
+    if not hasattr(atomic_data, AtomicDataDict.EDGE_OVERLAP_KEY):
+        atomic_data[AtomicDataDict.EDGE_OVERLAP_KEY] = torch.zeros(atomic_data[AtomicDataDict.EDGE_INDEX_KEY].shape[1], 1)
+    if not hasattr(atomic_data, AtomicDataDict.NODE_SOC_KEY):
+        atomic_data[AtomicDataDict.NODE_SOC_KEY] = torch.zeros(atomic_data[AtomicDataDict.POSITIONS_KEY].shape[0], 1)
+        atomic_data[AtomicDataDict.NODE_SOC_SWITCH_KEY] = torch.as_tensor([False],dtype=torch.bool)
+        # torch.as_tensor([False],dtype=torch.bool) # by default, no SOC
+
+    return atomic_data
+
+
 class _HDF5_TrajData(object):
     """ Class for handling HDF5 trajectory data. This class works mostly like the _default_dataset._TrajData class..
     Just instead the positions and atomic_numbers, cell data are not stored by .dat but the .h5 file.
@@ -48,80 +172,50 @@ class _HDF5_TrajData(object):
         self.info = info
         self.data = {}
 
-        assert os.path.exists(os.path.join(root, "structure.pkl")), "structure file not found."
-        # now the structure file is a pickle file
-        with open(os.path.join(self.root, "structure.pkl"), 'rb') as f:
-            self.data["structure"] = pickle.load(f)
-
-        # self.data["structure"] = h5py.File(os.path.join(self.root, "structure.h5"), "r")
+        if os.path.exists(os.path.join(root, "structure.h5")):
+            # the structures converted by `convert_hdf5_archive`, one group per frame.
+            self.data["structure"] = h5py.File(os.path.join(self.root, "structure.h5"), "r")
+        else:
+            assert os.path.exists(os.path.join(root, "structure.pkl")), "structure file not found."
+            with open(os.path.join(self.root, "structure.pkl"), 'rb') as f:
+                self.data["structure"] = pickle.load(f)
 
         if get_eigenvalues:
             log.error("get_eigenvalues is not implemented for HDF5_TrajData yet.")
             raise NotImplementedError("get_eigenvalues is not implemented for HDF5_TrajData yet.")
         
         if get_Hamiltonian:
-            assert os.path.exists(os.path.join(root, "hamiltonian.h5")), "Hamiltonian file not found."
-            self.data["hamiltonian_blocks"] = h5py.File(os.path.join(self.root, "hamiltonians.h5"), "r")
+            assert find_block_file(root, "hamiltonian") is not None, "Hamiltonian file not found."
+            self.data["hamiltonian_blocks"] = h5py.File(find_block_file(root, "hamiltonian"), "r")
 
         if get_overlap:
-            assert os.path.exists(os.path.join(root, "overlap.h5")), "Overlap file not found."
-            self.data["overlap_blocks"] = h5py.File(os.path.join(self.root, "overlap.h5"), "r")
+            assert find_block_file(root, "overlap") is not None, "Overlap file not found."
+            self.data["overlap_blocks"] = h5py.File(find_block_file(root, "overlap"), "r")
         
         if get_DM:
-            assert os.path.exists(os.path.join(root, "DM.h5")), "DM file not found."
-            self.data["DM_blocks"] = h5py.File(os.path.join(self.root, "DM.h5"), "r")
+            assert find_block_file(root, "DM") is not None, "DM file not found."
+            self.data["DM_blocks"] = h5py.File(find_block_file(root, "DM"), "r")
 
 
     def toAtomicDataList(self, idp: TypeMapper = None):
         data_list = []
         for frame in self.data["structure"].keys():
-            if self.data['structure'][frame].get('cell',None) is None:
-                frame_cell = None
-            else:
-                frame_cell = self.data['structure'][frame]['cell'][:]
-
-            atomic_data = AtomicData.from_points(
-                pos = self.data['structure'][frame]["positions"][:],
-                cell = frame_cell,
-                atomic_numbers = self.data['structure'][frame]["atomic_numbers"][:],
-                r_max = self.info["r_max"], 
-                er_max = self.info.get("er_max", None),
-                oer_max = self.info.get("oer_max", None),
-                pbc = self.info["pbc"], 
-            )
-            
             if "hamiltonian_blocks" in self.data:
                 assert idp is not None, "LCAO Basis must be provided  in `common_option` for loading Hamiltonian."
-                features = self.data["hamiltonian_blocks"][frame]
+                features = unpack_blocks(self.data["hamiltonian_blocks"][frame])
             elif "DM_blocks" in self.data:
                 assert idp is not None, "LCAO Basis must be provided  in `common_option` for loading Density Matrix."
-                features = self.data["DM_blocks"][frame]
+                features = unpack_blocks(self.data["DM_blocks"][frame])
             else:
                 features = False
                             
             if "overlap_blocks" in self.data:
-                overlaps = self.data["overlap_blocks"][frame]
+                overlaps = unpack_blocks(self.data["overlap_blocks"][frame])
             else:
                 overlaps = False
 
-            if features != False or overlaps != False:
-                block_to_feature(atomic_data, idp, features, overlaps)
-
-
-            if not hasattr(atomic_data, AtomicDataDict.EDGE_FEATURES_KEY):
-                # TODO: initialize the edge and node feature tempretely, there should be a better way.
-                atomic_data[AtomicDataDict.EDGE_FEATURES_KEY] = torch.zeros(atomic_data[AtomicDataDict.EDGE_INDEX_KEY].shape[1], 1)
-                atomic_data[AtomicDataDict.NODE_FEATURES_KEY] = torch.zeros(atomic_data[AtomicDataDict.POSITIONS_KEY].shape[0], 1)
-                # just temporarily initialize the edge and node feature to zeros, to let the batch collate work.
-            if not hasattr(atomic_data, AtomicDataDict.EDGE_OVERLAP_KEY):
-                atomic_data[AtomicDataDict.EDGE_OVERLAP_KEY] = torch.zeros(atomic_data[AtomicDataDict.EDGE_INDEX_KEY].shape[1], 1)
-                # with torch.no_grad():
-                #     atomic_data = e3(atomic_data.to_dict())
-                # atomic_data = AtomicData.from_dict(atomic_data)
-            if not hasattr(atomic_data, AtomicDataDict.NODE_SOC_KEY):
-                atomic_data[AtomicDataDict.NODE_SOC_KEY] = torch.zeros(atomic_data[AtomicDataDict.POSITIONS_KEY].shape[0], 1)
-                atomic_data[AtomicDataDict.NODE_SOC_SWITCH_KEY] = torch.as_tensor([False],dtype=torch.bool)
-                # torch.as_tensor([False],dtype=torch.bool) # by default, no SOC
+            atomic_data = _build_atomic_data(self.data['structure'][frame], self.info, idp, features, overlaps)
+
             if "eigenvalues" in self.data and "kpoints" in self.data:
                 assert "bandinfo" in self.info, "`bandinfo` must be provided in `info.json` for loading eigenvalues."
                 bandinfo = self.info["bandinfo"]
@@ -153,7 +247,8 @@ class HDF5Dataset(AtomicInMemoryDataset):
             get_Hamiltonian: bool = False,
             get_overlap: bool = False,
             get_DM: bool = False,
-            get_eigenvalues: bool = False
+            get_eigenvalues: bool = False,
+            num_workers: int = 1,
             ):
     
         self.root = root
@@ -194,6 +289,7 @@ class HDF5Dataset(AtomicInMemoryDataset):
             AtomicData_options={},  # we do not pass anything here.
             include_frames=include_frames,
             type_mapper=type_mapper,
+            num_workers=num_workers,
         )
 
     def get_data(self):
@@ -371,4 +467,215 @@ class HDF5Dataset(AtomicInMemoryDataset):
             "scalar_std": typed_scalar_std,
         }
 
-        return edge_stats
\ No newline at end of file
+        return edge_stats
+
+class LazyHDF5Dataset(AtomicDataset):
+    """The HDF5 trajectories of `HDF5Dataset`, with the AtomicData of each frame built on demand.
+
+    Only the list of frames is read at initialization. ``get(idx)`` reads the structure and blocks
+    of a single frame, builds its neighbor list and features, and keeps the result in a LRU cache of
+    ``cache_size`` frames, so the memory does not grow with the size of the archive.
+
+    The structures are read from ``structure.h5`` when the trajectory has been converted by
+    `convert_hdf5_archive`, and from ``structure.pkl`` otherwise. The h5 files are opened once per
+    process and reopened after a fork, so the dataset can be shared by the DataLoader workers.
+    """
+    def __init__(
+            self,
+            root: str,
+            info_files: Dict[str, Dict],
+            url: Optional[str] = None,
+            include_frames: Optional[List[int]] = None,
+            type_mapper: TypeMapper = None,
+            get_Hamiltonian: bool = False,
+            get_overlap: bool = False,
+            get_DM: bool = False,
+            get_eigenvalues: bool = False,
+            cache_size: int = 128,
+            ):
+        assert not get_Hamiltonian * get_DM, "Hamiltonian and Density Matrix can only loaded one at a time, for which will occupy the same attribute in the AtomicData."
+        if get_eigenvalues:
+            log.error("get_eigenvalues is not implemented for HDF5Dataset yet.")
+            raise NotImplementedError("get_eigenvalues is not implemented for HDF5Dataset yet.")
+
+        self.url = url
+        self.include_frames = include_frames
+        self.info_files = info_files
+        self.get_Hamiltonian = get_Hamiltonian
+        self.get_overlap = get_overlap
+        self.get_DM = get_DM
+        self.get_eigenvalues = get_eigenvalues
+        self.cache_size = cache_size
+        super().__init__(root=root, type_mapper=type_mapper)
+
+        self.files = {}
+        self.frames = []
+        for folder in self.info_files.keys():
+            path = os.path.join(self.root, folder)
+            files = {}
+            if os.path.exists(os.path.join(path, "structure.h5")):
+                files["structure"] = os.path.join(path, "structure.h5")
+                with h5py.File(files["structure"], "r") as f:
+                    frames = list(f.keys())
+            else:
+                assert os.path.exists(os.path.join(path, "structure.pkl")), f"structure file not found in {path}."
+                log.warning(f"{path} stores the structures in structure.pkl, which is loaded at once. "
+                            "Convert it with `convert_hdf5_archive` to load the structures on demand.")
+                with open(os.path.join(path, "structure.pkl"), 'rb') as f:
+                    files["structure"] = pickle.load(f)
+                frames = list(files["structure"].keys())
+
+            for kind, flag in [("hamiltonian", get_Hamiltonian), ("overlap", get_overlap), ("DM", get_DM)]:
+                if flag:
+                    files[kind] = find_block_file(path, kind)
+                    assert files[kind] is not None, f"{kind} file not found in {path}."
+
+            self.files[folder] = files
+            self.frames += [(folder, frame) for frame in sorted(frames, key=lambda x: int(x) if x.isdigit() else x)]
+
+        self._reset_handles()
+
+    def _reset_handles(self):
+        self._pid = os.getpid()
+        self._handles = {}
+        self._cache = OrderedDict()
+
+    def __getstate__(self):
+        # the h5 handles can not be pickled, the workers spawned by the DataLoader reopen them.
+        state = self.__dict__.copy()
+        state["_handles"] = {}
+        state["_cache"] = OrderedDict()
+        return state
+
+    def _handle(self, folder: str, kind: str):
+        if self._pid != os.getpid():
+            # the handles inherited from the parent process are not safe to use after a fork.
+            self._reset_handles()
+        source = self.files[folder][kind]
+        if not isinstance(source, str):
+            return source
+        if (folder, kind) not in self._handles:
+            self._handles[(folder, kind)] = h5py.File(source, "r")
+        return self._handles[(folder, kind)]
+
+    def len(self):
+        return len(self.frames)
+
+    def get(self, idx):
+        idx = int(idx)
+        if self._pid != os.getpid():
+            self._reset_handles()
+        if idx in self._cache:
+            self._cache.move_to_end(idx)
+            # a shallow copy, since the transform adds and removes the fields of the returned object.
+            return copy.copy(self._cache[idx])
+
+        folder, frame = self.frames[idx]
+        features, overlaps = False, False
+        if self.get_Hamiltonian or self.get_DM:
+            assert self.type_mapper is not None, "LCAO Basis must be provided  in `common_option` for loading Hamiltonian."
+            features = unpack_blocks(self._handle(folder, "hamiltonian" if self.get_Hamiltonian else "DM")[frame])
+        if self.get_overlap:
+            overlaps = unpack_blocks(self._handle(folder, "overlap")[frame])
+        atomic_data = _build_atomic_data(self._handle(folder, "structure")[frame], self.info_files[folder], self.type_mapper, features, overlaps)
+
+        if self.cache_size > 0:
+            self._cache[idx] = atomic_data
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return copy.copy(atomic_data)
+        return atomic_data
+
+    @property
+    def raw_file_names(self):
+        return ["Null"]
+
+    @property
+    def raw_dir(self):
+        return self.root
+
+    def download(self):
+        # the files are checked when the trajectories are indexed.
+        pass
+
+    def E3statistics(self, model: torch.nn.Module=None, decay=False, chunk_size: int=32, num_workers: int=1, use_cache: bool=True):
+
+        if not self.get_Hamiltonian and not self.get_DM:
+            return None
+
+        if model is not None:
+            if not isinstance(model.node_prediction_h, torch.nn.Module):
+                return None
+
+        assert self.transform is not None
+        idp = self.transform
+
+        cache_file = None
+        if use_cache:
+            # the h5 files can be rewritten in place, so their size and mtime are part of the cache key.
+            fingerprint = []
+            for files in self.files.values():
+                for source in files.values():
+                    if isinstance(source, str):
+                        fingerprint.append([source, os.path.getsize(source), os.path.getmtime(source)])
+            cache_file = statistics_cache_file(self, idp, decay=decay, h5_files=fingerprint)
+        stats = e3_statistics(self, idp, decay=decay, chunk_size=chunk_size, num_workers=num_workers, cache_file=cache_file)
+
+        if model is not None and stats is not None:
+            # initilize the model param with statistics
+            set_model_scale_shift(model, stats)
+
+        return stats
+
+
+def convert_hdf5_archive(
+        root: str,
+        out_root: Optional[str] = None,
+        compression: Optional[str] = "gzip",
+        compression_opts: int = 4,
+        chunk_size: int = 2**20,
+        ):
+    """Convert a trajectory folder of `HDF5Dataset` to the layout read on demand by `LazyHDF5Dataset`.
+
+    The structures of ``structure.pkl`` are written to ``structure.h5``, one group per frame, and
+    the Hamiltonian, overlap and density matrix block files are rewritten in the packed layout of
+    `pack_blocks`. Both layouts are read by `HDF5Dataset` and `LazyHDF5Dataset`.
+
+    Parameters
+    ----------
+    root : str
+        the trajectory folder, containing ``structure.pkl`` and the block files.
+    out_root : str, optional
+        the folder of the converted files, by default ``root``, where the block files are then
+        replaced by their packed version. ``structure.pkl`` is never modified.
+    compression : str, optional
+        the h5py compression filter of the block values, e.g. "gzip" or "lzf", None to disable.
+    compression_opts : int
+        the options of the compression filter, e.g. the gzip level.
+    chunk_size : int
+        the maximum number of values in one chunk of a frame.
+    """
+    out_root = out_root or root
+    os.makedirs(out_root, exist_ok=True)
+
+    with open(os.path.join(root, "structure.pkl"), 'rb') as f:
+        structures = pickle.load(f)
+    # the tracked order keeps the order of the frames in the pickle.
+    with h5py.File(os.path.join(out_root, "structure.h5"), "w", track_order=True) as f:
+        for frame, structure in structures.items():
+            group = f.create_group(str(frame))
+            for key in ["positions", "atomic_numbers", "cell"]:
+                if structure.get(key, None) is not None:
+                    group.create_dataset(key, data=np.asarray(structure[key]))
+
+    for kind in BLOCK_FILES:
+        source = find_block_file(root, kind)
+        if source is None:
+            continue
+        target = os.path.join(out_root, os.path.basename(source))
+        # the packed file is written aside, and replaces the original only once it is complete.
+        with h5py.File(source, "r") as fin, h5py.File(target + ".tmp", "w", track_order=True) as fout:
+            for frame in fin.keys():
+                pack_blocks(fout.create_group(frame), unpack_blocks(fin[frame]), compression=compression,
+                            compression_opts=compression_opts, chunk_size=chunk_size)
+        os.replace(target + ".tmp", target)
@@ -0,0 +1,197 @@
+"""The memory-mapped cache of the processed in-memory datasets.
+
+The processed frames are batched into shards of at most ``shard_frames`` frames. Every tensor of a
+shard (concatenated along the batch as by `Batch.from_data_list`) is stored in its own ``.npy``
+file, next to a ``table.pth`` with the slice and cumsum tables needed to reconstruct the frames.
+The shards are listed by the ``data.index`` file of the processed directory, which is written
+last, so that an interrupted or concurrent build never leaves a partial cache behind. The shards
+are built in a ``data.<id>.tmp`` directory, renamed to ``data.<id>`` once complete, and the
+complete directories no longer listed by the index are removed when it is written.
+
+The shards are loaded with copy-on-write memory maps: nothing is read until a frame is accessed,
+and the pages are shared through the OS page cache by all the processes loading the same cache,
+e.g. the workers of a DataLoader, instead of being unpickled into the memory of each of them.
+"""
+
+import os
+import uuid
+import shutil
+import bisect
+import logging
+import multiprocessing as mp
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+from dptb.utils.torch_geometric import Batch, Data
+from dptb.utils.savenload import atomic_write
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+INDEX_FILE = "data.index"
+LEGACY_FILE = "data.pth"
+
+
+def save_shard(batch: Batch, shard_dir: str):
+    """Save the tensors of a batch in their own ``.npy`` files, with the tables to reconstruct its frames."""
+    os.makedirs(shard_dir)
+    table = {
+        "num_graphs": batch.num_graphs,
+        "batchinfo": batch.get_batchinfo(),
+        "tensors": {},
+        "nested": {},
+        "objects": {},
+    }
+    for key, item in batch:
+        if isinstance(item, torch.Tensor) and item.is_nested:
+            # the components are concatenated along their first dimension, with their shapes.
+            components = item.unbind()
+            table["nested"][key] = [tuple(c.shape) for c in components]
+            item = torch.cat([c.reshape(-1) for c in components])
+        elif not isinstance(item, torch.Tensor):
+            table["objects"][key] = item
+            continue
+        table["tensors"][key] = str(item.dtype)
+        np.save(os.path.join(shard_dir, f"{key}.npy"), item.detach().cpu().contiguous().numpy())
+    torch.save(table, os.path.join(shard_dir, "table.pth"))
+    return batch.num_graphs
+
+
+def load_shard(shard_dir: str) -> Batch:
+    """Load a shard as a batch whose tensors are copy-on-write memory maps of its files."""
+    table = torch.load(os.path.join(shard_dir, "table.pth"), weights_only=False)
+    batch = Batch()
+    for key in table["tensors"]:
+        item = torch.from_numpy(np.load(os.path.join(shard_dir, f"{key}.npy"), mmap_mode="c"))
+        if key in table["nested"]:
+            shapes = table["nested"][key]
+            offsets = np.cumsum([0] + [int(np.prod(shape)) for shape in shapes])
+            item = torch.nested.as_nested_tensor(
+                [item[offsets[i]:offsets[i + 1]].view(shape) for i, shape in enumerate(shapes)])
+        batch[key] = item
+    for key, item in table["objects"].items():
+        batch[key] = item
+    for key, item in table["batchinfo"].items():
+        setattr(batch, key, item)
+    batch.__num_graphs__ = table["num_graphs"]
+    return batch
+
+
+# the frames are shared with the forked workers instead of being pickled for every shard.
+_WORKER_FRAME = None
+
+
+def _init_worker(frame):
+    global _WORKER_FRAME
+    _WORKER_FRAME = frame
+    torch.set_num_threads(1)
+
+
+def _build_shard(frame: Callable[[int], Data], indices: List[int], shard_dir: str) -> int:
+    return save_shard(Batch.from_data_list([frame(i) for i in indices]), shard_dir)
+
+
+def _build_shard_worker(args) -> int:
+    return _build_shard(_WORKER_FRAME, *args)
+
+
+def build_cache(
+        processed_dir: str,
+        frame: Callable[[int], Data],
+        indices: List[int],
+        include_frames: Optional[List[int]] = None,
+        shard_frames: int = 1000,
+        num_workers: int = 1,
+) -> List[Batch]:
+    """Build the shards of the frames ``frame(i)`` for ``i`` in ``indices``, and return them memory mapped.
+
+    The shards are built by ``num_workers`` forked worker processes, each of them constructing and batching
+    the frames of its shards.
+    """
+    data_dir = f"data.{uuid.uuid4().hex[:8]}"
+    chunks = [indices[i:i + shard_frames] for i in range(0, len(indices), shard_frames)]
+    tasks = [(chunk, os.path.join(processed_dir, f"{data_dir}.tmp", f"shard.{i}")) for i, chunk in enumerate(chunks)]
+    if num_workers > 1 and len(tasks) > 1:
+        ctx = mp.get_context("fork")
+        with ctx.Pool(processes=min(num_workers, len(tasks)), initializer=_init_worker, initargs=(frame,)) as pool:
+            num_graphs = pool.map(_build_shard_worker, tasks)
+    else:
+        num_graphs = [_build_shard(frame, *task) for task in tasks]
+    os.rename(os.path.join(processed_dir, f"{data_dir}.tmp"), os.path.join(processed_dir, data_dir))
+
+    shards = [{"dir": os.path.join(data_dir, f"shard.{i}"), "num_graphs": n} for i, n in enumerate(num_graphs)]
+    write_index(processed_dir, shards, include_frames)
+    return load_cache(processed_dir)[0]
+
+
+def write_index(processed_dir: str, shards: List[Dict], include_frames: Optional[List[int]] = None):
+    index = {"version": CACHE_VERSION, "shards": shards, "include_frames": include_frames}
+    with atomic_write(os.path.join(processed_dir, INDEX_FILE), binary=True) as f:
+        torch.save(index, f)
+    remove_stale_shards(processed_dir, shards)
+    total_MBs = sum(os.path.getsize(os.path.join(processed_dir, shard["dir"], name))
+                    for shard in shards for name in os.listdir(os.path.join(processed_dir, shard["dir"]))) / (1024 * 1024)
+    log.info(f"Cached {sum(shard['num_graphs'] for shard in shards)} processed frames in {len(shards)} shards, ~{total_MBs:.2f} MB")
+
+
+def remove_stale_shards(processed_dir: str, shards: List[Dict]):
+    """Remove the complete ``data.<id>`` directories of the earlier builds, which the index no longer lists.
+
+    The ``.tmp`` directories of the builds in progress are kept, and the processes still mapping the files of
+    a removed directory keep reading them until they unmap them.
+    """
+    listed = set(shard["dir"].split(os.sep)[0] for shard in shards)
+    for name in os.listdir(processed_dir):
+        path = os.path.join(processed_dir, name)
+        if name.startswith("data.") and not name.endswith(".tmp") and name not in listed and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_cache(processed_dir: str):
+    """Memory map the shards of a processed directory, returns them with the ``include_frames`` of the cache."""
+    index = torch.load(os.path.join(processed_dir, INDEX_FILE), weights_only=False)
+    if index["version"] != CACHE_VERSION:
+        raise ValueError(f"The processed cache {processed_dir} has the version {index['version']} instead of "
+                         f"{CACHE_VERSION}. Please delete it and rerun.")
+    shards = [load_shard(os.path.join(processed_dir, shard["dir"])) for shard in index["shards"]]
+    return shards, index["include_frames"]
+
+
+def migrate_legacy_cache(processed_dir: str, nested_fields) -> bool:
+    """Convert the ``data.pth`` cache of a processed directory to memory-mapped shards, if there is one.
+
+    The batch of the legacy cache is kept as a single shard, and the ``data.pth`` file is removed. Returns
+    whether a legacy cache was migrated, its shards are then loaded by `load_cache`.
+    """
+    legacy = os.path.join(processed_dir, LEGACY_FILE)
+    if not os.path.isfile(legacy):
+        return False
+    log.info(f"Migrating the processed data {legacy} to the memory-mapped cache.")
+    data, include_frames = torch.load(legacy, weights_only=False)
+    for k, v in data:
+        if k in nested_fields:
+            data[k] = torch.nested.as_nested_tensor(v)
+    data_dir = f"data.{uuid.uuid4().hex[:8]}"
+    save_shard(data, os.path.join(processed_dir, f"{data_dir}.tmp", "shard.0"))
+    os.rename(os.path.join(processed_dir, f"{data_dir}.tmp"), os.path.join(processed_dir, data_dir))
+    shard_dir = os.path.join(data_dir, "shard.0")
+    write_index(processed_dir, [{"dir": shard_dir, "num_graphs": data.num_graphs}], include_frames)
+    os.remove(legacy)
+    return True
+
+
+class ShardIndex(object):
+    """Map the frame indices of a dataset to its shards and their local frame indices."""
+
+    def __init__(self, shards: List[Batch]):
+        self.offsets = np.cumsum([0] + [shard.num_graphs for shard in shards]).tolist()
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def locate(self, idx: int):
+        idx = len(self) + idx if idx < 0 else idx
+        ishard = bisect.bisect_right(self.offsets, idx) - 1
+        return ishard, idx - self.offsets[ishard]
@@ -17,7 +17,7 @@ from dptb.data import (
 from tqdm import tqdm
 from ..transforms import TypeMapper
 from ._base_datasets import AtomicDataset
-from dptb.nn.hamiltonian import E3Hamiltonian
+from dptb.data.e3_statistics import e3_statistics, statistics_cache_file, set_model_scale_shift
 import lmdb
 from dptb.data.interfaces.ham_to_feature import block_to_feature
 import pickle
@@ -35,6 +35,7 @@ class LMDBDataset(AtomicDataset):
         get_overlap: bool = False,
         get_DM: bool = False,
         get_eigenvalues: bool = False,
+        record_ids: Optional[Dict[str, List[int]]] = None,
     ):
         # TO DO, this may be simplified
         # See if a subclass defines some inputs
@@ -71,9 +72,12 @@ class LMDBDataset(AtomicDataset):
             for lmdb_path in lmdb_paths:
                 db_env = lmdb.open(lmdb_path, readonly=True, lock=False)
                 with db_env.begin() as txn:
-                    self.num_graphs += txn.stat()['entries']
-                    self.file_map += [file] * txn.stat()['entries']
-                    self.index_map += list(range(txn.stat()['entries']))
+                    # the records of a manifest split, or all the records of the file.
+                    indices = list(range(txn.stat()['entries'])) if record_ids is None or file not in record_ids \
+                        else list(record_ids[file])
+                    self.num_graphs += len(indices)
+                    self.file_map += [file] * len(indices)
+                    self.index_map += indices
                 db_env.close()
 
     def len(self):
@@ -85,7 +89,8 @@ class LMDBDataset(AtomicDataset):
         Supports wildcards in root paths and returns all existing matches.
 
         Args:
-            folder_name: Folder name (or path). Only the base name is used for matching.
+            folder_name: Folder name (or path). Only the base name is used for matching, but an existing
+                absolute path, as listed in a manifest, is returned as it is.
 
         Returns:
             list[str]: List of existing LMDB paths. Empty list if none found.
@@ -95,6 +100,8 @@ class LMDBDataset(AtomicDataset):
             - Processes wildcards (*, ?, []) in root paths via `glob`
             - Handles both single root (str) and multiple roots (list)
         """
+        if os.path.isabs(folder_name) and os.path.exists(folder_name):
+            return [folder_name]  # the absolute paths of the folders of a manifest
         folder_name = os.path.split(folder_name)[-1]  # Keep only base name
 
         # Normalize root paths to list for consistent processing
@@ -193,7 +200,7 @@ class LMDBDataset(AtomicDataset):
 
         return atomicdata
 
-    def E3statistics(self, model: torch.nn.Module=None):
+    def E3statistics(self, model: torch.nn.Module=None, decay=False, chunk_size: int=32, num_workers: int=1, use_cache: bool=True):
 
         if not self.get_Hamiltonian and not self.get_DM:
             return None
@@ -205,143 +212,19 @@ class LMDBDataset(AtomicDataset):
         assert self.transform is not None
         idp = self.transform
 
-        e3h = E3Hamiltonian(basis=idp.basis, decompose=True)
-        idp.get_irreps()
-        sorted_irreps = idp.orbpair_irreps.sort()[0].simplify()
-        n_scalar = sorted_irreps[0].mul if sorted_irreps[0].ir.l == 0 else 0
-
-        # init a count dict of atom species
-        count_at = {}
-        for at, tp in idp.chemical_symbol_to_type.items():
-            count_at[tp] = 0
-
-        count_bt = {}
-        for bt, tp in idp.bond_to_type.items():
-            count_bt[tp] = 0
-
-        # calculate norm & mean
-        node_norm_ave = torch.zeros(len(idp.chemical_symbol_to_type), idp.orbpair_irreps.num_irreps)
-        node_square_ave = torch.zeros(len(idp.chemical_symbol_to_type), idp.orbpair_irreps.num_irreps)
-        node_norm_std = torch.ones(len(idp.chemical_symbol_to_type), idp.orbpair_irreps.num_irreps)
-        node_scalar_ave = torch.zeros(len(idp.chemical_symbol_to_type), n_scalar)
-        node_scalar_square_ave = torch.zeros(len(idp.chemical_symbol_to_type), n_scalar)
-        node_scalar_std = torch.ones(len(idp.chemical_symbol_to_type), n_scalar)
-        edge_norm_ave = torch.zeros(len(idp.bond_types), idp.orbpair_irreps.num_irreps)
-        edge_square_ave = torch.zeros(len(idp.bond_types), idp.orbpair_irreps.num_irreps)
-        edge_norm_std = torch.ones(len(idp.bond_types), idp.orbpair_irreps.num_irreps)
-        edge_scalar_ave = torch.zeros(len(idp.bond_types), n_scalar)
-        edge_scalar_square_ave = torch.zeros(len(idp.bond_types), n_scalar)
-        edge_scalar_std = torch.ones(len(idp.bond_types), n_scalar)
-
-        for idx in tqdm(range(self.len()), desc="Collecting E3 irreps statistics: "):
-            with torch.no_grad():
-                atomicdata = idp(self.get(idx=idx)).to_dict()
-                if atomicdata[AtomicDataDict.EDGE_FEATURES_KEY].abs().sum() < 1e-7:
-                    continue
-                atomicdata = e3h(atomicdata)
-
-                subcount_at = {}
-                for at, tp in idp.chemical_symbol_to_type.items():
-                    subcount_at[tp] = 0
-
-                subcount_bt = {}
-                for bt, tp in idp.bond_to_type.items():
-                    subcount_bt[tp] = 0
-
-                onsite_mask = idp.mask_to_nrme[atomicdata[AtomicDataDict.ATOM_TYPE_KEY].flatten()]
-
-                for at, tp in idp.chemical_symbol_to_type.items():
-                    count_scalar = 0
-                    at_mask = onsite_mask[atomicdata[AtomicDataDict.ATOM_TYPE_KEY].flatten().eq(tp)]
-                    n_at = at_mask.shape[0]
-
-                    if n_at > 0:
-                        at_onsite = atomicdata[AtomicDataDict.NODE_FEATURES_KEY][atomicdata[AtomicDataDict.ATOM_TYPE_KEY].flatten().eq(tp)]
-                        for ir, s in enumerate(idp.orbpair_irreps.slices()):
-                            sub_tensor = at_onsite[:, s]
-                            if sub_tensor.shape[-1] == 1:
-                                count_scalar += 1
-                            norms = torch.norm(sub_tensor, p=2, dim=1)
-                            # we do a running avg and var here
-                            node_norm_ave[tp][ir] = (node_norm_ave[tp][ir] * count_at[tp] + norms.sum(dim=0)) / (count_at[tp] + n_at)
-                            node_square_ave[tp][ir] = (node_square_ave[tp][ir] * count_at[tp] + (norms**2).sum(dim=0)) / (count_at[tp] + n_at)
-                            if count_at[tp] + n_at > 1:
-                                node_norm_std[tp][ir] = torch.nan_to_num(torch.sqrt((count_at[tp] + n_at) / (count_at[tp] + n_at - 1) * (node_square_ave[tp][ir] - node_norm_ave[tp][ir]**2)), nan=0.0)
-                            else:
-                                node_norm_std[tp][ir] = 1.0
-
-                            if sub_tensor.shape[-1] == 1:
-                                # is scalar
-                                node_scalar_ave[tp][count_scalar-1] = (node_scalar_ave[tp][count_scalar-1] * count_at[tp] + sub_tensor.sum()) / (count_at[tp] + n_at)
-                                node_scalar_square_ave[tp][count_scalar-1] = (node_scalar_square_ave[tp][count_scalar-1] * count_at[tp] + (sub_tensor**2).sum()) / (count_at[tp] + n_at)
-                                if count_at[tp] + n_at > 1:
-                                    node_scalar_std[tp][count_scalar-1] = torch.nan_to_num(torch.sqrt((count_at[tp] + n_at) / (count_at[tp] + n_at - 1) * (node_scalar_square_ave[tp][count_scalar-1] - node_scalar_ave[tp][count_scalar-1]**2)), nan=0.0)
-                                else:
-                                    node_scalar_std[tp][count_scalar-1] = 1.0
-                        subcount_at[tp] = n_at
-                        count_at[tp] += n_at
-                assert sum(subcount_at.values()) == atomicdata[AtomicDataDict.POSITIONS_KEY].shape[0]
-
-                # edge statistics
-                hopping_mask = idp.mask_to_erme[atomicdata[AtomicDataDict.EDGE_TYPE_KEY].flatten()]
-                for bt, tp in idp.bond_to_type.items():
-                    count_scalar = 0
-                    bt_mask = hopping_mask[atomicdata[AtomicDataDict.EDGE_TYPE_KEY].flatten().eq(tp)]
-                    n_bt = bt_mask.shape[0]
-
-                    if n_bt > 0:
-                        bt_hopping = atomicdata[AtomicDataDict.EDGE_FEATURES_KEY][atomicdata[AtomicDataDict.EDGE_TYPE_KEY].flatten().eq(tp)]
-                        for ir, s in enumerate(idp.orbpair_irreps.slices()):
-                            sub_tensor = bt_hopping[:, s]
-                            if sub_tensor.shape[-1] == 1:
-                                count_scalar += 1
-
-                            norms = torch.norm(sub_tensor, p=2, dim=1)
-                            # we do a running avg and var here
-                            edge_norm_ave[tp][ir] = (edge_norm_ave[tp][ir] * count_bt[tp] + norms.sum(dim=0)) / (count_bt[tp] + n_bt)
-                            edge_square_ave[tp][ir] = (edge_square_ave[tp][ir] * count_bt[tp] + (norms**2).sum(dim=0)) / (count_bt[tp] + n_bt)
-                            if count_bt[tp] + n_bt > 1:
-                                edge_norm_std[tp][ir] = torch.nan_to_num(torch.sqrt((count_bt[tp] + n_bt) / (count_bt[tp] + n_bt - 1) * (edge_square_ave[tp][ir] - edge_norm_ave[tp][ir]**2)), nan=0.0)
-                            else:
-                                edge_norm_std[tp][ir] = 1.0
-                            if sub_tensor.shape[-1] == 1:
-                                # is scalar
-                                edge_scalar_ave[tp][count_scalar-1] = (edge_scalar_ave[tp][count_scalar-1] * count_bt[tp] + sub_tensor.sum()) / (count_bt[tp] + n_bt)
-                                edge_scalar_square_ave[tp][count_scalar-1] = (edge_scalar_square_ave[tp][count_scalar-1] * count_bt[tp] + (sub_tensor**2).sum()) / (count_bt[tp] + n_bt)
-                                if count_bt[tp] + n_bt > 1:
-                                    edge_scalar_std[tp][count_scalar-1] = torch.nan_to_num(torch.sqrt((count_bt[tp] + n_bt) / (count_bt[tp] + n_bt - 1) * (edge_scalar_square_ave[tp][count_scalar-1] - edge_scalar_ave[tp][count_scalar-1]**2)), nan=0.0)
-                                else:
-                                    edge_scalar_std[tp][count_scalar-1] = 1.0
-
-                        subcount_bt[tp] = n_bt
-                        count_bt[tp] += n_bt
-                assert sum(subcount_bt.values()) == atomicdata[AtomicDataDict.EDGE_INDEX_KEY].shape[1]
-
-        stats = {}
-        stats["node"] = {
-            "norm_ave": node_norm_ave,
-            "norm_std": node_norm_std,
-            "scalar_ave": node_scalar_ave,
-            "scalar_std": node_scalar_std
-        }
-        stats["edge"] = {
-            "norm_ave": edge_norm_ave,
-            "norm_std": edge_norm_std,
-            "scalar_ave": edge_scalar_ave,
-            "scalar_std": edge_scalar_std,
-        }
-
-        if model is not None:
+        cache_file = None
+        if use_cache:
+            # the lmdb files can be updated in place, so their size and mtime are part of the cache key.
+            fingerprint = []
+            for file in self.info_files.keys():
+                for lmdb_path in self.simple_get_lmdb_path(file):
+                    mdb = os.path.join(lmdb_path, "data.mdb")
+                    fingerprint.append([mdb, os.path.getsize(mdb), os.path.getmtime(mdb)])
+            cache_file = statistics_cache_file(self, idp, decay=decay, lmdb_files=fingerprint)
+        stats = e3_statistics(self, idp, decay=decay, chunk_size=chunk_size, num_workers=num_workers, cache_file=cache_file)
+
+        if model is not None and stats is not None:
             # initilize the model param with statistics
-            scalar_mask = torch.BoolTensor([ir.dim==1 for ir in model.idp.orbpair_irreps])
-            node_shifts = stats["node"]["scalar_ave"]
-            node_scales = stats["node"]["norm_ave"]
-            node_scales[:,scalar_mask] = stats["node"]["scalar_std"]
-
-            edge_shifts = stats["edge"]["scalar_ave"]
-            edge_scales = stats["edge"]["norm_ave"]
-            edge_scales[:,scalar_mask] = stats["edge"]["scalar_std"]
-            model.node_prediction_h.set_scale_shift(scales=node_scales, shifts=node_shifts)
-            model.edge_prediction_h.set_scale_shift(scales=edge_scales, shifts=edge_shifts)
-
-        return stats
\ No newline at end of file
+            set_model_scale_shift(model, stats)
+
+        return stats
@@ -0,0 +1,311 @@
+"""Streaming statistics of the E3 irreducible matrix elements of a dataset.
+
+The statistics (mean and std of the norm of each irrep, and of the scalar irreps themselves, per
+atom species and per bond type) are used to initialize the scale and shift of the E3 prediction
+layers. They are collected frame chunk by frame chunk, so the memory does not grow with the size
+of the dataset: each chunk is reduced to per type ``(count, mean, M2)`` moments with scatter sums,
+and the moments of the chunks are merged with the parallel algorithm of Chan et al., which also
+allows to collect the chunks in a pool of worker processes.
+"""
+
+import os
+import hashlib
+import logging
+import multiprocessing as mp
+from typing import Dict, List, Optional
+
+import yaml
+import torch
+from tqdm import tqdm
+
+from dptb.data import AtomicDataDict
+from dptb.data.AtomicDataDict import with_edge_vectors
+from dptb.data.transforms import OrbitalMapper
+from dptb.nn.hamiltonian import E3Hamiltonian
+from dptb.utils.torch_geometric import Batch
+
+log = logging.getLogger(__name__)
+
+
+class RunningMoments(object):
+    """Count, mean and sum of squared deviations (M2) of grouped samples, with Chan's merge.
+
+    The moments are kept for ``n_groups`` groups (atom species or bond types) and ``n_features``
+    features, the ``count`` is per group since all the features of a sample share the same group.
+    """
+
+    def __init__(self, n_groups: int, n_features: int):
+        self.count = torch.zeros(n_groups, 1, dtype=torch.float64)
+        self.mean = torch.zeros(n_groups, n_features, dtype=torch.float64)
+        self.m2 = torch.zeros(n_groups, n_features, dtype=torch.float64)
+
+    @classmethod
+    def from_samples(cls, samples: torch.Tensor, groups: torch.Tensor, n_groups: int):
+        """Moments of a chunk, samples of shape [n_samples, n_features] with group index [n_samples]."""
+        moments = cls(n_groups, samples.shape[1])
+        samples = samples.to(torch.float64)
+        moments.count = torch.bincount(groups, minlength=n_groups).to(torch.float64).unsqueeze(1)
+        total = torch.zeros_like(moments.mean).index_add_(0, groups, samples)
+        moments.mean = total / moments.count.clamp(min=1)
+        moments.m2 = torch.zeros_like(moments.m2).index_add_(0, groups, (samples - moments.mean[groups]) ** 2)
+        return moments
+
+    def merge(self, other: "RunningMoments") -> "RunningMoments":
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        ratio = other.count / count.clamp(min=1)
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * ratio
+        self.count = count
+        return self
+
+    def std(self) -> torch.Tensor:
+        # unbiased std, the same as torch.std
+        return torch.sqrt(self.m2 / (self.count - 1).clamp(min=1))
+
+
+class E3StatisticsAccumulator(object):
+    """Accumulate the node and edge E3 irreps statistics of decomposed AtomicDataDict chunks."""
+
+    def __init__(self, idp: OrbitalMapper, decay: bool = False):
+        self.idp = idp
+        self.decay = decay
+
+        irreps = idp.get_irreps(no_parity=False)
+        slices = irreps.slices()
+        n_irreps = len(slices)
+        # the irrep index of each column of the features, used to sum the squares into norms.
+        self.irrep_index = torch.cat([torch.full((s.stop - s.start,), ir, dtype=torch.long) for ir, s in enumerate(slices)])
+        self.scalar_columns = torch.tensor([s.start for s in slices if s.stop - s.start == 1], dtype=torch.long)
+        self.n_irreps = n_irreps
+
+        # an irrep is valid for a type if all of its elements belong to the orbital pairs of the type.
+        irrep_width = torch.bincount(self.irrep_index, minlength=n_irreps)
+        self.node_valid = self._irrep_valid(idp.mask_to_nrme, irrep_width)
+        self.edge_valid = self._irrep_valid(idp.mask_to_erme, irrep_width)
+
+        n_nodes, n_edges, n_scalar = len(idp.type_names), len(idp.bond_types), len(self.scalar_columns)
+        self.node_norm = RunningMoments(n_nodes, n_irreps)
+        self.node_scalar = RunningMoments(n_nodes, n_scalar)
+        self.edge_norm = RunningMoments(n_edges, n_irreps)
+        self.edge_scalar = RunningMoments(n_edges, n_scalar)
+        self.edge_lengths = {bt: [] for bt in idp.bond_to_type}
+        self.edge_norms = {bt: [] for bt in idp.bond_to_type}
+
+    def _irrep_valid(self, mask: torch.Tensor, irrep_width: torch.Tensor) -> torch.Tensor:
+        mask = mask.cpu().to(torch.long)
+        n_valid = torch.zeros(mask.shape[0], self.n_irreps, dtype=torch.long).index_add_(1, self.irrep_index, mask)
+        return n_valid == irrep_width
+
+    def _norms(self, features: torch.Tensor) -> torch.Tensor:
+        squares = torch.zeros(features.shape[0], self.n_irreps, dtype=features.dtype)
+        return torch.sqrt(squares.index_add_(1, self.irrep_index, features ** 2))
+
+    def update(self, data: AtomicDataDict.Type):
+        """Add a chunk of typed AtomicDataDict, whose features are already decomposed into irreps."""
+        atom_types = data[AtomicDataDict.ATOM_TYPE_KEY].flatten().cpu()
+        node_features = data[AtomicDataDict.NODE_FEATURES_KEY].detach().cpu()
+        self.node_norm.merge(RunningMoments.from_samples(self._norms(node_features), atom_types, len(self.node_valid)))
+        self.node_scalar.merge(RunningMoments.from_samples(node_features[:, self.scalar_columns], atom_types, len(self.node_valid)))
+
+        edge_type = data[AtomicDataDict.EDGE_TYPE_KEY].flatten().cpu()
+        edge_features = data[AtomicDataDict.EDGE_FEATURES_KEY].detach().cpu()
+        edge_norms = self._norms(edge_features)
+        self.edge_norm.merge(RunningMoments.from_samples(edge_norms, edge_type, len(self.edge_valid)))
+        self.edge_scalar.merge(RunningMoments.from_samples(edge_features[:, self.scalar_columns], edge_type, len(self.edge_valid)))
+
+        if self.decay:
+            edge_lengths = with_edge_vectors(data)[AtomicDataDict.EDGE_LENGTH_KEY].detach().cpu()
+            for bt, tp in self.idp.bond_to_type.items():
+                bt_mask = edge_type.eq(tp)
+                # the norms of irreps that do not exist in this bond type are set to one.
+                norms = torch.where(self.edge_valid[tp], edge_norms[bt_mask], torch.ones(1, dtype=edge_norms.dtype))
+                self.edge_lengths[bt].append(edge_lengths[bt_mask])
+                self.edge_norms[bt].append(norms.T)
+
+    def merge(self, other: "E3StatisticsAccumulator") -> "E3StatisticsAccumulator":
+        self.node_norm.merge(other.node_norm)
+        self.node_scalar.merge(other.node_scalar)
+        self.edge_norm.merge(other.edge_norm)
+        self.edge_scalar.merge(other.edge_scalar)
+        for bt in self.edge_lengths:
+            self.edge_lengths[bt] += other.edge_lengths[bt]
+            self.edge_norms[bt] += other.edge_norms[bt]
+        return self
+
+    @property
+    def num_samples(self) -> int:
+        return int(self.node_norm.count.sum() + self.edge_norm.count.sum())
+
+    def _stats(self, norm: RunningMoments, scalar: RunningMoments, valid: torch.Tensor) -> Dict[str, torch.Tensor]:
+        # irreps without any sample keep the neutral scale 1 and shift 1, a single sample has std 1.
+        valid = valid & (norm.count > 0)
+        scalar_valid = valid[:, self.irrep_index[self.scalar_columns]]
+        single = norm.count == 1
+        dtype = torch.get_default_dtype()
+        norm_std = torch.where(single, torch.ones_like(norm.mean), norm.std())
+        scalar_std = torch.where(single, torch.ones_like(scalar.mean), scalar.std())
+        return {
+            "norm_ave": torch.where(valid, norm.mean, torch.ones_like(norm.mean)).to(dtype),
+            "norm_std": torch.where(valid, norm_std, torch.zeros_like(norm_std)).to(dtype),
+            "scalar_ave": torch.where(scalar_valid, scalar.mean, torch.ones_like(scalar.mean)).to(dtype),
+            "scalar_std": torch.where(scalar_valid, scalar_std, torch.zeros_like(scalar_std)).to(dtype),
+        }
+
+    def finalize(self) -> Dict[str, Dict[str, torch.Tensor]]:
+        stats = {
+            "node": self._stats(self.node_norm, self.node_scalar, self.node_valid),
+            "edge": self._stats(self.edge_norm, self.edge_scalar, self.edge_valid),
+        }
+
+        if self.decay:
+            decay = {}
+            sort_inv = self.idp.orbpair_irreps.sort().inv
+            for bt in self.idp.bond_to_type:
+                lengths = torch.cat(self.edge_lengths[bt]) if self.edge_lengths[bt] else torch.zeros(0)
+                norms = torch.cat(self.edge_norms[bt], dim=1) if self.edge_norms[bt] else torch.zeros(self.n_irreps, 0)
+                sorted_lengths, indices = lengths.sort() # from small to large
+                # sort the norms by irrep l, and then by edge length
+                decay[bt] = {
+                    "edge_length": sorted_lengths,
+                    "norm_decay": norms[sort_inv, :][:, indices].to(torch.get_default_dtype()),
+                }
+            stats["edge"]["decay"] = decay
+
+        return stats
+
+
+def _collect_chunk(dataset, indices: List[int], idp: OrbitalMapper, decay: bool) -> E3StatisticsAccumulator:
+    accumulator = E3StatisticsAccumulator(idp=idp, decay=decay)
+    data_list = []
+    for idx in indices:
+        data = dataset.get(int(idx))
+        # frames without any target do not contribute to the statistics.
+        if data[AtomicDataDict.EDGE_FEATURES_KEY].abs().sum() >= 1e-7:
+            data_list.append(data)
+    if len(data_list) == 0:
+        return accumulator
+
+    e3h = E3Hamiltonian(basis=idp.basis, decompose=True)
+    with torch.no_grad():
+        data = idp(Batch.from_data_list(data_list).to_dict())
+        data = e3h(data)
+    accumulator.update(data)
+    return accumulator
+
+
+# the dataset and options are shared with the forked workers instead of being pickled for every task.
+_WORKER_ARGS = None
+
+
+def _init_worker(dataset, idp, decay):
+    global _WORKER_ARGS
+    _WORKER_ARGS = (dataset, idp, decay)
+    # one intra-op thread per worker, the workers already occupy the cores.
+    torch.set_num_threads(1)
+
+
+def _collect_chunk_worker(indices: List[int]) -> E3StatisticsAccumulator:
+    dataset, idp, decay = _WORKER_ARGS
+    return _collect_chunk(dataset, indices, idp, decay)
+
+
+def statistics_cache_file(dataset, idp: OrbitalMapper, decay: bool = False, **fingerprint) -> Optional[str]:
+    """The file caching the statistics of a dataset, in its processed directory.
+
+    The file name is the SHA1 hash of the basis, the ``decay`` option, the selected frames and any
+    extra ``fingerprint`` of the data, while the processed directory itself is already keyed on the
+    hash of the dataset parameters. Returns ``None`` if the dataset has no single root directory.
+    """
+    if not isinstance(dataset.root, str) or any(char in dataset.root for char in ['*', '?', '[']):
+        return None
+    params = {
+        "basis": idp.basis,
+        "decay": decay,
+        "indices": None if dataset._indices is None else [int(i) for i in dataset._indices],
+        "num_frames": dataset.len(),
+    }
+    params.update(fingerprint)
+    param_hash = hashlib.sha1(yaml.dump(params).encode("ascii")).hexdigest()
+    return os.path.join(dataset.processed_dir, f"E3statistics_{param_hash}.pth")
+
+
+def e3_statistics(
+        dataset,
+        idp: OrbitalMapper,
+        decay: bool = False,
+        chunk_size: int = 32,
+        num_workers: int = 1,
+        cache_file: Optional[str] = None,
+        ) -> Optional[Dict[str, Dict[str, torch.Tensor]]]:
+    """Collect the E3 irreps statistics of a dataset in bounded-size chunks of frames.
+
+    Parameters
+    ----------
+    dataset : AtomicDataset
+        the dataset, the frames are fetched by ``dataset.get(idx)``, which does not apply the transform.
+    idp : OrbitalMapper
+        the e3tb orbital mapper of the dataset.
+    decay : bool, optional
+        whether to also collect the decay of the edge irrep norms with the bond length. This keeps
+        the norm of every edge, so its memory grows with the size of the dataset.
+    chunk_size : int, optional
+        the number of frames processed together.
+    num_workers : int, optional
+        the number of worker processes collecting the chunks, by default 1 (in the main process).
+    cache_file : str, optional
+        if given, the statistics are loaded from this file when it exists, and saved to it otherwise. A cache
+        that can not be written, e.g. in a read-only processed directory, is skipped with a warning.
+
+    Returns
+    -------
+    dict or None
+        the "node" and "edge" statistics, or None if no frame of the dataset has any target.
+    """
+    if cache_file is not None and os.path.isfile(cache_file):
+        log.info(f"Loading the E3 irreps statistics from {cache_file}")
+        return torch.load(cache_file, weights_only=False)
+
+    indices = dataset.indices()
+    chunks = [indices[i:i+chunk_size] for i in range(0, len(indices), chunk_size)]
+    accumulator = E3StatisticsAccumulator(idp=idp, decay=decay)
+    progress = tqdm(total=len(chunks), desc="Collecting E3 irreps statistics: ")
+    if num_workers > 1 and len(chunks) > 1:
+        ctx = mp.get_context("fork")
+        with ctx.Pool(processes=min(num_workers, len(chunks)), initializer=_init_worker, initargs=(dataset, idp, decay)) as pool:
+            # imap keeps the chunk order, so that the result does not depend on the scheduling.
+            for chunk_acc in pool.imap(_collect_chunk_worker, chunks):
+                accumulator.merge(chunk_acc)
+                progress.update(1)
+    else:
+        for chunk in chunks:
+            accumulator.merge(_collect_chunk(dataset, chunk, idp, decay))
+            progress.update(1)
+    progress.close()
+
+    if accumulator.num_samples == 0:
+        return None
+
+    stats = accumulator.finalize()
+    if cache_file is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            torch.save(stats, cache_file)
+        except OSError as e:
+            log.warning(f"Failed to cache the E3 irreps statistics in {cache_file}: {e}")
+
+    return stats
+
+
+def set_model_scale_shift(model: torch.nn.Module, stats: Dict[str, Dict[str, torch.Tensor]]):
+    """Initialize the scale and shift of the E3 node and edge prediction layers with the statistics."""
+    scalar_mask = torch.BoolTensor([ir.dim==1 for ir in model.idp.orbpair_irreps])
+    node_shifts = stats["node"]["scalar_ave"]
+    node_scales = stats["node"]["norm_ave"].clone()
+    node_scales[:,scalar_mask] = stats["node"]["scalar_std"]
+
+    edge_shifts = stats["edge"]["scalar_ave"]
+    edge_scales = stats["edge"]["norm_ave"].clone()
+    edge_scales[:,scalar_mask] = stats["edge"]["scalar_std"]
+    model.node_prediction_h.set_scale_shift(scales=node_scales, shifts=node_shifts)
+    model.edge_prediction_h.set_scale_shift(scales=edge_scales, shifts=edge_shifts)
@@ -0,0 +1,216 @@
+"""Manifests of the trajectory folders, or of the LMDB records, of the splits of a dataset.
+
+A manifest lists the data of a dataset instead of copying it: the ``dptb data --split`` and
+``--collect`` commands write one, and `build_dataset` loads the folders of one of its splits in
+place of a ``root`` and a ``prefix``. A JSON manifest looks like::
+
+    {
+        "root": "..",
+        "seed": 1,
+        "folders": {"train": ["frame.0", "frame.3"], "val": ["frame.1"], "test": ["frame.2"]},
+        "records": {"train": {"data.0": [0, 2, 5]}, "val": {"data.0": [1, 3]}}
+    }
+
+where ``root`` is relative to the directory of the manifest and the folders to ``root``. The
+``folders`` can also be a plain list, for a dataset without splits, and the optional ``records``
+restrict the LMDB folders to some of their records. A text manifest lists one folder per line,
+optionally preceded by the name of its split.
+"""
+
+import os
+import json
+import shutil
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+SPLITS = ["train", "val", "test"]
+LINK_MODES = ["symlink", "hardlink", "copy"]
+
+
+def split_indices(num: int, ratios: Dict[str, float], seed: int = 1) -> Dict[str, np.ndarray]:
+    """Randomly assign ``num`` items to the splits, reproducibly from ``seed``.
+
+    The splits but the validation set get ``int(num * ratio)`` items and the validation set the rest,
+    the items being drawn from a permutation of ``numpy.random.RandomState(seed)``.
+    """
+    assert abs(sum(ratios.values()) - 1.0) < 1e-8, "The sum of train_ratio, test_ratio, and val_ratio must be 1.0."
+    assert all(ratio >= 0 for ratio in ratios.values()), "All ratios must be positive."
+    counts = {name: int(num * ratio) for name, ratio in ratios.items() if name != "val"}
+    counts["val"] = num - sum(counts.values())
+
+    indices = np.random.RandomState(seed).choice(num, num, replace=False)
+    splits, start = {}, 0
+    for name in SPLITS:
+        if name in ratios:
+            splits[name] = np.sort(indices[start:start + counts[name]])
+            start += counts[name]
+    return splits
+
+
+def lmdb_num_records(path: str) -> int:
+    import lmdb
+    env = lmdb.open(path, readonly=True, lock=False)
+    with env.begin() as txn:
+        num = txn.stat()['entries']
+    env.close()
+    return num
+
+
+def write_manifest(path: str, root: str, folders, records: Optional[Dict] = None, **metadata) -> str:
+    """Write a JSON manifest of the ``folders`` under ``root``, and return its path."""
+    manifest_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest = {"root": os.path.relpath(os.path.abspath(root), manifest_dir), **metadata, "folders": folders}
+    if records is not None:
+        manifest["records"] = records
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    log.info(f"The manifest of the dataset is written to {path}.")
+    return path
+
+
+def load_manifest(path: str, split: Optional[str] = None) -> Tuple[str, List[str], Optional[Dict[str, List[int]]]]:
+    """Read the folders of a split from a manifest.
+
+    Parameters
+    ----------
+    path : str
+        The JSON manifest, or a text file with one folder per line, optionally preceded by its split.
+    split : str, optional
+        The split to load, all the folders of the manifest if None.
+
+    Returns
+    -------
+    root : str
+        The absolute root of the folders.
+    folders : List[str]
+        The absolute paths of the folders of the split.
+    records : Dict[str, List[int]] or None
+        The records of the LMDB folders in the split, by absolute folder path, or None for all the records.
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(path))
+    records = None
+    if path.endswith(".json"):
+        with open(path) as f:
+            manifest = json.load(f)
+        root = os.path.normpath(os.path.join(manifest_dir, manifest.get("root", ".")))
+        folders = manifest["folders"]
+        if isinstance(folders, dict):
+            if split is not None and split not in folders:
+                raise KeyError(f"The split {split} is not in the manifest {path}, which has {list(folders)}.")
+            folders = folders[split] if split is not None else sum(folders.values(), [])
+        if "records" in manifest:
+            records = manifest["records"]
+            records = records[split] if split is not None else \
+                {folder: sum([rec.get(folder, []) for rec in records.values()], []) for folder in folders}
+            records = {os.path.normpath(os.path.join(root, folder)): ids for folder, ids in records.items()}
+    else:
+        root, folders = manifest_dir, []
+        with open(path) as f:
+            for line in f:
+                fields = line.split("#")[0].split()
+                if len(fields) == 1 or (len(fields) == 2 and split in (None, fields[0])):
+                    folders.append(fields[-1])
+                elif len(fields) > 2:
+                    raise ValueError(f"The lines of the manifest {path} should be `folder` or `split folder`, not `{line}`.")
+
+    folders = [os.path.normpath(os.path.join(root, folder)) for folder in folders]
+    if len(folders) == 0:
+        raise ValueError(f"No folder of the split {split} is listed in the manifest {path}.")
+    return root, folders, records
+
+
+def link_folder(source: str, target: str, link: str):
+    """Make ``target`` a symlink, a tree of hardlinks or a copy of the folder ``source``."""
+    if link == "symlink":
+        os.symlink(os.path.abspath(source), target, target_is_directory=True)
+    elif link == "hardlink":
+        shutil.copytree(source, target, copy_function=os.link)
+    else:
+        assert link == "copy", f"The link mode should be one of {LINK_MODES}, not {link}."
+        shutil.copytree(source, target)
+
+
+def split_dataset(
+        dataset_dir: str,
+        prefix: str,
+        train_ratio: float,
+        val_ratio: float,
+        test_ratio: float = 0.,
+        seed: int = 1,
+        by: str = "folder",
+        manifest: Optional[str] = None,
+        link: Optional[str] = None,
+        **kwargs,
+) -> str:
+    """Split the trajectory folders ``prefix*`` of ``dataset_dir``, or their LMDB records, into a manifest.
+
+    With ``by="record"``, the records of the LMDB folders are assigned to the splits one by one. With a ``link``
+    mode, the folders of each split are also linked or copied to the ``train``, ``val`` and ``test`` subfolders
+    of ``dataset_dir``. Returns the path of the manifest, ``dataset_dir/manifest.json`` by default.
+    """
+    filenames = sorted(f for f in os.listdir(dataset_dir) if f.startswith(prefix))
+    assert len(filenames) > 0, "No file found in the dataset directory."
+    assert train_ratio > 0 and val_ratio > 0, "All ratios must be positive."
+    ratios = {"train": train_ratio, "val": val_ratio, "test": test_ratio}
+    if test_ratio == 0:
+        ratios.pop("test")
+
+    if by == "record":
+        assert link is None, "The records of the LMDB folders can not be split into linked folders."
+        items = [(name, i) for name in filenames for i in range(lmdb_num_records(os.path.join(dataset_dir, name)))]
+        records = {}
+        for split, indices in split_indices(len(items), ratios, seed).items():
+            records[split] = {}
+            for index in indices:
+                name, i = items[index]
+                records[split].setdefault(name, []).append(i)
+        folders = {split: list(records[split]) for split in records}
+    else:
+        assert by == "folder", f"The dataset is split by folder or by record, not by {by}."
+        records = None
+        folders = {split: [filenames[i] for i in indices] for split, indices in split_indices(len(filenames), ratios, seed).items()}
+
+    if link is not None:
+        for split in folders:
+            os.mkdir(os.path.join(dataset_dir, split))
+            for name in folders[split]:
+                link_folder(os.path.join(dataset_dir, name), os.path.join(dataset_dir, split, name), link)
+
+    manifest = manifest or os.path.join(dataset_dir, "manifest.json")
+    return write_manifest(manifest, dataset_dir, folders, records, seed=seed, by=by, ratios=ratios)
+
+
+def collect_dataset(
+        subfolders: List[str],
+        name: str,
+        output_dir: str,
+        manifest: Optional[str] = None,
+        link: Optional[str] = None,
+        **kwargs,
+) -> str:
+    """Collect the trajectory folders with the data files into a manifest, ``output_dir/name.json`` by default.
+
+    With a ``link`` mode, the folders are also linked or copied to ``output_dir/name/name.<index>``.
+    """
+    required_files = ['positions.dat', 'cell.dat', 'atomic_numbers.dat']
+    collected = []
+    for subfolder in subfolders:
+        if all(os.path.isfile(os.path.join(subfolder, f)) for f in required_files):
+            collected.append(os.path.abspath(subfolder))
+        else:
+            log.warning(f"Data missing in {subfolder}. Skipping.")
+    assert len(collected) > 0, "No sub-folders with the data files are found in the provided path."
+
+    if link is not None:
+        os.makedirs(os.path.join(output_dir, name))
+        for idx, subfolder in enumerate(collected):
+            link_folder(subfolder, os.path.join(output_dir, name, f"{name}.{idx}"), link)
+
+    manifest = manifest or os.path.join(output_dir, f"{name}.json")
+    manifest_dir = os.path.dirname(os.path.abspath(manifest))
+    return write_manifest(manifest, manifest_dir, [os.path.relpath(f, manifest_dir) for f in collected])
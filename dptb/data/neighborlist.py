@@ -0,0 +1,183 @@
+"""Neighbor lists with a Verlet skin, reused along a trajectory of frames."""
+
+from typing import Union, Optional, Iterable, Iterator, Dict
+
+import numpy as np
+import ase
+import ase.io
+import ase.geometry
+import ase.neighborlist
+import torch
+import logging
+
+from . import AtomicDataDict
+from .AtomicData import AtomicData, get_r_map, get_r_map_bondwise
+from dptb.utils.profiling import profile_stage
+
+log = logging.getLogger(__name__)
+
+# the index key of each graph and the key of its cell shifts.
+_SHIFT_KEYS = {
+    AtomicDataDict.EDGE_INDEX_KEY: AtomicDataDict.EDGE_CELL_SHIFT_KEY,
+    AtomicDataDict.ENV_INDEX_KEY: AtomicDataDict.ENV_CELL_SHIFT_KEY,
+    AtomicDataDict.ONSITENV_INDEX_KEY: AtomicDataDict.ONSITENV_CELL_SHIFT_KEY,
+}
+
+
+def _max_cutoff(r_max: Union[float, int, dict]) -> float:
+    return float(max(r_max.values())) if isinstance(r_max, dict) else float(r_max)
+
+
+def _pair_cutoff(r_max: dict, atomic_numbers: torch.Tensor, first: torch.Tensor, second: torch.Tensor) -> torch.Tensor:
+    # the cutoff of each pair, by the rules of `neighbor_list_and_relative_vec`.
+    if len(next(iter(r_max.keys())).split("-")) == 1:
+        r_map = get_r_map(r_max, atomic_numbers)
+        return 0.5 * (r_map[atomic_numbers[first] - 1] + r_map[atomic_numbers[second] - 1])
+    else:
+        r_map = get_r_map_bondwise(r_max, atomic_numbers)
+        return r_map[atomic_numbers[first] - 1, atomic_numbers[second] - 1]
+
+
+class VerletNeighborList(object):
+    """The neighbor lists of the ``r_max``, ``er_max`` and ``oer_max`` graphs along a trajectory.
+
+    One list is searched with the largest cutoff plus ``skin``, and the three graphs of each frame are the pairs
+    of that list within their cutoffs. The list is searched again only when an atom has moved more than half
+    the skin since the last search, which bounds the change of any pair distance by the skin, or when the
+    cell, the pbc or the atoms change. The graphs are the same as the ones of `AtomicData.from_points`, up to
+    the order of the edges.
+
+    Args:
+        r_max: the cutoff of the edges, a float, or a dict of cutoffs per atom or per bond type.
+        er_max: the cutoff of the environment graph, not built if None.
+        oer_max: the cutoff of the onsite environment graph, not built if None.
+        skin: the padding of the searched cutoff, in Angstrom.
+    """
+
+    def __init__(
+            self,
+            r_max: Union[float, int, dict],
+            er_max: Optional[float]=None,
+            oer_max: Optional[float]=None,
+            skin: float=1.0,
+            ):
+        self.cutoffs = {
+            key: r for key, r in zip(_SHIFT_KEYS.keys(), [r_max, er_max, oer_max]) if r is not None
+        }
+        self.skin = float(skin)
+        assert self.skin >= 0, "The skin of the neighbor list should be non-negative."
+        self.n_build = 0
+        self._ref_pos = None
+
+    def needs_build(self, pos: np.ndarray, cell: np.ndarray, pbc: np.ndarray, atomic_numbers: np.ndarray) -> bool:
+        if self._ref_pos is None or pos.shape != self._ref_pos.shape:
+            return True
+        if not (np.array_equal(atomic_numbers, self._atomic_numbers) and np.array_equal(pbc, self._pbc)):
+            return True
+        # the images of the atoms move with the cell, which the displacements do not account for.
+        if not np.allclose(cell, self._cell, rtol=0.0, atol=1e-10):
+            return True
+        displacement = np.linalg.norm(pos - self._ref_pos, axis=-1).max(initial=0.0)
+        return displacement > 0.5 * self.skin
+
+    def build(self, pos: np.ndarray, cell: np.ndarray, pbc: np.ndarray, atomic_numbers: np.ndarray):
+        cutoff = max(_max_cutoff(r) for r in self.cutoffs.values()) + self.skin
+        first, second, shifts = ase.neighborlist.primitive_neighbor_list(
+            "ijS",
+            pbc,
+            ase.geometry.complete_cell(cell),
+            pos,
+            cutoff=cutoff,
+            self_interaction=False,
+            use_scaled_positions=False,
+        )
+
+        # keep one direction of each pair: i < j, and of the periodic images (i, i, S) and (i, i, -S) the one
+        # with the lexicographically larger S.
+        first_nonzero = np.take_along_axis(shifts, np.argmax(shifts != 0, axis=1)[:, None], axis=1)[:, 0]
+        keep = (first < second) | ((first == second) & (first_nonzero > 0))
+        self._first = torch.as_tensor(first[keep], dtype=torch.long)
+        self._second = torch.as_tensor(second[keep], dtype=torch.long)
+        self._shifts = torch.as_tensor(shifts[keep], dtype=torch.get_default_dtype())
+
+        self._ref_pos = pos.copy()
+        self._cell = cell.copy()
+        self._pbc = pbc.copy()
+        self._atomic_numbers = atomic_numbers.copy()
+        self.n_build += 1
+
+    @profile_stage("neighbor_list")
+    def update(
+            self,
+            pos: np.ndarray,
+            cell: np.ndarray,
+            pbc: np.ndarray,
+            atomic_numbers: np.ndarray,
+            ) -> Dict[str, torch.Tensor]:
+        """The edge indices and cell shifts of the three graphs at the positions ``pos``."""
+        pos = np.asarray(pos, dtype=np.float64)
+        cell = np.asarray(cell, dtype=np.float64).reshape(3, 3)
+        pbc = np.asarray(pbc, dtype=bool).reshape(3)
+        atomic_numbers = np.asarray(atomic_numbers)
+        if self.needs_build(pos, cell, pbc, atomic_numbers):
+            self.build(pos, cell, pbc, atomic_numbers)
+
+        pos_t = torch.as_tensor(pos, dtype=torch.get_default_dtype())
+        cell_t = torch.as_tensor(cell, dtype=torch.get_default_dtype())
+        vectors = pos_t[self._second] - pos_t[self._first] + self._shifts @ cell_t
+        lengths = torch.linalg.norm(vectors, dim=-1)
+        numbers = torch.as_tensor(atomic_numbers, dtype=torch.long)
+
+        out = {}
+        for key, r_max in self.cutoffs.items():
+            mask = lengths < _max_cutoff(r_max)
+            if isinstance(r_max, dict):
+                if len(r_max) < len(set(atomic_numbers.tolist())):
+                    raise ValueError("The number of r_max is less than the number of required atom species.")
+                mask &= lengths <= _pair_cutoff(r_max, numbers, self._first, self._second)
+            first, second, shifts = self._first[mask], self._second[mask], self._shifts[mask]
+            # both directions of each pair, as `neighbor_list_and_relative_vec` with reduce=False.
+            out[key] = torch.stack([torch.cat([first, second]), torch.cat([second, first])])
+            out[_SHIFT_KEYS[key]] = torch.cat([shifts, -shifts])
+
+        return out
+
+    def atomic_data(self, atoms: ase.Atoms, **kwargs) -> AtomicData:
+        """The `AtomicData` of the frame ``atoms``, with the graphs of the list."""
+        graphs = self.update(atoms.positions, atoms.get_cell(), atoms.pbc, atoms.get_atomic_numbers())
+        kwargs[AtomicDataDict.ATOMIC_NUMBERS_KEY] = atoms.get_atomic_numbers()
+        kwargs[AtomicDataDict.CELL_KEY] = torch.as_tensor(np.asarray(atoms.get_cell()), dtype=torch.get_default_dtype()).view(3, 3)
+        kwargs[AtomicDataDict.PBC_KEY] = torch.as_tensor(atoms.pbc, dtype=torch.bool).view(3)
+        kwargs.update(graphs)
+
+        return AtomicData(pos=torch.as_tensor(atoms.positions, dtype=torch.get_default_dtype()), **kwargs)
+
+
+def iread_atomic_data(
+        frames: Union[str, Iterable[ase.Atoms]],
+        r_max: Union[float, int, dict],
+        er_max: Optional[float]=None,
+        oer_max: Optional[float]=None,
+        skin: float=1.0,
+        index: Union[str, int, slice]=":",
+        format: Optional[str]=None,
+        **kwargs,
+        ) -> Iterator[AtomicData]:
+    """Yield the `AtomicData` of each frame of a trajectory, sharing one `VerletNeighborList`.
+
+    Args:
+        frames: the path of a trajectory readable by `ase.io.iread` (ase traj, extxyz, ...), or an iterable of
+            ``ase.Atoms``.
+        r_max, er_max, oer_max, skin: see `VerletNeighborList`.
+        index, format: passed to `ase.io.iread` when ``frames`` is a path.
+        **kwargs: other fields of the `AtomicData` of every frame.
+    """
+    if isinstance(frames, str):
+        frames = ase.io.iread(frames, index=index, format=format)
+
+    nlist = VerletNeighborList(r_max=r_max, er_max=er_max, oer_max=oer_max, skin=skin)
+    nframes = 0
+    for atoms in frames:
+        yield nlist.atomic_data(atoms, **kwargs)
+        nframes += 1
+    log.debug(f"Searched the neighbor list {nlist.n_build} times for {nframes} frames.")
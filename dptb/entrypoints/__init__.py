@@ -1,5 +1,9 @@
-from dptb.entrypoints.train import train
-from dptb.entrypoints.config import config
-# from dptb.entrypoints.run import run
-from dptb.entrypoints.test import _test as test
-from dptb.entrypoints.bond import bond
\ No newline at end of file
+from dptb.utils.lazy_import import lazy_attach
+
+# the entry functions are only imported when used, ``dptb -h`` must stay cheap.
+__getattr__, __dir__, __all__ = lazy_attach(__name__, {
+    "train": ".train",
+    "config": ".config",
+    "test": ".test:_test",
+    "bond": ".bond",
+})
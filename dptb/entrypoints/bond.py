@@ -1,7 +1,7 @@
 from typing import Dict, List, Optional, Any
 import ase.io as io
 from pathlib import Path
-from dptb.utils.tools import get_neighbours
+from dptb.utils.bond_analysis import get_neighbours, bond_length_histogram, suggest_cutoffs
 import os
 
 
@@ -11,8 +11,16 @@ def bond(
         cutoff: float,
         log_level: int,
         log_path: Optional[str],
+        traj: bool = False,
+        bin_width: float = 0.01,
+        stride: int = 1,
+        nshell: int = 1,
+        num_workers: int = 1,
         **kwargs
 ):
+    if traj:
+        return bond_traj(struct, cutoff, bin_width=bin_width, stride=stride, nshell=nshell, num_workers=num_workers)
+
     atom = io.read(struct)
     nb = get_neighbours(atom=atom, cutoff=cutoff, thr=accuracy)
 
@@ -33,3 +41,33 @@ def bond(
     print(out)
 
     return out
+
+
+def bond_traj(
+        traj_path: str,
+        cutoff: float,
+        bin_width: float = 0.01,
+        stride: int = 1,
+        nshell: int = 1,
+        num_workers: int = 1,
+):
+    if not os.path.exists(traj_path):
+        raise FileNotFoundError(f"The trajectory file {traj_path} does not exist.")
+    histogram = bond_length_histogram(traj_path, cutoff=cutoff, bin_width=bin_width, stride=stride, num_workers=num_workers)
+    shells = histogram.shells()
+    cutoffs = suggest_cutoffs(shells, nshell=nshell)
+
+    out = "%10s%8s%10s%10s%10s%10s" % ("Bond Type", "Shell", "Distance", "Min", "Max", "Count") + "\n" + "--"*29 + "\n"
+    for k, v in shells.items():
+        for n, shell in enumerate(v):
+            out += "%10s%8d%10.2f%10.2f%10.2f%10.2f" % (k, n+1, shell["distance"], shell["min"], shell["max"], shell["count"]) + "\n"
+
+    fmt = lambda x: "%10s" % "-" if x is None else "%10.2f" % x
+    out += "\n" + "Suggested cutoffs over %d frames:" % histogram.n_frames + "\n"
+    out += "%10s%10s%10s" % ("Bond Type", "r_max", "er_max") + "\n" + "--"*15 + "\n"
+    for k, v in cutoffs.items():
+        out += "%10s" % k + fmt(v["r_max"]) + fmt(v["er_max"]) + "\n"
+
+    print(out)
+
+    return out
@@ -21,6 +21,7 @@ log = logging.getLogger(__name__)
 def skf2pth(
         dir_path: str = "./",
         output: str = "skparams.pth",
+        num_workers: int = 1,
         log_level: int = logging.INFO,
         log_path: Optional[str] = None,
         **kwargs
@@ -32,7 +33,8 @@ def skf2pth(
         bond_type = ifile_name.split('.')[0]
         skfile_dict[bond_type] = ifile
 
-    skdict = SKParam.read_skfiles(skfile_dict)
+    # the files parsed before are read from the cache shared with SKParam.
+    skdict = SKParam.read_skfiles(skfile_dict, num_workers=num_workers)
 
     if output.split('.')[-1] != 'pth':
         output += '/skparams.pth'
@@ -1,13 +1,9 @@
 import os
 from typing import Dict, List, Optional, Any
 from dptb.utils.tools import j_loader
-import numpy as np
 import glob
-import shutil
-from tqdm import tqdm
-from dptb.utils.argcheck import normalize
 from dptb.data.interfaces.abacus import recursive_parse
-from dptb.utils.tools import setup_seed
+from dptb.data.manifest import split_dataset, collect_dataset
 
 def data(
         INPUT: str,
@@ -55,84 +51,54 @@ def data(
         #    "prefix": "",
         #    "train_ratio": 0.6 
         #    "test_ratio": 0.2,
-        #    "val_ratio": 0.2 
+        #    "val_ratio": 0.2,
+        #    "seed": 1,                    the random seed of the split.
+        #    "by": "folder",               or "record", to split the records of the LMDB folders.
+        #    "manifest": "manifest.json",  default to dataset_dir/manifest.json.
+        #    "link": null                  or "symlink", "hardlink", "copy" to also fill the train/val/test folders.
         # }
 
-        # setup seed
-        rds = np.random.RandomState(1)
-
-
-        dataset_dir = jdata.get("dataset_dir")
-        filenames = list(glob.glob(os.path.join(dataset_dir, jdata.get("prefix")+"*")))
-        nfile = len(filenames)
-        assert nfile > 0, "No file found in the dataset directory."
-
-        train_ratio = jdata.get("train_ratio")
-        test_ratio = jdata.get("test_ratio", 0.)
-        val_ratio = jdata.get("val_ratio")
-
-        assert train_ratio + test_ratio + val_ratio == 1.0, "The sum of train_ratio, test_ratio, and val_ratio must be 1.0."
-        assert train_ratio > 0 and test_ratio >= 0 and val_ratio > 0, "All ratios must be positive."
-
-        n_train = int(nfile * train_ratio)
-        n_test = int(nfile * test_ratio)
-        n_val = nfile - n_train - n_test
-
-        indices = rds.choice(nfile, nfile, replace=False)
-        train_indices = indices[:n_train]
-        val_indices = indices[n_train:n_train+n_val]
-        test_indices = indices[n_train+n_val:]
-        
-        os.mkdir(os.path.join(dataset_dir, "train"))
-        os.mkdir(os.path.join(dataset_dir, "val"))
-
-        for id in tqdm(train_indices, desc="Copying files to training sets..."):
-            os.system(f"cp -r {filenames[id]} {dataset_dir}/train")
-        
-        for id in tqdm(val_indices, desc="Copying files to validation sets..."):
-            os.system(f"cp -r {filenames[id]} {dataset_dir}/val")
-
-        if n_test > 0:
-            os.mkdir(os.path.join(dataset_dir, "test"))
-            for id in tqdm(test_indices, desc="Copying files to testing sets..."):
-                os.system(f"cp -r {filenames[id]} {dataset_dir}/test")
+        manifest = split_dataset(
+            dataset_dir=jdata.get("dataset_dir"),
+            prefix=jdata.get("prefix"),
+            train_ratio=jdata.get("train_ratio"),
+            val_ratio=jdata.get("val_ratio"),
+            test_ratio=jdata.get("test_ratio", 0.),
+            seed=jdata.get("seed", 1),
+            by=jdata.get("by", "folder"),
+            manifest=jdata.get("manifest"),
+            link=jdata.get("link"),
+        )
+        print(f"Dataset split, see the manifest {manifest}.")
 
     if collect:
         # Collect sub-folders produced by parse into one dataset.
         # {
         #    "subfolders": "alice_*/*_bob/set.*/frame.*",  can be a list too.
         #    "name": "prefix_for_merged_dataset",
-        #    "output_dir": "path_for_collected_subsets"
+        #    "output_dir": "path_for_collected_subsets",
+        #    "manifest": "name.json",  default to output_dir/name.json.
+        #    "link": null              or "symlink", "hardlink", "copy" to also fill output_dir/name.
         # }
         # "subfolders" should always point to folders containing the `.dat` files.
         # IMPORTANT: collecting the `.traj` dataset folders are not supported yet.
 
-        name = jdata.get("name")
-        output_dir = jdata.get("output_dir")
         input_path = jdata.get("subfolders")
 
         if isinstance(input_path, list) and all(isinstance(item, str) for item in input_path):
             input_path = input_path
         else:
-            input_path = glob.glob(input_path)
+            input_path = sorted(glob.glob(input_path))
 
         subfolders = [item for item in input_path if os.path.isdir(item)]
 
         assert len(subfolders) > 0, "No sub-folders found in the provided path."
 
-        os.mkdir(os.path.join(output_dir, name))  
-        output_dir = os.path.join(output_dir, name)
-
-        for idx, subfolder in enumerate(tqdm(subfolders, desc="Collecting files...")):
-            # Check necessary data files.
-            required_files = ['positions.dat', 'cell.dat', 'atomic_numbers.dat']
-            files_exist = all(os.path.isfile(os.path.join(subfolder, f)) for f in required_files)
-
-            if files_exist:
-                new_folder_name = f"{name}.{idx}"
-                new_folder_path = os.path.join(output_dir, new_folder_name)
-                shutil.copytree(subfolder, new_folder_path)
-            else:
-                print(f"Warning: data missing in {subfolder}. Skipping.")
-        
-        print("Subfolders collected.")
\ No newline at end of file
+        manifest = collect_dataset(
+            subfolders=subfolders,
+            name=jdata.get("name"),
+            output_dir=jdata.get("output_dir"),
+            manifest=jdata.get("manifest"),
+            link=jdata.get("link"),
+        )
+        print(f"Subfolders collected, see the manifest {manifest}.")
@@ -110,5 +110,28 @@ def export(INPUT: str, init_model: str = None, structure: str = None, output: st
         except Exception as e:
             log.error(f"Error during PythTB export: {e}")
         
+    elif format.lower() in ["torchscript", "jit"]:
+        import ase.io
+        from dptb.data import AtomicData
+        from dptb.nn.deploy import export_torchscript
+        from dptb.postprocess.common import get_atomic_options
+
+        prefix = os.path.splitext(os.path.basename(ckpt_path))[0]
+        pt_file = os.path.join(output, f"{prefix}.torchscript.pt")
+
+        try:
+            atomic_options = get_atomic_options(model, AtomicData_options=jdata.get("AtomicData_options"))
+            atoms = ase.io.read(struct_path)
+            data = AtomicData.from_ase(atoms, **atomic_options)
+            # a larger, rattled copy of the structure checks that the trace does not depend on the graph size.
+            supercell = atoms.repeat([2 if p else 1 for p in atoms.pbc])
+            supercell.rattle(0.01, seed=0)
+            validation = AtomicData.from_ase(supercell, **atomic_options)
+            export_torchscript(model, AtomicData.to_AtomicDataDict(data), pt_file,
+                               validation_data=[AtomicData.to_AtomicDataDict(validation)])
+            log.info(f"Saved TorchScript model to {pt_file}")
+        except Exception as e:
+            log.error(f"Error during TorchScript export: {e}")
+
     else:
         log.error(f"Unknown format: {format}")
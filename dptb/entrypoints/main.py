@@ -2,23 +2,13 @@ import argparse
 import logging
 from pathlib import Path
 from typing import Dict, List, Optional
-from dptb.entrypoints.train import train
-from dptb.entrypoints.config import config
-from dptb.entrypoints.test import _test
-from dptb.entrypoints.run import run
-from dptb.entrypoints.bond import bond
-from dptb.entrypoints.nrl2json import nrl2json
-from dptb.entrypoints.pth2json import pth2json
-from dptb.entrypoints.data import data
 from dptb.utils.loggers import set_log_handles
-from dptb.utils.config_check import check_config_train
-from dptb.entrypoints.collectskf import skf2pth, skf2nnsk
-
-from dptb.entrypoints.emp_sk import to_empsk
-from dptb.entrypoints.export import export
 
 from dptb import __version__
 
+# NOTE: the subcommand handlers are imported inside `main` when dispatched. Most of them
+# depend on torch, e3nn, ase and scipy, which would otherwise be loaded for `dptb -h`,
+# `dptb config` and `dptb bond` as well.
 
 
 def get_ll(log_level: str) -> int:
@@ -163,6 +153,45 @@ def main_parser() -> argparse.ArgumentParser:
         help="The cutoff radius of bond search.",
     )
 
+    parser_bond.add_argument(
+        "-t",
+        "--traj",
+        action="store_true",
+        help="Analyse all the frames of a trajectory, and report the coordination shells and the suggested r_max/er_max of each bond type.",
+    )
+
+    parser_bond.add_argument(
+        "-bw",
+        "--bin_width",
+        type=float,
+        default=0.01,
+        help="The width of the bond length histogram bins in trajectory mode.",
+    )
+
+    parser_bond.add_argument(
+        "-s",
+        "--stride",
+        type=int,
+        default=1,
+        help="Only analyse every stride-th frame in trajectory mode.",
+    )
+
+    parser_bond.add_argument(
+        "-ns",
+        "--nshell",
+        type=int,
+        default=1,
+        help="The number of shells included in the suggested r_max, er_max includes one more shell.",
+    )
+
+    parser_bond.add_argument(
+        "-np",
+        "--num_workers",
+        type=int,
+        default=1,
+        help="The number of processes reading the trajectory in trajectory mode.",
+    )
+
     # nrl2json
     parser_nrl2json = subparsers.add_parser(
         "n2j",
@@ -323,6 +352,12 @@ def main_parser() -> argparse.ArgumentParser:
         help="The output files in postprocess run."
     )
 
+    parser_run.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write the blocks of the write_block task chunk by chunk in the packed layout, for large structures."
+    )
+
     # preprocess data
     parser_data = subparsers.add_parser(
         "data",
@@ -348,14 +383,14 @@ def main_parser() -> argparse.ArgumentParser:
         "-s",
         "--split",
         action="store_true",
-        help="Initialize the training from the frozen model.",
+        help="Split the trajectory folders into train/val/test sets, written to a manifest.",
     )
 
     parser_data.add_argument(
         "-c",
         "--collect",
         action="store_true",
-        help="Initialize the training from the frozen model.",
+        help="Collect the trajectory folders into one dataset, written to a manifest.",
     )
 
         # preprocess data
@@ -382,6 +417,14 @@ def main_parser() -> argparse.ArgumentParser:
         help="The output pth files of sk params from skfiles."
     )
 
+    parser_cskf.add_argument(
+        "-np",
+        "--num_workers",
+        type=int,
+        default=1,
+        help="The number of processes parsing the sk files which are not in the cache.",
+    )
+
     # neighbour
     parser_skf2nn = subparsers.add_parser(
         "skf2nn",
@@ -451,7 +494,7 @@ def main_parser() -> argparse.ArgumentParser:
     parser_export = subparsers.add_parser(
         "export",
         parents=[parser_log],
-        help="Export DeePTB model to external formats (Wannier90, PythTB, TB2J)",
+        help="Export DeePTB model to external formats (Wannier90, PythTB, TB2J, TorchScript)",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     
@@ -490,7 +533,7 @@ def main_parser() -> argparse.ArgumentParser:
         "--format",
         type=str,
         default="wannier90",
-        help="Target format: wannier90 (default) or pythtb."
+        help="Target format: wannier90 (default), pythtb or torchscript."
     )
 
     return parser
@@ -527,38 +570,51 @@ def main():
     dict_args = vars(args)
     
     if args.command == 'config':
+        from dptb.entrypoints.config import config
         config(**dict_args)
 
     elif args.command == 'bond':
+        from dptb.entrypoints.bond import bond
         bond(**dict_args)
 
     elif args.command == 'train':
+        from dptb.utils.config_check import check_config_train
+        from dptb.entrypoints.train import train
         check_config_train(**dict_args)
         train(**dict_args)
 
     elif args.command == 'test':
+        from dptb.entrypoints.test import _test
         _test(**dict_args)
 
     elif args.command == 'run':
+        from dptb.entrypoints.run import run
         run(**dict_args)
 
     elif args.command == 'n2j':
+        from dptb.entrypoints.nrl2json import nrl2json
         nrl2json(**dict_args)
     
     elif args.command == 'p2j':
+        from dptb.entrypoints.pth2json import pth2json
         pth2json(**dict_args)
 
     elif args.command == 'data':
+        from dptb.entrypoints.data import data
         data(**dict_args)
         
     elif args.command == 'cskf':
+        from dptb.entrypoints.collectskf import skf2pth
         skf2pth(**dict_args)
 
     elif args.command == 'skf2nn':
+        from dptb.entrypoints.collectskf import skf2nnsk
         skf2nnsk(**dict_args)
 
     elif args.command == 'esk':
+        from dptb.entrypoints.emp_sk import to_empsk
         to_empsk(**dict_args)
 
     elif args.command == 'export':
+        from dptb.entrypoints.export import export
         export(**dict_args)
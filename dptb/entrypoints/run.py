@@ -9,7 +9,8 @@ from dptb.utils.loggers import set_log_handles
 from dptb.utils.argcheck import normalize_run
 from dptb.utils.tools import j_loader
 from dptb.utils.tools import j_must_have
-from dptb.postprocess.write_block import write_block
+from dptb.postprocess.write_block import write_block, write_block_stream
+from dptb.postprocess.batch_run import BatchRun, is_batch_input
 import torch
 import h5py
 from dptb.utils.auto_band_config import auto_band_config
@@ -90,7 +91,12 @@ def run(
 
     struct_file = run_opt["structure"]
 
-    if task=='band':        
+    if is_batch_input(struct_file):
+        brun = BatchRun(model=model, results_path=results_path, device=model.device, **jdata.get("batch_options", {}))
+        brun.run(structure=struct_file, task_options=task_options, pbc=jdata["pbc"], AtomicData_options=jdata['AtomicData_options'])
+        log.info(msg=f'{task} calculation on the structures successfully completed.')
+
+    elif task=='band':        
         bcal = Band(model=model, results_path=results_path, use_gui=use_gui, device=model.device)
         bcal.get_bands( data=struct_file, 
                         kpath_kwargs=jdata["task_options"], 
@@ -105,10 +111,21 @@ def run(
 
     elif task=='write_block':
         task = torch.load(init_model, map_location="cpu", weights_only=False)["task"]
-        block = write_block(data=struct_file, AtomicData_options=jdata['AtomicData_options'], model=model, device=jdata["device"])
-        # write to h5 file, block is a dict, write to a h5 file
-        with h5py.File(os.path.join(results_path, task+".h5"), 'w') as fid:
-            default_group = fid.create_group("0")
-            for key_str, value in block.items():
-                default_group[key_str] = value.detach().cpu().numpy()
+        if kwargs.get("stream", False) or task_options.get("stream", False):
+            write_block_stream(
+                data=struct_file, 
+                model=model, 
+                path=os.path.join(results_path, task+".h5"), 
+                AtomicData_options=jdata['AtomicData_options'], 
+                device=jdata["device"], 
+                chunk_atoms=task_options.get("chunk_atoms", 2048), 
+                halo_hops=task_options.get("halo_hops", None),
+                )
+        else:
+            block = write_block(data=struct_file, AtomicData_options=jdata['AtomicData_options'], model=model, device=jdata["device"])
+            # write to h5 file, block is a dict, write to a h5 file
+            with h5py.File(os.path.join(results_path, task+".h5"), 'w') as fid:
+                default_group = fid.create_group("0")
+                for key_str, value in block.items():
+                    default_group[key_str] = value.detach().cpu().numpy()
         log.info(msg='write block successfully completed.')
\ No newline at end of file
@@ -11,9 +11,10 @@ from typing import Optional
 from dptb.utils.loggers import set_log_handles
 from dptb.utils.tools import j_loader, setup_seed
 from dptb.nnops.tester import Tester
-from dptb.utils.argcheck import normalize_test
+from dptb.utils.argcheck import normalize_test, collect_cutoffs
 from dptb.plugins.monitor import TestLossMonitor
 from dptb.plugins.train_logger import Logger
+from dptb.plugins.profiler import Profiler
 
 __all__ = ["test"]
 
@@ -74,7 +75,8 @@ def _test(
     jdata["model_options"] = f["config"]["model_options"]
     del f
     
-    test_datasets = build_dataset(**jdata["data_options"]["test"], **jdata["common_options"])
+    cutoff_options = collect_cutoffs(jdata)
+    test_datasets = build_dataset(**cutoff_options, **jdata["data_options"]["test"], **jdata["common_options"])
     model = build_model(run_opt["init_model"], model_options=jdata["model_options"], common_options=jdata["common_options"])
     model.eval()
     tester = Tester(
@@ -82,18 +84,25 @@ def _test(
         common_options=jdata["common_options"],
         model = model,
         test_datasets=test_datasets,
+        report_path=os.path.join(run_opt["results_path"], "structures.csv") if output else None,
     )
 
     # register the plugin in tester, to tract training info
     tester.register_plugin(TestLossMonitor())
     tester.register_plugin(Logger(["test_loss"], 
         interval=[(1, 'iteration'), (1, 'epoch')]))
+    profiler = jdata["test_options"].get("profiler")
+    if profiler is not None:
+        tester.register_plugin(Profiler(
+            log_freq=profiler["log_freq"],
+            trace_steps=profiler["trace_steps"],
+            trace_path=profiler["trace_path"] or os.path.join(output or ".", "profile_trace.json"),
+            synchronize=profiler["synchronize"],
+            ))
     
     for q in tester.plugin_queues.values():
         heapq.heapify(q)
     
-    tester.build()
-
     if output:
         # output training configurations:
         with open(os.path.join(output, "test_config.json"), "w") as fp:
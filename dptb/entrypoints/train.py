@@ -5,6 +5,7 @@ from dptb.plugins.monitor import TrainLossMonitor, LearningRateMonitor, Validati
 from dptb.plugins.train_logger import Logger
 from dptb.utils.argcheck import normalize, collect_cutoffs, chk_avg_per_iter
 from dptb.plugins.saver import Saver
+from dptb.plugins.profiler import Profiler
 from typing import Dict, List, Optional, Any
 from dptb.utils.tools import j_loader, setup_seed, j_must_have
 from dptb.utils.constants import dtype_dict
@@ -192,7 +193,11 @@ def train(
         # build model will handle the init model cases where the model options provided is not equals to the ones in checkpoint.
         checkpoint = init_model if init_model else None
         model = build_model(checkpoint=checkpoint, model_options=jdata["model_options"], common_options=jdata["common_options"])
-        train_datasets.E3statistics(model=model)
+        train_datasets.E3statistics(
+            model=model,
+            num_workers=jdata["data_options"]["train"]["statistics_num_workers"],
+            chunk_size=jdata["data_options"]["train"]["statistics_chunk_size"],
+        )
         trainer = Trainer(
             train_options=jdata["train_options"],
             common_options=jdata["common_options"],
@@ -216,6 +221,15 @@ def train(
         trainer.register_plugin(TensorBoardMonitor(interval=[(jdata["train_options"]["display_freq"], 'iteration'), (1, 'epoch')]))
     trainer.register_plugin(Logger(log_field,
         interval=[(jdata["train_options"]["display_freq"], 'iteration'), (1, 'epoch')]))
+    profiler = jdata["train_options"].get("profiler")
+    if profiler is not None:
+        # registered after the tensorboard monitor to share its writer.
+        trainer.register_plugin(Profiler(
+            log_freq=profiler["log_freq"],
+            trace_steps=profiler["trace_steps"],
+            trace_path=profiler["trace_path"] or os.path.join(output or ".", "profile_trace.json"),
+            synchronize=profiler["synchronize"],
+            ))
 
     for q in trainer.plugin_queues.values():
         heapq.heapify(q)
@@ -1,23 +1,18 @@
-from .build import build_model
-from .deeptb import NNENV, MIX
-from .nnsk import NNSK
-from .dftbsk import DFTBSK
-from .hamiltonian import E3Hamiltonian, SKHamiltonian
-from .hr2hk import HR2HK
-from .energy import Eigenvalues, Eigh
+from dptb.utils.lazy_import import lazy_attach
 
-__all__ = [
-    build_model,
-    E3Hamiltonian,
-    SKHamiltonian,
-    HR2HK,
-    Eigenvalues,
-    Eigh,
-    NNENV,
-    NNSK,
-    MIX,
-    DFTBSK,
-]
+# models are resolved on first access, so that importing ``dptb.nn`` does not pull in torch.
+__getattr__, __dir__, __all__ = lazy_attach(__name__, {
+    "build_model": ".build",
+    "E3Hamiltonian": ".hamiltonian",
+    "SKHamiltonian": ".hamiltonian",
+    "HR2HK": ".hr2hk",
+    "Eigenvalues": ".energy",
+    "Eigh": ".energy",
+    "NNENV": ".deeptb",
+    "NNSK": ".nnsk",
+    "MIX": ".deeptb",
+    "DFTBSK": ".dftbsk",
+})
 """
 
 nn module is the model class for the graph neural network model, which is the core of the deeptb package.
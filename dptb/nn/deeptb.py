@@ -11,6 +11,7 @@ from dptb.nn.nnsk import NNSK
 from dptb.nn.dftbsk import DFTBSK
 from e3nn.o3 import Linear
 from dptb.nn.rescale import E3PerSpeciesScaleShift, E3PerEdgeSpeciesScaleShift
+from dptb.nn.precision import get_autocast_dtype, autocast_context, compile_options, cast_fields
 import logging
 
 log = logging.getLogger(__name__)
@@ -58,6 +59,14 @@ def get_neuron_config(nl):
 class NNENV(nn.Module):
     quantities = ["hamiltonian", "energy"]
     name = "nnenv"
+    feature_fields = [
+        AtomicDataDict.NODE_FEATURES_KEY,
+        AtomicDataDict.EDGE_FEATURES_KEY,
+        AtomicDataDict.NODE_OVERLAP_KEY,
+        AtomicDataDict.EDGE_OVERLAP_KEY,
+        AtomicDataDict.NODE_ATTRS_KEY,
+        AtomicDataDict.EDGE_ATTRS_KEY,
+    ]
     def __init__(
             self,
             embedding: dict,
@@ -68,6 +77,8 @@ class NNENV(nn.Module):
             dtype: Union[str, torch.dtype] = torch.float32,
             device: Union[str, torch.device] = torch.device("cpu"),
             transform: bool = True,
+            autocast: Optional[str] = None,
+            compile: Union[bool, dict] = False,
             **kwargs,
     ):
         
@@ -89,6 +100,10 @@ class NNENV(nn.Module):
             _description_, by default torch.float32
         device : Union[str, torch.device], optional
             _description_, by default torch.device("cpu")
+        autocast : Optional[str], optional
+            run the embedding and prediction layers under autocast in `bf16` or `fp16`, by default None
+        compile : Union[bool, dict], optional
+            compile the embedding forward with torch.compile, a dict is passed to torch.compile as keyword arguments, by default False
 
         Raises
         ------
@@ -103,6 +118,7 @@ class NNENV(nn.Module):
         self.device = device
         self.model_options = {"embedding": embedding.copy(), "prediction": prediction.copy()}
         self.transform = transform
+        self.set_execution_mode(autocast=autocast, compile=compile)
         
         
         self.method = prediction.get("method", "e3tb")
@@ -291,24 +307,46 @@ class NNENV(nn.Module):
                     )
 
 
+    def set_execution_mode(self, autocast: Optional[str] = None, compile: Union[bool, dict] = False):
+        """Select the precision and compilation of the embedding and prediction layers.
+
+        The features are cast back to the model dtype before the Hamiltonian blocks are assembled.
+        """
+        self.execution_mode = {"autocast": autocast, "compile": compile}
+        self.autocast_dtype = get_autocast_dtype(autocast)
+        self.compile_options = compile_options(compile)
+        # compiled lazily at the first forward, so that the checkpoint can be loaded first.
+        self._compiled_embedding = None
+
+    def embed(self, data: AtomicDataDict.Type):
+        if self.compile_options is None:
+            return self.embedding(data)
+        if self._compiled_embedding is None:
+            self._compiled_embedding = torch.compile(self.embedding.forward, **self.compile_options)
+        return self._compiled_embedding(data)
+
     def forward(self, data: AtomicDataDict.Type):
         if data.get(AtomicDataDict.EDGE_TYPE_KEY, None) is None:
             self.idp(data)
 
-        data = self.embedding(data)
-        if hasattr(self, "overlap") and self.method == "sktb":
-            data[AtomicDataDict.EDGE_OVERLAP_KEY] = data[AtomicDataDict.EDGE_FEATURES_KEY]
-        
-        data = self.node_prediction_h(data)
-        data = self.edge_prediction_h(data)
-        if hasattr(self, "overlap"):
-            data = self.edge_prediction_s(data)
-            data[AtomicDataDict.NODE_OVERLAP_KEY] = self.overlaponsite_param[data[AtomicDataDict.ATOM_TYPE_KEY].flatten()]
-            data[AtomicDataDict.NODE_OVERLAP_KEY][:,self.idp_sk.mask_diag] = 1.
-        
-        # prediction for two-body part of e3tb
-        if hasattr(self, "edge_prediction_h2"):
-            data = self.edge_prediction_h2(data)
+        with autocast_context(self.device, self.autocast_dtype):
+            data = self.embed(data)
+            if hasattr(self, "overlap") and self.method == "sktb":
+                data[AtomicDataDict.EDGE_OVERLAP_KEY] = data[AtomicDataDict.EDGE_FEATURES_KEY]
+            
+            data = self.node_prediction_h(data)
+            data = self.edge_prediction_h(data)
+            if hasattr(self, "overlap"):
+                data = self.edge_prediction_s(data)
+                data[AtomicDataDict.NODE_OVERLAP_KEY] = self.overlaponsite_param[data[AtomicDataDict.ATOM_TYPE_KEY].flatten()]
+                data[AtomicDataDict.NODE_OVERLAP_KEY][:,self.idp_sk.mask_diag] = 1.
+            
+            # prediction for two-body part of e3tb
+            if hasattr(self, "edge_prediction_h2"):
+                data = self.edge_prediction_h2(data)
+
+        if self.autocast_dtype is not None:
+            cast_fields(data, self.feature_fields, self.dtype)
         
         if self.transform:
             data = self.hamiltonian(data)
@@ -332,6 +370,8 @@ class NNENV(nn.Module):
         dtype: Union[str, torch.dtype]=None,
         device: Union[str, torch.device]=None,
         transform: bool = True,
+        autocast: Optional[str] = None,
+        compile: Union[bool, dict] = False,
         **kwargs
         ):
         if device == 'cuda':
@@ -359,7 +399,7 @@ class NNENV(nn.Module):
             if v is None:
                 common_options[k] = ckpt["config"]["common_options"][k]
         
-        model = cls(**model_options, **common_options, transform=transform)
+        model = cls(**model_options, **common_options, transform=transform, autocast=autocast, compile=compile)
         model.load_state_dict(ckpt["model_state_dict"])
 
         del ckpt
@@ -381,6 +421,8 @@ class MIX(nn.Module):
             device: Union[str, torch.device] = torch.device("cpu"),
             transform: bool = True,
             num_xgrid: int = -1,
+            autocast: Optional[str] = None,
+            compile: Union[bool, dict] = False,
             **kwargs,
     ):
         super(MIX, self).__init__()
@@ -402,6 +444,8 @@ class MIX(nn.Module):
             dtype=dtype, 
             device=device,
             transform=False,
+            autocast=autocast,
+            compile=compile,
             )
         
         if (dftbsk is None) == (nnsk is None):
@@ -445,6 +489,13 @@ class MIX(nn.Module):
 
         self.model_options.update(self.nnenv.model_options)
         
+    def set_execution_mode(self, autocast: Optional[str] = None, compile: Union[bool, dict] = False):
+        # the sk part has no neural network layers, only the environment correction is affected.
+        self.nnenv.set_execution_mode(autocast=autocast, compile=compile)
+
+    @property
+    def execution_mode(self):
+        return self.nnenv.execution_mode
 
     def forward(self, data: AtomicDataDict.Type):
 
@@ -482,6 +533,8 @@ class MIX(nn.Module):
         dtype: Union[str, torch.dtype] = None,
         device: Union[str, torch.device] = None,
         transform: bool = True,
+        autocast: Optional[str] = None,
+        compile: Union[bool, dict] = False,
         **kwargs,
         ):
         # the mapping from the parameters of the ref_model and the current model can be found using
@@ -531,6 +584,7 @@ class MIX(nn.Module):
         for k,v in common_options.items():
             if v is None:
                 common_options[k] = ckpt["config"]["common_options"][k]
+        common_options.update({"autocast": autocast, "compile": compile})
 
         if nnsk is not None:
             assert ckpt["config"]["model_options"].get("nnsk") is not None, "The referenced checkpoint should provide at least the nnsk model info."
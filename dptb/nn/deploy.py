@@ -0,0 +1,161 @@
+"""Frozen TorchScript artifacts of the models, for inference services without the dptb package.
+
+The artifact is the model traced from the graph of a structure, as given by `AtomicData.from_ase`, to the
+Hamiltonian (and overlap) features, with the atom and bond type tables embedded as buffers. The basis, the
+cutoffs and the orbital pair layout of the features are stored next to it as ``metadata.json``, and the artifact
+is loaded with ``torch.jit.load`` or `dptb.utils.frozen.load_frozen_model`.
+"""
+
+import json
+import logging
+import warnings
+from typing import Dict, List, Optional, Sequence
+
+import ase.data
+import torch
+
+import dptb
+from dptb.data import AtomicDataDict
+from dptb.utils.argcheck import get_cutoffs_from_model_options
+from dptb.utils.frozen import FORMAT_VERSION, METADATA_FILE
+
+log = logging.getLogger(__name__)
+
+# the outputs of the models kept in the artifact, when the model computes them.
+OUTPUT_FIELDS = [
+    AtomicDataDict.EDGE_FEATURES_KEY,
+    AtomicDataDict.NODE_FEATURES_KEY,
+    AtomicDataDict.EDGE_OVERLAP_KEY,
+    AtomicDataDict.NODE_OVERLAP_KEY,
+    AtomicDataDict.NODE_SOC_KEY,
+]
+OVERLAP_FIELDS = [AtomicDataDict.EDGE_OVERLAP_KEY, AtomicDataDict.NODE_OVERLAP_KEY]
+
+
+class FrozenModel(torch.nn.Module):
+    """The model from the graph of a structure, with atomic numbers, to the Hamiltonian features.
+
+    The atom types and the bond types are looked up in the ``z_to_type`` buffer, which replaces the type
+    mappers of the model, whose checks do not trace.
+    """
+
+    def __init__(self, model: torch.nn.Module, output_fields: List[str]):
+        super(FrozenModel, self).__init__()
+        self.model = model
+        self.num_types = model.idp.num_types
+        self.output_fields = output_fields
+        z_to_type = torch.full((len(ase.data.chemical_symbols),), -1, dtype=torch.long)
+        for symbol, index in model.idp.chemical_symbol_to_type.items():
+            z_to_type[ase.data.atomic_numbers[symbol]] = index
+        self.register_buffer("z_to_type", z_to_type.to(model.device))
+
+    def forward(self, data: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        data = dict(data)
+        atom_types = self.z_to_type[data.pop(AtomicDataDict.ATOMIC_NUMBERS_KEY)]
+        edge_index = data[AtomicDataDict.EDGE_INDEX_KEY]
+        data[AtomicDataDict.ATOM_TYPE_KEY] = atom_types
+        data[AtomicDataDict.EDGE_TYPE_KEY] = atom_types[edge_index[0]] * self.num_types + atom_types[edge_index[1]]
+        data = self.model(data)
+        return {field: data[field] for field in self.output_fields}
+
+
+def graph_inputs(data: AtomicDataDict.Type, device: Optional[torch.device]=None) -> Dict[str, torch.Tensor]:
+    """The tensors of ``data`` the artifact takes as input."""
+    return {
+        key: value.to(device) if device is not None else value for key, value in data.items() \
+        if isinstance(value, torch.Tensor) and not value.is_nested and key not in (
+            AtomicDataDict.ATOM_TYPE_KEY, AtomicDataDict.EDGE_TYPE_KEY, AtomicDataDict.BATCH_KEY, AtomicDataDict.BATCH_PTR_KEY)
+    }
+
+
+def _eager(model: torch.nn.Module, data: Dict[str, torch.Tensor]) -> AtomicDataDict.Type:
+    with torch.no_grad():
+        return model(model.idp(dict(data)))
+
+
+def metadata(model: torch.nn.Module, inputs: Dict[str, torch.Tensor], output_fields: List[str]) -> dict:
+    idp = model.idp
+    idp.get_orbpair_maps()
+    r_max, er_max, oer_max = get_cutoffs_from_model_options(model.model_options)
+    return {
+        "format_version": FORMAT_VERSION,
+        "dptb_version": getattr(dptb, "__version__", None),
+        "torch_version": torch.__version__,
+        "model": getattr(model, "name", type(model).__name__),
+        "dtype": str(model.dtype).replace("torch.", ""),
+        "overlap": AtomicDataDict.EDGE_OVERLAP_KEY in output_fields,
+        "basis": idp.basis,
+        "chemical_symbols": idp.type_names,
+        "atomic_numbers": [ase.data.atomic_numbers[symbol] for symbol in idp.type_names],
+        "cutoffs": {"r_max": r_max, "er_max": er_max, "oer_max": oer_max},
+        "input_fields": sorted(inputs.keys()),
+        "output_fields": output_fields,
+        "reduced_matrix_element": idp.reduced_matrix_element,
+        "orbpair_maps": {pair: [s.start, s.stop] for pair, s in idp.orbpair_maps.items()},
+        "model_options": model.model_options,
+    }
+
+
+def max_error(ref: Dict[str, torch.Tensor], out: Dict[str, torch.Tensor]) -> float:
+    error = 0.0
+    for field, value in ref.items():
+        if out[field].shape != value.shape:
+            return float("inf")
+        if value.numel() > 0:
+            error = max(error, (out[field] - value).abs().max().item())
+    return error
+
+
+def export_torchscript(
+        model: torch.nn.Module,
+        data: AtomicDataDict.Type,
+        path: str,
+        validation_data: Sequence[AtomicDataDict.Type]=(),
+        atol: Optional[float]=None,
+        ) -> float:
+    """Trace ``model`` on the graph ``data`` and save the artifact to ``path``.
+
+    The saved artifact is loaded back and compared with the eager model on ``data`` and on every graph of
+    ``validation_data``; a difference larger than ``atol`` raises a RuntimeError. The structure traced should
+    contain every element of the model, since the branches of the species absent from it are not recorded.
+
+    Returns:
+        the largest absolute difference between the artifact and the eager model.
+    """
+    model.eval()
+    device = torch.device(model.device)
+    if atol is None:
+        atol = 1e-10 if model.dtype == torch.float64 else 1e-5
+
+    inputs = graph_inputs(data, device)
+    numbers = set(inputs[AtomicDataDict.ATOMIC_NUMBERS_KEY].flatten().tolist())
+    missing = [symbol for symbol in model.idp.type_names if ase.data.atomic_numbers[symbol] not in numbers]
+    if len(missing) > 0:
+        log.warning(f"The traced structure does not contain {missing}, the artifact may be wrong on structures with them.")
+
+    ref = _eager(model, inputs)
+    output_fields = [field for field in OUTPUT_FIELDS if isinstance(ref.get(field), torch.Tensor)]
+    if not hasattr(model, "overlap"):
+        # some embeddings use the overlap fields for their own features.
+        output_fields = [field for field in output_fields if field not in OVERLAP_FIELDS]
+    frozen = FrozenModel(model, output_fields).eval()
+    with torch.no_grad(), warnings.catch_warnings():
+        # the shape checks of the modules are recorded as constants, the validation below covers the trace.
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        traced = torch.jit.trace(frozen, (inputs,), strict=False, check_trace=False)
+
+    info = metadata(model, inputs, output_fields)
+    torch.jit.save(traced, path, _extra_files={METADATA_FILE: json.dumps(info, default=str)})
+
+    loaded = torch.jit.load(path, map_location=device)
+    error = 0.0
+    for graph in [inputs] + [graph_inputs(d, device) for d in validation_data]:
+        ref = _eager(model, graph)
+        with torch.no_grad():
+            out = loaded(graph)
+        error = max(error, max_error({field: ref[field] for field in output_fields}, out))
+    if not error <= atol:
+        raise RuntimeError(f"The exported model differs from the eager model by {error:.3e}, more than {atol:.1e}.")
+
+    log.info(f"The model is exported to {path}, the largest difference to the eager model is {error:.3e}.")
+    return error
@@ -1,6 +1,7 @@
 from dptb.nn.sktb.hopping import BaseHopping
 import torch
 from dptb.utils._xitorch.interpolate import Interp1D
+from dptb.utils._xitorch._impls.interpolate.interp_1d import _get_spline_mat_inv
 import logging
 log = logging.getLogger(__name__)
 class HoppingIntp(BaseHopping):
@@ -52,4 +53,76 @@ class HoppingIntp(BaseHopping):
             yyintp = self.intpfunc(xq=rij, y=yy)
 
         return yyintp.T
-        
\ No newline at end of file
+
+    def get_coefficients(self, xx:torch.Tensor, yy:torch.Tensor):
+        """The polynomial coefficients of the SK tables in each interval of the distance grid.
+
+        The coefficients are computed once per table, and then used by `get_skhij_typed` to
+        interpolate all the edges at once.
+
+        Parameters
+        ----------
+        xx : torch.Tensor
+            the distance grid, of shape [n_grid], sorted in increasing order.
+        yy : torch.Tensor
+            the SK tables, of shape [..., n_grid], e.g. [n_bond_types, n_ingrls, n_grid].
+
+        Returns
+        -------
+        torch.Tensor
+            the coefficients of shape [..., n_grid-1, n_coeff], such that in the k-th interval
+            y = c[k,0] + t * (c[k,1] + t * (c[k,2] + t * c[k,3])) with t = (r - xx[k]) / (xx[k+1] - xx[k]).
+        """
+        yl = yy[..., :-1]
+        dy = yy[..., 1:] - yl
+        if self.intp_method == 'linear':
+            return torch.stack([yl, dy], dim=-1)
+
+        # the not-a-knot cubic spline, the same as Interp1D(method='cspline').
+        ks = torch.matmul(_get_spline_mat_inv(xx, "not-a-knot"), yy.unsqueeze(-1)).squeeze(-1)
+        dx = xx[1:] - xx[:-1]
+        a = ks[..., :-1] * dx - dy
+        b = -ks[..., 1:] * dx + dy
+        return torch.stack([yl, dy + a, b - 2 * a, a - b], dim=-1)
+
+    def get_skhij_typed(self, rij:torch.Tensor, bond_type:torch.Tensor, xx:torch.Tensor, coeffs:torch.Tensor, uniform:bool=True):
+        """Interpolate the SK integrals of all edges at once, each one with the table of its bond type.
+
+        Parameters
+        ----------
+        rij : torch.Tensor
+            the bond lengths, of shape [n_edges].
+        bond_type : torch.Tensor
+            the bond type index of each edge, of shape [n_edges].
+        xx : torch.Tensor
+            the distance grid, of shape [n_grid].
+        coeffs : torch.Tensor
+            the coefficients from `get_coefficients`, of shape [n_bond_types, n_ingrls, n_grid-1, n_coeff].
+        uniform : bool
+            whether the grid is uniform, as in the DFTB sk files. The interval of each edge is then
+            found in O(1) instead of a binary search.
+
+        Returns
+        -------
+        torch.Tensor
+            the SK integrals of shape [n_edges, n_ingrls], zero for the bonds outside of the grid.
+        """
+        n_grid = xx.shape[0]
+        if uniform:
+            pos = (rij - xx[0]) / (xx[1] - xx[0])
+            idx = pos.detach().floor().long().clamp(0, n_grid - 2)
+            t = pos - idx
+        else:
+            idx = (torch.searchsorted(xx.detach(), rij.detach(), right=False).clamp(1, n_grid - 1) - 1)
+            t = (rij - xx[idx]) / (xx[idx + 1] - xx[idx])
+
+        # gather the coefficients of the interval of each edge, [n_edges, n_ingrls, n_coeff]
+        ingrls = torch.arange(coeffs.shape[1], device=coeffs.device)
+        c = coeffs[bond_type.unsqueeze(1), ingrls.unsqueeze(0), idx.unsqueeze(1)]
+        t = t.unsqueeze(1)
+        yyintp = c[..., -1]
+        for k in range(c.shape[-1] - 2, -1, -1):
+            yyintp = yyintp * t + c[..., k]
+
+        mask_in_range = (rij >= xx[0]) & (rij <= xx[-1])
+        return torch.where(mask_in_range.unsqueeze(1), yyintp, torch.zeros_like(yyintp))
@@ -1,7 +1,10 @@
 import os
+import re
 import sys
+import hashlib
+import itertools
+import multiprocessing as mp
 import torch
-from dptb.utils.tools import format_readline
 from dptb.utils.constants import NumHvals,MaxShells
 import logging
 from typing import Tuple, Union, Dict
@@ -12,6 +15,142 @@ from dptb.nn.sktb.cov_radiiDB import Covalent_radii
 
 log = logging.getLogger(__name__)
 
+# the separators of the values of the skf files, besides the whitespaces.
+SKF_SEPARATORS = re.compile('[,;]')
+# the version of the parsed skf files in the cache, to be bumped when the parser changes.
+SKF_CACHE_VERSION = 1
+
+
+def expand_skf_tokens(tokens):
+    '''The tokens of a skf file with the repeats like 5*0.0 expanded to 5 tokens 0.0.
+
+    Parameters
+    ----------
+    tokens
+        a list of the string tokens.
+
+    Returns
+    -------
+        The expanded tokens as an object array, and the number of expanded tokens of each token.
+    '''
+    values = np.array(tokens, dtype=object)
+    counts = np.ones(len(tokens), dtype=np.int64)
+    for i in [i for i, token in enumerate(tokens) if '*' in token]:
+        count, values[i] = tokens[i].split('*')
+        assert values[i], "The format of the line is not correct! n*value, the value is gone!"
+        counts[i] = int(count)
+    return np.repeat(values, counts), counts
+
+
+def parse_skf_values(tokens):
+    '''The float64 values of the tokens, converted in one call.'''
+    values = np.fromstring(' '.join(tokens), dtype=np.float64, sep=' ')
+    if len(values) != len(tokens):
+        raise ValueError(f"The values of the skf file are not numbers: {' '.join(tokens[:20])} ...")
+    return values
+
+
+def read_skf_rows(lines, ncols):
+    '''The first ``ncols`` values of each of the lines of a skf file, the rest of the lines being ignored.'''
+    rows = [line.split() for line in lines]
+    lengths = [len(row) for row in rows]
+    tokens, counts = expand_skf_tokens(list(itertools.chain.from_iterable(rows)))
+    ntokens = np.bincount(np.repeat(np.repeat(np.arange(len(rows)), lengths), counts), minlength=len(rows))
+    if (ntokens < ncols).any():
+        raise ValueError(f"The lines of the skf file should have at least {ncols} values.")
+    if not (ntokens == ncols).all():
+        starts = np.cumsum(ntokens) - ntokens
+        tokens = tokens[(starts[:, None] + np.arange(ncols)).reshape(-1)]
+    return parse_skf_values(tokens.tolist()).reshape(len(rows), ncols)
+
+
+def parse_skfile(filename, homo):
+    '''Parses a Slater-Koster file into the arrays of its values, in the units of the file.
+
+    Parameters
+    ----------
+    filename
+        the path of the skf file.
+    homo
+        whether the file is for a homo-nuclear pair, with the onsite line.
+
+    Returns
+    -------
+        {"gridDist": float, "ngrid": int, "onsite": [10] or empty array, "HSvals": [ngrid - 1, 2 * NumHvals]}
+    '''
+    with open(filename) as fr:
+        lines = SKF_SEPARATORS.sub(' ', fr.read()).split('\n')
+    # Line 1
+    datline = expand_skf_tokens(lines[0].split())[0]
+    gridDist, ngrid = float(datline[0]), int(datline[1])
+    assert gridDist >0, "The grid distance should be positive."
+    if homo:
+        # Line 2 for Homo-nuclear case: Ed Ep Es, spe, Ud Up Us, Od Op Os.
+        onsite = read_skf_rows(lines[1:2], 10)[0]
+        start = 3
+    else:
+        onsite = np.zeros(0)
+        start = 2
+    HSvals = read_skf_rows(lines[start:start + ngrid - 1], 2 * NumHvals)
+    return {"gridDist": np.float64(gridDist), "ngrid": np.int64(ngrid), "onsite": onsite, "HSvals": HSvals}
+
+
+def skf_cache_file(filename):
+    '''The file of the cached arrays of a skf file, keyed on its path, modification time and size.'''
+    cache_dir = os.environ.get("DPTB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "dptb"))
+    stat = os.stat(filename)
+    key = f"{SKF_CACHE_VERSION}:{os.path.abspath(filename)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return os.path.join(cache_dir, "skf", hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+
+def load_skfiles(skfiles, cache=True, num_workers=1):
+    '''Parses the Slater-Koster files, from the cache for the files parsed before.
+
+    Parameters
+    ----------
+    skfiles
+        {bond_type: the path of the skf file}
+    cache
+        whether to read and write the cache of the parsed files.
+    num_workers
+        the number of processes parsing the files missing from the cache.
+
+    Returns
+    -------
+        {bond_type: the arrays of `parse_skfile`}
+    '''
+    parsed = {}
+    missing = []
+    for isktype, filename in skfiles.items():
+        if cache:
+            cache_file = skf_cache_file(filename)
+            if os.path.isfile(cache_file):
+                with np.load(cache_file) as cached:
+                    parsed[isktype] = {key: cached[key] for key in cached.files}
+                continue
+        missing.append(isktype)
+
+    tasks = [(skfiles[isktype], isktype.split('-')[0] == isktype.split('-')[1]) for isktype in missing]
+    if num_workers > 1 and len(tasks) > 1:
+        with mp.get_context("fork").Pool(processes=min(num_workers, len(tasks))) as pool:
+            results = pool.starmap(parse_skfile, tasks)
+    else:
+        results = [parse_skfile(*task) for task in tasks]
+
+    for isktype, result in zip(missing, results):
+        parsed[isktype] = result
+        if cache:
+            cache_file = skf_cache_file(skfiles[isktype])
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                # written aside and moved, so that a concurrent reader never sees a partial file.
+                tmp_file = f"{cache_file[:-4]}.{os.getpid()}.tmp.npz"
+                np.savez(tmp_file, **result)
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                log.warning(f'Failed to cache the skfile {skfiles[isktype]}: {e}')
+    return {isktype: parsed[isktype] for isktype in skfiles}
+
 class SKParam:
     # 键积分存储顺序
     intgl_order = {
@@ -99,7 +238,7 @@ class SKParam:
         self.skdict = self.format_skparams(skdict)
 
     @classmethod
-    def read_skfiles(self, skfiles):
+    def read_skfiles(self, skfiles, cache: bool=True, num_workers: int=1):
         '''It reads the Slater-Koster files names and returns the grid distance, number of grids, 
         and the Slater-Koster integrals
 
@@ -107,6 +246,10 @@ class SKParam:
         ----------
         skfiles
             a list of skfiles.
+        cache
+            whether to reuse the files parsed before, cached in $DPTB_CACHE_DIR (~/.cache/dptb by default).
+        num_workers
+            the number of processes parsing the files missing from the cache.
 
         Note: the Slater-Koster files name now consider that all the atoms are interacted with each other.
         Therefore, the number of Slater-Koster files is num_atom_types *2.
@@ -125,7 +268,8 @@ class SKParam:
             }
         '''
         assert isinstance(skfiles, dict)
-        skfiletypes = list(skfiles.keys())
+        log.info('Reading SlaterKoster Files......')
+        parsed = load_skfiles(skfiles, cache=cache, num_workers=num_workers)
 
         skdict = {}
         skdict['OnsiteE'] = {}
@@ -134,51 +278,26 @@ class SKParam:
         skdict["Distance"] = {}
         skdict["HubdU"] = {}
         skdict["Occu"] = {}
-        for isktype in skfiletypes:
-            filename = skfiles[isktype]
-            log.info('Reading SlaterKoster File......')
-            log.info(' ' + filename)
-            fr = open(filename)
-            data = fr.readlines()
-            fr.close()
-            # Line 1
-            datline = format_readline(data[0])
-            gridDist, ngrid = float(datline[0]), int(datline[1])
-            assert gridDist >0, "The grid distance should be positive."
-            ngrid = ngrid - 1
-
-            skdict["Distance"][isktype] = torch.arange(1,ngrid+1)*gridDist * 0.529177249
-
-            HSvals = torch.zeros([ngrid, NumHvals * 2])
+        for isktype, values in parsed.items():
+            ngrid = int(values["ngrid"]) - 1
+            skdict["Distance"][isktype] = torch.arange(1,ngrid+1)*float(values["gridDist"]) * 0.529177249
+
             atomtypes = isktype.split(sep='-')
             if atomtypes[0]==atomtypes[1]:
-                log.info('This file is a Homo-nuclear case!')
-                # Line 2 for Homo-nuclear case
-                datline = format_readline(data[1])
                 # Ed Ep Es, spe, Ud Up Us, Od Op Os.
                 # order from d p s -> s p d.
-                OnSiteEs = torch.tensor([float(datline[2 - ish]) for ish in range(MaxShells)])
-                HubdU = torch.tensor([float(datline[6 - ish]) for ish in range(MaxShells)])
-                Occu  = torch.tensor([float(datline[9 - ish]) for ish in range(MaxShells)])
+                datline = values["onsite"].tolist()
+                OnSiteEs = torch.tensor([datline[2 - ish] for ish in range(MaxShells)])
+                HubdU = torch.tensor([datline[6 - ish] for ish in range(MaxShells)])
+                Occu  = torch.tensor([datline[9 - ish] for ish in range(MaxShells)])
 
                 skdict["OnsiteE"][atomtypes[0]] = OnSiteEs *  13.605662285137 * 2
                 skdict["HubdU"][atomtypes[0]] = HubdU *  13.605662285137 * 2
                 skdict["Occu"][atomtypes[0]] = Occu
-                
-                for il in range(3, 3 + ngrid):
-                    datline = format_readline(data[il])
-                    HSvals[il - 3] = torch.tensor([float(val) for val in datline[0:2 * NumHvals]])
-                
-            else:
-                log.info('This is for Hetero-nuclear case!')
-                for il in range(2, 2 + ngrid):
-                    datline = format_readline(data[il])
-                    HSvals[il - 2] = torch.tensor([float(val) for val in datline[0:2 * NumHvals]])
 
-            # HSintgrl[isktype] = HSvals
+            HSvals = torch.as_tensor(values["HSvals"], dtype=torch.get_default_dtype())
             skdict['Hopping'][isktype] = HSvals[:,:NumHvals].T * 13.605662285137 * 2
             skdict['Overlap'][isktype] = HSvals[:,NumHvals:].T
-            
 
         return skdict
     
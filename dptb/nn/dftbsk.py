@@ -98,6 +98,23 @@ class DFTBSK(torch.nn.Module):
                 self.overlaponsite_param = overlaponsite_param
         self.idp = self.hamiltonian.idp
 
+    def _sk_coefficients(self) -> torch.Tensor:
+        """The interpolation coefficients of the hopping (and overlap) tables, [n_bond_types, n_ingrls, n_grid-1, n_coeff].
+
+        They are only recomputed when the tables are modified, e.g. by `load_state_dict` or moved to another device.
+        """
+        tables = [self.distance_param, self.hopping_param]
+        if hasattr(self, "overlap"):
+            tables.append(self.overlap_param)
+        key = tuple((t.data_ptr(), t._version) for t in tables)
+        if getattr(self, "_sk_coeffs_key", None) != key:
+            # the sk files tabulate the integrals on a uniform grid
+            spacing = self.distance_param[1:] - self.distance_param[:-1]
+            self._uniform_grid = bool(torch.allclose(spacing, spacing[0].expand_as(spacing)))
+            self._sk_coeffs = self.hopping_fn.get_coefficients(xx=self.distance_param, yy=torch.cat(tables[1:], dim=1))
+            self._sk_coeffs_key = key
+        return self._sk_coeffs
+
     def forward(self, data: AtomicDataDict.Type) -> AtomicDataDict.Type:
         
         data = AtomicDataDict.with_edge_vectors(data, with_lengths=True)
@@ -106,21 +123,16 @@ class DFTBSK(torch.nn.Module):
         edge_number = self.idp_sk.untransform_bond(edge_index).T
         rij = data[AtomicDataDict.EDGE_LENGTH_KEY]
 
-        data[AtomicDataDict.EDGE_FEATURES_KEY] = torch.zeros((len(edge_index), self.idp_sk.reduced_matrix_element), dtype=self.dtype, device=self.device)
-        
         if hasattr(self, "overlap"):
-            data[AtomicDataDict.EDGE_OVERLAP_KEY] = torch.zeros((len(edge_index), self.idp_sk.reduced_matrix_element), dtype=self.dtype, device=self.device)
             data[AtomicDataDict.NODE_OVERLAP_KEY] = self.overlaponsite_param[data[AtomicDataDict.ATOM_TYPE_KEY].flatten()]
             data[AtomicDataDict.NODE_OVERLAP_KEY][:,self.idp_sk.mask_diag] = 1.
 
-        for ibtype in self.idp_sk.bond_types:
-            ibtype_idx = self.idp_sk.bond_to_type[ibtype]
-            mask = edge_index == ibtype_idx
-            
-            data[AtomicDataDict.EDGE_FEATURES_KEY][mask] = self.hopping_fn.get_skhij(rij[mask], xx=self.distance_param, yy=self.hopping_param[ibtype_idx])
-            
-            if hasattr(self, "overlap"):
-                data[AtomicDataDict.EDGE_OVERLAP_KEY][mask] = self.hopping_fn.get_skhij(rij[mask], xx=self.distance_param, yy=self.overlap_param[ibtype_idx])
+        # hopping and overlap integrals of all the bond types are interpolated together.
+        coeffs = self._sk_coefficients()
+        skints = self.hopping_fn.get_skhij_typed(rij, edge_index, xx=self.distance_param, coeffs=coeffs, uniform=self._uniform_grid)
+        data[AtomicDataDict.EDGE_FEATURES_KEY] = skints[:, :self.idp_sk.reduced_matrix_element]
+        if hasattr(self, "overlap"):
+            data[AtomicDataDict.EDGE_OVERLAP_KEY] = skints[:, self.idp_sk.reduced_matrix_element:]
 
         atomic_numbers = self.idp_sk.untransform_atom(data[AtomicDataDict.ATOM_TYPE_KEY].flatten())
         
@@ -3,16 +3,189 @@ The quantities module of GNN, with AtomicDataDict.Type as input and output the s
     one field and get features of an other field. E.p, the energy model should act on NODE_FEATURES or EDGE_FEATURES to get NODE or EDGE
     ENERGY. Then it will be summed up to graph level features TOTOL_ENERGY.
 """
+import os
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import numpy as np
 import torch.nn as nn
-from dptb.nn.hr2hk import HR2HK
-from typing import Union, Optional, Dict, List
+from dptb.nn.hr2hk import HR2HK, time_reversal_kset
+from typing import Union, Optional, Dict, List, Tuple
 from dptb.data.transforms import OrbitalMapper
 from dptb.data import AtomicDataDict
 import logging
 log = logging.getLogger(__name__)
 
+# the largest fraction of the bands for which the numpy solver computes a band window with the subset driver of
+# LAPACK, above it the full spectrum is as fast.
+SUBSET_BAND_FRACTION = 0.25
+# the least work of a task of the thread pool, in Norb^3 per k-point, for its overhead to be negligible.
+PARALLEL_TASK_WORK = 2**22
+
+
+class EigvalshWindow(torch.autograd.Function):
+    """The eigenvalues ``band_min:band_max`` of a batch of Hermitian matrices, with the Hellmann-Feynman backward
+    dE_n/dH = v_n v_n^H, which keeps only the eigenvectors of the window."""
+
+    @staticmethod
+    def forward(ctx, h, band_min, band_max):
+        eigvals, eigvecs = torch.linalg.eigh(h)
+        eigvecs = eigvecs[..., band_min:band_max].contiguous()
+        ctx.save_for_backward(eigvecs)
+        return eigvals[..., band_min:band_max]
+
+    @staticmethod
+    def backward(ctx, grad):
+        eigvecs, = ctx.saved_tensors
+        return (eigvecs * grad.unsqueeze(-2).to(eigvecs.dtype)) @ eigvecs.mH, None, None
+
+
+def eigvalsh_window(h: torch.Tensor, band_min: int=0, band_max: Optional[int]=None) -> torch.Tensor:
+    """The eigenvalues ``band_min:band_max`` of the Hermitian matrices ``h`` [..., N, N]."""
+    if (band_min == 0 and band_max in (None, h.shape[-1])) or not (torch.is_grad_enabled() and h.requires_grad):
+        return torch.linalg.eigvalsh(h)[..., band_min:band_max]
+    return EigvalshWindow.apply(h, band_min, h.shape[-1] if band_max is None else band_max)
+
+
+def eigvalsh_window_numpy(h: np.ndarray, band_min: int=0, band_max: Optional[int]=None) -> np.ndarray:
+    """The eigenvalues ``band_min:band_max`` of the Hermitian matrices ``h`` [nk, N, N], from the subset driver
+    of LAPACK when the window is a small part of the spectrum."""
+    norb = h.shape[-1]
+    band_max = norb if band_max is None else band_max
+    if (band_min == 0 and band_max == norb) or band_max - band_min > SUBSET_BAND_FRACTION * norb:
+        return np.linalg.eigvalsh(h)[..., band_min:band_max]
+    import scipy.linalg
+    return np.stack([scipy.linalg.eigh(hk, eigvals_only=True, subset_by_index=[band_min, band_max-1], driver="evr") for hk in h])
+
+
+def energy_window_bands(eigvals: torch.Tensor, emin: Optional[float], emax: Optional[float]) -> Tuple[int, int]:
+    """The band indices ``[band_min, band_max)`` of the bands inside ``[emin, emax]`` at one k-point at least."""
+    band_min = int((eigvals < emin).sum(-1).min()) if emin is not None else 0
+    band_max = int((eigvals <= emax).sum(-1).max()) if emax is not None else eigvals.shape[-1]
+    return band_min, max(band_min, band_max)
+
+
+def default_num_workers() -> int:
+    """The number of cores available to the process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def parallel_chunk_size(num_k: int, norb: int, num_workers: int) -> int:
+    """The number of k-points of a task: about 4 tasks per worker to balance the load, but not less work than
+    `PARALLEL_TASK_WORK`, which makes the small matrices batched in few tasks."""
+    balanced = int(np.ceil(num_k / (4 * num_workers)))
+    least = int(np.ceil(PARALLEL_TASK_WORK / norb**3))
+    return max(1, min(num_k, max(balanced, least)))
+
+
+@contextlib.contextmanager
+def single_threaded_lapack():
+    """Limit torch, and the BLAS/LAPACK libraries of numpy and scipy when threadpoolctl is installed, to one
+    thread, so that the workers of a pool do not oversubscribe the cores."""
+    num_threads = torch.get_num_threads()
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        limits = contextlib.nullcontext()
+    else:
+        limits = threadpool_limits(limits=1)
+    torch.set_num_threads(1)
+    try:
+        with limits:
+            yield
+    finally:
+        torch.set_num_threads(num_threads)
+
+
+def map_k_chunks(fn, num_k: int, chunk_size: int, num_workers: int):
+    """Call ``fn(start, stop)`` on the chunks of ``chunk_size`` k-points of ``range(num_k)``, in a pool of
+    ``num_workers`` threads with one LAPACK thread each. ``fn`` writes its results in preallocated outputs."""
+    chunks = [(start, min(start + chunk_size, num_k)) for start in range(0, num_k, chunk_size)]
+    if num_workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            fn(*chunk)
+        return
+
+    def task(start, stop):
+        # the number of threads of torch is also set in the worker, for its OpenMP runtime.
+        torch.set_num_threads(1)
+        fn(start, stop)
+
+    with single_threaded_lapack(), ThreadPoolExecutor(max_workers=min(num_workers, len(chunks))) as pool:
+        for future in [pool.submit(task, *chunk) for chunk in chunks]:
+            future.result()
+
+
+def generalized_eigvalsh(h, s=None, band_min: int=0, band_max: Optional[int]=None):
+    """The eigenvalues ``band_min:band_max`` of H c = E S c, for H and S [nk, N, N] tensors or numpy arrays,
+    from the Cholesky factor of S."""
+    if isinstance(h, torch.Tensor):
+        if s is not None:
+            chklowtinv = torch.linalg.inv(torch.linalg.cholesky(s))
+            h = chklowtinv @ h @ chklowtinv.mH
+        return eigvalsh_window(h, band_min, band_max)
+    if s is not None:
+        chklowtinv = np.linalg.inv(np.linalg.cholesky(s))
+        h = chklowtinv @ h @ np.transpose(chklowtinv, (0, 2, 1)).conj()
+    return eigvalsh_window_numpy(h, band_min, band_max)
+
+
+def generalized_eigh(h: torch.Tensor, s: Optional[torch.Tensor]=None) -> Tuple[torch.Tensor, torch.Tensor]:
+    """The eigenvalues and the eigenvectors, as columns, of H c = E S c."""
+    if s is None:
+        return torch.linalg.eigh(h)
+    chklowtinv = torch.linalg.inv(torch.linalg.cholesky(s))
+    eigvals, eigvecs = torch.linalg.eigh(chklowtinv @ h @ chklowtinv.mH)
+    return eigvals, chklowtinv.mH @ eigvecs
+
+
+def parallel_eigvalsh(h, s=None, band_min: int=0, band_max: Optional[int]=None, num_workers: Optional[int]=None, out=None):
+    """`generalized_eigvalsh` with the k-points split over a pool of ``num_workers`` threads, written in ``out``
+    [nk, nbands] if given. For inference only: the eigenvalues carry no gradient."""
+    num_workers = default_num_workers() if num_workers is None else num_workers
+    num_k, norb = h.shape[0], h.shape[-1]
+    nbands = (norb if band_max is None else band_max) - band_min
+    if isinstance(h, torch.Tensor):
+        h, s = h.detach(), s.detach() if s is not None else None
+        if out is None:
+            out = torch.empty((num_k, nbands), dtype=h.real.dtype, device=h.device)
+    elif out is None:
+        out = np.empty((num_k, nbands), dtype=h.real.dtype)
+
+    def solve(start, stop):
+        out[start:stop] = generalized_eigvalsh(h[start:stop], s[start:stop] if s is not None else None, band_min, band_max)
+
+    map_k_chunks(solve, num_k, parallel_chunk_size(num_k, norb, num_workers), num_workers)
+    return out
+
+
+def parallel_eigh(h: torch.Tensor, s: Optional[torch.Tensor]=None, num_workers: Optional[int]=None) -> Tuple[torch.Tensor, torch.Tensor]:
+    """`generalized_eigh` with the k-points split over a pool of ``num_workers`` threads. For inference only: the
+    eigenvalues and the eigenvectors carry no gradient."""
+    num_workers = default_num_workers() if num_workers is None else num_workers
+    h, s = h.detach(), s.detach() if s is not None else None
+    num_k, norb = h.shape[0], h.shape[-1]
+    eigvals = torch.empty((num_k, norb), dtype=h.real.dtype, device=h.device)
+    eigvecs = torch.empty_like(h)
+
+    def solve(start, stop):
+        eigvals[start:stop], eigvecs[start:stop] = generalized_eigh(h[start:stop], s[start:stop] if s is not None else None)
+
+    map_k_chunks(solve, num_k, parallel_chunk_size(num_k, norb, num_workers), num_workers)
+    return eigvals, eigvecs
+
+
+def expand_fields(data: AtomicDataDict.Type, kset, fields: List[Optional[str]]):
+    """Expand the matrices of ``fields``, e.g. H(k) and S(k), from the representatives of ``kset`` to all its
+    k-points."""
+    for field in fields:
+        if field is not None and field in data:
+            data[field] = kset.expand(data[field], conjugate=True)
+
+
 class Eigenvalues(nn.Module):
     def __init__(
             self,
@@ -24,8 +197,22 @@ class Eigenvalues(nn.Module):
             s_edge_field: str = None,
             s_node_field: str = None,
             s_out_field: str = None,
+            band_window: Optional[Tuple[int, Optional[int]]] = None,
+            energy_window: Optional[Tuple[Optional[float], Optional[float]]] = None,
+            time_reversal: bool = True,
             dtype: Union[str, torch.dtype] = torch.float32, 
             device: Union[str, torch.device] = torch.device("cpu")):
+        """
+        The eigenvalues of the Hamiltonian at the k-points of the data.
+
+        By default all the bands are computed. With ``band_window = (band_min, band_max)`` only the bands
+        ``band_min:band_max`` are returned, and the backward of the torch solver keeps only their eigenvectors. With
+        ``energy_window = (emin, emax)``, the bands inside the energy window at one k-point at least are returned.
+        Both can also be given to `forward`, which overrides these defaults.
+
+        With ``time_reversal`` and the soc switched off, only one k-point of each ±k pair is solved, see
+        `dptb.utils.make_kpoints.TimeReversalKSet`.
+        """
         super(Eigenvalues, self).__init__()
 
         self.h2k = HR2HK(
@@ -55,12 +242,23 @@ class Eigenvalues(nn.Module):
         self.out_field = out_field
         self.h_out_field = h_out_field
         self.s_out_field = s_out_field
+        self.band_window = band_window
+        self.energy_window = energy_window
+        self.time_reversal = time_reversal
 
 
     def forward(self, 
                 data: AtomicDataDict.Type, 
                 nk: Optional[int]=None,
-                eig_solver: str='torch') -> AtomicDataDict.Type:
+                eig_solver: str='torch',
+                band_window: Optional[Tuple[int, Optional[int]]]=None,
+                energy_window: Optional[Tuple[Optional[float], Optional[float]]]=None,
+                num_workers: Optional[int]=None) -> AtomicDataDict.Type:
+        """
+        With ``num_workers`` > 1 on cpu, the k-points of each chunk of ``nk`` are diagonalized by a pool of threads
+        with one LAPACK thread each, which scales better on many cores than the threads of LAPACK for the small
+        matrices. This mode is for inference, the eigenvalues carry no gradient.
+        """
 
         if eig_solver is None:
             eig_solver = 'torch'
@@ -69,6 +267,13 @@ class Eigenvalues(nn.Module):
             log.error(f"eig_solver should be 'torch' or 'numpy', but got {eig_solver}.")
             raise ValueError        
 
+        band_window = band_window if band_window is not None else self.band_window
+        energy_window = energy_window if energy_window is not None else self.energy_window
+        if band_window is not None and energy_window is not None:
+            raise ValueError("Only one of band_window and energy_window can be given.")
+        # the bands of an energy window are only known with all the k-points, so the full spectrum is computed.
+        band_min, band_max = band_window if band_window is not None else (0, None)
+
         kpoints = data[AtomicDataDict.KPOINT_KEY]
         if kpoints.is_nested:
             nested = True
@@ -76,43 +281,82 @@ class Eigenvalues(nn.Module):
             kpoints = kpoints[0]
         else:
             nested = False
-        num_k = kpoints.shape[0]
+        kset = time_reversal_kset(data, kpoints) if self.time_reversal else None
+        irreducible = kpoints if kset is None else kpoints[torch.as_tensor(kset.irreducible, device=kpoints.device)]
+        num_k = irreducible.shape[0]
         eigvals = []
         if nk is None:
             nk = num_k
-        for i in range(int(np.ceil(num_k / nk))):
-            data[AtomicDataDict.KPOINT_KEY] = kpoints[i*nk:(i+1)*nk]
-            data = self.h2k(data)
-            h_transformed_np = None
-            if self.overlap:
-                data = self.s2k(data)
+        nchunks = int(np.ceil(num_k / nk))
+        if num_workers is not None and num_workers > 1 and torch.device(self.h2k.device).type == "cpu":
+            eigvals.append(self._parallel_eigvals(data, irreducible, nk, eig_solver, band_min, band_max, num_workers))
+        else:
+            for i in range(nchunks):
+                data[AtomicDataDict.KPOINT_KEY] = irreducible[i*nk:(i+1)*nk]
+                data = self.h2k(data)
+                h_transformed_np = None
+                if self.overlap:
+                    data = self.s2k(data)
+                    if eig_solver == 'torch':
+                        chklowt = torch.linalg.cholesky(data[self.s_out_field])
+                        chklowtinv = torch.linalg.inv(chklowt)
+                        data[self.h_out_field] = (chklowtinv @ data[self.h_out_field] @ torch.transpose(chklowtinv,dim0=1,dim1=2).conj())
+                    elif eig_solver == 'numpy':
+                        s_np = data[self.s_out_field].detach().cpu().numpy()
+                        h_np = data[self.h_out_field].detach().cpu().numpy()
+                        chklowt = np.linalg.cholesky(s_np)
+                        chklowtinv = np.linalg.inv(chklowt)
+                        h_transformed_np = chklowtinv @ h_np @ np.transpose(chklowtinv,(0,2,1)).conj()
+
                 if eig_solver == 'torch':
-                    chklowt = torch.linalg.cholesky(data[self.s_out_field])
-                    chklowtinv = torch.linalg.inv(chklowt)
-                    data[self.h_out_field] = (chklowtinv @ data[self.h_out_field] @ torch.transpose(chklowtinv,dim0=1,dim1=2).conj())
+                    eigvals.append(eigvalsh_window(data[self.h_out_field], band_min, band_max))
                 elif eig_solver == 'numpy':
-                    s_np = data[self.s_out_field].detach().cpu().numpy()
-                    h_np = data[self.h_out_field].detach().cpu().numpy()
-                    chklowt = np.linalg.cholesky(s_np)
-                    chklowtinv = np.linalg.inv(chklowt)
-                    h_transformed_np = chklowtinv @ h_np @ np.transpose(chklowtinv,(0,2,1)).conj()
-
-            if eig_solver == 'torch':
-                eigvals.append(torch.linalg.eigvalsh(data[self.h_out_field]))
-            elif eig_solver == 'numpy':
-                if h_transformed_np is None:
-                    h_transformed_np = data[self.h_out_field].detach().cpu().numpy()
-                eigvals_np = np.linalg.eigvalsh(a=h_transformed_np)
-                # Preserve dtype by converting to the Hamiltonian's original dtype
-                eigvals.append(torch.from_numpy(eigvals_np).to(dtype=self.h2k.dtype, device=self.h2k.device))
-
-        data[self.out_field] = torch.nested.as_nested_tensor([torch.cat(eigvals, dim=0)])
+                    if h_transformed_np is None:
+                        h_transformed_np = data[self.h_out_field].detach().cpu().numpy()
+                    eigvals_np = eigvalsh_window_numpy(h_transformed_np, band_min, band_max)
+                    # Preserve dtype by converting to the Hamiltonian's original dtype
+                    eigvals.append(torch.from_numpy(eigvals_np).to(dtype=self.h2k.dtype, device=self.h2k.device))
+
+        eigvals = torch.cat(eigvals, dim=0)
+        if kset is not None:
+            eigvals = kset.expand(eigvals)
+            if nchunks == 1:
+                expand_fields(data, kset, [self.h_out_field, self.s_out_field])
+        if energy_window is not None:
+            band_min, band_max = energy_window_bands(eigvals.detach(), *energy_window)
+            eigvals = eigvals[:, band_min:band_max]
+        data[self.out_field] = torch.nested.as_nested_tensor([eigvals])
         if nested:
             data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([kpoints])
         else:
             data[AtomicDataDict.KPOINT_KEY] = kpoints
 
         return data
+
+    @torch.no_grad()
+    def _parallel_eigvals(self, data, kpoints, nk, eig_solver, band_min, band_max, num_workers) -> torch.Tensor:
+        # the eigenvalues of all the chunks are written in one preallocated output.
+        num_k = kpoints.shape[0]
+        eigvals = None
+        for i in range(int(np.ceil(num_k / nk))):
+            data[AtomicDataDict.KPOINT_KEY] = kpoints[i*nk:(i+1)*nk]
+            data = self.h2k(data)
+            h, s = data[self.h_out_field], None
+            if self.overlap:
+                data = self.s2k(data)
+                s = data[self.s_out_field]
+            if eig_solver == 'numpy':
+                h, s = h.cpu().numpy(), s.cpu().numpy() if s is not None else None
+            if eigvals is None:
+                nbands = (h.shape[-1] if band_max is None else band_max) - band_min
+                if eig_solver == 'numpy':
+                    eigvals = np.empty((num_k, nbands), dtype=h.real.dtype)
+                else:
+                    eigvals = torch.empty((num_k, nbands), dtype=self.h2k.dtype, device=self.h2k.device)
+            parallel_eigvalsh(h, s, band_min, band_max, num_workers=num_workers, out=eigvals[i*nk:i*nk+h.shape[0]])
+        if eig_solver == 'numpy':
+            eigvals = torch.from_numpy(eigvals).to(dtype=self.h2k.dtype, device=self.h2k.device)
+        return eigvals
     
 class Eigh(nn.Module):
     def __init__(
@@ -126,8 +370,15 @@ class Eigh(nn.Module):
             s_edge_field: str = None,
             s_node_field: str = None,
             s_out_field: str = None,
+            time_reversal: bool = True,
             dtype: Union[str, torch.dtype] = torch.float32, 
             device: Union[str, torch.device] = torch.device("cpu")):
+        """
+        The eigenvalues and eigenvectors of the Hamiltonian at the k-points of the data.
+
+        With ``time_reversal`` and the soc switched off, only one k-point of each ±k pair is solved, and the
+        eigenvectors of its partner are the conjugates.
+        """
         super(Eigh, self).__init__()
 
         self.h2k = HR2HK(
@@ -158,9 +409,14 @@ class Eigh(nn.Module):
         self.eigvec_field = eigvec_field
         self.h_out_field = h_out_field
         self.s_out_field = s_out_field
+        self.time_reversal = time_reversal
 
 
-    def forward(self, data: AtomicDataDict.Type, nk: Optional[int]=None) -> AtomicDataDict.Type:
+    def forward(self, data: AtomicDataDict.Type, nk: Optional[int]=None, num_workers: Optional[int]=None) -> AtomicDataDict.Type:
+        """
+        With ``num_workers`` > 1 on cpu, the k-points are diagonalized by a pool of threads, for inference, see
+        `Eigenvalues.forward`.
+        """
         kpoints = data[AtomicDataDict.KPOINT_KEY]
         if kpoints.is_nested:
             nested = True
@@ -168,14 +424,24 @@ class Eigh(nn.Module):
             kpoints = kpoints[0]
         else:
             nested = False
-        num_k = kpoints.shape[0]
+        kset = time_reversal_kset(data, kpoints) if self.time_reversal else None
+        irreducible = kpoints if kset is None else kpoints[torch.as_tensor(kset.irreducible, device=kpoints.device)]
+        num_k = irreducible.shape[0]
         eigvals = []
         eigvecs = []
         if nk is None:
             nk = num_k
-        for i in range(int(np.ceil(num_k / nk))):
-            data[AtomicDataDict.KPOINT_KEY] = kpoints[i*nk:(i+1)*nk]
+        nchunks = int(np.ceil(num_k / nk))
+        parallel = num_workers is not None and num_workers > 1 and torch.device(self.h2k.device).type == "cpu"
+        for i in range(nchunks):
+            data[AtomicDataDict.KPOINT_KEY] = irreducible[i*nk:(i+1)*nk]
             data = self.h2k(data)
+            if parallel:
+                s = self.s2k(data)[self.s_out_field] if self.overlap else None
+                eigval, eigvec = parallel_eigh(data[self.h_out_field], s, num_workers=num_workers)
+                eigvals.append(eigval)
+                eigvecs.append(eigvec.transpose(1, 2) if self.overlap else eigvec)
+                continue
             if self.overlap:
                 data = self.s2k(data)
                 chklowt = torch.linalg.cholesky(data[self.s_out_field])
@@ -193,8 +459,16 @@ class Eigh(nn.Module):
             eigvecs.append(eigvec)
             eigvals.append(eigval)
 
-        data[self.eigval_field] = torch.nested.as_nested_tensor([torch.cat(eigvals, dim=0)])
-        data[self.eigvec_field] = torch.cat(eigvecs, dim=0)
+        eigvals = torch.cat(eigvals, dim=0)
+        eigvecs = torch.cat(eigvecs, dim=0)
+        if kset is not None:
+            eigvals = kset.expand(eigvals)
+            eigvecs = kset.expand(eigvecs, conjugate=True)
+            if nchunks == 1:
+                expand_fields(data, kset, [self.h_out_field, self.s_out_field])
+
+        data[self.eigval_field] = torch.nested.as_nested_tensor([eigvals])
+        data[self.eigvec_field] = eigvecs
 
         if nested:
             data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([kpoints])
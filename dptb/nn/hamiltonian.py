@@ -368,7 +368,7 @@ class SKHamiltonian_old(torch.nn.Module):
         # compute if strain effect is included
         # this is a little wired operation, since it acting on somekind of a edge(strain env) feature, and summed up to return a node feature.
         if self.strain:
-            n_onsitenv = len(data[AtomicDataDict.ONSITENV_FEATURES_KEY])
+            n_onsitenv = data[AtomicDataDict.ONSITENV_FEATURES_KEY].shape[0]
             for opairtype in self.idp.orbpairtype_maps.keys(): # save all env direction and pair direction like sp and ps, but only get sp
                 l1, l2 = anglrMId[opairtype[0]], anglrMId[opairtype[2]]
                 # opairtype = opair[1]+"-"+opair[4]
@@ -569,7 +569,7 @@ class SKHamiltonian(torch.nn.Module):
         # compute if strain effect is included
         # this is a little wired operation, since it acting on somekind of a edge(strain env) feature, and summed up to return a node feature.
         if self.strain:
-            n_onsitenv = len(data[AtomicDataDict.ONSITENV_FEATURES_KEY])
+            n_onsitenv = data[AtomicDataDict.ONSITENV_FEATURES_KEY].shape[0]
             for opairtype in self.idp.orbpairtype_maps.keys(): # save all env direction and pair direction like sp and ps, but only get sp
                 l1, l2 = anglrMId[opairtype[0]], anglrMId[opairtype[2]]
                 # opairtype = opair[1]+"-"+opair[4]
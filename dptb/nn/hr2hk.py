@@ -1,10 +1,22 @@
 import torch
 from dptb.utils.constants import h_all_types, anglrMId, atomic_num_dict, atomic_num_dict_r
-from typing import Tuple, Union, Dict
+from typing import Tuple, Union, Dict, Optional
 from dptb.data.transforms import OrbitalMapper
 from dptb.data import AtomicDataDict
 import re
 from dptb.utils.tools import float2comlex
+from dptb.utils.make_kpoints import TimeReversalKSet
+
+
+def time_reversal_kset(data: AtomicDataDict.Type, kpoints: torch.Tensor, periodic: bool=True) -> Optional[TimeReversalKSet]:
+    """The ±k pairs of ``kpoints``, or None when the soc of ``data`` is switched on or no k-point has a partner."""
+    soc = data.get(AtomicDataDict.NODE_SOC_SWITCH_KEY, False)
+    if isinstance(soc, torch.Tensor):
+        soc = soc.all()
+    if soc:
+        return None
+    kset = TimeReversalKSet(kpoints, periodic=periodic)
+    return None if kset.is_trivial else kset
 
 
 class HR2HK(torch.nn.Module):
@@ -22,16 +34,19 @@ class HR2HK(torch.nn.Module):
             device: Union[str, torch.device] = torch.device("cpu"),
             derivative:bool = False,
             out_derivative_field: str = AtomicDataDict.HAMILTONIAN_DERIV_KEY,
-            gauge: bool = False 
+            gauge: bool = False,
+            time_reversal: bool = True,
             ):
         # gauge: False -> Tight-binding Convention I:  Wannier90 Gauge 
         # gauge: True  -> Tight-binding Convention II: "Physical Gauge"/"Periodic Gauge"
+        # time_reversal: without soc, H(-k) = H(k)*, so only one k of each ±k pair is computed and conjugated to the other.
         super(HR2HK, self).__init__()
     
         if derivative:
             gauge = True
         self.gauge = gauge
         self.derivative = derivative
+        self.time_reversal = time_reversal
         if isinstance(dtype, str):
             dtype = getattr(torch, dtype)
         self.dtype = dtype
@@ -80,6 +95,13 @@ class HR2HK(torch.nn.Module):
         soc = data.get(AtomicDataDict.NODE_SOC_SWITCH_KEY, False)
         if isinstance(soc, torch.Tensor):
             soc = soc.all()
+        kset = None
+        if self.time_reversal:
+            # in the gauge II, H(k+G) is only unitarily equivalent to H(k), so only the exact -k are paired.
+            kset = time_reversal_kset(data, kpoints, periodic=not self.gauge)
+            if kset is not None:
+                kpoints = kpoints[torch.as_tensor(kset.irreducible, device=kpoints.device)]
+
         if soc: 
             # this soc only support sktb.
             orbpair_soc = data[AtomicDataDict.NODE_SOC_KEY]
@@ -231,10 +253,15 @@ class HR2HK(torch.nn.Module):
 
                 data[self.out_field] = HK_SOC
         else:
+            if kset is not None:
+                block = kset.expand(block, conjugate=True)
             data[self.out_field] = block
         
         # Store derivative if computed
         if self.derivative:
+            if kset is not None:
+                # dH/dk(-k) = -dH/dk(k)*
+                dblock = kset.expand(dblock, conjugate=True, sign=-1.0)
             data[self.out_derivative_field] = dblock
 
         return data
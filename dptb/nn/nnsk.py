@@ -99,7 +99,17 @@ class NNSK(torch.nn.Module):
 
         if self.soc_options.get("method", None) is not None:
             self.idp_sk.get_sksoc_maps()
-        
+
+        # the bond type of the reflected bond, A-B -> B-A, and the mask of the orbital pairs of the same orbitals, e.g. s-s,
+        # whose parameters are shared by a bond and its reflection. See `symmetrize`.
+        reflective_bonds = [self.idp_sk.bond_to_type["-".join(self.idp_sk.type_to_bond[i].split("-")[::-1])] for i in range(len(self.idp_sk.bond_types))]
+        equal_orbpair = torch.zeros(self.idp_sk.reduced_matrix_element, dtype=torch.bool)
+        for orbpair_key, slices in self.idp_sk.orbpair_maps.items():
+            if orbpair_key.split("-")[0] == orbpair_key.split("-")[1]:
+                equal_orbpair[slices] = True
+        self.register_buffer("reflective_bonds", torch.tensor(reflective_bonds, dtype=torch.long, device=self.device), persistent=False)
+        self.register_buffer("equal_orbpair", equal_orbpair.to(self.device), persistent=False)
+
         self.count_push = 0
 
         # init_onsite, hopping, overlap formula
@@ -282,6 +292,17 @@ class NNSK(torch.nn.Module):
 
             self.model_options["nnsk"]["hopping"] = self.hopping_options
 
+    @torch.no_grad()
+    def symmetrize(self, param: torch.Tensor):
+        """Average, in place, the parameters of the orbital pairs of the same orbitals over a bond and its reflection.
+
+        This keeps the symmetry As-Bs = Bs-As. It is needed because for different orbital pairs we only have one set of
+        parameters, e.g. As-Bp and Bs-Ap but not Ap-Bs and Bp-As, and use Ap-Bs = Bs-Ap and Bp-As = As-Bp for the
+        hopping integrals.
+        """
+        mask = self.equal_orbpair.view(1, -1, 1)
+        param.data.copy_(torch.where(mask, 0.5 * (param.data + param.data.index_select(0, self.reflective_bonds)), param.data))
+
     def forward(self, data: AtomicDataDict.Type) -> AtomicDataDict.Type:
         # get the env and bond from the data
         # calculate the sk integrals
@@ -295,25 +316,10 @@ class NNSK(torch.nn.Module):
         if self.if_push:
             self.push_decay(**self.push)
 
-        reflective_bonds = np.array([self.idp_sk.bond_to_type["-".join(self.idp_sk.type_to_bond[i].split("-")[::-1])] for i  in range(len(self.idp_sk.bond_types))])
-        params = self.hopping_param.data
-        reflect_params = params[reflective_bonds]
-        for k in self.idp_sk.orbpair_maps.keys():
-            iorb, jorb = k.split("-")
-            if iorb == jorb:
-                # This is to keep the symmetry of the hopping parameters for the same orbital pairs
-                # As-Bs = Bs-As; we need to do this because for different orbital pairs, we only have one set of parameters, 
-                # eg. we only have As-Bp and Bs-Ap, but not Ap-Bs and Bp-As; and we will use Ap-Bs = Bs-Ap and Bp-As = As-Bp to calculate the hopping integral
-                self.hopping_param.data[:,self.idp_sk.orbpair_maps[k],:] = 0.5 * (params[:,self.idp_sk.orbpair_maps[k],:] + reflect_params[:,self.idp_sk.orbpair_maps[k],:])
+        self.symmetrize(self.hopping_param)
         if hasattr(self, "overlap"):
-            params = self.overlap_param.data
-            reflect_params = params[reflective_bonds]
-            for k in self.idp_sk.orbpair_maps.keys():
-                iorb, jorb = k.split("-")
-                if iorb == jorb:
-                    self.overlap_param.data[:,self.idp_sk.orbpair_maps[k],:] = 0.5 * (params[:,self.idp_sk.orbpair_maps[k],:] + reflect_params[:,self.idp_sk.orbpair_maps[k],:])
+            self.symmetrize(self.overlap_param)
 
-        
         data = AtomicDataDict.with_edge_vectors(data, with_lengths=True)
         if data.get(AtomicDataDict.EDGE_TYPE_KEY, None) is None:
             self.idp_sk(data)
@@ -347,24 +353,20 @@ class NNSK(torch.nn.Module):
 
         data[AtomicDataDict.EDGE_FEATURES_KEY] = self.hopping_fn.get_skhij(
             rij=data[AtomicDataDict.EDGE_LENGTH_KEY],
-            paraArray=self.hopping_param[edge_index], # [N_edge, n_pairs, n_paras],
+            paraArray=self.hopping_param.index_select(0, edge_index), # [N_edge, n_pairs, n_paras],
             **hopping_options,
             r0=r0
             ) # [N_edge, n_pairs]
 
         if hasattr(self, "overlap"):
-            equal_orbpair = torch.zeros(self.idp_sk.reduced_matrix_element, dtype=self.dtype, device=self.device)
-            for orbpair_key, slices in self.idp_sk.orbpair_maps.items():
-                if orbpair_key.split("-")[0] == orbpair_key.split("-")[1]:
-                    equal_orbpair[slices] = 1.0
             # this paraconst is to make sure the overlap between the same orbital pairs of the save atom is 1.0 
             # this is taken from the formula of NRL-TB. 
             # the overlap tag now is only designed to be used in the NRL-TB case. In the future, we may need to change this.
-            paraconst = edge_number[0].eq(edge_number[1]).float().view(-1, 1) * equal_orbpair.unsqueeze(0)
+            paraconst = (edge_number[0].eq(edge_number[1]).view(-1, 1) & self.equal_orbpair.unsqueeze(0)).to(self.dtype)
 
             data[AtomicDataDict.EDGE_OVERLAP_KEY] = self.ovp_factor * self.overlap_fn.get_sksij(
                 rij=data[AtomicDataDict.EDGE_LENGTH_KEY],
-                paraArray=self.overlap_param[edge_index],
+                paraArray=self.overlap_param.index_select(0, edge_index),
                 paraconst=paraconst,
                 **hopping_options,
                 r0=r0,
@@ -424,12 +426,12 @@ class NNSK(torch.nn.Module):
                 nn_soc_paras=self.soc_param
                 )
             if AtomicDataDict.NODE_SOC_SWITCH_KEY not in data:
-                data[AtomicDataDict.NODE_SOC_SWITCH_KEY] =  torch.full((data['pbc'].shape[0], 1), True) 
+                data[AtomicDataDict.NODE_SOC_SWITCH_KEY] =  torch.ones((data['pbc'].shape[0], 1), dtype=torch.bool, device=self.device)
             else:
                 data[AtomicDataDict.NODE_SOC_SWITCH_KEY].fill_(True)
         else:
             if AtomicDataDict.NODE_SOC_SWITCH_KEY not in data:
-                data[AtomicDataDict.NODE_SOC_SWITCH_KEY] =  torch.full((data['pbc'].shape[0], 1), False)
+                data[AtomicDataDict.NODE_SOC_SWITCH_KEY] =  torch.zeros((data['pbc'].shape[0], 1), dtype=torch.bool, device=self.device)
             else:
                 data[AtomicDataDict.NODE_SOC_SWITCH_KEY].fill_(False)
                 
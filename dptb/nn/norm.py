@@ -5,6 +5,7 @@ from e3nn import o3
 from e3nn.util.jit import compile_mode
 from torch_scatter import scatter_mean
 from typing import Union
+from dptb.nn.precision import full_precision
 
 class SeperableLayerNorm(nn.Module):
     '''
@@ -92,7 +93,7 @@ class SeperableLayerNorm(nn.Module):
         return f"{self.__class__.__name__}(irreps={self.irreps}, eps={self.eps}, std_balance_degrees={self.std_balance_degrees})"
 
 
-    @torch.amp.autocast(device_type="cuda",enabled=False)
+    @full_precision
     def forward(self, x):
         '''
             Assume input is of shape [N, sphere_basis, C]
@@ -379,7 +380,7 @@ class EquivariantLayerNormArray(nn.Module):
         return f"{self.__class__.__name__}(lmax={self.lmax}, num_channels={self.num_channels}, eps={self.eps})"
 
 
-    @torch.amp.autocast(device_type="cuda",enabled=False)
+    @full_precision
     def forward(self, node_input):
         '''
             Assume input is of shape [N, sphere_basis, C]
@@ -471,7 +472,7 @@ class EquivariantLayerNormArraySphericalHarmonics(nn.Module):
         return f"{self.__class__.__name__}(lmax={self.lmax}, num_channels={self.num_channels}, eps={self.eps}, std_balance_degrees={self.std_balance_degrees})"
 
 
-    @torch.amp.autocast(device_type="cuda",enabled=False)
+    @full_precision
     def forward(self, node_input):
         '''
             Assume input is of shape [N, sphere_basis, C]
@@ -546,7 +547,7 @@ class EquivariantRMSNormArraySphericalHarmonics(nn.Module):
         return f"{self.__class__.__name__}(lmax={self.lmax}, num_channels={self.num_channels}, eps={self.eps})"
 
 
-    @torch.amp.autocast(device_type="cuda",enabled=False)
+    @full_precision
     def forward(self, node_input):
         '''
             Assume input is of shape [N, sphere_basis, C]
@@ -629,7 +630,7 @@ class EquivariantRMSNormArraySphericalHarmonicsV2(nn.Module):
         return f"{self.__class__.__name__}(lmax={self.lmax}, num_channels={self.num_channels}, eps={self.eps}, centering={self.centering}, std_balance_degrees={self.std_balance_degrees})"
 
 
-    @torch.amp.autocast(device_type="cuda",enabled=False)
+    @full_precision
     def forward(self, node_input):
         '''
             Assume input is of shape [N, sphere_basis, C]
@@ -0,0 +1,140 @@
+"""Execution modes of the model forward: mixed precision autocast and ``torch.compile``.
+
+The neural network part of a model (the embedding and the prediction MLPs) tolerates
+reduced precision, while the assembly of the Hamiltonian blocks from the predicted
+features and the eigen-solves downstream are kept at the model ``dtype``.
+"""
+
+import time
+import functools
+import contextlib
+from typing import Union, Optional, List, Dict
+import torch
+
+AUTOCAST_DTYPES = {
+    "bf16": torch.bfloat16,
+    "bfloat16": torch.bfloat16,
+    "fp16": torch.float16,
+    "float16": torch.float16,
+}
+
+
+def get_autocast_dtype(autocast: Union[str, bool, None]) -> Optional[torch.dtype]:
+    """Translate the ``autocast`` common option to the reduced precision dtype, None if disabled."""
+    if autocast in (None, False, "none"):
+        return None
+    if autocast is True:
+        return torch.bfloat16
+    if autocast not in AUTOCAST_DTYPES:
+        raise ValueError(f"The autocast dtype {autocast} is not supported, choose among {list(AUTOCAST_DTYPES.keys())} or none.")
+    return AUTOCAST_DTYPES[autocast]
+
+
+def autocast_context(device: Union[str, torch.device], dtype: Optional[torch.dtype]):
+    """Return the autocast context of ``device``, or a null context when ``dtype`` is None."""
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+
+def full_precision(forward):
+    """Run a module forward outside of autocast, upcasting half precision inputs to float32.
+
+    Used for the normalization layers, whose variance estimates lose too much accuracy in half precision.
+    """
+    @functools.wraps(forward)
+    def wrapper(self, x, *args, **kwargs):
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            if x.dtype in (torch.float16, torch.bfloat16):
+                x = x.float()
+            return forward(self, x, *args, **kwargs)
+
+    return wrapper
+
+
+def cast_fields(data: dict, fields: List[str], dtype: torch.dtype) -> dict:
+    """Cast the floating point ``fields`` of ``data`` back to ``dtype`` in place."""
+    for field in fields:
+        value = data.get(field, None)
+        if torch.is_tensor(value) and value.is_floating_point() and value.dtype != dtype:
+            data[field] = value.to(dtype)
+    return data
+
+
+def compile_options(compile: Union[bool, dict, None]) -> Optional[dict]:
+    """Translate the ``compile`` common option to the keyword arguments of ``torch.compile``, None if disabled.
+
+    The number of edges changes with every structure, so the shapes are traced symbolically
+    (``dynamic=True``) by default instead of recompiling the graph for each new edge count.
+    """
+    if not compile:
+        return None
+    options = {"dynamic": True}
+    if isinstance(compile, dict):
+        options.update(compile)
+    return options
+
+
+def benchmark_execution_modes(
+        model: torch.nn.Module,
+        data: List[dict],
+        modes: Optional[Dict[str, dict]]=None,
+        fields: Optional[List[str]]=None,
+        n_repeat: int=3,
+        ) -> Dict[str, dict]:
+    """Compare the throughput and the Hamiltonian error of the execution modes of a model on CPU.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        a model supporting the ``set_execution_mode`` method, e.g. ``NNENV`` or ``MIX``.
+    data : List[dict]
+        the AtomicDataDict of the structures to evaluate.
+    modes : Dict[str, dict], optional
+        map from the name of a mode to the keyword arguments of ``set_execution_mode``.
+        The first mode is the reference of the errors. By default fp32 and bf16 autocast.
+    fields : List[str], optional
+        the output fields on which the errors are measured, by default the edge and node features.
+    n_repeat : int
+        the number of timed passes over ``data``, after one warm up pass.
+
+    Returns
+    -------
+    Dict[str, dict]
+        per mode, the ``structures_per_second`` and the ``max_abs_err`` of each field.
+        The execution mode of the model is restored afterwards.
+    """
+    if modes is None:
+        modes = {"fp32": {}, "bf16": {"autocast": "bf16"}}
+    if fields is None:
+        fields = ["edge_features", "node_features"]
+
+    results = {}
+    reference = None
+    previous_mode = dict(model.execution_mode)
+    model.eval()
+    try:
+        for name, mode in modes.items():
+            model.set_execution_mode(**mode)
+            with torch.no_grad():
+                # the warm up pass also triggers the compilation, if any.
+                outputs = [model({k: v.clone() for k, v in d.items()}) for d in data]
+                start = time.perf_counter()
+                for _ in range(n_repeat):
+                    for d in data:
+                        model({k: v.clone() for k, v in d.items()})
+                elapsed = time.perf_counter() - start
+
+            if reference is None:
+                reference = outputs
+            results[name] = {
+                "structures_per_second": n_repeat * len(data) / elapsed,
+                "max_abs_err": {
+                    field: max((out[field] - ref[field]).abs().max().item() for out, ref in zip(outputs, reference))
+                    for field in fields
+                },
+            }
+    finally:
+        model.set_execution_mode(**previous_mode)
+
+    return results
@@ -5,7 +5,6 @@ import torch.nn as nn
 from torch.nn import Linear
 import os
 import torch.nn.functional as F
-from collections import defaultdict
 
 _Jd = torch.load(os.path.join(os.path.dirname(__file__), "Jd.pt"), weights_only=False)
 _idx_data = torch.load(os.path.join(os.path.dirname(__file__), "z_rot_indices_lmax12.pt"), weights_only=False)
@@ -142,46 +141,41 @@ class SO2_Linear(torch.nn.Module):
         for m in range(1, self.irreps_out.lmax + 1):
             self.m_linear.append(SO2_m_Linear(m, self.irreps_in, self.irreps_out))
         
-        # generate m mask
-        self.m_in_mask = torch.zeros(self.irreps_in.lmax+1, self.irreps_in.dim, dtype=torch.bool)
-        self.m_out_mask = torch.zeros(self.irreps_in.lmax+1, self.irreps_out.dim, dtype=torch.bool)
-        
+        # the m-blocked layout: the rotated input is gathered by ``m_in_perm`` into the blocks of m = 0, 1, ...,
+        # where the block m > 0 holds the -m components of all its channels, then their +m components. The block
+        # diagonal weight of `block_weight` maps it to the output blocks, scattered back by ``m_out_inv_perm``.
         if self.irreps_in.dim <= self.irreps_out.dim:
             front = True
             self.m_in_num = [0] * (self.irreps_in.lmax+1)
         else:
             front = False
             self.m_in_num = [0] * (self.irreps_out.lmax+1)
-    
-            
-        offset = 0
-        for mul, (l, p) in self.irreps_in:
-            start_id = offset + torch.LongTensor(list(range(mul))) * (2 * l + 1)
-            for m in range(l+1):
-                self.m_in_mask[m, start_id+l+m] = True
-                self.m_in_mask[m, start_id+l-m] = True
-                if front:
-                    self.m_in_num[m] += mul
-            offset += mul * (2 * l + 1)
 
-        # assert sum(self.m_in_num) == self.irreps_in.dim
-            
-        offset = 0
-        for mul, (l, p) in self.irreps_out:
-            start_id = offset + torch.LongTensor(list(range(mul))) * (2 * l + 1)
-            for m in range(l+1):
-                if m <= self.irreps_in.lmax:
-                    self.m_out_mask[m, start_id+l+m] = True
-                    self.m_out_mask[m, start_id+l-m] = True
-                    if not front:
-                        self.m_in_num[m] += mul
-            offset += mul * (2 * l + 1)
+        m_in_index = self._m_components(self.irreps_in, self.irreps_in.lmax)
+        m_out_index = self._m_components(self.irreps_out, self.irreps_out.lmax)
+        for m in range(len(self.m_in_num)):
+            self.m_in_num[m] = len(m_in_index[m][0]) if front else len(m_out_index[m][0])
 
         self.m_in_index = [0] + list(torch.cumsum(torch.tensor(self.m_in_num), dim=0))
         if radial_emb:
             self.radial_emb = RadialFunction([latent_dim]+radial_channels+[self.m_in_index[-1]])
         self.front = front
 
+        m_in_perm, m_out_perm, radial_index = [], [], []
+        for m in range(self.irreps_out.lmax + 1):
+            components = m_in_index[m] if m == 0 else m_in_index[m][::-1]
+            m_in_perm += [i for comp in components for i in comp]
+            components = m_out_index[m] if m == 0 else m_out_index[m][::-1]
+            m_out_perm += [i for comp in components for i in comp]
+            # the radial weights scale the channels of the inputs, or of the outputs, of the block m.
+            radial_index += list(range(int(self.m_in_index[m]), int(self.m_in_index[m+1]))) * len(components)
+        assert sorted(m_out_perm) == list(range(self.irreps_out.dim))
+        m_out_inv_perm = torch.empty(self.irreps_out.dim, dtype=torch.long)
+        m_out_inv_perm[torch.tensor(m_out_perm, dtype=torch.long)] = torch.arange(self.irreps_out.dim)
+        self.register_buffer("m_in_perm", torch.tensor(m_in_perm, dtype=torch.long), persistent=False)
+        self.register_buffer("m_out_inv_perm", m_out_inv_perm, persistent=False)
+        self.register_buffer("radial_index", torch.tensor(radial_index, dtype=torch.long), persistent=False)
+
         self.l_max = max(l for (_, (l, _)), _ in zip(self.irreps_in, self.irreps_in.slices()) if l > 0)
         self.dims = {l: 2*l + 1 for l in range(self.l_max + 1)}
         self.offsets = {}
@@ -189,14 +183,35 @@ class SO2_Linear(torch.nn.Module):
         for l in range(self.l_max + 1):
             self.offsets[l] = offset
             offset += self.dims[l]
-    
+
+    @staticmethod
+    def _m_components(irreps, m_max):
+        """The positions of the +m and -m components of the channels of ``irreps`` with l >= m, for m <= ``m_max``,
+        as ``[[+0 positions]], [[+1 positions], [-1 positions]], ...``."""
+        index = [[[]] if m == 0 else [[], []] for m in range(m_max + 1)]
+        offset = 0
+        for mul, (l, p) in irreps:
+            for i in range(mul):
+                start = offset + i * (2 * l + 1)
+                for m in range(min(l, m_max) + 1):
+                    index[m][0].append(start + l + m)
+                    if m > 0:
+                        index[m][1].append(start + l - m)
+            offset += mul * (2 * l + 1)
+        return index
+
+    def block_weight(self):
+        """The block diagonal weight of all the m-blocks, where the pairing of +m and -m of the block m folds the
+        two halves of the weight of ``m_linear[m-1]`` into real 2x2 blocks, [[W_r, -W_i], [W_i, W_r]]."""
+        blocks = [self.fc_m0.weight]
+        for m_linear in self.m_linear:
+            w_r, w_i = m_linear.fc.weight.chunk(2, dim=0)
+            blocks.append(torch.cat([torch.cat([w_r, -w_i], dim=1), torch.cat([w_i, w_r], dim=1)], dim=0))
+        return torch.block_diag(*blocks)
 
     def forward(self, x, R, latents=None):
         n, _ = x.shape
 
-        if self.radial_emb:
-            weights = self.radial_emb(latents)
-        
         x_ = torch.zeros_like(x)
         angle = xyz_to_angles(R[:, [1,2,0]])
 
@@ -204,9 +219,9 @@ class SO2_Linear(torch.nn.Module):
         wigner_D_all = batch_wigner_D(self.l_max, angle[0], angle[1], torch.zeros_like(angle[0]), _Jd)
 
         # 1. group irreps by l
-        groups = defaultdict(list)
+        groups = {}
         for (mul, (l, p)), slice_info in zip(self.irreps_in, self.irreps_in.slices()):
-            groups[l].append((mul, slice_info))
+            groups.setdefault(l, []).append((mul, slice_info))
             if l == 0:
                 x_[:, slice_info] = x[:, slice_info]
 
@@ -230,38 +245,17 @@ class SO2_Linear(torch.nn.Module):
             for part, slice_info, mul in zip(transformed.split(muls, dim=1), slices, muls):
                 x_[:, slice_info] = part.reshape(n, -1)
 
-        out = torch.zeros(n, self.irreps_out.dim, dtype=x.dtype, device=x.device)
-        for m in range(self.irreps_out.lmax+1):
-            radial_weight = weights[:, self.m_in_index[m]:self.m_in_index[m+1]].unsqueeze(1) if self.radial_emb else 1.
-            if m == 0:
-                if self.front and self.radial_emb:
-                    out[:, self.m_out_mask[m]] += self.fc_m0(x_[:, self.m_in_mask[m]] * radial_weight.squeeze(1))
-                elif self.radial_emb:
-                    out[:, self.m_out_mask[m]] += self.fc_m0(x_[:, self.m_in_mask[m]]) * radial_weight.squeeze(1)
-                else:
-                    out[:, self.m_out_mask[m]] += self.fc_m0(x_[:, self.m_in_mask[m]])
-            else:
-                # 1. Prepare input data. .contiguous() is for in-place ops and performance.
-                #    Shape becomes (n, 2, C_in_m / 2)
-                x_m_in = x_[:, self.m_in_mask[m]].reshape(n, -1, 2).transpose(1, 2).contiguous()
-
-                if self.front and self.radial_emb:
-                    # Apply weight before linear layer. Use in-place mul_ to save memory.
-                    x_m_in.mul_(radial_weight)
-                    linear_output = self.m_linear[m - 1](x_m_in)
-                elif self.radial_emb:
-                    # Apply weight after linear layer. Use in-place mul_ to save memory.
-                    linear_output = self.m_linear[m - 1](x_m_in)
-                    linear_output.mul_(radial_weight)
-                else:
-                    # No radial embedding, just pass through the linear layer.
-                    linear_output = self.m_linear[m - 1](x_m_in)
-
-                # 2. Reshape output and add to the result tensor.
-                #    .contiguous() is necessary before .reshape() after a .transpose().
-                final_addition = linear_output.transpose(1, 2).contiguous().reshape(n, -1)
-                out[:, self.m_out_mask[m]] += final_addition
-
+        # 3. The SO(2) linear of all the m-blocks at once: permute, one matmul, inverse permute.
+        x_m = x_.index_select(1, self.m_in_perm)
+        if self.radial_emb:
+            radial_weight = self.radial_emb(latents).index_select(1, self.radial_index)
+            if self.front:
+                x_m = x_m * radial_weight
+        weight = self.block_weight()
+        out_m = F.linear(x_m, weight, F.pad(self.fc_m0.bias, (0, weight.shape[0] - self.fc_m0.out_features)))
+        if self.radial_emb and not self.front:
+            out_m = out_m * radial_weight
+        out = out_m.index_select(1, self.m_out_inv_perm)
 
         for (mul, (l, p)), slice_in in zip(self.irreps_out, self.irreps_out.slices()):
             if l > 0:
@@ -97,8 +97,7 @@ class BaseTester(PluginUser, metaclass=ABCMeta):
 
         self.epoch()
         # run plugins of epoch events.
-        self.call_plugins(queue_name='epoch', time=i)
-        self.lr_scheduler.step()  # modify the lr at each epoch (should we add it to pluggins so we could record the lr scheduler process?)
+        self.call_plugins(queue_name='epoch', time=self.ep)
         self.ep += 1
 
 
@@ -4,7 +4,7 @@ from torch.nn.functional import mse_loss
 from dptb.utils.register import Register
 from dptb.nn.energy import Eigenvalues
 from dptb.nn.hamiltonian import E3Hamiltonian
-from typing import Any, Union, Dict
+from typing import Any, Union, Dict, Optional, Tuple
 from dptb.data import AtomicDataDict, AtomicData
 from dptb.data.transforms import OrbitalMapper
 from e3nn.o3 import Irreps
@@ -136,7 +136,65 @@ class EigLoss(nn.Module):
                 )
 
         self.overlap = overlap
-    
+
+    def window_bands(
+            self,
+            data: AtomicDataDict,
+            ref_data: AtomicDataDict,
+            band_window: Optional[Tuple[int, Optional[int]]]=None,
+            ):
+        """
+        The predicted and label eigenvalues (n_kpt, n_band) of the band window of one structure, as compared by the loss:
+        the ``diff_valence`` bands are excluded from the labels, and both are shifted to a zero minimum. The window is
+        ``band_window`` if given, else the band window of ``ref_data``.
+        """
+        if ref_data.get(AtomicDataDict.ENERGY_EIGENVALUE_KEY) is None:
+            ref_data = self.eigenvalue(ref_data)
+        band_min, band_max = band_window or ref_data.get(AtomicDataDict.BAND_WINDOW_KEY, (0, None))
+        eig_label = ref_data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0] # (n_kpt, n_band_dft/n_band)
+
+        if self.diff_valence is not None and isinstance(self.diff_valence, dict):
+            nbands_exclude = sum([self.diff_valence[self.idp.type_to_chemical_symbol[int(ii)]] for ii in ref_data['atom_types']])
+            assert nbands_exclude % self.spin_deg == 0
+            nbands_exclude = nbands_exclude // self.spin_deg
+        else:
+            nbands_exclude = 0
+
+        eig_label = eig_label[:,nbands_exclude:]
+        nbanddft = eig_label.shape[-1]
+
+        # only the predicted bands of the band window are solved, the window is cut to the orbitals below.
+        band_min = int(band_min)
+        window_max = int(band_max) if band_max is not None else nbanddft
+        data = self.eigenvalue(AtomicData.to_AtomicDataDict(data), band_window=(band_min, window_max))
+        eig_pred = data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0] # (n_kpt, n_band in the window)
+
+        norbs = data[AtomicDataDict.HAMILTONIAN_KEY].shape[-1]
+        num_kp = eig_label.shape[-2]
+
+        assert num_kp == eig_pred.shape[-2]
+        up_nband = min(norbs, nbanddft)
+
+        if band_max == None:
+            band_max = up_nband
+        else:
+            assert band_max <= up_nband
+
+        band_min = int(band_min)
+        band_max = int(band_max)
+
+        assert band_min < band_max
+        assert len(eig_pred.shape) == 2 and len(eig_label.shape) == 2
+
+        # 对齐eig_pred和eig_label
+        eig_pred_cut = eig_pred[:,:band_max-band_min]
+        eig_label_cut = eig_label[:,band_min:band_max]
+
+        eig_pred_cut = eig_pred_cut - eig_pred_cut.reshape(-1).min()
+        eig_label_cut = eig_label_cut - eig_label_cut.reshape(-1).min()
+
+        return eig_pred_cut, eig_label_cut
+
     def forward(
             self, 
             data: AtomicDataDict, 
@@ -151,54 +209,11 @@ class EigLoss(nn.Module):
         datalist = data.to_data_list()
         ref_datalist = ref_data.to_data_list()
         for data, ref_data in zip(datalist, ref_datalist):
-            data = self.eigenvalue(AtomicData.to_AtomicDataDict(data))
             ref_data = AtomicData.to_AtomicDataDict(ref_data)
-            if ref_data.get(AtomicDataDict.ENERGY_EIGENVALUE_KEY) is None:
-                ref_data = self.eigenvalue(ref_data)
-            
             emin, emax = ref_data.get(AtomicDataDict.ENERGY_WINDOWS_KEY, (None, None))
-            band_min, band_max = ref_data.get(AtomicDataDict.BAND_WINDOW_KEY, (0, None))
-            eig_pred = data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0] # (n_kpt, n_band)
-            eig_label = ref_data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0] # (n_kpt, n_band_dft/n_band)
-
-            if self.diff_valence is not None and isinstance(self.diff_valence, dict):
-                nbands_exclude = sum([self.diff_valence[self.idp.type_to_chemical_symbol[int(ii)]] for ii in ref_data['atom_types']])
-                assert nbands_exclude % self.spin_deg == 0
-                nbands_exclude = nbands_exclude // self.spin_deg
-            else:
-                nbands_exclude = 0
-            
-            eig_label = eig_label[:,nbands_exclude:]
-
-            norbs = eig_pred.shape[-1]
-            nbanddft = eig_label.shape[-1]
-            num_kp = eig_label.shape[-2]
-
-            assert num_kp == eig_pred.shape[-2]
-            up_nband = min(norbs, nbanddft)
-
-            if band_max == None:
-                band_max = up_nband
-            else:
-                assert band_max <= up_nband
-
-            band_min = int(band_min)
-            band_max = int(band_max)
-
-            assert band_min < band_max
-            assert len(eig_pred.shape) == 2 and len(eig_label.shape) == 2
-
-            # 对齐eig_pred和eig_label
-            eig_pred_cut = eig_pred[:,band_min:band_max]
-            eig_label_cut = eig_label[:,band_min:band_max]
-
-
+            eig_pred_cut, eig_label_cut = self.window_bands(data, ref_data)
             num_kp, num_bands = eig_pred_cut.shape
 
-            eig_pred_cut = eig_pred_cut - eig_pred_cut.reshape(-1).min()
-            eig_label_cut = eig_label_cut - eig_label_cut.reshape(-1).min()
-
-            
             if emax != None and emin != None:
                 mask_in = eig_label_cut.lt(emax) * eig_label_cut.gt(emin)
                 mask_out = eig_label_cut.gt(emax) + eig_label_cut.lt(emin)
@@ -1042,7 +1057,76 @@ class HamilLossAnalysis(object):
             self.stats["rmse"] = self.stats["rmse"].sqrt()
             
         return self.stats
-    
+
+    def per_structure(self, data: AtomicDataDict, ref_data: AtomicDataDict) -> Dict[str, torch.Tensor]:
+        """Compute the MAE and RMSE of each structure in a batch, split by atom/bond type and orbital pair.
+
+        Returns a dict of column name -> tensor of shape [n_structures], the columns are named like
+        ``hopping/B-N/1s-2p/mae``. The errors of the types absent in a structure are NaN.
+        """
+        batch = data.get(AtomicDataDict.BATCH_KEY, torch.zeros(data[AtomicDataDict.POSITIONS_KEY].shape[0], dtype=torch.long, device=self.device))
+        edge_batch = batch[data[AtomicDataDict.EDGE_INDEX_KEY][0]]
+        n_struct = int(batch.max()) + 1 if batch.numel() > 0 else 0
+        data, ref_data = data.copy(), ref_data.copy()
+
+        with torch.no_grad():
+            if self.onsite_shift:
+                mu_n, mu_e, norm_ss_n, norm_ss_e = shift_mu(data=data, ref_data=ref_data, idp=self.idp)
+                mu = mu_n.new_zeros(n_struct).index_add_(0, batch, mu_n).index_add_(0, edge_batch, mu_e)
+                ss = mu_n.new_zeros(n_struct).index_add_(0, batch, norm_ss_n).index_add_(0, edge_batch, norm_ss_e)
+                mu = mu / ss
+                ref_data[AtomicDataDict.NODE_FEATURES_KEY] = ref_data[AtomicDataDict.NODE_FEATURES_KEY] + mu[batch, None] * ref_data[AtomicDataDict.NODE_OVERLAP_KEY]
+                ref_data[AtomicDataDict.EDGE_FEATURES_KEY] = ref_data[AtomicDataDict.EDGE_FEATURES_KEY] + mu[edge_batch, None] * ref_data[AtomicDataDict.EDGE_OVERLAP_KEY]
+
+            if self.decompose:
+                data = self.e3h(data)
+                ref_data = self.e3h(ref_data)
+                if self.overlap:
+                    data = self.e3s(data)
+                    ref_data = self.e3s(ref_data)
+
+            blocks = [
+                ("onsite", AtomicDataDict.NODE_FEATURES_KEY, data[AtomicDataDict.ATOM_TYPE_KEY].flatten(), batch, self.idp.chemical_symbol_to_type, self.idp.mask_to_nrme),
+                ("hopping", AtomicDataDict.EDGE_FEATURES_KEY, data[AtomicDataDict.EDGE_TYPE_KEY].flatten(), edge_batch, self.idp.bond_to_type, self.idp.mask_to_erme),
+            ]
+            if self.overlap:
+                blocks.append(("overlap", AtomicDataDict.EDGE_OVERLAP_KEY, data[AtomicDataDict.EDGE_TYPE_KEY].flatten(), edge_batch, self.idp.bond_to_type, self.idp.mask_to_erme))
+
+            columns = {}
+            for name, field, types, index, type_names, mask in blocks:
+                columns.update(self._structure_errors(name, data[field] - ref_data[field], types, index, n_struct, type_names, mask))
+
+        return columns
+
+    def _structure_errors(self, name, err, types, index, n_struct, type_names, mask):
+        n_type = len(type_names)
+        orbpairs = list(self.idp.orbpair_maps.keys())
+        err = err * mask[types]
+        # the sums of each (structure, type) segment and orbital pair, [n_struct * n_type, n_orbpair]
+        segment = index * n_type + types
+        abs_sum = torch.stack([err[:, self.idp.orbpair_maps[op]].abs().sum(dim=-1) for op in orbpairs], dim=-1)
+        sq_sum = torch.stack([(err[:, self.idp.orbpair_maps[op]]**2).sum(dim=-1) for op in orbpairs], dim=-1)
+        abs_sum = abs_sum.new_zeros(n_struct * n_type, len(orbpairs)).index_add_(0, segment, abs_sum).reshape(n_struct, n_type, -1)
+        sq_sum = sq_sum.new_zeros(n_struct * n_type, len(orbpairs)).index_add_(0, segment, sq_sum).reshape(n_struct, n_type, -1)
+        n_block = err.new_zeros(n_struct * n_type).index_add_(0, segment, torch.ones_like(types, dtype=err.dtype)).reshape(n_struct, n_type)
+        # the number of elements of each orbital pair in the block of each type, [n_type, n_orbpair]
+        n_element = torch.stack([mask[:, self.idp.orbpair_maps[op]].sum(dim=-1) for op in orbpairs], dim=-1).to(err.dtype)
+
+        columns = {}
+        count = n_block[:, :, None] * n_element[None, :, :]
+        columns[f"{name}/mae"] = abs_sum.sum(dim=(1, 2)) / count.sum(dim=(1, 2))
+        columns[f"{name}/rmse"] = (sq_sum.sum(dim=(1, 2)) / count.sum(dim=(1, 2))).sqrt()
+        for tn, tp in type_names.items():
+            columns[f"{name}/{tn}/mae"] = abs_sum[:, tp].sum(dim=-1) / count[:, tp].sum(dim=-1)
+            columns[f"{name}/{tn}/rmse"] = (sq_sum[:, tp].sum(dim=-1) / count[:, tp].sum(dim=-1)).sqrt()
+            for i, op in enumerate(orbpairs):
+                if n_element[tp, i] == 0:
+                    continue
+                columns[f"{name}/{tn}/{op}/mae"] = abs_sum[:, tp, i] / count[:, tp, i]
+                columns[f"{name}/{tn}/{op}/rmse"] = (sq_sum[:, tp, i] / count[:, tp, i]).sqrt()
+
+        return columns
+
     def report(self):
         assert hasattr(self, "stats"), "The stats is not computed yet."
 
@@ -1,16 +1,66 @@
+import os
+import csv
 import torch
 import logging
 from dptb.utils.tools import get_lr_scheduler, \
 get_optimizer, j_must_have
 from dptb.nnops.base_tester import BaseTester
-from typing import Union, Optional
-from dptb.data import AtomicDataset, DataLoader, AtomicData
+from typing import Union, Optional, List, Dict
+from dptb.data import AtomicDataset, DataLoader, AtomicData, AtomicDataDict
+from dptb.utils.torch_geometric import Batch
 from dptb.nn import build_model
-from dptb.nnops.loss import Loss
+from dptb.nnops.loss import Loss, EigLoss, HamilLossAnalysis
+from dptb.utils.profiling import profile_iter
 
 log = logging.getLogger(__name__)
 #TODO: complete the log output for initilizing the trainer
 
+class StructureReport(object):
+    """A csv file with one row of errors per structure, written batch by batch.
+
+    The first column ``idx`` is the index of the structure in the dataset. When ``resume`` is True and the
+    file exists, the rows already written are kept, and ``finished`` gives the structures to skip. Only the
+    columns are checked, so a report must only be resumed with the same model and dataset.
+    """
+
+    def __init__(self, path: str, resume: bool=False):
+        self.path = path
+        self.header = None
+        self.finished = set()
+
+        if resume and os.path.exists(path):
+            with open(path, "r+", newline="") as f:
+                text = f.read()
+                # drop the last row if it was cut off by an interruption.
+                if text and not text.endswith("\n"):
+                    f.seek(0)
+                    f.truncate(text.rfind("\n") + 1)
+                    text = text[:text.rfind("\n") + 1]
+            rows = list(csv.reader(text.splitlines()))
+            if len(rows) > 0:
+                self.header = rows[0]
+                self.finished = set(int(row[0]) for row in rows[1:])
+            log.info(f"Resume the structure report {path} with {len(self.finished)} structures.")
+        else:
+            open(path, "w").close()
+
+    def write(self, indices: List[int], columns: Dict[str, torch.Tensor]):
+        header = ["idx"] + list(columns.keys())
+        if self.header is None:
+            self.header = header
+            rows = [header]
+        elif self.header != header:
+            raise ValueError(f"The columns of {self.path} do not match the current test, remove the file or set resume to False.")
+        else:
+            rows = []
+
+        values = torch.stack([v.detach().double().cpu() for v in columns.values()], dim=-1).tolist() if columns else [[]] * len(indices)
+        rows += [[idx] + row for idx, row in zip(indices, values)]
+        with open(self.path, "a", newline="") as f:
+            csv.writer(f).writerows(rows)
+        self.finished.update(indices)
+
+
 class Tester(BaseTester):
 
     def __init__(
@@ -19,28 +69,44 @@ class Tester(BaseTester):
             common_options: dict,
             model: torch.nn.Module,
             test_datasets: AtomicDataset,
+            report_path: Optional[str]=None,
             ) -> None:
         super(Tester, self).__init__(dtype=common_options["dtype"], device=common_options["device"])
-        
+
         # init the object
         self.model = model.to(self.device)
         self.common_options = common_options
         self.test_options = test_options
-        
-        self.test_datasets = test_datasets
 
-        self.test_loader = DataLoader(dataset=self.train_datasets, batch_size=test_options["batch_size"], shuffle=False)
+        self.test_datasets = test_datasets
 
         # loss function
         self.test_lossfunc = Loss(**test_options["loss_options"]["test"], **common_options, idp=self.model.hamiltonian.idp)
-    
-    def iteration(self, batch):
+
+        # the per-structure errors of the blocks and eigenvalues
+        self.report = None
+        if report_path is not None:
+            self.report = StructureReport(report_path, resume=test_options.get("resume", False))
+            self.analysis = HamilLossAnalysis(
+                idp=self.model.hamiltonian.idp,
+                overlap=common_options["overlap"],
+                onsite_shift=test_options["loss_options"]["test"].get("onsite_shift", False),
+                dtype=self.dtype,
+                device=self.device,
+                )
+            # the eigenvalues are compared in the band window of the eigenvalue loss, with its diff_valence.
+            if isinstance(self.test_lossfunc, EigLoss):
+                self.eig_loss = self.test_lossfunc
+            else:
+                self.eig_loss = EigLoss(**test_options["loss_options"]["test"], **common_options, idp=self.model.hamiltonian.idp)
+
+    def iteration(self, batch, indices: Optional[List[int]]=None):
         '''
         conduct one step forward computation, used in train, test and validation.
         '''
         self.model.eval()
         batch = batch.to(self.device)
-        
+
         # record the batch_info to help reconstructing sub-graph from the batch
         batch_info = {
             "__slices__": batch.__slices__,
@@ -56,22 +122,65 @@ class Tester(BaseTester):
         #TODO: the rescale/normalization can be added here
         batch = self.model(batch)
 
-        #TODO: this could make the loss function unjitable since t he batchinfo in batch and batch_for_loss does not necessarily 
+        if self.report is not None and indices is not None:
+            self.report.write(indices, self.structure_errors(batch, batch_for_loss, batch_info))
+
+        #TODO: this could make the loss function unjitable since t he batchinfo in batch and batch_for_loss does not necessarily
         #       match the torch.Tensor requiresment, should be improved further
 
         batch.update(batch_info)
         batch_for_loss.update(batch_info)
 
-        loss = self.train_lossfunc(batch, batch_for_loss)
+        loss = self.test_lossfunc(batch, batch_for_loss)
 
         state = {'field':'iteration', "test_loss": loss.detach()}
         self.call_plugins(queue_name='iteration', time=self.iter, **state)
         self.iter += 1
 
         return loss.detach()
-    
+
+    def structure_errors(self, data: AtomicDataDict, ref_data: AtomicDataDict, batch_info: dict) -> Dict[str, torch.Tensor]:
+        '''
+        the errors of each structure in the batch, the Hamiltonian (overlap) blocks are compared when the labels
+        are loaded, and the eigenvalues in the band window are compared as by `EigLoss.window_bands` when the
+        eigenvalues are loaded.
+        '''
+        columns = {}
+        # the datasets without Hamiltonian labels carry placeholder features of width 1.
+        if ref_data.get(AtomicDataDict.EDGE_FEATURES_KEY) is not None and \
+            ref_data[AtomicDataDict.EDGE_FEATURES_KEY].shape[-1] == self.analysis.idp.reduced_matrix_element:
+            columns.update(self.analysis.per_structure(data, ref_data))
+
+        if ref_data.get(AtomicDataDict.ENERGY_EIGENVALUE_KEY) is not None:
+            data_list = Batch.from_dict({**data, **batch_info}).to_data_list()
+            ref_list = Batch.from_dict({**ref_data, **batch_info}).to_data_list()
+            errors = []
+            for pred, ref in zip(data_list, ref_list):
+                eig_pred, eig_label = self.eig_loss.window_bands(
+                    pred, AtomicData.to_AtomicDataDict(ref), band_window=self.test_options.get("band_window"))
+                err = eig_pred - eig_label
+                errors.append(torch.stack([err.abs().mean(), (err**2).mean().sqrt(), err.abs().max()]))
+            errors = torch.stack(errors)
+            columns.update({"eig/mae": errors[:, 0], "eig/rmse": errors[:, 1], "eig/max": errors[:, 2]})
+
+        return columns
+
     def epoch(self) -> None:
 
-        for ibatch in self.test_loader:
-            # iter with different structure
-            self.iteration(ibatch)
\ No newline at end of file
+        indices = list(range(len(self.test_datasets)))
+        if self.report is not None:
+            indices = [i for i in indices if i not in self.report.finished]
+            log.info(f"{len(indices)} of {len(self.test_datasets)} structures to test.")
+
+        batch_size = self.test_options["batch_size"]
+        test_loader = DataLoader(
+            dataset=self.test_datasets,
+            batch_size=batch_size,
+            sampler=indices,
+            num_workers=self.test_options.get("num_workers", 0),
+            )
+
+        with torch.inference_mode():
+            for i, ibatch in enumerate(profile_iter(test_loader)):
+                # iter with different structure
+                self.iteration(ibatch, indices[i*batch_size:(i+1)*batch_size])
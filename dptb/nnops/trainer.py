@@ -7,6 +7,7 @@ from typing import Union, Optional
 from dptb.data import AtomicDataset, DataLoader, AtomicData
 from dptb.nn import build_model
 from dptb.nnops.loss import Loss
+from dptb.utils.profiling import profile_stage, profile_iter
 
 log = logging.getLogger(__name__)
 #TODO: complete the log output for initilizing the trainer
@@ -133,9 +134,11 @@ class Trainer(BaseTrainer):
             loss += self.train_lossfunc(ref_batch, ref_batch_for_loss)
 
         self.optimizer.zero_grad(set_to_none=True)
-        loss.backward()
+        with profile_stage("backward"):
+            loss.backward()
         #TODO: add clip large gradient
-        self.optimizer.step()
+        with profile_stage("optimizer"):
+            self.optimizer.step()
         if self.update_lr_per_iter:
             # set self.iter > 0 to ensure a valid
             if isinstance(self.lr_scheduler, torch.optim.lr_scheduler.ReduceLROnPlateau):
@@ -200,10 +203,12 @@ class Trainer(BaseTrainer):
 
     def epoch(self) -> None:
 
-        for ibatch in self.train_loader:
+        for ibatch in profile_iter(self.train_loader):
             # iter with different structure
             if self.use_reference:
-                self.iteration(ibatch, next(iter(self.reference_loader)))
+                with profile_stage("data_loading"):
+                    ref_batch = next(iter(self.reference_loader))
+                self.iteration(ibatch, ref_batch)
             else:
                 self.iteration(ibatch)
 
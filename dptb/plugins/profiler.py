@@ -0,0 +1,206 @@
+import os
+import logging
+import collections
+from time import perf_counter
+from typing import Optional, List
+
+import torch
+from dptb.plugins.base_plugin import Plugin
+from dptb.plugins.monitor import TensorBoardMonitor
+from dptb.nn.hr2hk import HR2HK
+from dptb.nn.energy import Eigenvalues, Eigh
+from dptb.utils.profiling import StageTimer, profile_stage, peak_memory
+
+log = logging.getLogger(__name__)
+
+# the stage of the submodules of the models, by their attribute name.
+_MODULE_STAGES = {
+    "embedding": "embedding",
+    "node_prediction_h": "prediction",
+    "edge_prediction_h": "prediction",
+    "edge_prediction_s": "prediction",
+    "edge_prediction_h2": "prediction",
+    "hamiltonian": "hamiltonian",
+    "overlap": "hamiltonian",
+    "h2miltonian": "hamiltonian",
+}
+
+# the stage of the modules, by their type.
+_TYPE_STAGES = [
+    (HR2HK, "hr2hk"),
+    (Eigenvalues, "eigensolver"),
+    (Eigh, "eigensolver"),
+]
+
+
+class Profiler(Plugin):
+    """Time the stages of each training or testing step.
+
+    The data loading, the neighbor lists, the embedding, the prediction, the Hamiltonian assembly, HR2HK, the
+    eigensolver, the loss, the backward pass and the optimizer step are timed exclusive of each other, and the
+    rest of the step is reported as ``other``. Every ``log_freq`` iterations, the mean milliseconds per step of
+    each stage and the peak memory are logged, written to the ``profile`` stats of the trainer, and to
+    tensorboard if a `TensorBoardMonitor` is registered before this plugin.
+
+    Args:
+        log_freq: the number of iterations between two reports.
+        trace_steps: the first and the last iteration of the Chrome trace, no trace is recorded if None.
+        trace_path: the path of the Chrome trace.
+        synchronize: synchronize the cuda device around every stage, for accurate times of the cuda kernels.
+    """
+
+    stat_name = "profile"
+
+    def __init__(
+            self,
+            log_freq: int=10,
+            trace_steps: Optional[List[int]]=None,
+            trace_path: str="./profile_trace.json",
+            synchronize: bool=True,
+            ):
+        super(Profiler, self).__init__([(1, 'iteration'), (1, 'epoch')])
+        self.log_freq = log_freq
+        if trace_steps is not None:
+            assert len(trace_steps) == 2 and trace_steps[0] <= trace_steps[1], \
+                "The trace_steps should be the [first, last] iterations of the trace."
+        self.trace_steps = trace_steps
+        self.trace_path = trace_path
+        self.timer = StageTimer(synchronize=synchronize)
+        self.writer = None
+        self._trace = None
+        self._handles = []
+        self._open = []
+
+    def register(self, trainer):
+        self.trainer = trainer
+        for queue in trainer.plugin_queues.values():
+            for _, _, plugin in queue:
+                if isinstance(plugin, TensorBoardMonitor):
+                    self.writer = plugin.writer
+
+        modules = [("", trainer.model)]
+        modules += [(name, module) for name, module in vars(trainer).items() \
+                    if name.endswith("lossfunc") and isinstance(module, torch.nn.Module)]
+        for root, module in modules:
+            for name, submodule in module.named_modules():
+                self._hook(submodule, self._stage(root, name, submodule))
+
+        self.timer.activate()
+        self.window = collections.defaultdict(float)
+        self.epoch_totals = collections.defaultdict(float)
+        self.window_steps, self.epoch_steps = 0, 0
+        if self.trace_steps is not None and self.trace_steps[0] <= trainer.iter <= self.trace_steps[1]:
+            self._start_trace()
+        self._reset_memory()
+        self.last_time = perf_counter()
+
+    @staticmethod
+    def _stage(root: str, name: str, module: torch.nn.Module) -> Optional[str]:
+        for cls, stage in _TYPE_STAGES:
+            if isinstance(module, cls):
+                return stage
+        if name == "":
+            return "loss" if root.endswith("lossfunc") else "model"
+        return _MODULE_STAGES.get(name.split(".")[-1], None)
+
+    def _hook(self, module: torch.nn.Module, stage: Optional[str]):
+        if stage is None:
+            return
+
+        def pre_hook(module, args):
+            cm = profile_stage(stage)
+            cm.__enter__()
+            self._open.append(cm)
+
+        def hook(module, args, output):
+            if len(self._open) > 0:
+                self._open.pop().__exit__(None, None, None)
+
+        self._handles.append(module.register_forward_pre_hook(pre_hook))
+        self._handles.append(module.register_forward_hook(hook))
+
+    def remove(self):
+        """Remove the hooks from the modules and stop the timing."""
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self.timer.deactivate()
+        if self._trace is not None:
+            self._stop_trace()
+
+    def _device(self) -> torch.device:
+        return torch.device(self.trainer.device)
+
+    def _reset_memory(self):
+        if self._device().type == "cuda":
+            torch.cuda.reset_peak_memory_stats(self._device())
+
+    def _start_trace(self):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self._device().type == "cuda":
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._trace = torch.profiler.profile(activities=activities)
+        self._trace.start()
+
+    def _stop_trace(self):
+        self._trace.stop()
+        if os.path.dirname(self.trace_path):
+            os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+        self._trace.export_chrome_trace(self.trace_path)
+        log.info(f"The Chrome trace of the iterations {self.trace_steps[0]} to {self.trace_steps[1]} is written to {self.trace_path}.")
+        self._trace = None
+
+    def iteration(self, time: int, **kwargs):
+        now = perf_counter()
+        step = now - self.last_time
+        stages = self.timer.reset()
+        stages["other"] = max(step - sum(stages.values()), 0.0)
+        stages["step"] = step
+        for name, value in stages.items():
+            self.window[name] += value
+            self.epoch_totals[name] += value
+        self.window_steps += 1
+        self.epoch_steps += 1
+
+        if self.trace_steps is not None:
+            if self._trace is not None and time >= self.trace_steps[1]:
+                self._stop_trace()
+            elif self._trace is None and time + 1 == self.trace_steps[0]:
+                self._start_trace()
+
+        if self.window_steps >= self.log_freq:
+            stats = self.trainer.stats.setdefault(self.stat_name, {})
+            stats["last"] = {name: 1e3 * value / self.window_steps for name, value in self.window.items()}
+            stats["peak_memory"] = peak_memory(self._device())
+            log.info(f"iteration:{time}\tprofile: {self._format(stats['last'], stats['peak_memory'])}")
+            if self.writer is not None:
+                for name, value in stats["last"].items():
+                    self.writer.add_scalar(f"profile/{name}", value, time)
+                if stats["peak_memory"] is not None:
+                    self.writer.add_scalar("profile/peak_memory", stats["peak_memory"], time)
+            self.window.clear()
+            self.window_steps = 0
+            self._reset_memory()
+
+        # the logging of the profile is not counted in the next step.
+        self.last_time = perf_counter()
+
+    def epoch(self, **kwargs):
+        if self.epoch_steps == 0:
+            return
+        stats = self.trainer.stats.setdefault(self.stat_name, {})
+        stats["epoch_mean"] = {name: 1e3 * value / self.epoch_steps for name, value in self.epoch_totals.items()}
+        log.info(f"Epoch {self.trainer.ep} profile: {self._format(stats['epoch_mean'], peak_memory(self._device()))}")
+        self.epoch_totals.clear()
+        self.epoch_steps = 0
+
+    @staticmethod
+    def _format(stages: dict, memory: Optional[float]) -> str:
+        step = stages["step"]
+        fields = [f"step {step:.2f} ms"]
+        for name, value in sorted(stages.items(), key=lambda item: -item[1]):
+            if name != "step" and value > 0:
+                fields.append(f"{name} {value:.2f} ms ({100 * value / max(step, 1e-12):.1f}%)")
+        if memory is not None:
+            fields.append(f"peak memory {memory:.1f} MB")
+        return " | ".join(fields)
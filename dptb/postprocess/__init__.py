@@ -1,11 +1,7 @@
-from .bandstructure import Band
-from .totbplas import TBPLaS
-from .write_block import write_block
+from dptb.utils.lazy_import import lazy_attach
 
-
-__all__ = [
-    Band,
-    TBPLaS,
-    write_block,
-
-]
\ No newline at end of file
+__getattr__, __dir__, __all__ = lazy_attach(__name__, {
+    "Band": ".bandstructure",
+    "TBPLaS": ".totbplas",
+    "write_block": ".write_block",
+})
@@ -22,17 +22,12 @@ class Band(ElecStruCal):
         self.results_path = results_path
         self.use_gui = use_gui
             
-    def get_bands(self, data: Union[AtomicData, ase.Atoms, str], kpath_kwargs: dict, pbc:Union[bool,list]=None, AtomicData_options:dict=None):
+    @staticmethod
+    def get_kpath(structase: ase.Atoms, kpath_kwargs: dict):
+        """The k-points of the band path of ``structase``, with their coordinates along the path, the high symmetry
+        k-points and their labels."""
         kline_type = kpath_kwargs['kline_type']
 
-        # get  the ase structure
-        if isinstance(data, str):
-            structase = read(data)
-        elif isinstance(data, ase.Atoms):
-            structase = data
-        elif isinstance(data, AtomicData):
-            structase = data.to("cpu").to_ase()
-        
         if kline_type == 'ase':
             kpath = kpath_kwargs['kpath']
             nkpoints = kpath_kwargs['nkpoints']
@@ -59,6 +54,18 @@ class Band(ElecStruCal):
             log.error('Error, now, kline_type only support ase_kpath, abacus, or vasp.')
             raise ValueError
 
+        return klist, xlist, high_sym_kpoints, labels
+
+    def get_bands(self, data: Union[AtomicData, ase.Atoms, str], kpath_kwargs: dict, pbc:Union[bool,list]=None, AtomicData_options:dict=None):
+        # get  the ase structure
+        if isinstance(data, str):
+            structase = read(data)
+        elif isinstance(data, ase.Atoms):
+            structase = data
+        elif isinstance(data, AtomicData):
+            structase = data.to("cpu").to_ase()
+        
+        klist, xlist, high_sym_kpoints, labels = self.get_kpath(structase, kpath_kwargs)
 
         override_overlap = kpath_kwargs.get("override_overlap", None)       
 
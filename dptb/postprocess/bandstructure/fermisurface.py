@@ -4,13 +4,120 @@ from dptb.utils.make_kpoints import monkhorst_pack,  gamma_center, kmesh_samplin
 from dptb.utils.make_kpoints import rot_revlatt_2D, kmesh_fs
 from ase.io import read
 import ase
-from scipy.interpolate import  interp2d, interpn
 from dptb.utils.tools import LorentzSmearing, GaussianSmearing
 import matplotlib.pyplot as plt
 import logging
 log = logging.getLogger(__name__)
 
 
+def select_bands(eigenvalues, emin, emax):
+    """ The range [ist, ied) of the bands which cross the energy window [emin, emax] on the k-points.
+
+    Parameters
+    ----------
+    eigenvalues: array
+        The eigenvalues on the k-points of a coarse mesh, shape = (nk, nbands)
+    emin, emax: float
+        The bounds of the energy window.
+
+    Returns
+    -------
+    ist, ied: int
+        The first band and one past the last band which cross the window, empty when none does.
+    """
+    crossing = (eigenvalues.max(axis=0) >= emin) & (eigenvalues.min(axis=0) <= emax)
+    ibands = np.nonzero(crossing)[0]
+    if len(ibands) == 0:
+        log.warning(f'No band crosses the energy window [{emin}, {emax}].')
+        return 0, 0
+    return int(ibands[0]), int(ibands[-1]) + 1
+
+
+def interpolate_bands(grid_axes, eigenvalues, grid_axes_intp):
+    """ Linear interpolation of all the bands from a regular grid to a finer one.
+
+    The interpolation is separable: along each axis, the values are contracted with the matrix of the linear weights
+    of the fine points on the coarse ones. This equals interpn on every point of the fine grid, at the cost of a few
+    tensor products.
+
+    Parameters
+    ----------
+    grid_axes: tuple
+        The coordinates of the coarse grid along each axis.
+    eigenvalues: array
+        The bands on the coarse grid, shape = (*[len(x) for x in grid_axes], nbands)
+    grid_axes_intp: tuple
+        The coordinates of the fine grid along each axis, within the coarse ones.
+
+    Returns
+    -------
+    array
+        The bands on the fine grid, shape = (*[len(x) for x in grid_axes_intp], nbands)
+    """
+    values = np.asarray(eigenvalues, dtype=float)
+    for axis, (x, x_intp) in enumerate(zip(grid_axes, grid_axes_intp)):
+        weights = np.stack([np.interp(x_intp, x, row) for row in np.eye(len(x))], axis=1)
+        values = np.moveaxis(np.tensordot(weights, values, axes=([1], [axis])), 0, axis)
+    return values
+
+
+def write_bxsf(filename, eigenvalues, mesh_grid, rev_latt, fermi_energy=0.0, case=''):
+    """ Write the bands on a general grid to a bxsf file for xcrysden. not support spin-polarized case.
+
+    The file is written as bytes with unix line endings, each band formatted in one operation.
+
+    Parameters
+    ----------
+    filename: str
+        The path of the bxsf file.
+    eigenvalues: array
+        The eigenvalues of the system, shape = (nkx*nky*nkz, nbands), the k-points in row-major order.
+    mesh_grid: list
+        The mesh grid of kpoints, [nkx, nky, nkz]
+    rev_latt: array
+        The reciprocal lattice vectors as rows.
+    fermi_energy: float
+        The energy of the isosurface.
+    case: str
+        The name of the system in the header.
+    """
+    nkx, nky, nkz = mesh_grid
+    eigenvalues = np.asarray(eigenvalues, dtype=float).reshape(nkx * nky * nkz, -1)
+
+    # 1: Write headers blocks.
+    header = ['BEGIN_INFO',
+              '   #',
+              '   # Case:  {0}'.format(case),
+              '   #',
+              '   # Launch as: xcrysden --bxsf FS.bxsf',
+              '   #',
+              '   Fermi Energy: {0}'.format(fermi_energy),
+              ' END_INFO',
+              '',
+              ' BEGIN_BLOCK_BANDGRID_3D',
+              ' band_energies',
+              '   BEGIN_BANDGRID_3D',
+              '    {:d}'.format(eigenvalues.shape[1]),
+              '    {:5d}{:5d}{:5d}'.format(nkx, nky, nkz),
+              '    {:16.8f}{:16.8f}{:16.8f}'.format(0.0, 0.0, 0.0)]
+    header += ['    ' + ''.join(['%16.8f' % xx for xx in row]) for row in np.asarray(rev_latt)]
+
+    # 2: Write band grid for each band, in row-major order: one line of nkz values for each (x, y), the nky lines of
+    # each x separated by an empty line.
+    line_format = '       ' + '  '.join(['%.8f'] * nkz) + '\n'
+    band_format = (line_format * nky + '\n') * nkx
+
+    with open(filename, 'wb') as out_file:
+        out_file.write(('\n'.join(header) + '\n').encode('ascii'))
+        for j in range(eigenvalues.shape[1]): # j is index of band
+            out_file.write('   BAND:  {0}\n'.format(j + 1).encode('ascii'))
+            out_file.write((band_format % tuple(eigenvalues[:, j].tolist())).encode('ascii'))
+
+        # 3: Write ending blocks.
+        out_file.write(b'   END_BANDGRID_3D\n')
+        out_file.write(b' END_BLOCK_BANDGRID_3D')
+
+
 class fs3dcalc(object):
     def __init__ (self, apiHrk, run_opt, jdata):
         self.apiH = apiHrk
@@ -44,21 +151,15 @@ class fs3dcalc(object):
         # E0 = self.E_fermi + E0
         self.E0 = E0
 
-        ist = np.sum(np.sum(self.eigenvalues - (self.E_fermi + E0 - 10*sigma) < 0, axis=0) / self.eigenvalues.shape[0]  >=1) -1
-        ied = np.sum(np.sum(self.eigenvalues - (self.E_fermi + E0 + 10*sigma) > 0, axis=0) /  self.eigenvalues.shape[0] < 1) + 1
-        if ist <0:
-            ist = 0
-        
-        eig_pick = self.eigenvalues[:,ist:ied]
-        eig_pick = np.reshape(eig_pick,(N1,N2,N3,ied-ist))
+        # only the bands crossing the window around the isosurface on the coarse mesh are interpolated.
+        E_iso = self.E_fermi + E0
+        ist, ied = select_bands(self.eigenvalues, E_iso - 10*sigma, E_iso + 10*sigma)
 
-        eig_pick_intp = np.zeros((Np1*Np2*Np3, ied-ist))
+        eig_pick = np.reshape(self.eigenvalues[:,ist:ied],(N1,N2,N3,ied-ist))
 
-        _, kpoints_intp = kmesh_fs(meshgrid=mesh_grid_intp)
-
-        for i in range(ied-ist):
-        # interpolate eigenvalues to a finer mesh, 3D interpolation scipy.interpolate.interpn is used.
-            eig_pick_intp[:,i] = interpn(line_xyz, eig_pick[:,:,:,i],kpoints_intp)
+        line_xyz_intp, _ = kmesh_fs(meshgrid=mesh_grid_intp)
+        # interpolate eigenvalues to a finer mesh, all the bands at once.
+        eig_pick_intp = interpolate_bands(line_xyz, eig_pick, line_xyz_intp).reshape(Np1*Np2*Np3, ied-ist)
 
         eig_pick_intp = eig_pick_intp - self.E_fermi
         self.eigenvalues_intp = eig_pick_intp
@@ -96,9 +197,7 @@ class fs3dcalc(object):
         None
 
         """
-        nkx,nky,nkz = mesh_grid
-        num_total_bands= eigenvalues.shape[1] 
-        rev_latt = np.array(np.mat(self.structase.cell).I.T)
+        rev_latt = np.linalg.inv(np.asarray(self.structase.cell)).T
 
         if filename is None:
             outfile_name = f'{self.results_path}/{self.filename}'
@@ -106,55 +205,8 @@ class fs3dcalc(object):
         else:
             outfile_name = filename
 
-        # 1: Write headers blocks.
-        
-        out_file=open(outfile_name,'w')
-        out_file.write('BEGIN_INFO\n')
-        out_file.write('   #\n')
-        out_file.write('   # Case:  {0}\n'.format(self.structase.symbols))
-        out_file.write('   #\n')
-        out_file.write('   # Launch as: xcrysden --bxsf FS.bxsf\n')
-        out_file.write('   #\n')
-        out_file.write('   Fermi Energy: {0}\n'.format(self.E0))  # Fermi  energy is set to 0,  surface of constant energy E0, when E0 =0 , it it fermi surface.  
-        out_file.write(' END_INFO\n')
-        out_file.write('\n')
-        out_file.write(' BEGIN_BLOCK_BANDGRID_3D\n')
-        out_file.write(' band_energies\n')
-        out_file.write('   BEGIN_BANDGRID_3D\n')
-        out_file.write("    {:d}\n".format(num_total_bands))
-        out_file.write("    {:5d}{:5d}{:5d}\n".format(nkx,nky,nkz))
-        out_file.write("    {:16.8f}{:16.8f}{:16.8f}\n".format(0.0, 0.0, 0.0))
-        out_file.write('\n'.join(["    " + ''.join(["%16.8f" % xx for xx in row]) for row in rev_latt]))
-
-        # 2: Write band grid for each band 
-        # row-major ie C-syntax: 
-        # C-syntax:
-        #   for (i=0; i<nx; i++)
-        #     for (j=0; j<ny; j++)
-        #       for (k=0; k<nz; k++)
-        #         printf("%f",eigenvalues[i][j][k])
-  
-        for j in range(eigenvalues.shape[1]): # j is index of band
-            out_file.write('   BAND:  {0}\n'.format(j+1)) 
-            # reshape band j in shape from (nkx*nky*nkz,) to  (nkx*nky, nkz).
-            one_band=np.reshape(eigenvalues[:,j], (nkx*nky,nkz))
-            # block_counter is index of y-z block.
-            block_counter=0
-            # there are 'nkx' number of blocks within one BAND
-            for i in range(nkx):
-                # there are 'nky' number of lines within one block
-                for k in range(nky):
-                    # there are 'nkz' number of columns within one line
-                    # block_counter*nky+k row will be line to be printed
-                    out_file.write('       '+'  '.join(map(str,one_band[block_counter*nky+k,:]))+'\n')
-                # each blocks are separated by empty line
-                out_file.write('\n')
-                block_counter+=1
-
-        # 3: Write ending blocks.  
-        out_file.write('   END_BANDGRID_3D\n')
-        out_file.write(' END_BLOCK_BANDGRID_3D')
-        out_file.close()
+        # Fermi  energy is set to 0,  surface of constant energy E0, when E0 =0 , it it fermi surface.
+        write_bxsf(outfile_name, eigenvalues, mesh_grid, rev_latt, fermi_energy=self.E0, case=self.structase.symbols)
 
     def get_eigenvalues(self, kpoints):
         all_bonds, hamil_blocks, overlap_blocks = self.apiH.get_HR()
@@ -214,20 +266,14 @@ class fs2dcalc (object):
         self.eigenvalues, self.E_fermi = self.get_eigenvalues(kpoints=self.kpoints)
         E0 = self.E_fermi + E0
 
-        ist = np.sum(np.sum(self.eigenvalues - (E0 - 10*sigma) < 0, axis=0) / self.eigenvalues.shape[0]  >=1) -1
-        ied = np.sum(np.sum(self.eigenvalues - (E0 + 10*sigma) > 0, axis=0) /  self.eigenvalues.shape[0] < 1) + 1
-        if ist <0:
-            ist = 0
-        
+        ist, ied = select_bands(self.eigenvalues, E0 - 10*sigma, E0 + 10*sigma)
+
         eig_pick = self.eigenvalues[:,ist:ied]
         eig_pick = np.reshape(eig_pick,(N1,N2,ied-ist))
 
         k1intp= np.linspace(0,1,N1 * intpfactor)
         k2intp = np.linspace(0,1,N2 * intpfactor)
-        eig_pick_intp = np.zeros(shape=(N1*intpfactor, N2*intpfactor,ied-ist))
-        for i in range(eig_pick.shape[2]):
-            f =interp2d(k1,k2,eig_pick[:,:,i])
-            eig_pick_intp[:,:,i] = f(k1intp,k2intp)
+        eig_pick_intp = interpolate_bands((k1, k2), eig_pick, (k1intp, k2intp))
 
         specfunc_ek = LorentzSmearing(eig_pick_intp, E0, sigma=sigma)
         self.specfunc_k = np.sum(specfunc_ek,axis=2)
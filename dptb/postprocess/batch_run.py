@@ -0,0 +1,283 @@
+import os
+import glob
+import h5py
+import numpy as np
+import torch
+import ase
+import ase.db
+import ase.io
+import logging
+from typing import Union, Optional, List, Tuple
+from dptb.data import AtomicData, AtomicDataDict, feature_to_block
+from dptb.data.AtomicData import _NODE_FIELDS, _EDGE_FIELDS, _ENV_FIELDS, _ONSITENV_FIELDS
+from dptb.data.dataset._hdf5_dataset import pack_blocks
+from dptb.utils.torch_geometric import Batch
+from dptb.postprocess.elec_struc_cal import ElecStruCal
+from dptb.postprocess.bandstructure.band import Band
+from dptb.postprocess.common import get_atomic_options
+
+log = logging.getLogger(__name__)
+
+# the tasks of `dptb run` that can run on many structures.
+BATCH_TASKS = ["band", "write_block"]
+
+# the formats that may hold several frames in one file.
+_MULTIFRAME_SUFFIXES = [".extxyz", ".xyz", ".traj"]
+
+# the key giving the size of each kind of field of a graph.
+_FIELD_SIZES = [
+    (AtomicDataDict.POSITIONS_KEY, _NODE_FIELDS),
+    (AtomicDataDict.EDGE_INDEX_KEY, _EDGE_FIELDS),
+    (AtomicDataDict.ENV_INDEX_KEY, _ENV_FIELDS),
+    (AtomicDataDict.ONSITENV_INDEX_KEY, _ONSITENV_FIELDS),
+]
+
+
+def _count_frames(path: str) -> int:
+    if os.path.splitext(path)[1] not in _MULTIFRAME_SUFFIXES:
+        return 1
+    if path.endswith(".traj"):
+        with ase.io.Trajectory(path, "r") as traj:
+            return len(traj)
+    return sum(1 for _ in ase.io.iread(path, index=":"))
+
+
+def collect_structures(structure: str) -> List[Tuple[str, str, Optional[int]]]:
+    """The ``(name, path, index)`` of each structure of ``structure``: a directory, a glob pattern, an ASE
+    database (``.db``), or a file of one or several frames. ``index`` is the frame of the file, or the row id
+    of the database.
+    """
+    if os.path.isdir(structure):
+        paths = sorted(os.path.join(root, f) for root, _, files in os.walk(structure) for f in files if not f.startswith("."))
+        root = structure
+    elif glob.has_magic(structure):
+        paths = sorted(glob.glob(structure))
+        root = None
+    else:
+        paths = [structure]
+        root = None
+
+    entries = []
+    for path in paths:
+        name = os.path.relpath(path, root) if root is not None else path
+        if path.endswith(".db"):
+            with ase.db.connect(path) as db:
+                entries += [(f"{name}@{row.id}", path, row.id) for row in db.select()]
+            continue
+        nframes = _count_frames(path)
+        if nframes == 1:
+            entries.append((name, path, None))
+        else:
+            entries += [(f"{name}@{i}", path, i) for i in range(nframes)]
+
+    return entries
+
+
+def is_batch_input(structure: str) -> bool:
+    """Whether ``structure`` gives several structures, or a database, to run in batches."""
+    if os.path.isdir(structure) or glob.has_magic(structure) or structure.endswith(".db"):
+        return True
+    return os.path.isfile(structure) and _count_frames(structure) > 1
+
+
+def read_structure(path: str, index: Optional[int]=None) -> ase.Atoms:
+    if path.endswith(".db"):
+        with ase.db.connect(path) as db:
+            return db.get(id=index).toatoms()
+    return ase.io.read(path, index=index if index is not None else -1)
+
+
+class _StructureGraphs(torch.utils.data.Dataset):
+    """The graphs of the structures, built in the workers of the loader.
+
+    Each item is ``(idx, AtomicData, None)``, or ``(idx, None, error)`` if the structure could not be built.
+    """
+
+    def __init__(self, entries: List[Tuple[str, str, Optional[int]]], atomic_options: dict):
+        self.entries = entries
+        self.atomic_options = atomic_options
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, idx):
+        _, path, index = self.entries[idx]
+        try:
+            return idx, AtomicData.from_ase(read_structure(path, index), **self.atomic_options), None
+        except Exception as e:
+            return idx, None, f"{type(e).__name__}: {e}"
+
+
+def budget_batches(items, max_atoms: int, max_edges: Optional[int]=None):
+    """Group the ``(idx, AtomicData)`` items into batches of at most ``max_atoms`` atoms and ``max_edges`` edges.
+
+    A structure larger than the budget makes a batch of its own.
+    """
+    batch, natoms, nedges = [], 0, 0
+    for idx, data in items:
+        n = data.num_nodes
+        e = data[AtomicDataDict.EDGE_INDEX_KEY].shape[1]
+        if len(batch) > 0 and (natoms + n > max_atoms or (max_edges is not None and nedges + e > max_edges)):
+            yield batch
+            batch, natoms, nedges = [], 0, 0
+        batch.append((idx, data))
+        natoms += n
+        nedges += e
+    if len(batch) > 0:
+        yield batch
+
+
+def split_batch(data: AtomicDataDict.Type, batch_info: dict) -> List[AtomicDataDict.Type]:
+    """Split the output of the model on a batch into the data of each structure.
+
+    The fields added by the model are split like the node, edge or environment fields they belong to.
+    """
+    info = {key: dict(batch_info[key]) for key in ["__slices__", "__cumsum__", "__cat_dims__"]}
+    info["__num_nodes_list__"] = batch_info["__num_nodes_list__"]
+    info["__data_class__"] = batch_info["__data_class__"]
+    slices = info["__slices__"]
+    for key in list(data.keys()):
+        if key in slices:
+            continue
+        for size_key, fields in _FIELD_SIZES:
+            if key in fields and size_key in slices:
+                slices[key] = slices[size_key]
+                info["__cumsum__"][key] = [0] * len(slices[size_key])
+                info["__cat_dims__"][key] = 0
+                break
+
+    data = {key: value for key, value in data.items() if key in slices}
+    for key in ["__slices__", "__cumsum__", "__cat_dims__"]:
+        info[key] = {k: v for k, v in info[key].items() if k in data}
+    # the batch index would label the structures by their place in the batch.
+    return [
+        AtomicData.to_AtomicDataDict(d, exclude_keys=(AtomicDataDict.BATCH_KEY, AtomicDataDict.BATCH_PTR_KEY))
+        for d in Batch.from_dict({**data, **info}).to_data_list()
+        ]
+
+
+class BatchRun(ElecStruCal):
+    """Run the ``band`` or ``write_block`` task of `dptb run` on many structures with one model.
+
+    The graphs are built in ``num_workers`` worker processes, and the structures go through the model in
+    batches of at most ``max_atoms`` atoms and ``max_edges`` edges. The outputs of each structure are written to
+    the group ``str(idx)`` of one HDF5 file, and the ``index`` group lists the name, the status and the error of
+    every structure. A structure that fails is recorded in the index, and does not stop the others.
+    """
+
+    def __init__(
+            self,
+            model: torch.nn.Module,
+            results_path: str,
+            device: Union[str, torch.device]=None,
+            max_atoms: int=4096,
+            max_edges: Optional[int]=None,
+            num_workers: int=0,
+            ):
+        super(BatchRun, self).__init__(model=model, device=device)
+        self.results_path = results_path
+        self.max_atoms = max_atoms
+        self.max_edges = max_edges
+        self.num_workers = num_workers
+
+    def run(self, structure: str, task_options: dict, pbc: Union[bool, list]=None, AtomicData_options: dict=None) -> str:
+        task = task_options["task"]
+        if task not in BATCH_TASKS:
+            log.error(f"The task {task} can not run on many structures, only {BATCH_TASKS} are supported.")
+            raise ValueError(f"The task {task} can not run on many structures, only {BATCH_TASKS} are supported.")
+
+        entries = collect_structures(structure)
+        log.info(f"Run the {task} task on {len(entries)} structures.")
+        atomic_options = get_atomic_options(model=self.model, pbc=pbc, AtomicData_options=AtomicData_options)
+        loader = torch.utils.data.DataLoader(
+            _StructureGraphs(entries, atomic_options),
+            batch_size=None,
+            num_workers=self.num_workers,
+            )
+
+        errors = [None] * len(entries)
+        done = np.zeros(len(entries), dtype=bool)
+
+        def graphs():
+            for idx, data, error in loader:
+                if error is not None:
+                    errors[idx] = error
+                    log.warning(f"Failed to build the structure {entries[idx][0]}: {error}")
+                    continue
+                yield idx, data
+
+        path = os.path.join(self.results_path, f"{task}_structures.h5")
+        with h5py.File(path, "w") as fid:
+            fid.attrs["task"] = task
+            for batch in budget_batches(graphs(), self.max_atoms, self.max_edges):
+                try:
+                    outputs = self.forward([data for _, data in batch])
+                except Exception as e:
+                    # isolate the structure breaking the batch.
+                    log.warning(f"Failed to run a batch of {len(batch)} structures, run them one by one: {e}")
+                    outputs = []
+                    for idx, data in batch:
+                        try:
+                            outputs += self.forward([data])
+                        except Exception as e:
+                            outputs.append(e)
+
+                for (idx, _), output in zip(batch, outputs):
+                    try:
+                        if isinstance(output, Exception):
+                            raise output
+                        group = fid.create_group(str(idx))
+                        group.attrs["name"] = entries[idx][0]
+                        self.write(group, output, task_options)
+                        done[idx] = True
+                    except Exception as e:
+                        if str(idx) in fid:
+                            del fid[str(idx)]
+                        errors[idx] = f"{type(e).__name__}: {e}"
+                        log.warning(f"Failed to run the structure {entries[idx][0]}: {errors[idx]}")
+
+            index = fid.create_group("index")
+            index.create_dataset("name", data=[name for name, _, _ in entries], dtype=h5py.string_dtype())
+            index.create_dataset("status", data=done.astype(np.int8))
+            index.create_dataset("error", data=[error or "" for error in errors], dtype=h5py.string_dtype())
+
+        log.info(f"{done.sum()} of {len(entries)} structures are written to {path}.")
+        return path
+
+    def forward(self, data_list: List[AtomicData]) -> List[AtomicDataDict.Type]:
+        """The outputs of the model on a batch of structures, split by structure."""
+        batch = Batch.from_data_list(data_list).to(self.device)
+        batch_info = {
+            "__slices__": batch.__slices__,
+            "__cumsum__": batch.__cumsum__,
+            "__cat_dims__": batch.__cat_dims__,
+            "__num_nodes_list__": batch.__num_nodes_list__,
+            "__data_class__": batch.__data_class__,
+        }
+        with torch.no_grad():
+            data = self.model(self.model.idp(AtomicData.to_AtomicDataDict(batch)))
+        return split_batch(data, batch_info)
+
+    def write(self, group: h5py.Group, data: AtomicDataDict.Type, task_options: dict):
+        if task_options["task"] == "write_block":
+            with torch.no_grad():
+                blocks = feature_to_block(data=data, idp=self.model.idp)
+            pack_blocks(group, {key: value.detach().cpu().numpy() for key, value in blocks.items()})
+
+        elif task_options["task"] == "band":
+            structase = AtomicData.from_AtomicDataDict({key: value.cpu() for key, value in data.items()}).to_ase(self.model.idp)
+            klist, xlist, high_sym_kpoints, labels = Band.get_kpath(structase, task_options)
+            data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([torch.as_tensor(klist, dtype=self.model.dtype, device=self.device)])
+            with torch.no_grad():
+                data = self.eigv(data, eig_solver=task_options.get("eig_solver", None))
+            group.create_dataset("eigenvalues", data=data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0].detach().cpu().numpy())
+            group.create_dataset("kpoints", data=np.asarray(klist))
+            if xlist is not None:
+                group.create_dataset("xlist", data=np.asarray(xlist))
+            if high_sym_kpoints is not None:
+                group.create_dataset("high_sym_kpoints", data=np.asarray(high_sym_kpoints))
+            if labels is not None:
+                group.attrs["labels"] = [str(label) for label in labels]
+            if task_options.get("nel_atom") is not None:
+                _, E_fermi = self.get_fermi_level(data=data, nel_atom=task_options["nel_atom"], klist=klist)
+                group.attrs["E_fermi"] = E_fermi
@@ -26,35 +26,25 @@ def get_orbitals_for_type(orb_dict):
     return orb_list
 
 
-def load_data_for_model(
-     data: Union[AtomicData, ase.Atoms, str],
+def get_atomic_options(
      model: torch.nn.Module,
-     device: Optional[Union[str, torch.device]] = None,
      pbc: Optional[Union[bool, list]] = None,
      AtomicData_options: Optional[dict] = None,
-     override_overlap: Optional[str] = None
- ) -> AtomicData:
+ ) -> dict:
     """
-    Standardized helper to load and process data for post-processing with a DeePTB model.
-    Handles defaults from model options (r_max), user overrides, and device transfer.
+    The options of `AtomicData.from_ase` for a DeePTB model: the cutoffs of the model, overridden by
+    ``AtomicData_options``, and the ``pbc`` override.
     """
-    
-    # 1. Determine device
-    if device is None:
-        device = model.device
-    if isinstance(device, str):
-        device = torch.device(device)
-        
-    # 2. Get default cutoffs from model
+    # 1. Get default cutoffs from model
     r_max, er_max, oer_max = get_cutoffs_from_model_options(model.model_options)
     atomic_options = {'r_max': r_max, 'er_max': er_max, 'oer_max': oer_max}
     
-    # 3. Handle PBC overrides
+    # 2. Handle PBC overrides
     if pbc is not None:
         # If pbc provided, override default (which usually comes from atoms object)
         atomic_options.update({'pbc': pbc})
         
-    # 4. Handle AtomicData_options overrides with warnings
+    # 3. Handle AtomicData_options overrides with warnings
     if AtomicData_options is not None:
         for key in ['r_max', 'er_max', 'oer_max']:
             if AtomicData_options.get(key) is not None:
@@ -63,12 +53,37 @@ def load_data_for_model(
                     log.warning(f'Overwrite the {key} setting in the model with the {key} setting in the AtomicData_options: {AtomicData_options.get(key)}')
                     log.warning(f'This is very dangerous, please make sure you know what you are doing.')
                     
-    # 5. Validation
+    # 4. Validation
     if atomic_options['r_max'] is None:
         log.error('The r_max is not provided in model_options, please provide it in AtomicData_options.')
         raise RuntimeError('The r_max is not provided in model_options, please provide it in AtomicData_options.')
+
+    return atomic_options
+
+
+def load_data_for_model(
+     data: Union[AtomicData, ase.Atoms, str],
+     model: torch.nn.Module,
+     device: Optional[Union[str, torch.device]] = None,
+     pbc: Optional[Union[bool, list]] = None,
+     AtomicData_options: Optional[dict] = None,
+     override_overlap: Optional[str] = None
+ ) -> AtomicData:
+    """
+    Standardized helper to load and process data for post-processing with a DeePTB model.
+    Handles defaults from model options (r_max), user overrides, and device transfer.
+    """
+    
+    # 1. Determine device
+    if device is None:
+        device = model.device
+    if isinstance(device, str):
+        device = torch.device(device)
+        
+    # 2. Get the cutoffs from the model, with the user overrides
+    atomic_options = get_atomic_options(model=model, pbc=pbc, AtomicData_options=AtomicData_options)
         
-    # 6. Load Data
+    # 3. Load Data
     if isinstance(data, str):
         structase = read(data)
         data_obj = AtomicData.from_ase(structase, **atomic_options)
@@ -81,7 +96,7 @@ def load_data_for_model(
     else:
         raise ValueError('data should be either a string, ase.Atoms, or AtomicData')
         
-    # 7. Handle Overlap Override
+    # 4. Handle Overlap Override
     overlap_flag = hasattr(model, 'overlap')
     
     if isinstance(override_overlap, str):
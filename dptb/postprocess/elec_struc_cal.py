@@ -15,6 +15,7 @@ from dptb.utils.argcheck import get_cutoffs_from_model_options
 from copy import deepcopy
 from dptb.utils.constants import Boltzmann,eV2J
 from dptb.postprocess.common import load_data_for_model
+from dptb.postprocess.unified.utils import calculate_fermi_level
 
 # This class `ElecStruCal`  is designed to calculate electronic structure properties such as
 # eigenvalues and Fermi energy based on provided input data and model. 
@@ -199,7 +200,7 @@ class ElecStruCal(object):
         smearing_method : str
             The `smearing_method` parameter in the `get_fermi_level` function is used to specify the method of
         smearing to be used in the calculation of the Fermi energy. The default method is 'FD' (Fermi-Dirac).
-        Other possible methods include 'Gaussian'.
+        Other possible methods include 'Gaussian', 'MP' (Methfessel-Paxton) and 'cold'.
         temp : float
             The `temp` parameter in the `get_fermi_level` function represents the temperature for smearing in the
         calculation of the Fermi energy.
@@ -255,7 +256,7 @@ class ElecStruCal(object):
     @classmethod
     def cal_E_fermi(cls,eigenvalues: np.ndarray, total_electrons: int, spindeg: int=2,wk: np.ndarray=None,
                     q_tol:float=1e-10,smearing_method:str='FD',temp:float=300):
-        '''This  function calculates the Fermi energy using iteration algorithm.
+        '''This  function calculates the Fermi energy using iteration algorithm, see `calculate_fermi_level`.
 
             In this version, the function calculates the Fermi energy in the case of spin-degeneracy. 
         The smearing method here is to ensure the convergence of the Fermi energy calculation especially in metal systems.
@@ -282,7 +283,7 @@ class ElecStruCal(object):
         smearing_method : str
             The `smearing_method` parameter in the `cal_E_fermi` function is used to specify the method of
         smearing to be used in the calculation of the Fermi energy. The default method is 'FD' (Fermi-Dirac).
-        Other possible methods include 'Gaussian'.
+        Other possible methods include 'Gaussian', 'MP' (Methfessel-Paxton) and 'cold'.
         temp : float
             The `temp` parameter in the `cal_E_fermi` function represents the temperature for smearing in the
         calculation of the Fermi energy.
@@ -293,51 +294,10 @@ class ElecStruCal(object):
         
         '''        
         
-        nextafter = np.nextafter
-        total_electrons = total_electrons / spindeg # This version is for the case of spin-degeneracy
-        log.info('Calculating Fermi energy in the case of spin-degeneracy.')
-            
-        
-        # calculate boundaries
-        min_Ef, max_Ef = eigenvalues.min(), eigenvalues.max()
-        kT = Boltzmann/eV2J * temp
-        drange = kT*np.sqrt(-np.log(q_tol*1e-2))
-        min_Ef = min_Ef - drange
-        max_Ef = max_Ef + drange
-
-        Ef = (min_Ef + max_Ef) * 0.5
-
         if wk is None:
-            wk = np.ones(eigenvalues.shape[0]) / eigenvalues.shape[0]
             log.info('wk is not provided, using equal weight for kpoints.')
-
-        icounter = 0
-        while nextafter(min_Ef, max_Ef) < max_Ef:
-        # while icounter <= 150:
-            icounter += 1
-            # Calculate guessed charge
-            wk = wk.reshape(-1,1)
-            if smearing_method == 'FD':
-                q_cal = (wk * cls.fermi_dirac_smearing(eigenvalues,kT=kT, mu=Ef)).sum()
-            elif smearing_method == 'Gaussian':
-                q_cal = (wk * cls.Gaussian_smearing(eigenvalues,sigma = kT, mu=Ef)).sum()
-            else:
-                raise ValueError(f'Unknown smearing method: {smearing_method}')
-
-            if abs(q_cal - total_electrons) < q_tol:
-                log.info(f'Fermi energy converged after {icounter} iterations.')
-                log.info(f'q_cal: {q_cal*spindeg}, total_electrons: {total_electrons*spindeg}, diff q: {abs(q_cal - total_electrons)*spindeg}')
-                return Ef
-
-            if q_cal >= total_electrons:
-                max_Ef = Ef
-            else:
-                min_Ef = Ef
-            Ef = (min_Ef + max_Ef) * 0.5
-
-        log.warning(f'Fermi level bisection did not converge under tolerance {q_tol} after {icounter} iterations.')
-        log.info(f'q_cal: {q_cal*spindeg}, total_electrons: {total_electrons*spindeg}, diff q: {abs(q_cal - total_electrons)*spindeg}')
-        return Ef
+        return calculate_fermi_level(eigenvalues, total_electrons, spindeg=spindeg, weights=wk, q_tol=q_tol,
+                                     smearing_method=smearing_method, temperature=temp)
     
     @classmethod
     def fermi_dirac_smearing(cls, E, kT=0.025852, mu=0.0):
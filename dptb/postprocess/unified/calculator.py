@@ -4,7 +4,7 @@ import torch
 import numpy as np
 from dptb.data import AtomicData, AtomicDataDict
 from dptb.utils.argcheck import get_cutoffs_from_model_options
-from dptb.nn.energy import Eigenvalues, Eigh
+from dptb.nn.energy import Eigenvalues, Eigh, default_num_workers
 from dptb.data.interfaces.ham_to_feature import feature_to_block
 from dptb.nn.hr2hk import HR2HK
 
@@ -89,11 +89,16 @@ class HamiltonianCalculator(ABC):
 class DeePTBAdapter(HamiltonianCalculator):
     """Adapter for DeePTB PyTorch models to match HamiltonianCalculator interface."""
     
-    def __init__(self, model: torch.nn.Module, override_overlap: str = None):
+    def __init__(self, model: torch.nn.Module, override_overlap: str = None, num_workers: Optional[int] = None):
         self.model = model
         self.device = model.device
         self.dtype = model.dtype
         self.model.eval()
+
+        # The k-points are diagonalized by a pool of num_workers threads on cpu, all the cores by default.
+        if num_workers is None:
+            num_workers = default_num_workers() if torch.device(self.device).type == "cpu" else 1
+        self.num_workers = num_workers
         
         # Check model capabilities
         self.overlap = hasattr(model, 'overlap') or (override_overlap != None)
@@ -158,7 +163,9 @@ class DeePTBAdapter(HamiltonianCalculator):
     def get_eigenvalues(self, 
                         atomic_data: dict, 
                         nk: Optional[int]=None,
-                        solver: Optional[str]=None) -> Tuple[dict, torch.Tensor]:
+                        solver: Optional[str]=None,
+                        band_window: Optional[Tuple[int, Optional[int]]]=None,
+                        energy_window: Optional[Tuple[Optional[float], Optional[float]]]=None) -> Tuple[dict, torch.Tensor]:
         # 1. Get Hamiltonian
         atomic_data = self.model_forward(atomic_data)
         
@@ -168,7 +175,8 @@ class DeePTBAdapter(HamiltonianCalculator):
                  raise RuntimeError("Overlap model but no overlap in output.")
                  
         # 3. Solve Eigenvalues
-        atomic_data = self.eigv_solver(data=atomic_data,nk=nk, eig_solver=solver)
+        atomic_data = self.eigv_solver(data=atomic_data,nk=nk, eig_solver=solver, band_window=band_window, energy_window=energy_window,
+                                       num_workers=self.num_workers)
         
         eigs = atomic_data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0] # atomic_data is usually batched, take 0
         return atomic_data, eigs
@@ -183,7 +191,7 @@ class DeePTBAdapter(HamiltonianCalculator):
                  raise RuntimeError("Overlap model but no overlap in output.")
 
         # 3. Solve Eigenvalues + Eigenvectors
-        atomic_data = self.eigh_solver(data=atomic_data, nk=nk)
+        atomic_data = self.eigh_solver(data=atomic_data, nk=nk, num_workers=self.num_workers)
         
         eigs = atomic_data[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
         vecs = atomic_data[AtomicDataDict.EIGENVECTOR_KEY] # Usually not nested? Check nn/energy.py 
@@ -221,9 +221,14 @@ class BandAccessor:
         k_tensor = torch.as_tensor(self._k_points, dtype=self._system._calculator.dtype, device=self._system._calculator.device)
         self._system._atomic_data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([k_tensor])
         
-    def compute(self):
+    def compute(self, band_window: Optional[tuple] = None, energy_window: Optional[tuple] = None):
         """
         Compute the band structure using the configured K-path and store result in system.
+
+        Args:
+            band_window: ``(band_min, band_max)``, compute only the bands ``band_min:band_max``.
+            energy_window: ``(emin, emax)`` relative to the Fermi level, compute only the bands inside this window
+                at one k-point at least.
         """
         if self._k_points is None:
             raise RuntimeError("K-path not set. Call system.band.set_kpath() first.")
@@ -231,17 +236,22 @@ class BandAccessor:
         # Use system state data
         data = self._system._atomic_data
         
-        # Calculate
-        data, eigs = self._system.calculator.get_eigenvalues(data)
-        
-        # Extract results
-        eigenvalues = eigs.detach().cpu().numpy() # [Nk, Nb]
-        
         if self._system._efermi is None:
             efermi = 0.0
             log.info('The efermi is not unknown, set it to 0.0!')
         else:
             efermi = self._system._efermi
+
+        # Calculate
+        window = {}
+        if band_window is not None:
+            window["band_window"] = band_window
+        if energy_window is not None:
+            window["energy_window"] = tuple(e + efermi if e is not None else None for e in energy_window)
+        data, eigs = self._system.calculator.get_eigenvalues(data, **window)
+        
+        # Extract results
+        eigenvalues = eigs.detach().cpu().numpy() # [Nk, Nb]
         # Create Data Object
         self._band_data = BandStructureData(
             eigenvalues=eigenvalues,
@@ -113,6 +113,7 @@ class DosAccessor:
         self._config = {}
         self._dos_data = None 
         self._k_points = None
+        self._kset = None
 
     def set_kpoints(self, kmesh: List[int], is_gamma_center: bool = True):
         """
@@ -128,9 +129,11 @@ class DosAccessor:
         # Eager generation
         self._k_points = kmesh_sampling(kmesh, is_gamma_center=is_gamma_center)
         self._num_k = self._k_points.shape[0]
+        # only one k-point of each ±k pair is solved, with the weight of the pair.
+        self._kset = self._system.get_kset(self._k_points)
         
         # Prepare Data for Model
-        k_tensor = torch.as_tensor(self._k_points, dtype=self._system._calculator.dtype, device=self._system._calculator.device)
+        k_tensor = torch.as_tensor(self._kset.irreducible_kpoints, dtype=self._system._calculator.dtype, device=self._system._calculator.device)
         self._system._atomic_data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([k_tensor])
 
     @property
@@ -160,7 +163,7 @@ class DosAccessor:
             raise RuntimeError("The kpoints not set. Call set_kpoints first.")
         
         data = self._system._atomic_data
-        num_k = self._num_k
+        k_weights = self._kset.weights
                 
         # 3. Calculate Eigenvalues/Vectors
         calc_pdos = self._config.get('pdos', False)
@@ -189,9 +192,11 @@ class DosAccessor:
         
         eigenvalues = eigs.detach().cpu().numpy() # [Nk, Nb]
         eigenvalues_flat = eigenvalues.flatten()
+        # the weights of the k-points of the states
+        state_weights = np.repeat(k_weights, eigenvalues.shape[1]) # [Nk*Nb]
         
         # 4. Compute Weights for DOS/PDOS
-        # Total DOS: weight = 1 for each state
+        # Total DOS: weight = the weight of the k-point of each state
         # PDOS: weight = projected char
         
         erange = self._config['erange']
@@ -221,7 +226,7 @@ class DosAccessor:
 
         # Calculate Total DOS
         broadened = broadening(energy_grid, eigenvalues_flat, sigma, smearing) # [Npts, Nk*Nb]
-        total_dos = np.sum(broadened, axis=1) / num_k
+        total_dos = broadened @ state_weights
         
         pdos = None
         pdos_labels = None
@@ -260,7 +265,7 @@ class DosAccessor:
             # broadened: [Npts, N_states]
             # weights.T: [N_states, Norb]
             
-            pdos = np.dot(broadened, weights.T) / num_k # [Npts, Norb]
+            pdos = np.dot(broadened * state_weights, weights.T) # [Npts, Norb]
             
             # Labels
             if hasattr(self._system, 'atom_orbs'):
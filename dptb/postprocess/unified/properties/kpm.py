@@ -0,0 +1,622 @@
+"""Kernel polynomial method (KPM) for the spectral properties of large systems.
+
+The dense accessors diagonalize H(k), which scales as N^3 in memory and time. Here the
+Hamiltonian (and overlap) of the whole cell is assembled as a sparse matrix from the
+orbital pair features emitted by the model, and the spectral functions are expanded in
+Chebyshev polynomials of the rescaled Hamiltonian. Traces are estimated stochastically
+with random phase vectors, so the cost is linear in the number of orbitals.
+
+The cell is sampled at the Gamma point only, so it should be large enough for the
+quantity of interest, e.g. an amorphous or defected supercell.
+
+References:
+    - A. Weisse, G. Wellein, A. Alvermann, H. Fehske, Rev. Mod. Phys. 78, 275 (2006).
+    - J. H. Garcia, L. Covaci, T. G. Rappoport, Phys. Rev. Lett. 114, 116602 (2015).
+"""
+
+import re
+import logging
+from typing import TYPE_CHECKING, Optional, Union, List, Dict, Tuple
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import torch
+from dptb.data import AtomicDataDict
+from dptb.utils.constants import anglrMId
+from dptb.postprocess.unified.properties.dos import DosData
+
+if TYPE_CHECKING:
+    from dptb.postprocess.unified.system import TBSystem
+
+log = logging.getLogger(__name__)
+
+# boltzmann constant in eV/K
+KB = 8.617333262e-5
+
+
+def jackson_kernel(num_moments: int) -> np.ndarray:
+    """The Jackson damping factors g_n, which remove the Gibbs oscillations of the truncated expansion."""
+    n = np.arange(num_moments)
+    q = np.pi / (num_moments + 1)
+    return ((num_moments - n + 1) * np.cos(q * n) + np.sin(q * n) / np.tan(q)) / (num_moments + 1)
+
+
+def lorentz_kernel(num_moments: int, lambda_: float = 4.0) -> np.ndarray:
+    """The Lorentz damping factors g_n, preferred for Green's functions."""
+    n = np.arange(num_moments)
+    return np.sinh(lambda_ * (1 - n / num_moments)) / np.sinh(lambda_)
+
+
+KERNELS = {"jackson": jackson_kernel, "lorentz": lorentz_kernel}
+
+
+def get_kernel(kernel: str, num_moments: int) -> np.ndarray:
+    if kernel not in KERNELS:
+        raise ValueError(f"Unknown kernel {kernel}, should be one of {list(KERNELS.keys())}.")
+    return KERNELS[kernel](num_moments)
+
+
+def chebyshev_t(x: np.ndarray, num_moments: int) -> np.ndarray:
+    """The Chebyshev polynomials T_n(x) for n < num_moments, shape [num_moments, len(x)]."""
+    return np.cos(np.arange(num_moments)[:, None] * np.arccos(np.clip(x, -1, 1))[None, :])
+
+
+def features_to_blocks(features: torch.Tensor, idp) -> torch.Tensor:
+    """Expand the reduced orbital pair features to [N, full_basis_norb, full_basis_norb] blocks.
+
+    Only the upper triangle in the orbital type index is filled and the diagonal orbital pairs
+    are halved, following HR2HK, so that the full matrix is recovered as A + A^H.
+    """
+    blocks = torch.zeros((len(features), idp.full_basis_norb, idp.full_basis_norb), dtype=features.dtype, device=features.device)
+    ist = 0
+    for i, iorb in enumerate(idp.full_basis):
+        li = anglrMId[re.findall(r"[a-zA-Z]+", iorb)[0]]
+        jst = 0
+        for j, jorb in enumerate(idp.full_basis):
+            lj = anglrMId[re.findall(r"[a-zA-Z]+", jorb)[0]]
+            if i <= j:
+                factor = 0.5 if i == j else 1.0
+                orbpair = iorb + "-" + jorb
+                blocks[:, ist:ist+2*li+1, jst:jst+2*lj+1] = factor * features[:, idp.orbpair_maps[orbpair]].reshape(-1, 2*li+1, 2*lj+1)
+            jst += 2*lj+1
+        ist += 2*li+1
+    return blocks
+
+
+def orbital_index(idp, atom_types: torch.Tensor) -> np.ndarray:
+    """The global orbital index of each atom and full basis orbital, -1 where the atom lacks the orbital."""
+    mask = idp.mask_to_basis[atom_types].cpu().numpy()
+    norb = mask.sum(axis=1)
+    offsets = np.cumsum(norb) - norb
+    index = offsets[:, None] + np.cumsum(mask, axis=1) - 1
+    index[~mask] = -1
+    return index
+
+
+def _block_triplets(index_i: np.ndarray, index_j: np.ndarray, blocks: np.ndarray):
+    rows = np.broadcast_to(index_i[:, :, None], blocks.shape)
+    cols = np.broadcast_to(index_j[:, None, :], blocks.shape)
+    valid = (rows >= 0) & (cols >= 0) & (blocks != 0)
+    return rows[valid], cols[valid], blocks[valid]
+
+
+def sparse_hr(
+        data: AtomicDataDict.Type,
+        idp,
+        overlap: bool = False,
+        edge_weight: Optional[torch.Tensor] = None,
+        chunk_size: int = 65536,
+        ) -> sp.csr_matrix:
+    """Assemble the Gamma point Hamiltonian (or overlap) of the cell as a sparse matrix.
+
+    Parameters
+    ----------
+    data : AtomicDataDict.Type
+        the atomic data with the node/edge features emitted by the model.
+    idp : OrbitalMapper
+        the e3tb orbital mapper of the model.
+    overlap : bool
+        assemble the overlap matrix from the overlap features instead of the Hamiltonian.
+    edge_weight : torch.Tensor, optional
+        a weight per edge multiplying the hopping blocks; the onsite blocks are then dropped.
+        With the edge vector components, this gives the [H, r] commutator of the velocity operator.
+    chunk_size : int
+        the number of edges expanded to dense blocks at once, to bound the memory.
+
+    Returns
+    -------
+    sp.csr_matrix
+        the matrix A, such that the operator is A + A^H (or A - A^H for the commutator).
+    """
+    if overlap:
+        edge_field, node_field = AtomicDataDict.EDGE_OVERLAP_KEY, AtomicDataDict.NODE_OVERLAP_KEY
+    else:
+        edge_field, node_field = AtomicDataDict.EDGE_FEATURES_KEY, AtomicDataDict.NODE_FEATURES_KEY
+        soc = data.get(AtomicDataDict.NODE_SOC_SWITCH_KEY, False)
+        if isinstance(soc, torch.Tensor):
+            soc = soc.all()
+        if soc:
+            raise NotImplementedError("The KPM solver does not support SOC Hamiltonians yet.")
+
+    idp.get_orbpair_maps()
+    atom_types = data[AtomicDataDict.ATOM_TYPE_KEY].flatten()
+    index = orbital_index(idp, atom_types)
+    norb = int(index.max()) + 1
+
+    rows, cols, vals = [], [], []
+    if edge_weight is None:
+        blocks = features_to_blocks(data[node_field].detach(), idp).cpu().numpy().astype(np.float64)
+        triplets = _block_triplets(index, index, blocks)
+        for out, value in zip((rows, cols, vals), triplets):
+            out.append(value)
+
+    edge_index = data[AtomicDataDict.EDGE_INDEX_KEY].cpu().numpy()
+    edge_features = data[edge_field].detach()
+    for start in range(0, edge_index.shape[1], chunk_size):
+        stop = min(start + chunk_size, edge_index.shape[1])
+        blocks = features_to_blocks(edge_features[start:stop], idp).cpu().numpy().astype(np.float64)
+        if edge_weight is not None:
+            blocks = blocks * edge_weight[start:stop].detach().cpu().numpy().astype(np.float64)[:, None, None]
+        triplets = _block_triplets(index[edge_index[0, start:stop]], index[edge_index[1, start:stop]], blocks)
+        for out, value in zip((rows, cols, vals), triplets):
+            out.append(value)
+
+    # duplicated entries, e.g. from periodic images within the cell, are summed up.
+    return sp.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(norb, norb)).tocsr()
+
+
+class KPM:
+    """Chebyshev expansion engine for the spectral functions of a sparse Hamiltonian.
+
+    With an overlap matrix S, the expansion is done for S^-1 H, whose diagonal elements
+    are the Mulliken projections used by the dense PDOS.
+
+    Parameters
+    ----------
+    hamiltonian : sp.spmatrix
+        the Hermitian Hamiltonian matrix.
+    overlap : sp.spmatrix, optional
+        the positive definite overlap matrix, None for an orthogonal basis.
+    bounds : Tuple[float, float], optional
+        the lower and upper bounds of the spectrum, estimated by Lanczos iterations if not given.
+    epsilon : float
+        the safety margin of the rescaled spectrum, which is mapped to [-1 + epsilon/2, 1 - epsilon/2].
+    """
+    def __init__(
+            self,
+            hamiltonian: sp.spmatrix,
+            overlap: Optional[sp.spmatrix] = None,
+            bounds: Optional[Tuple[float, float]] = None,
+            epsilon: float = 0.05,
+            ):
+        self.hamiltonian = sp.csr_matrix(hamiltonian)
+        self.overlap = None if overlap is None else sp.csc_matrix(overlap)
+        self.norb = self.hamiltonian.shape[0]
+        self._solve = None if overlap is None else spla.splu(self.overlap).solve
+
+        if bounds is None:
+            bounds = self.spectral_bounds()
+        emin, emax = bounds
+        self.a = (emax - emin) / (2 - epsilon)
+        self.b = (emax + emin) / 2
+
+    def spectral_bounds(self) -> Tuple[float, float]:
+        """Estimate the extremal eigenvalues, falling back to the Gershgorin bounds."""
+        if self.norb <= 2:
+            return self._gershgorin_bounds()
+        try:
+            kwargs = {"k": 1, "tol": 1e-4, "M": self.overlap}
+            emin = spla.eigsh(self.hamiltonian, which="SA", return_eigenvectors=False, **kwargs)[0]
+            emax = spla.eigsh(self.hamiltonian, which="LA", return_eigenvectors=False, **kwargs)[0]
+        except spla.ArpackNoConvergence:
+            log.warning("The Lanczos estimation of the spectral bounds did not converge, use the Gershgorin bounds instead.")
+            return self._gershgorin_bounds()
+        return emin, emax
+
+    def _gershgorin_bounds(self) -> Tuple[float, float]:
+        if self.overlap is not None:
+            # there is no cheap bound of the spectrum of S^-1 H, fall back to the dense eigenvalues.
+            dense = np.linalg.solve(self.overlap.toarray(), self.hamiltonian.toarray())
+            eigs = np.linalg.eigvals(dense).real
+            return eigs.min(), eigs.max()
+        diag = self.hamiltonian.diagonal().real
+        radius = np.asarray(abs(self.hamiltonian).sum(axis=1)).flatten() - np.abs(diag)
+        return (diag - radius).min(), (diag + radius).max()
+
+    def to_scaled(self, energies: np.ndarray) -> np.ndarray:
+        return (np.asarray(energies) - self.b) / self.a
+
+    def matvec(self, v: np.ndarray) -> np.ndarray:
+        """Apply the rescaled Hamiltonian (S^-1 H - b) / a to a block of vectors."""
+        hv = self.hamiltonian @ v
+        if self._solve is not None:
+            # the factorization of the real overlap only solves real right hand sides.
+            if np.iscomplexobj(hv):
+                hv = self._solve(np.ascontiguousarray(hv.real)) + 1j * self._solve(np.ascontiguousarray(hv.imag))
+            else:
+                hv = self._solve(hv)
+        return (hv - self.b * v) / self.a
+
+    def random_vectors(self, num_random: Optional[int], rng: np.random.Generator, block_size: int = 64):
+        """Yield the blocks of random phase vectors, or of unit vectors for the exact trace if num_random is None.
+
+        Each block comes with its weight, such that the weighted sum of <r|A|r> over all vectors estimates Tr[A].
+        """
+        if num_random is None:
+            for start in range(0, self.norb, block_size):
+                stop = min(start + block_size, self.norb)
+                vectors = np.zeros((self.norb, stop - start))
+                vectors[np.arange(start, stop), np.arange(stop - start)] = 1.
+                yield vectors, 1.
+        else:
+            for start in range(0, num_random, block_size):
+                n = min(block_size, num_random - start)
+                yield np.exp(2j * np.pi * rng.random((self.norb, n))), 1. / num_random
+
+    def dos_moments(
+            self,
+            num_moments: int,
+            num_random: Optional[int] = 16,
+            projectors: Optional[List[np.ndarray]] = None,
+            seed: Optional[int] = None,
+            ) -> np.ndarray:
+        """The Chebyshev moments mu_n = Tr[P T_n(H)] of the total and projected density of states.
+
+        Parameters
+        ----------
+        num_moments : int
+            the number of Chebyshev moments.
+        num_random : int, optional
+            the number of random phase vectors of the stochastic trace, None for the exact trace.
+        projectors : List[np.ndarray], optional
+            the orbital indices of each projected density of states.
+        seed : int, optional
+            the seed of the random vectors.
+
+        Returns
+        -------
+        np.ndarray
+            [1 + len(projectors), num_moments], the moments of the total DOS first.
+        """
+        projectors = projectors or []
+        # the rows of the projection matrix sum the orbital resolved estimates of each subset.
+        proj = sp.vstack(
+            [sp.csr_matrix(np.ones((1, self.norb)))] +
+            [sp.csr_matrix((np.ones(len(p)), (np.zeros(len(p), dtype=int), p)), shape=(1, self.norb)) for p in projectors]
+            ).tocsr()
+
+        rng = np.random.default_rng(seed)
+        moments = np.zeros((proj.shape[0], num_moments))
+        for r, weight in self.random_vectors(num_random, rng):
+            v_prev, v = r, self.matvec(r)
+            moments[:, 0] += weight * (proj @ (r.conj() * r).sum(axis=1)).real
+            if num_moments > 1:
+                moments[:, 1] += weight * (proj @ (r.conj() * v).sum(axis=1)).real
+            for n in range(2, num_moments):
+                v_prev, v = v, 2 * self.matvec(v) - v_prev
+                moments[:, n] += weight * (proj @ (r.conj() * v).sum(axis=1)).real
+
+        return moments
+
+    def correlation_moments(
+            self,
+            op_left: sp.spmatrix,
+            op_right: sp.spmatrix,
+            num_moments: int,
+            num_random: Optional[int] = 8,
+            seed: Optional[int] = None,
+            max_elements: int = 2**24,
+            ) -> np.ndarray:
+        """The two dimensional moments mu_nm = Tr[A T_n(H) B T_m(H)] for Hermitian operators A, B.
+
+        The vectors B T_m(H)|r> are kept for all m, the random vectors are processed in blocks
+        such that at most ``max_elements`` of them are stored at once.
+        """
+        if self.overlap is not None:
+            raise NotImplementedError("The KPM correlation functions only support orthogonal basis.")
+
+        rng = np.random.default_rng(seed)
+        block_size = max(1, min(32, max_elements // (num_moments * self.norb)))
+        moments = np.zeros((num_moments, num_moments), dtype=np.complex128)
+        for r, weight in self.random_vectors(num_random, rng, block_size=block_size):
+            r = r.astype(np.complex128)
+            right = np.empty((num_moments,) + r.shape, dtype=np.complex128)
+            left = np.empty((num_moments,) + r.shape, dtype=np.complex128)
+            # <r|A T_n = (T_n A |r>)^H, since A and H are Hermitian.
+            for out, start in ((right, r), (left, op_left @ r)):
+                v_prev, v = start, self.matvec(start)
+                out[0] = start
+                for m in range(1, num_moments):
+                    if m > 1:
+                        v_prev, v = v, 2 * self.matvec(v) - v_prev
+                    out[m] = v
+            right = (op_right @ right.transpose(1, 0, 2).reshape(self.norb, -1)).reshape(self.norb, num_moments, -1)
+            moments += weight * (left.conj().reshape(num_moments, -1) @ right.transpose(1, 0, 2).reshape(num_moments, -1).T)
+
+        return moments
+
+    def density(self, energies: np.ndarray, moments: np.ndarray, kernel: str = "jackson") -> np.ndarray:
+        """Reconstruct the spectral density at the energies from the moments [..., num_moments]."""
+        num_moments = moments.shape[-1]
+        x = self.to_scaled(energies)
+        inside = np.abs(x) < 1
+        xs = np.clip(x, -1 + 1e-12, 1 - 1e-12)
+        coeffs = moments * get_kernel(kernel, num_moments)
+        coeffs[..., 1:] *= 2
+        rho = coeffs @ chebyshev_t(xs, num_moments) / (np.pi * self.a * np.sqrt(1 - xs ** 2))
+        return rho * inside
+
+    def delta_weights(self, energies: np.ndarray, num_moments: int, kernel: str = "jackson") -> np.ndarray:
+        """The expansion of delta(E - H) = sum_n w_n(E) T_n(H), shape [num_moments, len(energies)]."""
+        x = self.to_scaled(energies)
+        inside = np.abs(x) < 1
+        xs = np.clip(x, -1 + 1e-12, 1 - 1e-12)
+        g = get_kernel(kernel, num_moments)
+        g[1:] *= 2
+        return g[:, None] * chebyshev_t(xs, num_moments) / (np.pi * self.a * np.sqrt(1 - xs ** 2)) * inside
+
+    def kubo_greenwood(
+            self,
+            moments: np.ndarray,
+            omegas: np.ndarray,
+            efermi: float,
+            temperature: float = 300.,
+            npts: Optional[int] = None,
+            kernel: str = "jackson",
+            ) -> np.ndarray:
+        """The absorptive optical conductivity sum_nm (f_n - f_m)/(E_m - E_n) A_nm B_mn delta(E_m - E_n - omega).
+
+        ``moments`` are the correlation moments Tr[A T_n(H) B T_m(H)], the result is not normalized by the volume.
+        """
+        num_moments = moments.shape[0]
+        # the grid resolves the kernel broadening, about pi / num_moments in the rescaled units.
+        npts = npts or 4 * num_moments
+        x = np.linspace(-1, 1, npts + 2)[1:-1]
+        energies = self.a * x + self.b
+        de = energies[1] - energies[0]
+        weights = self.delta_weights(energies, num_moments, kernel)
+        # the spectral map gamma[i, j] = Tr[A delta(E_i - H) B delta(E_j - H)], the lower states at E_j.
+        gamma = weights.T @ moments.real @ weights
+        f1 = fermi_dirac(energies, efermi, temperature)
+
+        sigma = np.zeros(len(omegas))
+        for i, omega in enumerate(omegas):
+            # E_j + omega falls between the grid points j + k and j + k + 1.
+            k, frac = divmod(omega / de, 1.)
+            k = int(k)
+            if omega < 1e-4 or k + 1 >= npts:
+                continue
+            corr = (1 - frac) * np.diagonal(gamma, offset=-k)[:npts-k-1] + frac * np.diagonal(gamma, offset=-k-1)
+            occ = (f1[:npts-k-1] - fermi_dirac(energies[:npts-k-1] + omega, efermi, temperature)) / omega
+            sigma[i] = np.sum(corr * occ) * de
+        return sigma
+
+    def kubo_bastin(
+            self,
+            moments: np.ndarray,
+            mu: np.ndarray,
+            temperature: float = 300.,
+            npts: Optional[int] = None,
+            kernel: str = "jackson",
+            ) -> np.ndarray:
+        """The static conductivity of the Kubo-Bastin formula at the chemical potentials mu.
+
+        ``moments`` are the correlation moments Tr[A T_n(H) B T_m(H)] of the velocities of the
+        sigma_AB element, the result is not normalized by the volume.
+        """
+        num_moments = moments.shape[0]
+        n = np.arange(num_moments)
+        g = get_kernel(kernel, num_moments) / np.where(n == 0, 2., 1.)
+        # mu_nm = Tr[A T_m(H) B T_n(H)] in the notation of Garcia et al.
+        mu_nm = g[:, None] * g[None, :] * moments.T
+
+        npts = npts or 4 * num_moments
+        x = np.cos(np.pi * (np.arange(npts) + 0.5) / npts)[::-1]
+        theta = np.arccos(x)
+        s = np.sqrt(1 - x ** 2)
+        t = chebyshev_t(x, num_moments)                                           # [m, e]
+        p = (x[None, :] - 1j * n[:, None] * s[None, :]) * np.exp(1j * n[:, None] * theta[None, :])
+        q = (x[None, :] + 1j * n[:, None] * s[None, :]) * np.exp(-1j * n[:, None] * theta[None, :])
+        gamma = (p * (mu_nm @ t)).sum(axis=0) + (q * (mu_nm.T @ t)).sum(axis=0)
+        integrand = (gamma / (1 - x ** 2) ** 2).real
+
+        energies = self.a * x + self.b
+        occ = fermi_dirac(energies[None, :], np.asarray(mu)[:, None], temperature)
+        # sigma = (4 / pi) (4 / dE^2) int dx f(x) ..., dE = 2a being the width of the rescaled spectrum.
+        return 4 / np.pi / self.a ** 2 * np.trapz(occ * integrand[None, :], x, axis=1)
+
+
+def fermi_dirac(energies: np.ndarray, efermi: Union[float, np.ndarray], temperature: float) -> np.ndarray:
+    if temperature <= 0:
+        return (energies <= efermi).astype(np.float64)
+    return 0.5 * (1 - np.tanh((energies - efermi) / (2 * KB * temperature)))
+
+
+class KPMAccessor:
+    """
+    Accessor for the KPM spectral properties on a TBSystem.
+
+    The sparse Hamiltonian is assembled once per structure, e.g.:
+        >>> dos = system.kpm.compute_dos(erange=[-10, 10], npts=1000, num_moments=1024)
+        >>> sigma = system.kpm.compute_conductivity(direction="xx", erange=[-1, 1])
+    """
+    def __init__(self, system: 'TBSystem'):
+        self._system = system
+        self._engine = None
+        self._bounds = None
+        self._velocity = None
+        self._dos_data = None
+
+    @property
+    def overlap(self) -> bool:
+        return self._system.calculator.overlap
+
+    def build(self, bounds: Optional[Tuple[float, float]] = None, epsilon: float = 0.05) -> KPM:
+        """Assemble the sparse Hamiltonian (and overlap) of the cell and set up the Chebyshev expansion."""
+        if self._engine is not None and bounds in (None, self._bounds):
+            return self._engine
+
+        data = self._system.calculator.model_forward(self._system._atomic_data.copy())
+        idp = self._system.model.idp
+        h = sparse_hr(data, idp)
+        h = h + h.getH()
+        s = None
+        if self.overlap:
+            s = sparse_hr(data, idp, overlap=True)
+            s = s + s.getH()
+        log.info(f"KPM: sparse Hamiltonian with {h.shape[0]} orbitals and {h.nnz} non-zero elements.")
+
+        self._data = data
+        self._engine = KPM(h, s, bounds=bounds, epsilon=epsilon)
+        self._bounds = bounds
+        self._velocity = None
+        return self._engine
+
+    def velocity(self, direction: int) -> sp.csr_matrix:
+        """The velocity operator dH/dk along a cartesian direction, consistent with the dense accessors."""
+        if self._velocity is None:
+            self.build()
+            data = AtomicDataDict.with_edge_vectors(self._data, with_lengths=False)
+            self._velocity = {}
+            for alpha in range(3):
+                # dH/dk = -i sum_R R H(R), the edge vector being the bond vector R of the hopping block.
+                d = sparse_hr(data, self._system.model.idp, edge_weight=data[AtomicDataDict.EDGE_VECTORS_KEY][:, alpha])
+                self._velocity[alpha] = -1j * (d - d.getH())
+        return self._velocity[direction]
+
+    def orbital_indices(self, selector: Union[str, List[int], np.ndarray]) -> np.ndarray:
+        """The orbital indices selected by a list of indices, or by a regular expression on the system's atom_orbs labels.
+
+        e.g. "^3-" selects the orbitals of the atom 3, "Si-3p" the 3p orbitals of all Si atoms.
+        """
+        if isinstance(selector, str):
+            indices = [i for i, label in enumerate(self._system.atom_orbs) if re.search(selector, label)]
+            if len(indices) == 0:
+                raise ValueError(f"No orbital matches {selector}.")
+            return np.array(indices)
+        return np.asarray(selector, dtype=int)
+
+    def compute_dos(
+            self,
+            erange: Union[List[float], np.ndarray],
+            npts: int = 1000,
+            num_moments: int = 512,
+            num_random: Optional[int] = 16,
+            pdos: Optional[Dict[str, Union[str, List[int]]]] = None,
+            kernel: str = "jackson",
+            seed: Optional[int] = None,
+            ) -> DosData:
+        """
+        Compute the total and projected DOS with the KPM.
+
+        Args:
+            erange: the energy window w.r.t. the Fermi level (0 if not set).
+            npts: the number of energy points.
+            num_moments: the number of Chebyshev moments, the energy resolution is about pi * width / num_moments.
+            num_random: the number of random phase vectors, None for the exact trace (small systems only).
+            pdos: map from label to the orbital subset of each projected DOS, given as orbital
+                indices or as a regular expression on atom_orbs. A single atom gives the LDOS.
+            kernel: 'jackson' or 'lorentz'.
+            seed: the seed of the random vectors.
+
+        Returns:
+            DosData, with the projected DOS in the order of the pdos labels.
+        """
+        engine = self.build()
+        labels = list(pdos.keys()) if pdos else None
+        projectors = [self.orbital_indices(pdos[k]) for k in labels] if pdos else None
+        moments = engine.dos_moments(num_moments, num_random=num_random, projectors=projectors, seed=seed)
+
+        efermi = 0.0 if self._system._efermi is None else self._system._efermi
+        energy_grid = np.linspace(erange[0] + efermi, erange[1] + efermi, npts)
+        rho = engine.density(energy_grid, moments, kernel=kernel)
+
+        self._dos_data = DosData(
+            energy_grid=energy_grid,
+            total_dos=rho[0],
+            pdos=rho[1:].T if pdos else None,
+            pdos_labels=labels,
+            fermi_level=efermi,
+        )
+        return self._dos_data
+
+    @property
+    def dos_data(self) -> DosData:
+        if self._dos_data is None:
+            raise RuntimeError("KPM DOS not calculated. Call compute_dos() first.")
+        return self._dos_data
+
+    def _correlation_moments(self, direction: str, num_moments: int, num_random: Optional[int], seed: Optional[int]) -> np.ndarray:
+        assert len(direction) == 2, "The direction should be like 'xx' or 'xy'."
+        dir_map = {'x': 0, 'y': 1, 'z': 2}
+        engine = self.build()
+        v_alpha = self.velocity(dir_map[direction[0]])
+        v_beta = self.velocity(dir_map[direction[1]])
+        return engine.correlation_moments(v_alpha, v_beta, num_moments, num_random=num_random, seed=seed)
+
+    def _volume(self) -> float:
+        cell = self._system._atomic_data[AtomicDataDict.CELL_KEY]
+        if cell.dim() == 3:
+            cell = cell[0]
+        return abs(torch.det(cell.double()).item())
+
+    def compute_conductivity(
+            self,
+            erange: Union[List[float], np.ndarray],
+            npts: int = 200,
+            direction: str = 'xx',
+            temperature: float = 300.0,
+            num_moments: int = 256,
+            num_random: Optional[int] = 8,
+            g_s: Union[float, int] = 2.0,
+            kernel: str = "jackson",
+            seed: Optional[int] = None,
+            ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the DC conductivity as a function of the chemical potential with the Kubo-Bastin formula.
+
+        The units follow ACAccessor: the velocities are dH/dk in eV*Angstrom and the result is
+        normalized by the cell volume and multiplied by the spin degeneracy g_s.
+
+        Args:
+            erange: the chemical potential window w.r.t. the Fermi level (0 if not set).
+            npts: the number of chemical potentials.
+            direction: the tensor element, e.g. 'xx' or 'xy'.
+            temperature: the temperature (K) of the Fermi-Dirac occupations.
+            num_moments: the number of Chebyshev moments in each dimension.
+            num_random: the number of random phase vectors, None for the exact trace (small systems only).
+
+        Returns:
+            (chemical potentials, conductivity)
+        """
+        engine = self.build()
+        moments = self._correlation_moments(direction, num_moments, num_random, seed)
+        efermi = 0.0 if self._system._efermi is None else self._system._efermi
+        mu = np.linspace(erange[0] + efermi, erange[1] + efermi, npts)
+        sigma = engine.kubo_bastin(moments, mu, temperature=temperature, kernel=kernel)
+        return mu, sigma * 2 * g_s / self._volume()
+
+    def compute_optical(
+            self,
+            omegas: Union[np.ndarray, List[float]],
+            direction: str = 'xx',
+            temperature: float = 300.0,
+            num_moments: int = 256,
+            num_random: Optional[int] = 8,
+            g_s: Union[float, int] = 2.0,
+            kernel: str = "jackson",
+            seed: Optional[int] = None,
+            ) -> np.ndarray:
+        """
+        Compute the real (absorptive) optical conductivity with the Kubo-Greenwood formula.
+
+        The result matches the real part of ACAccessor.compute at the Gamma point, with the
+        broadening given by the kernel resolution instead of eta. The Fermi level must be set.
+
+        Returns:
+            the conductivity at each frequency.
+        """
+        engine = self.build()
+        moments = self._correlation_moments(direction, num_moments, num_random, seed)
+        sigma = engine.kubo_greenwood(moments, np.asarray(omegas), self._system.efermi, temperature=temperature, kernel=kernel)
+        return sigma * 2 * np.pi * g_s / self._volume()
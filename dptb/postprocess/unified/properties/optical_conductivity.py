@@ -3,6 +3,7 @@ import numpy as np
 import logging
 from typing import Optional, Union, List
 from dptb.postprocess.unified.utils import calculate_fermi_level
+from dptb.nn.energy import parallel_eigh
 
 from dptb.data import AtomicDataDict
 
@@ -53,8 +54,11 @@ class ACAccessor:
         
         # K-Point Sampling
         from dptb.utils.make_kpoints import kmesh_sampling
-        kpoints = kmesh_sampling(kmesh, is_gamma_center=True)
-        weights = torch.ones(kpoints.shape[0]) / kpoints.shape[0]
+        # only one k-point of each ±k pair is solved, with the weight of the pair.
+        kset = self._system.get_kset(kmesh_sampling(kmesh, is_gamma_center=True))
+        kpoints = kset.irreducible_kpoints
+        weights = torch.as_tensor(kset.weights)
+        closed = torch.as_tensor(kset.closed)
         
         batch_size = 200 # Smaller batch due to dense matrices
         nk_total = kpoints.shape[0]
@@ -64,6 +68,7 @@ class ACAccessor:
         omegas_t = torch.as_tensor(omegas, device=device, dtype=torch.float64)
         
         data_template = self._system._atomic_data.copy()
+        num_workers = getattr(self._system.calculator, 'num_workers', 1)
         
         # Calculate Volume from cell
         cell = data_template[AtomicDataDict.CELL_KEY]
@@ -93,7 +98,10 @@ class ACAccessor:
                 
             # 3. Solve Eigenvalues
             # If Overlap, solve generalized: H c = E S c.
-            if self.overlap:
+            if num_workers > 1:
+                # the k-points of the batch are split over a pool of threads.
+                eigs, vecs = parallel_eigh(Hk, Sk if self.overlap else None, num_workers=num_workers)
+            elif self.overlap:
                 try:
                     # Cholesky decomposition of S
                     L = torch.linalg.cholesky(Sk)
@@ -161,6 +169,9 @@ class ACAccessor:
             
             T_nm = M_nm * f_mn / E_mn_safe
             T_nm[mask_deg] = 0.0 
+            # T_nm(-k) = T_nm(k)*, so the sum over a ±k pair is its real part times the weight of the pair.
+            c_batch = closed[i_start:i_end].to(device)
+            T_nm[c_batch] = T_nm[c_batch].real.type_as(T_nm)
             
             # Use selected method
             # Flatten for efficiency (common prep)
@@ -12,9 +12,10 @@ from dptb.nn.build import build_model
 from dptb.postprocess.unified.properties.band import BandAccessor
 from dptb.postprocess.unified.properties.dos import DosAccessor
 from dptb.postprocess.unified.properties.optical_conductivity import ACAccessor
+from dptb.postprocess.unified.properties.kpm import KPMAccessor
 from dptb.utils.constants import atomic_num_dict_r
 from dptb.postprocess.unified.utils import calculate_fermi_level
-from dptb.utils.make_kpoints import kmesh_sampling
+from dptb.utils.make_kpoints import kmesh_sampling, TimeReversalKSet
 from dptb.postprocess.unified.properties.export import ExportAccessor
 
 log = logging.getLogger(__name__)
@@ -33,16 +34,17 @@ class TBSystem:
                  data: Union[AtomicData, ase.Atoms, str],
                  calculator: Union[HamiltonianCalculator, torch.nn.Module, str],
                  override_overlap: Optional[str] = None,
-                 device: Optional[Union[str, torch.device]]= torch.device("cpu")
+                 device: Optional[Union[str, torch.device]]= torch.device("cpu"),
+                 num_workers: Optional[int] = None
                  ):
         # Initialize Calculator/Model
         if isinstance(calculator, str):
             # Load from checkpoint path
             log.info(f"Loading model from checkpoint: {calculator}")
             _model = build_model(checkpoint=calculator, common_options={'device': device})
-            self._calculator = DeePTBAdapter(_model,override_overlap)
+            self._calculator = DeePTBAdapter(_model,override_overlap,num_workers=num_workers)
         elif isinstance(calculator, torch.nn.Module):
-            self._calculator = DeePTBAdapter(calculator,override_overlap)
+            self._calculator = DeePTBAdapter(calculator,override_overlap,num_workers=num_workers)
         elif isinstance(calculator, HamiltonianCalculator) or hasattr(calculator, 'get_eigenvalues'):
             # Allow objects that look like the protocol
             self._calculator = calculator
@@ -53,6 +55,7 @@ class TBSystem:
         self._bands = None
         self._dos = None
         self._export = None
+        self._kpm = None
         self._total_electrons = None
         self._efermi = None
         self.has_bands = False
@@ -88,6 +91,18 @@ class TBSystem:
     def atomic_symbols(self):
         return self._atomic_symbols
 
+    @property
+    def soc(self) -> bool:
+        # SOC detection: the models with soc have 'soc_param'
+        return hasattr(self.model, 'soc_param')
+
+    def get_kset(self, kpoints: np.ndarray, weights: Optional[np.ndarray] = None) -> TimeReversalKSet:
+        """
+        The ±k pairs of ``kpoints``, whose sums over the k-points only need the representatives, with the weights
+        of the pairs. Without time-reversal symmetry, i.e. with soc, every k-point is its own representative.
+        """
+        return TimeReversalKSet(kpoints, weights=weights, time_reversal=not self.soc)
+
     @property
     def total_electrons(self):
         if self._total_electrons is None:
@@ -140,6 +155,12 @@ class TBSystem:
             self._optical_conductivity = ACAccessor(self)
         return self._optical_conductivity
 
+    @property
+    def kpm(self) -> 'KPMAccessor':
+        """Access the linear scaling KPM DOS and conductivity of large cells (Lazy initialization)."""
+        if self._kpm is None:
+            self._kpm = KPMAccessor(self)
+        return self._kpm
 
     def set_atoms(self,struct: Optional[Union[AtomicData, ase.Atoms, str]] = None, override_overlap: Optional[str] = None) -> AtomicDataDict:
         """Set the atomic structure."""
@@ -149,6 +170,8 @@ class TBSystem:
         # Reset state flags
         self.has_bands=False
         self.has_dos=False
+        # the sparse Hamiltonian of the KPM accessor belongs to the previous structure.
+        self._kpm = None
         
         atomic_options = self._calculator.cutoffs        
         if isinstance(struct, str):
@@ -233,9 +256,9 @@ class TBSystem:
                          smearing_method: str = 'FD',
                          q_tol: float = 1e-5,
                          **kwargs):
-        # get efermi from scratch.
-        kpoints = kmesh_sampling(kmesh, is_gamma_center=is_gamma_center)
-        k_tensor = torch.as_tensor(kpoints, 
+        # get efermi from scratch, on one k-point of each ±k pair with the weight of the pair.
+        kset = self.get_kset(kmesh_sampling(kmesh, is_gamma_center=is_gamma_center))
+        k_tensor = torch.as_tensor(kset.irreducible_kpoints, 
                                    dtype=self.calculator.dtype, 
                                    device=self.calculator.device)
         data = self._atomic_data.copy()             
@@ -244,6 +267,7 @@ class TBSystem:
 
         calculated_efermi = self.estimate_efermi_e(
                         eigenvalues=eigs.detach().numpy(),
+                        k_weights=kset.weights,
                         temperature = temperature,
                         smearing_method=smearing_method,
                         q_tol  = q_tol, **kwargs)
@@ -270,7 +294,7 @@ class TBSystem:
         temperature : float
             Smearing temperature in Kelvin.
         smearing_method : str
-            'FD' or 'Gaussian'.
+            'FD', 'Gaussian', 'MP' or 'cold'.
         q_tol : float
             Charge convergence tolerance.
 
@@ -280,8 +304,7 @@ class TBSystem:
             Fermi Energy (eV).
         """      
                     
-        # SOC detection: if model has 'soc_param', spindeg=1, else 2
-        spindeg = 1 if hasattr(self.model, 'soc_param') else 2
+        spindeg = 1 if self.soc else 2
         
         return calculate_fermi_level(
             eigenvalues=eigenvalues,
@@ -26,11 +26,43 @@ def gaussian_smearing(E, sigma=0.025852, mu=0.0):
     x = (mu - E) / sigma
     return 0.5 * erfc(-1 * x)
 
+# the half width, in units of the smearing width, beyond which the occupations of a smearing function are 0 or 1 to
+# double precision.
+SMEARING_CUTOFF = {'FD': 40.0, 'Gaussian': 7.0, 'MP': 7.0, 'cold': 8.0}
+
+def smearing_occupation(x, smearing_method='FD'):
+    """
+    The occupations of the states at x = (E - mu) / sigma and their derivatives -d occupation / dx.
+
+    The methods are 'FD' (Fermi-Dirac), 'Gaussian', 'MP' (first order Methfessel-Paxton) and 'cold' (Marzari-Vanderbilt).
+    The derivative divided by sigma is the contribution of the state to dN/dmu.
+    """
+    from scipy.special import erfc, expit
+    if smearing_method == 'FD':
+        occupation = expit(-x)
+        return occupation, occupation * expit(x)
+    gauss = np.exp(-x ** 2) / np.sqrt(np.pi)
+    if smearing_method == 'Gaussian':
+        return 0.5 * erfc(x), gauss
+    elif smearing_method == 'MP':
+        return 0.5 * erfc(x) - 0.5 * x * gauss, gauss * (1.5 - x ** 2)
+    elif smearing_method == 'cold':
+        xp = x + 1.0 / np.sqrt(2.0)
+        gauss = np.exp(-xp ** 2) / np.sqrt(np.pi)
+        return 0.5 * erfc(xp) + gauss / np.sqrt(2.0), gauss * (2.0 + np.sqrt(2.0) * x)
+    else:
+        raise ValueError(f'Unknown smearing method: {smearing_method}')
+
 def calculate_fermi_level(eigenvalues: np.ndarray, total_electrons: float, spindeg: int = 2,
                           weights: np.ndarray = None, q_tol: float = 1e-10,
                           smearing_method: str = 'FD', temperature: float = 300):
     """
-    Calculates the Fermi energy using iteration algorithm (Bisection method).
+    Calculates the Fermi energy by safeguarded Newton iterations on the electron count.
+
+    The states are sorted once. The Fermi level is bracketed around the state where the cumulative weight of the
+    spectrum crosses the number of electrons, and each iteration evaluates only the states within the cutoff of the
+    smearing function around the current guess, the states below being fully occupied. The Newton steps use the
+    analytic dN/dmu, and fall back to bisection when they leave the bracket.
 
     Parameters
     ----------
@@ -41,90 +73,86 @@ def calculate_fermi_level(eigenvalues: np.ndarray, total_electrons: float, spind
     spindeg : int, optional
         Spin degeneracy factor (typically 2 for spin-degenerate systems, 1 for SOC/spin-polarized). Default is 2.
     weights : np.ndarray, optional
-        Weights assigned to each k-point. If None, equal weights are assumed.
+        Weights assigned to each k-point, or to each state. If None, equal weights are assumed.
     q_tol : float, optional
         Tolerance level for charge convergence. Default is 1e-10.
     smearing_method : str, optional
-        Smearing method: 'FD' (Fermi-Dirac) or 'Gaussian'. Default is 'FD'.
+        Smearing method: 'FD' (Fermi-Dirac), 'Gaussian', 'MP' (Methfessel-Paxton) or 'cold'. Default is 'FD'.
     temperature : float, optional
-        Temperature in Kelvin for smearing. Default is 300 K.
+        Temperature in Kelvin for smearing, kT is the smearing width. Default is 300 K.
 
     Returns
     -------
     float
         The calculated Fermi energy (Ef).
     """
+    if smearing_method not in SMEARING_CUTOFF:
+        raise ValueError(f'Unknown smearing method: {smearing_method}')
 
-    nextafter = np.nextafter
-    
     # Adjust total electrons for spin degeneracy
     target_electrons = total_electrons / spindeg
-    
-    log.info(f"Calculating Fermi energy. Target electrons per spin channel: {target_electrons}")
-
-    # calculate boundaries
-    min_Ef, max_Ef = eigenvalues.min(), eigenvalues.max()
-    kT = Boltzmann / eV2J * temperature
-    
-    # Expand search range to ensure Ef is within bounds even if it's in the band gap
-    drange = kT * np.sqrt(-np.log(q_tol * 1e-2))
-    min_Ef = min_Ef - drange
-    max_Ef = max_Ef + drange
 
-    Ef = (min_Ef + max_Ef) * 0.5
+    log.info(f"Calculating Fermi energy. Target electrons per spin channel: {target_electrons}")
 
+    eigenvalues = np.asarray(eigenvalues, dtype=np.float64)
     if weights is None:
-        # Assuming flattened eigenvalues or handled by broadcasting if logic allows, 
-        # but typically weights correspond to K-points.
-        # If eigenvalues is (Nk, Nb), weights should be (Nk,).
-        # We need to broadcast weights to (Nk, Nb) or flatten everything.
-        
-        # Let's handle generic shaping: flatten everything for summation
+        # equal weights for the k-points of the 1st dimension.
         weights = np.ones(eigenvalues.shape[0]) / eigenvalues.shape[0]
-        # log.info('Weights not provided, using equal weights for 1st dimension (ktools).')
-
-    # Ensure weights match eigenvalues shape for broadcasting
+    weights = np.asarray(weights, dtype=np.float64)
     # If eigenvalues is (Nk, Nb) and weights is (Nk,), reshape weights to (Nk, 1)
-    if eigenvalues.ndim == 2 and weights.ndim == 1:
-        if eigenvalues.shape[0] == weights.shape[0]:
-            weights = weights.reshape(-1, 1)
-    
-    icounter = 0
-    # Use a safe max iteration count to prevent infinite loops in pathological cases
-    MAX_ITER = 200 
-    
-    while icounter < MAX_ITER:
-        icounter += 1
-        
-        # Determine smearing width parameter
-        sigma_val = kT # For FD, it's kT. For Gaussian, passing kT as sigma is common convention here.
-        
-        if smearing_method == 'FD':
-            occupation = fermi_dirac_smearing(eigenvalues, kT=sigma_val, mu=Ef)
-        elif smearing_method == 'Gaussian':
-            occupation = gaussian_smearing(eigenvalues, sigma=sigma_val, mu=Ef)
-        else:
-            raise ValueError(f'Unknown smearing method: {smearing_method}')
+    if eigenvalues.ndim == 2 and weights.ndim == 1 and eigenvalues.shape[0] == weights.shape[0]:
+        weights = weights.reshape(-1, 1)
+    weights = np.broadcast_to(weights, eigenvalues.shape).ravel()
+
+    order = np.argsort(eigenvalues, axis=None, kind='stable')
+    energies, weights = eigenvalues.ravel()[order], weights[order]
+    # the electrons in the states up to each state, at zero temperature.
+    filled = np.cumsum(weights)
 
-        # q_cal is weighted sum of occupation
-        # weights broadcasted against occupation
-        q_cal = (weights * occupation).sum()
+    sigma = Boltzmann / eV2J * temperature
+    cutoff = SMEARING_CUTOFF[smearing_method] * sigma
 
-        if abs(q_cal - target_electrons) < q_tol:
+    def charge_error(mu):
+        lo, hi = np.searchsorted(energies, [mu - cutoff, mu + cutoff])
+        occupation, delta = smearing_occupation((energies[lo:hi] - mu) / sigma, smearing_method)
+        below = filled[lo - 1] if lo > 0 else 0.0
+        return below + weights[lo:hi] @ occupation - target_electrons, weights[lo:hi] @ delta / sigma
+
+    # the Fermi level at zero temperature is between the state crossing the electron count and the next one. the
+    # states up to a cutoff below the lower bound hold less electrons than the target, and the states up to a cutoff
+    # above the upper bound more.
+    icross = min(np.searchsorted(filled, target_electrons - q_tol), energies.size - 1)
+    inext = min(icross + 1, energies.size - 1)
+    min_Ef, max_Ef = energies[icross] - cutoff, energies[inext] + cutoff
+    q_min, _ = charge_error(min_Ef)
+    q_max, _ = charge_error(max_Ef)
+    # the Methfessel-Paxton and cold occupations are not monotonic, widen the bracket if it misses the root.
+    while q_min > 0 and min_Ef > energies[0] - 2 * cutoff:
+        min_Ef -= cutoff
+        q_min, _ = charge_error(min_Ef)
+    while q_max < 0 and max_Ef < energies[-1] + 2 * cutoff:
+        max_Ef += cutoff
+        q_max, _ = charge_error(max_Ef)
+
+    Ef = 0.5 * (energies[icross] + energies[inext])
+    MAX_ITER = 100
+    for icounter in range(1, MAX_ITER + 1):
+        q_err, dq = charge_error(Ef)
+        if abs(q_err) < q_tol:
             log.info(f'Fermi energy converged after {icounter} iterations. Ef = {Ef:.6f} eV')
             return Ef
-        
-        # Check convergence limit of bisection interval
-        if nextafter(min_Ef, max_Ef) >= max_Ef:
-             break
 
-        if q_cal >= target_electrons:
+        if q_err > 0:
             max_Ef = Ef
         else:
             min_Ef = Ef
-        Ef = (min_Ef + max_Ef) * 0.5
+        if np.nextafter(min_Ef, max_Ef) >= max_Ef:
+            break
+
+        Ef_newton = Ef - q_err / dq if dq > 0 else np.nan
+        Ef = Ef_newton if min_Ef < Ef_newton < max_Ef else 0.5 * (min_Ef + max_Ef)
+
+    log.warning(f'Fermi level search did not converge under tolerance {q_tol} after {icounter} iterations.')
+    log.info(f'q_cal: {(q_err + target_electrons) * spindeg}, total_nel: {total_electrons}, diff: {abs(q_err) * spindeg}')
 
-    log.warning(f'Fermi level bisection did not converge under tolerance {q_tol} after {icounter} iterations.')
-    log.info(f'q_cal: {q_cal * spindeg}, total_nel: {total_electrons}, diff: {abs(q_cal - target_electrons) * spindeg}')
-    
     return Ef
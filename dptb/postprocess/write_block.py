@@ -1,4 +1,6 @@
 import numpy as np
+import scipy.sparse as sp
+import h5py
 from dptb.utils.tools import j_must_have
 from ase.io import read
 import ase
@@ -9,31 +11,46 @@ from typing import Optional
 import matplotlib
 import logging
 from dptb.data import AtomicData, AtomicDataDict
+from dptb.data.AtomicData import _NODE_FIELDS, _EDGE_FIELDS, _ENV_FIELDS, _ONSITENV_FIELDS
 from dptb.data.interfaces.ham_to_feature import feature_to_block
+from dptb.data.dataset._hdf5_dataset import PackedBlockWriter
+from dptb.utils.constants import anglrMId
+import re
 
 log = logging.getLogger(__name__)
 
+# the index key of each graph of AtomicData, and the fields along its edges.
+_GRAPHS = [
+    (AtomicDataDict.EDGE_INDEX_KEY, _EDGE_FIELDS),
+    (AtomicDataDict.ENV_INDEX_KEY, _ENV_FIELDS),
+    (AtomicDataDict.ONSITENV_INDEX_KEY, _ONSITENV_FIELDS),
+]
+
+def _to_atomic_data(data: Union[AtomicData, ase.Atoms, str], AtomicData_options: dict={}) -> AtomicData:
+    if isinstance(data, str):
+        structase = read(data)
+        data = AtomicData.from_ase(structase, **AtomicData_options)
+    elif isinstance(data, ase.Atoms):
+        structase = data
+        data = AtomicData.from_ase(structase, **AtomicData_options)
+    elif isinstance(data, AtomicData):
+        data = data
+
+    return data
+
 def write_block(
-        data: Union[AtomicData, ase.Atoms, str], 
+        data: Union[AtomicData, ase.Atoms, str],
         model: torch.nn.Module,
         AtomicData_options: dict={},
         device: Union[str, torch.device]=None
         ):
-    
+
     model.eval()
     if isinstance(device, str):
         device = torch.device(device)
     # get the AtomicData structure and the ase structure
-    if isinstance(data, str):
-        structase = read(data)
-        data = AtomicData.from_ase(structase, **AtomicData_options)
-    elif isinstance(data, ase.Atoms):
-        structase = data
-        data = AtomicData.from_ase(structase, **AtomicData_options)
-    elif isinstance(data, AtomicData):
-        structase = data.to("cpu").to_ase()
-        data = data
-    
+    data = _to_atomic_data(data, AtomicData_options)
+
     data = AtomicData.to_AtomicDataDict(data.to(device))
     with torch.no_grad():
         data = model.idp(data)
@@ -44,6 +61,227 @@ def write_block(
 
     return block
 
+def _message_passing_layers(embedding: torch.nn.Module, method: str) -> int:
+    """The number of message passing layers of a built embedding module."""
+    if isinstance(getattr(embedding, "layers", None), torch.nn.ModuleList):
+        return len(embedding.layers)
+    elif method == "deeph-e3":
+        return len(embedding.net.node_update_blocks)
+    elif method == "se2":
+        # a single descriptor of the environment of each atom.
+        return 1
+    elif method == "none":
+        return 0
+    else:
+        raise ValueError(f"The number of message passing layers of the {method} embedding is unknown, "
+                         "the receptive field of the model can not be determined.")
+
+def receptive_hops(model: torch.nn.Module) -> int:
+    """The number of graph hops around an atom that affect its onsite block and the blocks of its bonds.
+
+    An edge block depends on the states of its two atoms, which see one more hop per message passing layer.
+    """
+    if model.name == "nnenv":
+        return _message_passing_layers(model.embedding, model.model_options["embedding"]["method"]) + 1
+    elif model.name == "mix":
+        return max(receptive_hops(model.nnenv), 1)
+    else:
+        # the sk models only look at the bond itself, and at the onsite environment for the onsite blocks.
+        return 1
+
+def _spatial_order(data: AtomicDataDict.Type, chunk_atoms: int) -> np.ndarray:
+    # sort the atoms in columns of a grid, so that consecutive atoms are close and the halos stay small.
+    pos = data[AtomicDataDict.POSITIONS_KEY].cpu().numpy()
+    cell = data.get(AtomicDataDict.CELL_KEY)
+    if cell is not None and abs(np.linalg.det(cell.reshape(3, 3).cpu().numpy())) > 1e-6:
+        frac = np.linalg.solve(cell.reshape(3, 3).cpu().numpy().T, pos.T).T % 1.0
+    else:
+        frac = (pos - pos.min(axis=0)) / np.maximum(np.ptp(pos, axis=0), 1e-6)
+    nbins = max(1, int(round((len(pos) / chunk_atoms) ** (1 / 3))))
+    bins = np.minimum((frac * nbins).astype(int), nbins - 1)
+    return np.lexsort((frac[:, 2], bins[:, 1], bins[:, 0]))
+
+def _subgraph(data: AtomicDataDict.Type, nodes: np.ndarray):
+    """The AtomicDataDict restricted to the atoms in the mask ``nodes`` and the edges between them."""
+    node_index = torch.from_numpy(np.flatnonzero(nodes))
+    remap = torch.full((len(nodes),), -1, dtype=torch.long)
+    remap[node_index] = torch.arange(len(node_index))
+    nodes = torch.from_numpy(nodes)
+
+    graph_fields = set.union(*[set(fields) | {key} for key, fields in _GRAPHS])
+    sub = {key: value[node_index] if key in _NODE_FIELDS else value for key, value in data.items() if key not in graph_fields}
+    kept = {}
+    for index_key, fields in _GRAPHS:
+        if index_key not in data:
+            continue
+        index = data[index_key]
+        keep = nodes[index[0]] & nodes[index[1]]
+        sub[index_key] = remap[index[:, keep]]
+        for key in fields:
+            if key in data:
+                sub[key] = data[key][keep]
+        kept[index_key] = keep
+
+    return sub, node_index, kept
+
+def _full_basis_blocks(features: torch.Tensor, idp, onsite: bool) -> torch.Tensor:
+    """The [N, full_basis_norb, full_basis_norb] blocks of the features as built by `feature_to_block`.
+
+    The onsite blocks are symmetric, while the hopping blocks keep the upper triangle in the orbital type
+    index, with the orbital type diagonal halved.
+    """
+    blocks = torch.zeros((len(features), idp.full_basis_norb, idp.full_basis_norb), dtype=features.dtype, device=features.device)
+    ist = 0
+    for i, iorb in enumerate(idp.full_basis):
+        li = anglrMId[re.findall(r"[a-zA-Z]+", iorb)[0]]
+        jst = ist
+        for jorb in idp.full_basis[i:]:
+            lj = anglrMId[re.findall(r"[a-zA-Z]+", jorb)[0]]
+            block = features[:, idp.orbpair_maps[iorb + "-" + jorb]].reshape(-1, 2*li+1, 2*lj+1)
+            if onsite:
+                blocks[:, ist:ist+2*li+1, jst:jst+2*lj+1] = block
+                if iorb != jorb:
+                    blocks[:, jst:jst+2*lj+1, ist:ist+2*li+1] = block.transpose(1, 2)
+            else:
+                blocks[:, ist:ist+2*li+1, jst:jst+2*lj+1] = 0.5 * block if iorb == jorb else block
+            jst += 2*lj+1
+        ist += 2*li+1
+    return blocks
+
+def _fold_edges(index: np.ndarray, shift: np.ndarray):
+    """The block key (i, j, R) with i <= j of each edge, and whether the edge block is transposed into it.
+
+    The rule follows `feature_to_block`: the edges (j, i, -R) with j > i go to (i, j, R), and of the two
+    self image edges (i, i, R) and (i, i, -R), the first one gives the key.
+    """
+    i, j = index
+    keys = np.concatenate([np.minimum(i, j)[:, None], np.maximum(i, j)[:, None], np.where((i > j)[:, None], -shift, shift)], axis=1)
+    transpose = i > j
+
+    onsite = np.flatnonzero(i == j)
+    if len(onsite) > 0:
+        r = shift[onsite]
+        # the image pair (R, -R) is labelled by its lexicographically larger member.
+        flip = _lexless(r, -r)
+        label = np.concatenate([i[onsite][:, None], np.where(flip[:, None], -r, r)], axis=1)
+        _, first, inverse = np.unique(label, axis=0, return_index=True, return_inverse=True)
+        r_first = r[first[inverse.reshape(-1)]]
+        keys[onsite, 2:] = r_first
+        transpose[onsite] = np.any(r != r_first, axis=1)
+
+    return keys, transpose
+
+def _lexless(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # row-wise lexicographic a < b
+    diff = a != b
+    first = np.argmax(diff, axis=1)
+    rows = np.arange(len(a))
+    return diff.any(axis=1) & (a[rows, first] < b[rows, first])
+
+def _crop_blocks(blocks: torch.Tensor, types_i: torch.Tensor, types_j: torch.Tensor, idp):
+    """Crop the full basis blocks to the orbitals of their atom types, grouped by the pair of types.
+
+    Returns the order of the blocks in the groups, their shapes and their flattened values.
+    """
+    pairs = torch.stack([types_i, types_j], dim=1)
+    order, values = [], []
+    for ti, tj in torch.unique(pairs, dim=0).tolist():
+        sel = torch.nonzero((pairs[:, 0] == ti) & (pairs[:, 1] == tj)).flatten()
+        order.append(sel)
+        values.append(blocks[sel][:, idp.mask_to_basis[ti]][:, :, idp.mask_to_basis[tj]].reshape(-1))
+    order = torch.cat(order) if len(order) > 0 else torch.zeros(0, dtype=torch.long)
+    values = torch.cat(values) if len(values) > 0 else blocks.new_zeros(0)
+    shapes = torch.stack([idp.atom_norb[types_i[order]], idp.atom_norb[types_j[order]]], dim=1)
+    return order, shapes, values
+
+def write_block_stream(
+        data: Union[AtomicData, ase.Atoms, str],
+        model: torch.nn.Module,
+        path: str,
+        AtomicData_options: dict={},
+        device: Union[str, torch.device]=None,
+        chunk_atoms: int=2048,
+        halo_hops: Optional[int]=None,
+        compression: Optional[str]="gzip",
+        compression_opts: int=4,
+        ):
+    """Write the Hamiltonian blocks of a large structure to ``path`` in chunks of atoms.
+
+    The atoms are split into spatially compact chunks, and the model runs on the subgraph of each chunk
+    plus a halo of ``halo_hops`` graph hops (by default `receptive_hops` of the model), so that the blocks
+    are the same as the ones of `write_block`. A smaller halo changes the blocks near the chunk boundaries. Each chunk writes the onsite blocks of its atoms and the
+    blocks of the bonds (i, j) with min(i, j) in the chunk to the group ``0`` of ``path``, in the packed
+    layout read by `unpack_blocks`, without building the dict of all the blocks.
+    """
+    model.eval()
+    if isinstance(device, str):
+        device = torch.device(device)
+    data = AtomicData.to_AtomicDataDict(_to_atomic_data(data, AtomicData_options).to("cpu"))
+    idp = model.idp
+    idp.get_orbpair_maps()
+    with torch.no_grad():
+        data = idp(data)
+
+    natoms = data[AtomicDataDict.POSITIONS_KEY].shape[0]
+    hops = receptive_hops(model)
+    if halo_hops is not None:
+        if halo_hops < hops:
+            log.warning(f"The halo of {halo_hops} hops is smaller than the receptive field of the model, {hops} hops. "
+                        "The blocks near the chunk boundaries will differ from the ones of write_block.")
+        hops = halo_hops
+    # the atoms linked by the edges of any graph, whose states may propagate to each other.
+    rows = np.concatenate([data[key].numpy() for key, _ in _GRAPHS if key in data], axis=1)
+    adj = sp.coo_matrix((np.ones(rows.shape[1]), (rows[0], rows[1])), shape=(natoms, natoms)).tocsr()
+    adj = (adj + adj.T).tocsr()
+
+    order = _spatial_order(data, chunk_atoms)
+    chunk_of_atom = np.empty(natoms, dtype=int)
+    chunk_of_atom[order] = np.arange(natoms) // chunk_atoms
+    edge_index = data[AtomicDataDict.EDGE_INDEX_KEY].numpy()
+    edge_chunk = chunk_of_atom[np.minimum(edge_index[0], edge_index[1])]
+
+    with h5py.File(path, "w") as fid:
+        writer = None
+        for start in range(0, natoms, chunk_atoms):
+            ichunk = start // chunk_atoms
+            atoms = order[start:start+chunk_atoms]
+            nodes = np.zeros(natoms, dtype=bool)
+            nodes[atoms] = True
+            for _ in range(hops):
+                nodes |= adj @ nodes.astype(np.float64) > 0
+
+            sub, node_index, kept = _subgraph(data, nodes)
+            log.debug(f"chunk {ichunk}: {len(atoms)} atoms with a halo of {len(node_index) - len(atoms)} atoms.")
+            sub = {key: value.to(device) if isinstance(value, torch.Tensor) else value for key, value in sub.items()}
+            with torch.no_grad():
+                sub = model(sub)
+                atom_types = data[AtomicDataDict.ATOM_TYPE_KEY].flatten()
+
+                # the onsite blocks of the atoms of the chunk
+                local = torch.searchsorted(node_index, torch.from_numpy(np.sort(atoms)))
+                onsite = _full_basis_blocks(sub[AtomicDataDict.NODE_FEATURES_KEY][local.to(device)].cpu(), idp, onsite=True)
+                onsite_atoms = node_index[local]
+                onsite_keys = np.concatenate([np.stack([onsite_atoms.numpy()]*2, axis=1), np.zeros((len(local), 3), dtype=int)], axis=1)
+                onsite_order, onsite_shapes, onsite_values = _crop_blocks(onsite, atom_types[onsite_atoms], atom_types[onsite_atoms], idp)
 
+                # the blocks of the bonds owned by the chunk, folded to i <= j
+                owned = torch.from_numpy(np.flatnonzero(edge_chunk[kept[AtomicDataDict.EDGE_INDEX_KEY].numpy()] == ichunk))
+                index = node_index[sub[AtomicDataDict.EDGE_INDEX_KEY][:, owned.to(device)].cpu()].numpy()
+                shift = sub[AtomicDataDict.EDGE_CELL_SHIFT_KEY][owned.to(device)].cpu().numpy().round().astype(int)
+                keys, transpose = _fold_edges(index, shift)
+                hopping = _full_basis_blocks(sub[AtomicDataDict.EDGE_FEATURES_KEY][owned.to(device)].cpu(), idp, onsite=False)
+                transpose = torch.from_numpy(transpose)
+                hopping[transpose] = hopping[transpose].transpose(1, 2)
+                keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+                hopping = hopping.new_zeros((len(keys),) + hopping.shape[1:]).index_add_(0, torch.from_numpy(inverse.reshape(-1)), hopping)
+                keys_t = torch.from_numpy(keys)
+                hopping_order, hopping_shapes, hopping_values = _crop_blocks(hopping, atom_types[keys_t[:, 0]], atom_types[keys_t[:, 1]], idp)
 
-    
+            values = torch.cat([onsite_values, hopping_values]).numpy()
+            if writer is None:
+                writer = PackedBlockWriter(fid.create_group("0"), dtype=values.dtype, compression=compression, compression_opts=compression_opts)
+            writer.append(
+                np.concatenate([onsite_keys[onsite_order.numpy()], keys[hopping_order.numpy()]]).astype(np.int32),
+                torch.cat([onsite_shapes, hopping_shapes]).numpy().astype(np.int32),
+                values,
+                )
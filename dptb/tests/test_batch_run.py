@@ -0,0 +1,103 @@
+import os
+from pathlib import Path
+import h5py
+import numpy as np
+import pytest
+import ase.db
+import ase.io
+from ase.build import bulk
+
+from dptb.nn.build import build_model
+from dptb.postprocess.batch_run import BatchRun, collect_structures, is_batch_input, budget_batches
+from dptb.postprocess.write_block import write_block
+from dptb.postprocess.bandstructure.band import Band
+from dptb.data import AtomicData
+from dptb.data.dataset._hdf5_dataset import unpack_blocks
+
+rootdir = os.path.join(Path(os.path.abspath(__file__)).parent, "data")
+options = {"r_max": 2.6, "oer_max": 2.5}
+
+
+@pytest.fixture(scope="module")
+def model():
+    return build_model(checkpoint=f"{rootdir}/silicon_1nn/nnsk.ep500.pth")
+
+
+@pytest.fixture()
+def frames():
+    frames = []
+    for i in range(5):
+        atoms = bulk("Si", "diamond", a=5.43).repeat((1 + i % 2, 1, 1))
+        atoms.rattle(0.05, seed=i)
+        frames.append(atoms)
+    return frames
+
+
+def read_index(path):
+    with h5py.File(path, "r") as f:
+        return [n.decode() for n in f["index/name"][:]], f["index/status"][:], [e.decode() for e in f["index/error"][:]]
+
+
+def test_collect_structures(tmp_path, frames):
+    for i, atoms in enumerate(frames):
+        atoms.write(tmp_path / f"s{i}.vasp", format="vasp")
+    ase.io.write(tmp_path / "traj.extxyz", frames)
+    with ase.db.connect(str(tmp_path / "frames.db")) as db:
+        for atoms in frames:
+            db.write(atoms)
+
+    assert [name for name, _, _ in collect_structures(str(tmp_path / "s*.vasp"))] == [str(tmp_path / f"s{i}.vasp") for i in range(5)]
+    assert collect_structures(str(tmp_path / "traj.extxyz"))[2] == (f"{tmp_path}/traj.extxyz@2", str(tmp_path / "traj.extxyz"), 2)
+    assert [index for _, _, index in collect_structures(str(tmp_path / "frames.db"))] == [1, 2, 3, 4, 5]
+    assert len(collect_structures(str(tmp_path))) == 15
+    assert is_batch_input(str(tmp_path / "traj.extxyz")) and not is_batch_input(str(tmp_path / "s0.vasp"))
+
+
+def test_budget_batches(frames):
+    items = [(i, AtomicData.from_ase(atoms, **options)) for i, atoms in enumerate(frames)]
+    batches = list(budget_batches(items, max_atoms=6))
+    assert [[idx for idx, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+    # a structure larger than the budget runs alone.
+    assert len(list(budget_batches(items, max_atoms=1))) == 5
+    assert len(list(budget_batches(items, max_atoms=100, max_edges=24))) == 3
+
+
+def test_batch_write_block(tmp_path, frames, model):
+    os.mkdir(tmp_path / "structures")
+    for i, atoms in enumerate(frames):
+        atoms.write(tmp_path / "structures" / f"s{i}.vasp", format="vasp")
+    (tmp_path / "structures" / "broken.vasp").write_text("not a structure\n")
+
+    path = BatchRun(model, str(tmp_path), max_atoms=6, num_workers=2).run(
+        str(tmp_path / "structures"), {"task": "write_block"}, AtomicData_options=options)
+    names, status, errors = read_index(path)
+    assert names == ["broken.vasp"] + [f"s{i}.vasp" for i in range(5)]
+    # the broken structure is recorded, and the others are written.
+    assert status.tolist() == [0, 1, 1, 1, 1, 1]
+    assert errors[0] != "" and errors[1:] == [""] * 5
+
+    with h5py.File(path, "r") as f:
+        assert "0" not in f
+        for i, atoms in enumerate(frames):
+            ref = write_block(atoms, model, options)
+            blocks = unpack_blocks(f[str(i + 1)])
+            assert set(ref.keys()) == set(blocks.keys())
+            for key, value in ref.items():
+                assert np.allclose(value.numpy(), blocks[key], atol=1e-6)
+
+
+def test_batch_band(tmp_path, frames, model):
+    ase.io.write(tmp_path / "traj.extxyz", frames)
+    task_options = {"task": "band", "kline_type": "abacus", "kpath": [[0, 0, 0, 10], [0.5, 0, 0, 1]], "klabels": ["G", "X"]}
+
+    path = BatchRun(model, str(tmp_path), max_atoms=100).run(str(tmp_path / "traj.extxyz"), task_options, AtomicData_options=options)
+    names, status, _ = read_index(path)
+    assert status.all() and len(names) == 5
+
+    band = Band(model)
+    with h5py.File(path, "r") as f:
+        for i, atoms in enumerate(frames):
+            ref = band.get_bands(atoms, task_options, AtomicData_options=options)
+            assert np.allclose(f[f"{i}/eigenvalues"][:], ref["eigenvalues"], atol=1e-4)
+            assert np.allclose(f[f"{i}/kpoints"][:], ref["klist"])
+        assert list(f["0"].attrs["labels"]) == ["G", "X"]
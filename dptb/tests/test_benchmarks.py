@@ -0,0 +1,76 @@
+import json
+import pytest
+import torch
+
+from benchmarks.run import main as run_main
+from benchmarks.compare import compare, main as compare_main
+
+
+def results(**medians):
+    benchmarks = {}
+    for name, median in medians.items():
+        if median is None:
+            benchmarks[f"{name}[natoms=8]"] = {"error": "RuntimeError"}
+        elif median == "missing":
+            benchmarks[f"{name}[natoms=8]"] = {"missing": "ImportError"}
+        else:
+            benchmarks[f"{name}[natoms=8]"] = {"median": median, "min": median}
+    return {"machine": {"commit": "0" * 40}, "benchmarks": benchmarks}
+
+
+def test_compare():
+    base = results(a=1.0, b=1.0, c=1.0, d=1.0, e=1.0, g="missing")
+    new = results(a=1.05, b=1.5, c=0.5, d=None, f=1.0, g=1.0)
+    status = {name: row for name, *_, row in compare(base, new, threshold=0.1)}
+    assert status == {
+        "a[natoms=8]": "same",
+        "b[natoms=8]": "slower",
+        "c[natoms=8]": "faster",
+        "d[natoms=8]": "failed",
+        "e[natoms=8]": "removed",
+        "f[natoms=8]": "added",
+        "g[natoms=8]": "missing",
+    }
+
+
+def test_run_and_compare(tmp_path):
+    output = tmp_path / "results.json"
+    num_threads = torch.get_num_threads()
+    try:
+        run_main(["-k", r"^(neighbor_list|collater)\[", "--quick", "--repeat", "2", "--min-time", "0.01", "-o", str(output)])
+    finally:
+        torch.set_num_threads(num_threads)
+    with open(output) as f:
+        data = json.load(f)
+    assert set(data["benchmarks"].keys()) == {"neighbor_list[natoms=8]", "collater[natoms=8]"}
+    for case in data["benchmarks"].values():
+        assert 0 < case["min"] <= case["median"] and case["rounds"] == 2
+    assert data["machine"]["num_threads"] >= 1
+
+    # the same results do not regress, and a doubled time does.
+    assert compare_main([str(output), str(output)]) == 0
+    data["benchmarks"]["collater[natoms=8]"]["median"] *= 2
+    with open(tmp_path / "slower.json", "w") as f:
+        json.dump(data, f)
+    assert compare_main([str(output), str(tmp_path / "slower.json")]) == 1
+
+
+def test_run_missing(tmp_path):
+    # a benchmark of the code missing from the benchmarked revision.
+    from benchmarks.harness import BENCHMARKS, benchmark
+
+    @benchmark(sizes=[8], name="not_in_revision")
+    def not_in_revision(natoms: int):
+        from dptb.nn.energy import not_in_revision
+        return lambda: None
+
+    try:
+        output = tmp_path / "results.json"
+        run_main(["-k", r"^not_in_revision\[", "--repeat", "2", "--min-time", "0.01", "-o", str(output)])
+    finally:
+        BENCHMARKS.pop("not_in_revision")
+    with open(output) as f:
+        data = json.load(f)
+    assert data["benchmarks"]["not_in_revision[natoms=8]"]["missing"].startswith("ImportError")
+    assert data["missing_modules"] == {}
+    assert compare_main([str(output), str(output)]) == 0
@@ -1,6 +1,7 @@
 import os
 import pytest
 import ase
+import ase.io
 from ase import Atoms
 import numpy as np
 from dptb.utils.tools import get_neighbours
@@ -47,6 +48,10 @@ def test_get_neighbours():
     expected_result = {"Cu-Cu": [1.0]}
     assert get_neighbours(atoms, cutoff, thr) == expected_result
 
+    # Test case 5: The distances are the first ones found in the neighbour list, not chained within thr
+    atoms = ase.Atoms("Cu6", positions=[[0, 0, 0], [1.0, 0, 0], [0, 5, 0], [1.0008, 5, 0], [0, 10, 0], [1.0016, 10, 0]])
+    assert get_neighbours(atoms, cutoff=2.0, thr=1e-3) == {"Cu-Cu": [1.0, 1.0016]}
+
 # def test_bond_cmd(root_directory):
 
 def test_bond_empty_structure(root_directory):
@@ -102,3 +107,55 @@ def test_bond_hBN(root_directory):
 
     out = bond(struct, accuracy, cutoff, log_level, log_path)
     assert out == ' Bond Type         1         2         3\n------------------------------------------------\n       N-N      2.50      4.34\n       N-B      1.45      2.89      3.82\n       B-B      2.50      4.34\n'
+
+
+@pytest.fixture(scope='module')
+def hBN_traj(tmp_path_factory):
+    from ase.io.trajectory import Trajectory
+    atoms = ase.io.read(os.path.join(os.path.dirname(__file__), "data/hBN/hBN.vasp")).repeat((3, 3, 1))
+    traj_path = str(tmp_path_factory.mktemp("bond") / "hBN.traj")
+    traj = Trajectory(traj_path, "w")
+    for seed in range(10):
+        frame = atoms.copy()
+        frame.rattle(0.02, seed=seed)
+        traj.write(frame)
+    traj.close()
+    return traj_path
+
+
+def test_bond_length_histogram(hBN_traj):
+    from dptb.utils.bond_analysis import bond_length_histogram, suggest_cutoffs
+
+    histogram = bond_length_histogram(hBN_traj, cutoff=5.0)
+    assert histogram.n_frames == 10
+    # the partial histograms of the workers add up to the serial one.
+    parallel = bond_length_histogram(hBN_traj, cutoff=5.0, num_workers=3)
+    assert parallel.n_frames == 10
+    for pair_id, counts in histogram.counts.items():
+        assert np.array_equal(parallel.counts[pair_id], counts)
+        assert np.allclose(parallel.sums[pair_id], histogram.sums[pair_id])
+    assert bond_length_histogram(hBN_traj, cutoff=5.0, stride=3).n_frames == 4
+
+    shells = histogram.shells()
+    assert [round(shell["distance"], 2) for shell in shells["N-B"]] == [1.45, 2.89, 3.83]
+    # 18 atoms in the supercell, every N has 3 B nearest neighbours.
+    assert [round(shell["count"]) for shell in shells["N-B"]] == [27, 27, 54]
+
+    cutoffs = suggest_cutoffs(shells, nshell=1)
+    assert shells["N-B"][0]["max"] < cutoffs["N-B"]["r_max"] < shells["N-B"][1]["min"]
+    assert shells["N-B"][1]["max"] < cutoffs["N-B"]["er_max"] < shells["N-B"][2]["min"]
+
+
+def test_bond_traj_cmd(hBN_traj):
+    out = bond(hBN_traj, 0.01, 5.0, 1, None, traj=True, num_workers=2)
+    assert "       N-B       1      1.45" in out
+    assert "Suggested cutoffs over 10 frames" in out
+
+
+def test_bn_stast(hBN_traj):
+    from dptb.utils.bond_analysis import bn_stast
+
+    d = bn_stast(hBN_traj, cutoff=3.0, first=True)
+    stast = bn_stast(hBN_traj, cutoff=3.0, nns=[2.0, 3.0])
+    assert len(d) == len(stast[0]) + len(stast[1])
+    assert len(stast[0]) == 10 * 18 * 3
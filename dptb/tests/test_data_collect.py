@@ -1,5 +1,6 @@
 import pytest
 import os
+import json
 
 @pytest.fixture(scope='session', autouse=True)
 def root_directory(request):
@@ -8,15 +9,14 @@ def root_directory(request):
 def test_data_collect(root_directory):
     from dptb.entrypoints.data import data
     INPUT = root_directory + "/dptb/tests/data/collect_config.json"
-
-    # clear possible left-behind output
-    if os.path.exists(root_directory + "/dptb/tests/data/fake_dataset_split/full/"):
-        os.system("rm -r " + root_directory + "/dptb/tests/data/fake_dataset_split/full")
+    manifest = root_directory + "/dptb/tests/data/fake_dataset_split/full.json"
 
     data(INPUT=INPUT, collect=True)
 
-    assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset_split/full/full.0")
-    assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset_split/full/full.1")
-    assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset_split/full/full.2")
+    assert os.path.exists(manifest)
+    assert not os.path.exists(root_directory + "/dptb/tests/data/fake_dataset_split/full")
+    with open(manifest) as f:
+        folders = json.load(f)["folders"]
+    os.remove(manifest)
 
-    os.system("rm -r " + root_directory + "/dptb/tests/data/fake_dataset_split/full")
\ No newline at end of file
+    assert folders == ["set.0/frame.0", "set.0/frame.1", "set.1/frame.0"]
@@ -0,0 +1,92 @@
+import os
+import json
+import pickle
+import shutil
+import pytest
+import lmdb
+
+from dptb.data.build import build_dataset
+from dptb.data.dataset.lmdb_dataset import LMDBDataset
+from dptb.data.manifest import split_dataset, collect_dataset, load_manifest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def root_directory(request):
+    return str(request.config.rootdir)
+
+
+@pytest.fixture
+def fake_dataset(root_directory, tmp_path):
+    dataset_dir = tmp_path / "fake_dataset"
+    shutil.copytree(os.path.join(root_directory, "dptb/tests/data/fake_dataset"), dataset_dir)
+    return str(dataset_dir)
+
+
+def test_split_dataset_seed(fake_dataset):
+    first = split_dataset(fake_dataset, "frame", 0.6, 0.2, 0.2, seed=7, manifest=os.path.join(fake_dataset, "a.json"))
+    second = split_dataset(fake_dataset, "frame", 0.6, 0.2, 0.2, seed=7, manifest=os.path.join(fake_dataset, "b.json"))
+    other = split_dataset(fake_dataset, "frame", 0.6, 0.2, 0.2, seed=8, manifest=os.path.join(fake_dataset, "c.json"))
+    folders = [json.load(open(path))["folders"] for path in [first, second, other]]
+    assert folders[0] == folders[1]
+    assert folders[0] != folders[2]
+
+    root, train, records = load_manifest(first, split="train")
+    assert root == fake_dataset and records is None
+    assert train == [os.path.join(fake_dataset, name) for name in folders[0]["train"]]
+    assert len(load_manifest(first)[1]) == 7
+    with pytest.raises(KeyError):
+        load_manifest(first, split="holdout")
+
+
+@pytest.mark.parametrize("link", ["symlink", "hardlink"])
+def test_split_dataset_link(fake_dataset, link):
+    manifest = split_dataset(fake_dataset, "frame", 0.6, 0.4, link=link)
+    folders = json.load(open(manifest))["folders"]
+    assert set(folders) == {"train", "val"}
+    for split, names in folders.items():
+        assert sorted(os.listdir(os.path.join(fake_dataset, split))) == names
+        target = os.path.join(fake_dataset, split, names[0])
+        assert os.path.islink(target) == (link == "symlink")
+        assert os.path.samefile(os.path.join(target, "fake.data"), os.path.join(fake_dataset, names[0], "fake.data"))
+
+
+def test_collect_dataset_link(root_directory, tmp_path):
+    subfolders = [os.path.join(root_directory, "dptb/tests/data/fake_dataset_split", name)
+                  for name in ["set.0/frame.0", "set.1/frame.0", "set.1"]]
+    manifest = collect_dataset(subfolders, "full", str(tmp_path), link="symlink")
+    assert manifest == os.path.join(str(tmp_path), "full.json")
+    assert sorted(os.listdir(tmp_path / "full")) == ["full.0", "full.1"]
+    assert load_manifest(manifest)[1] == subfolders[:2]
+
+
+def test_build_dataset_from_manifest(root_directory, tmp_path):
+    dataset_dir = os.path.join(root_directory, "dptb/tests/data/test_sktb/dataset")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(f"# split folder\ntrain {dataset_dir}/kpath_spk.0\nval {dataset_dir}/kpathmd25.0\n")
+    options = {"r_max": 5.0, "er_max": 5.0, "oer_max": 2.5, "get_eigenvalues": True, "basis": {"Si": ["3s", "3p"]}}
+
+    reference = build_dataset(root=dataset_dir, prefix="kpath_spk", **options)
+    dataset = build_dataset(manifest=str(manifest), split="train", **options)
+    assert len(dataset) == len(reference)
+    assert list(dataset.info_files) == [os.path.join(dataset_dir, "kpath_spk.0")]
+    assert (dataset[0].pos == reference[0].pos).all()
+    assert len(build_dataset(manifest=str(manifest), **options).info_files) == 2
+
+
+def test_lmdb_record_split(tmp_path):
+    for name, num in [("data.0", 5), ("data.1", 3)]:
+        env = lmdb.open(str(tmp_path / name), map_size=1 << 20)
+        with env.begin(write=True) as txn:
+            for i in range(num):
+                txn.put(i.to_bytes(length=4, byteorder='big'), pickle.dumps(i))
+        env.close()
+
+    manifest = split_dataset(str(tmp_path), "data", 0.5, 0.5, seed=3, by="record")
+    records = json.load(open(manifest))["records"]
+    assert sorted(sum([ids for split in records.values() for ids in split.values()], [])) == \
+        sorted(list(range(5)) + list(range(3)))
+
+    root, folders, record_ids = load_manifest(manifest, split="train")
+    dataset = LMDBDataset(root=root, info_files={folder: {} for folder in folders}, record_ids=record_ids)
+    assert len(dataset) == 4
+    assert dataset.index_map == sum([record_ids[folder] for folder in folders], [])
@@ -1,5 +1,6 @@
 import pytest
 import os
+import json
 
 @pytest.fixture(scope='session', autouse=True)
 def root_directory(request):
@@ -9,29 +10,18 @@ def root_directory(request):
 def test_data_split(root_directory):
     from dptb.entrypoints.data import data
     INPUT = root_directory + "/dptb/tests/data/split_config.json"
+    manifest = root_directory + "/dptb/tests/data/fake_dataset/manifest.json"
 
     data(INPUT=INPUT, parse=False, split=True)
 
-    assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/train")
-    assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/test")
-    assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/val")
-
-    assert len(os.listdir(root_directory + "/dptb/tests/data/fake_dataset/train")) == 4
-    assert len(os.listdir(root_directory + "/dptb/tests/data/fake_dataset/test")) == 1
-    assert len(os.listdir(root_directory + "/dptb/tests/data/fake_dataset/val")) == 2
-
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/train/frame.1")
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/train/frame.2")
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/train/frame.0")
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/train/frame.5")
-
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/test/frame.4")
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/test/frame.6")
-
-    # assert os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/val/frame.3")
-
-    os.system("rm -r " + root_directory + "/dptb/tests/data/fake_dataset/train")
-    os.system("rm -r " + root_directory + "/dptb/tests/data/fake_dataset/val")
-    os.system("rm -r " + root_directory + "/dptb/tests/data/fake_dataset/test")
-
-
+    # only the manifest is written, the folders are not copied.
+    assert os.path.exists(manifest)
+    assert not os.path.exists(root_directory + "/dptb/tests/data/fake_dataset/train")
+    with open(manifest) as f:
+        folders = json.load(f)["folders"]
+    os.remove(manifest)
+
+    assert len(folders["train"]) == 4
+    assert len(folders["test"]) == 1
+    assert len(folders["val"]) == 2
+    assert sorted(sum(folders.values(), [])) == [f"frame.{i}" for i in range(7)]
@@ -4,7 +4,7 @@ import torch
 from pathlib import Path
 from dptb.data import AtomicDataset, DataLoader, AtomicDataDict,AtomicData
 from dptb.data.build import build_dataset
-from dptb.data.dataloader import Collater
+from dptb.data.dataloader import Collater, AtomicDataCollater, benchmark_collaters
 from dptb.utils.torch_geometric.batch import Batch
 from dptb.utils.torch_geometric.data import Data
 from collections.abc import Mapping
@@ -267,4 +267,44 @@ class TestDataLoaderBatch:
 
         #assert torch.all(batch[AtomicDataDict.ONSITENV_INDEX_KEY] == expected_onsiteenv_index)
         #assert torch.all(torch.abs(batch[AtomicDataDict.ONSITENV_LENGTH_KEY] - expected_onsiteenv_length) < 1e-8)
-        #assert torch.all(torch.abs(batch[AtomicDataDict.ONSITENV_VECTORS_KEY] - expected_onsiteenv_vectors) < 1e-8)
\ No newline at end of file
+        #assert torch.all(torch.abs(batch[AtomicDataDict.ONSITENV_VECTORS_KEY] - expected_onsiteenv_vectors) < 1e-8)
+
+def assert_same_batch(ref, batch):
+    assert set(ref.keys) == set(batch.keys)
+    for key in ref.keys:
+        if getattr(ref[key], "is_nested", False):
+            assert all(torch.equal(a, b) for a, b in zip(ref[key].unbind(), batch[key].unbind()))
+        else:
+            assert ref[key].dtype == batch[key].dtype
+            assert torch.equal(ref[key], batch[key])
+    for info in ["__slices__", "__cumsum__", "__cat_dims__", "__num_nodes_list__", "__data_class__", "__num_graphs__"]:
+        assert getattr(ref, info) == getattr(batch, info)
+
+
+def test_atomic_data_collater():
+    dataset = build_dataset(root=f"{rootdir}/test_sktb/dataset", prefix="kpathmd25", get_eigenvalues=True,
+                            r_max=5.0, er_max=5.0, oer_max=2.5, basis={"Si": ["3s", "3p"]})
+    data_list = [dataset[i] for i in range(len(dataset))]
+    collater = AtomicDataCollater()
+    for batch_size in [1, 4]:
+        for i in range(0, len(data_list), batch_size):
+            ref = Collater()(data_list[i:i+batch_size])
+            batch = collater(data_list[i:i+batch_size])
+            assert_same_batch(ref, batch)
+            # the structures are recovered from the batch.
+            for data, example in zip(data_list[i:i+batch_size], batch.to_data_list()):
+                assert torch.equal(data[AtomicDataDict.EDGE_INDEX_KEY], example[AtomicDataDict.EDGE_INDEX_KEY])
+    assert len(collater._rules) == 1
+
+    # a list mixing the structures with and without eigenvalues falls back to the generic collation.
+    data = data_list[0].clone()
+    del data[AtomicDataDict.ENERGY_EIGENVALUE_KEY]
+    assert_same_batch(Collater()([data, data_list[1]]), collater([data, data_list[1]]))
+    assert len(collater._rules) == 2
+
+    loader = DataLoader(dataset, batch_size=4)
+    assert isinstance(loader.collate_fn, AtomicDataCollater)
+    assert not isinstance(DataLoader(dataset, batch_size=4, fast_collate=False).collate_fn, AtomicDataCollater)
+
+    results = benchmark_collaters(data_list, batch_size=5, n_repeat=1)
+    assert results["generic"] > 0 and results["fast"] > 0
@@ -0,0 +1,124 @@
+import os
+import sys
+import subprocess
+
+import pytest
+import torch
+from ase.build import bulk
+
+from dptb.data import AtomicData, AtomicDataDict
+from dptb.entrypoints.export import export
+from dptb.nn.build import build_model
+from dptb.nn.deploy import export_torchscript, graph_inputs
+from dptb.utils.frozen import load_frozen_model, check_inputs
+
+
+@pytest.fixture(scope='session', autouse=True)
+def root_directory(request):
+    return str(request.config.rootdir)
+
+
+# runs the artifact in a process without dptb.nn, and saves its outputs.
+LOAD_SCRIPT = """
+import sys, torch
+from dptb.utils.frozen import load_frozen_model, check_inputs
+module, metadata = load_frozen_model(sys.argv[1])
+data = torch.load(sys.argv[2])
+check_inputs(metadata, data)
+with torch.no_grad():
+    out = module({key: data[key] for key in metadata["input_fields"]})
+torch.save(out, sys.argv[3])
+assert not any(name.startswith("dptb.nn") for name in sys.modules), "dptb.nn is imported"
+"""
+
+
+def silicon(repeat, seed=0):
+    atoms = bulk("Si", "diamond", a=5.43, cubic=True).repeat(repeat)
+    atoms.rattle(0.05, seed=seed)
+    return atoms
+
+
+def graph(atoms, r_max, er_max=None, oer_max=None):
+    return AtomicData.to_AtomicDataDict(AtomicData.from_ase(atoms, r_max=r_max, er_max=er_max, oer_max=oer_max))
+
+
+def eager(model, data):
+    with torch.no_grad():
+        return model(model.idp(graph_inputs(data)))
+
+
+def run_in_subprocess(path, data, tmp_path):
+    inputs, outputs = str(tmp_path / "inputs.pt"), str(tmp_path / "outputs.pt")
+    torch.save(graph_inputs(data), inputs)
+    subprocess.run([sys.executable, "-c", LOAD_SCRIPT, path, inputs, outputs], check=True)
+    return torch.load(outputs)
+
+
+@pytest.fixture
+def e3_model():
+    torch.manual_seed(0)
+    model_options = {
+        "embedding": {
+            "method": "slem",
+            "r_max": {"Si": 5.0},
+            "irreps_hidden": "8x0e+4x1o+4x2e",
+            "n_layers": 1,
+            "avg_num_neighbors": 20,
+            "tp_radial_emb": True,
+        },
+        "prediction": {"method": "e3tb", "neurons": [16]},
+    }
+    common_options = {"basis": {"Si": "1s1p"}, "device": "cpu", "dtype": "float32", "overlap": False, "seed": 0}
+    return build_model(model_options=model_options, common_options=common_options).eval()
+
+
+def test_export_e3_torchscript(e3_model, tmp_path):
+    path = str(tmp_path / "e3.pt")
+    other = graph(silicon(2, seed=1), r_max=5.0)
+    error = export_torchscript(e3_model, graph(silicon(1), r_max=5.0), path, validation_data=[other])
+    assert error < 1e-5
+
+    module, metadata = load_frozen_model(path)
+    assert metadata["model"] == "nnenv"
+    assert metadata["chemical_symbols"] == ["Si"]
+    assert metadata["atomic_numbers"] == [14]
+    assert metadata["output_fields"] == [AtomicDataDict.EDGE_FEATURES_KEY, AtomicDataDict.NODE_FEATURES_KEY]
+    assert metadata["cutoffs"]["r_max"] == {"Si": 5.0}
+
+    ref = eager(e3_model, other)
+    out = run_in_subprocess(path, other, tmp_path)
+    for field in metadata["output_fields"]:
+        assert out[field].shape == ref[field].shape
+        assert torch.allclose(out[field], ref[field], atol=1e-5)
+
+
+def test_export_nnsk_cli(root_directory, tmp_path):
+    ckpt = os.path.join(root_directory, "dptb/tests/data/silicon_1nn/nnsk.ep500.pth")
+    structure = os.path.join(root_directory, "dptb/tests/data/silicon_1nn/silicon.vasp")
+    export(INPUT=None, init_model=ckpt, structure=structure, output=str(tmp_path), format="torchscript")
+    path = str(tmp_path / "nnsk.ep500.torchscript.pt")
+    assert os.path.exists(path)
+
+    module, metadata = load_frozen_model(path)
+    assert metadata["model"] == "nnsk"
+    assert metadata["overlap"] is False
+
+    model = build_model(checkpoint=ckpt)
+    other = graph(silicon(2, seed=2), **metadata["cutoffs"])
+    ref = eager(model, other)
+    out = run_in_subprocess(path, other, tmp_path)
+    for field in metadata["output_fields"]:
+        assert torch.allclose(out[field], ref[field], atol=1e-5)
+
+
+def test_check_inputs(e3_model, tmp_path):
+    path = str(tmp_path / "e3.pt")
+    export_torchscript(e3_model, graph(silicon(1), r_max=5.0), path)
+    module, metadata = load_frozen_model(path)
+
+    data = graph_inputs(graph(bulk("C", "diamond", a=3.57, cubic=True), r_max=5.0))
+    with pytest.raises(ValueError, match="not in the basis"):
+        check_inputs(metadata, data)
+    data.pop(AtomicDataDict.EDGE_INDEX_KEY)
+    with pytest.raises(ValueError, match="lacks the fields"):
+        check_inputs(metadata, data)
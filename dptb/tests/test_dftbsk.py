@@ -3,6 +3,7 @@ import os
 import torch
 from dptb.nn.dftbsk import DFTBSK
 from dptb.nn.dftb.sk_param import SKParam
+from dptb.nn.dftb.hopping_dftb import HoppingIntp
 from dptb.data.transforms import OrbitalMapper
 from dptb.data.build import build_dataset
 from pathlib import Path
@@ -117,3 +118,27 @@ class TestDFTBSK:
 
 
 
+@pytest.mark.parametrize("method", ["linear", "cspline"])
+@pytest.mark.parametrize("uniform", [True, False])
+def test_skhij_typed_interp(method, uniform):
+    skparams = SKParam(basis={"B": ["2s", "2p"], "N": ["2s", "2p"]}, skdata=TestDFTBSK.skdatapath)
+    xx = skparams.skdict['Distance']
+    yy = torch.cat([skparams.skdict['Hopping'], skparams.skdict['Overlap']], dim=1)
+    num_ingrls = yy.shape[1]
+
+    torch.manual_seed(0)
+    # include the grid points and the bonds outside of the grid
+    rij = torch.cat([torch.rand(50) * (xx[-1] + 1.0), xx[[0, 5, -1]]])
+    bond_type = torch.randint(0, yy.shape[0], (rij.shape[0],))
+
+    hopping_fn = HoppingIntp(num_ingrls=num_ingrls, method=method)
+    coeffs = hopping_fn.get_coefficients(xx=xx, yy=yy)
+    skints = hopping_fn.get_skhij_typed(rij, bond_type, xx=xx, coeffs=coeffs, uniform=uniform)
+    assert skints.shape == (rij.shape[0], num_ingrls)
+
+    reference = torch.zeros_like(skints)
+    for ibt in range(yy.shape[0]):
+        mask = bond_type == ibt
+        reference[mask] = HoppingIntp(num_ingrls=num_ingrls, method=method).get_skhij(rij[mask], xx=xx, yy=yy[ibt])
+    assert torch.allclose(skints, reference, atol=1e-5)
+    assert (skints[rij > xx[-1]] == 0).all()
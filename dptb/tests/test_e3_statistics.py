@@ -0,0 +1,93 @@
+import os
+from pathlib import Path
+import pytest
+import torch
+
+from dptb.data import AtomicDataDict
+from dptb.data.dataset import DefaultDataset
+from dptb.data.transforms import OrbitalMapper
+from dptb.data.e3_statistics import RunningMoments, e3_statistics, statistics_cache_file
+from dptb.nn.hamiltonian import E3Hamiltonian
+
+rootdir = os.path.join(Path(os.path.abspath(__file__)).parent, "data")
+
+
+def test_running_moments_merge():
+    torch.manual_seed(0)
+    samples = torch.randn(200, 3, dtype=torch.float64)
+    groups = torch.randint(0, 4, (200,))
+
+    moments = RunningMoments(4, 3)
+    for chunk in torch.arange(200).split(37):
+        moments.merge(RunningMoments.from_samples(samples[chunk], groups[chunk], 4))
+
+    for g in range(4):
+        assert moments.count[g, 0] == groups.eq(g).sum()
+        assert torch.allclose(moments.mean[g], samples[groups.eq(g)].mean(dim=0))
+        assert torch.allclose(moments.std()[g], samples[groups.eq(g)].std(dim=0))
+
+
+@pytest.fixture(scope="module")
+def si_dataset(tmp_path_factory):
+    # two frames of the same Si64 structure, so the statistics are collected in several chunks.
+    root = tmp_path_factory.mktemp("e3_statistics")
+    for i in range(2):
+        os.symlink(f"{rootdir}/e3_band/data/Si64.0", root / f"Si64.{i}")
+    info = {"nframes": 1, "natoms": 64, "pos_type": "cart", "pbc": True, "r_max": 5.0}
+    idp = OrbitalMapper({"Si": "1s1p"}, method="e3tb")
+    return DefaultDataset(root=str(root), info_files={"Si64.0": info, "Si64.1": info}, type_mapper=idp, get_Hamiltonian=True)
+
+
+def reference_stats(dataset):
+    # the statistics computed on the whole in-memory dataset at once.
+    idp = dataset.type_mapper
+    data = E3Hamiltonian(basis=idp.basis, decompose=True)(idp(dataset.data.clone().to_dict()))
+    slices = idp.get_irreps(no_parity=False).slices()
+    features = data[AtomicDataDict.EDGE_FEATURES_KEY][data[AtomicDataDict.EDGE_TYPE_KEY].flatten().eq(0)]
+    norms = torch.stack([features[:, s].norm(dim=1) for s in slices], dim=1)
+    scalars = torch.cat([features[:, s] for s in slices if s.stop - s.start == 1], dim=1)
+    return norms.mean(dim=0), norms.std(dim=0), scalars.mean(dim=0), scalars.std(dim=0)
+
+
+@pytest.mark.parametrize("chunk_size, num_workers", [(1, 1), (2, 1), (1, 2)])
+def test_e3_statistics(si_dataset, chunk_size, num_workers):
+    stats = e3_statistics(si_dataset, si_dataset.type_mapper, chunk_size=chunk_size, num_workers=num_workers)
+    norm_ave, norm_std, scalar_ave, scalar_std = reference_stats(si_dataset)
+
+    assert torch.allclose(stats["edge"]["norm_ave"][0], norm_ave, atol=1e-6)
+    assert torch.allclose(stats["edge"]["norm_std"][0], norm_std, atol=1e-6)
+    assert torch.allclose(stats["edge"]["scalar_ave"][0], scalar_ave, atol=1e-6)
+    assert torch.allclose(stats["edge"]["scalar_std"][0], scalar_std, atol=1e-6)
+    assert stats["node"]["norm_ave"].shape == (1, len(norm_ave))
+    assert stats["node"]["scalar_std"].shape == (1, len(scalar_ave))
+
+
+def test_e3_statistics_decay(si_dataset):
+    stats = e3_statistics(si_dataset, si_dataset.type_mapper, decay=True, chunk_size=1)
+    decay = stats["edge"]["decay"]["Si-Si"]
+    n_edges = si_dataset.data[AtomicDataDict.EDGE_INDEX_KEY].shape[1]
+    assert decay["edge_length"].shape == (n_edges,)
+    assert (decay["edge_length"][1:] >= decay["edge_length"][:-1]).all()
+    assert decay["norm_decay"].shape == (5, n_edges)
+
+
+def test_e3_statistics_cache(si_dataset):
+    cache_file = statistics_cache_file(si_dataset, si_dataset.type_mapper)
+    assert cache_file.startswith(si_dataset.processed_dir)
+    assert not os.path.exists(cache_file)
+
+    stats = si_dataset.E3statistics()
+    assert os.path.isfile(cache_file)
+    cached = si_dataset.E3statistics()
+    for key in ["norm_ave", "norm_std", "scalar_ave", "scalar_std"]:
+        assert torch.equal(stats["edge"][key], cached["edge"][key])
+        assert torch.equal(stats["node"][key], cached["node"][key])
+    assert statistics_cache_file(si_dataset, si_dataset.type_mapper, decay=True) != cache_file
+
+
+def test_e3_statistics_unwritable_cache(si_dataset, tmp_path):
+    # the cache is skipped when it can not be written, e.g. in a read-only processed directory.
+    (tmp_path / "readonly").write_text("")
+    cache_file = str(tmp_path / "readonly" / "E3statistics.pth")
+    stats = e3_statistics(si_dataset, si_dataset.type_mapper, cache_file=cache_file)
+    assert stats is not None and not os.path.exists(cache_file)
@@ -0,0 +1,86 @@
+import os
+import pytest
+import torch
+import numpy as np
+from ase.io import read
+
+from dptb.data import AtomicData, AtomicDataDict
+from dptb.nn.build import build_model
+from dptb.nn.energy import Eigenvalues, eigvalsh_window, eigvalsh_window_numpy, energy_window_bands
+
+
+@pytest.fixture(scope='session', autouse=True)
+def root_directory(request):
+    return str(request.config.rootdir)
+
+
+def hermitian(nk, norb, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    h = torch.randn(nk, norb, norb, dtype=torch.complex128, generator=generator)
+    return h + h.mH
+
+
+def test_eigvalsh_window_backward():
+    h = hermitian(3, 12)
+    weight = torch.randn(3, 4, dtype=torch.float64)
+
+    full = h.clone().requires_grad_()
+    (torch.linalg.eigvalsh(full)[:, 2:6] * weight).sum().backward()
+    window = h.clone().requires_grad_()
+    eigvals = eigvalsh_window(window, 2, 6)
+    (eigvals * weight).sum().backward()
+
+    assert eigvals.shape == (3, 4)
+    assert torch.allclose(eigvals, torch.linalg.eigvalsh(h)[:, 2:6])
+    assert torch.allclose(window.grad, full.grad)
+
+
+def test_eigvalsh_window_numpy(monkeypatch):
+    import scipy.linalg
+    subsets = []
+    eigh = scipy.linalg.eigh
+    def spy_eigh(*args, **kwargs):
+        subsets.append(kwargs["subset_by_index"])
+        return eigh(*args, **kwargs)
+    monkeypatch.setattr(scipy.linalg, "eigh", spy_eigh)
+
+    h = hermitian(2, 40).numpy()
+    full = np.linalg.eigvalsh(h)
+    # the subset driver for a narrow window, wherever it is in the spectrum, and the full spectrum for a large window.
+    assert np.allclose(eigvalsh_window_numpy(h, 3, 8), full[:, 3:8])
+    assert np.allclose(eigvalsh_window_numpy(h, 28, 35), full[:, 28:35])
+    assert subsets == [[3, 7]] * 2 + [[28, 34]] * 2
+    assert np.allclose(eigvalsh_window_numpy(h, 0, 30), full[:, :30])
+    assert np.allclose(eigvalsh_window_numpy(h), full)
+    assert len(subsets) == 4
+
+
+def test_energy_window_bands():
+    eigvals = torch.tensor([[-2., -1., 0., 1., 2.], [-3., -0.5, 0.5, 1.5, 3.]])
+    assert energy_window_bands(eigvals, -0.8, 0.8) == (1, 3)
+    assert energy_window_bands(eigvals, None, -2.5) == (0, 1)
+    assert energy_window_bands(eigvals, 5., None) == (5, 5)
+
+
+@pytest.mark.parametrize("eig_solver", ["torch", "numpy"])
+def test_eigenvalues_window(root_directory, eig_solver):
+    model = build_model(checkpoint=os.path.join(root_directory, "dptb/tests/data/silicon_1nn/nnsk.ep500.pth"))
+    atoms = read(os.path.join(root_directory, "dptb/tests/data/silicon_1nn/silicon.vasp"))
+    r_max, er_max, oer_max = 2.6, 2.5, 2.5
+    data = AtomicData.to_AtomicDataDict(AtomicData.from_ase(atoms, r_max=r_max, er_max=er_max, oer_max=oer_max))
+    kpoints = torch.tensor([[0., 0., 0.], [0.25, 0., 0.25], [0.5, 0., 0.5]], dtype=model.dtype)
+    data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([kpoints])
+    with torch.no_grad():
+        data = model(model.idp(data))
+
+    eigv = Eigenvalues(idp=model.idp, dtype=model.dtype, device=model.device)
+    full = eigv(dict(data), eig_solver=eig_solver)[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    window = eigv(dict(data), nk=2, eig_solver=eig_solver, band_window=(1, 5))[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    assert torch.allclose(window, full[:, 1:5], atol=1e-5)
+
+    emin, emax = full[:, 3].min().item(), full[:, 4].max().item()
+    eigv = Eigenvalues(idp=model.idp, energy_window=(emin, emax), dtype=model.dtype, device=model.device)
+    window = eigv(dict(data), eig_solver=eig_solver)[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    band_min, band_max = energy_window_bands(full, emin, emax)
+    assert band_min <= 3 and band_max >= 5
+    assert torch.allclose(window, full[:, band_min:band_max], atol=1e-5)
@@ -0,0 +1,58 @@
+import numpy as np
+from scipy.interpolate import interpn
+
+from dptb.utils.make_kpoints import kmesh_fs
+from dptb.postprocess.bandstructure.fermisurface import select_bands, interpolate_bands, write_bxsf
+
+
+def test_select_bands():
+    eigenvalues = np.array([[-3.0, -1.0, 0.5, 2.0],
+                            [-2.5, -0.2, 1.5, 3.0]])
+    assert select_bands(eigenvalues, -0.5, 0.6) == (1, 3)
+    assert select_bands(eigenvalues, -2.0, -1.5) == (0, 0)
+    assert select_bands(eigenvalues, -10.0, 10.0) == (0, 4)
+
+
+def test_interpolate_bands():
+    rng = np.random.default_rng(0)
+    axes, _ = kmesh_fs(meshgrid=[4, 5, 3])
+    eigenvalues = rng.normal(size=(4, 5, 3, 2))
+    axes_intp, kpoints_intp = kmesh_fs(meshgrid=[8, 10, 6])
+
+    out = interpolate_bands(axes, eigenvalues, axes_intp)
+    assert out.shape == (8, 10, 6, 2)
+    for i in range(2):
+        ref = interpn(axes, eigenvalues[..., i], kpoints_intp)
+        assert np.allclose(out[..., i].reshape(-1), ref)
+
+    # 2D grids, as in the FS2D plots.
+    k1, k2 = np.linspace(0, 1, 4), np.linspace(0, 1, 6)
+    k1intp, k2intp = np.linspace(0, 1, 8), np.linspace(0, 1, 12)
+    eigenvalues = rng.normal(size=(4, 6, 1))
+    out = interpolate_bands((k1, k2), eigenvalues, (k1intp, k2intp))
+    points = np.stack(np.meshgrid(k1intp, k2intp, indexing='ij'), axis=-1).reshape(-1, 2)
+    assert np.allclose(out[..., 0].reshape(-1), interpn((k1, k2), eigenvalues[..., 0], points))
+
+
+def test_write_bxsf(tmp_path):
+    mesh_grid = [2, 3, 4]
+    eigenvalues = np.arange(2 * 3 * 4 * 2, dtype=float).reshape(-1, 2) / 10
+    filename = str(tmp_path / "FS.bxsf")
+    write_bxsf(filename, eigenvalues, mesh_grid, 2 * np.eye(3), fermi_energy=0.5, case="Si2")
+
+    with open(filename, 'rb') as f:
+        content = f.read()
+    assert b'\r' not in content
+    lines = content.decode().split('\n')
+    assert lines[0] == 'BEGIN_INFO' and '   Fermi Energy: 0.5' in lines
+    assert lines[lines.index('   BEGIN_BANDGRID_3D') + 1].split() == ['2']
+    assert lines[lines.index('   BAND:  1') - 1].split() == ['0.00000000', '0.00000000', '2.00000000']
+    assert lines[-2:] == ['   END_BANDGRID_3D', ' END_BLOCK_BANDGRID_3D']
+
+    for j in range(2):
+        start = lines.index(f'   BAND:  {j + 1}') + 1
+        block = lines[start:start + 2 * (3 + 1)]
+        # the nky lines of nkz values of each x, separated by an empty line.
+        assert block[3] == '' and block[7] == ''
+        values = np.array([float(x) for line in block for x in line.split()])
+        assert np.allclose(values, eigenvalues[:, j])
@@ -0,0 +1,97 @@
+import os
+import json
+import pickle
+from pathlib import Path
+import pytest
+import numpy as np
+import h5py
+import torch
+
+from dptb.data import AtomicDataDict
+from dptb.data.build import build_dataset
+from dptb.data.transforms import OrbitalMapper
+from dptb.data.dataset import HDF5Dataset, LazyHDF5Dataset, convert_hdf5_archive
+
+rootdir = os.path.join(Path(os.path.abspath(__file__)).parent, "data")
+info = {"nframes": 2, "natoms": 64, "pos_type": "pickle", "pbc": True}
+
+
+@pytest.fixture(scope="module")
+def hdf5_archive(tmp_path_factory):
+    # two frames of the Si64 structure in the pickle + h5 archive layout, the second one shifted.
+    root = tmp_path_factory.mktemp("hdf5_dataset")
+    src = f"{rootdir}/e3_band/data/Si64.0"
+    traj = root / "Si64.0"
+    traj.mkdir()
+    pos = np.loadtxt(f"{src}/positions.dat")
+    structures = {}
+    for frame in range(2):
+        structures[str(frame)] = {
+            "positions": pos + 0.1 * frame,
+            "atomic_numbers": np.loadtxt(f"{src}/atomic_numbers.dat", dtype=int),
+            "cell": np.loadtxt(f"{src}/cell.dat"),
+        }
+    with open(traj / "info.json", "w") as f:
+        json.dump(info, f)
+    with open(traj / "structure.pkl", "wb") as f:
+        pickle.dump(structures, f)
+    for name in ["hamiltonians.h5", "overlaps.h5"]:
+        with h5py.File(f"{src}/{name}", "r") as fin, h5py.File(traj / name, "w") as fout:
+            for frame in range(2):
+                fin.copy(fin["0"], fout, name=str(frame))
+    return root
+
+
+def dataset_kwargs(root):
+    return dict(root=str(root), info_files={"Si64.0": dict(info, r_max=5.0)}, type_mapper=OrbitalMapper({"Si": "1s1p"}, method="e3tb"),
+                get_Hamiltonian=True, get_overlap=True)
+
+
+def assert_same_frames(ref, dataset):
+    assert dataset.len() == ref.len() == 2
+    for idx in range(2):
+        a, b = ref[idx], dataset[idx]
+        for key in [AtomicDataDict.EDGE_INDEX_KEY, AtomicDataDict.EDGE_CELL_SHIFT_KEY, AtomicDataDict.EDGE_FEATURES_KEY,
+                    AtomicDataDict.NODE_FEATURES_KEY, AtomicDataDict.EDGE_OVERLAP_KEY, AtomicDataDict.ATOM_TYPE_KEY]:
+            assert torch.equal(a[key], b[key])
+
+
+def test_lazy_hdf5_dataset(hdf5_archive):
+    ref = HDF5Dataset(**dataset_kwargs(hdf5_archive))
+    dataset = LazyHDF5Dataset(**dataset_kwargs(hdf5_archive), cache_size=1)
+    assert_same_frames(ref, dataset)
+    # the cache keeps the last frame only, and is not modified by the transform.
+    assert list(dataset._cache.keys()) == [1]
+    assert AtomicDataDict.ATOMIC_NUMBERS_KEY in dataset._cache[1]
+    assert torch.equal(dataset[1][AtomicDataDict.EDGE_FEATURES_KEY], ref[1][AtomicDataDict.EDGE_FEATURES_KEY])
+
+    built = build_dataset(root=str(hdf5_archive), type="HDF5Dataset", prefix="Si64", r_max=5.0, get_Hamiltonian=True,
+                          get_overlap=True, lazy=True, basis={"Si": "1s1p"})
+    assert isinstance(built, LazyHDF5Dataset)
+    assert built.len() == 2
+
+
+def test_convert_hdf5_archive(hdf5_archive, tmp_path):
+    out = tmp_path / "Si64.0"
+    convert_hdf5_archive(str(hdf5_archive / "Si64.0"), out_root=str(out))
+    assert (out / "structure.h5").exists() and not (out / "structure.pkl").exists()
+    with h5py.File(out / "hamiltonians.h5", "r") as f:
+        assert set(f["1"].keys()) == {"keys", "shapes", "offsets", "values"}
+        assert f["1"]["values"].compression == "gzip"
+    assert os.path.getsize(out / "hamiltonians.h5") < os.path.getsize(hdf5_archive / "Si64.0" / "hamiltonians.h5")
+
+    ref = LazyHDF5Dataset(**dataset_kwargs(hdf5_archive))
+    assert_same_frames(ref, LazyHDF5Dataset(**dataset_kwargs(tmp_path)))
+    # the converted archive is also read by the in-memory dataset.
+    assert_same_frames(ref, HDF5Dataset(**dataset_kwargs(tmp_path)))
+
+
+def test_lazy_hdf5_dataset_fork(hdf5_archive):
+    dataset = LazyHDF5Dataset(**dataset_kwargs(hdf5_archive))
+    # the handles opened here are reopened by the forked workers.
+    dataset.get(0)
+    serial = dataset.E3statistics(chunk_size=1, use_cache=False)
+    forked = dataset.E3statistics(chunk_size=1, num_workers=2, use_cache=False)
+    for key in ["norm_ave", "norm_std", "scalar_ave", "scalar_std"]:
+        assert torch.allclose(serial["edge"][key], forked["edge"][key])
+        assert torch.allclose(serial["node"][key], forked["node"][key])
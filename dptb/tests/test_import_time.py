@@ -0,0 +1,60 @@
+import sys
+import subprocess
+import pytest
+
+# cumulative import time budget of the CLI module in seconds, measured with `python -X importtime`.
+# eagerly importing the subcommands costs several seconds, the lazy dispatch stays well below 1s.
+CLI_IMPORT_BUDGET = 1.0
+HEAVY_MODULES = ["torch", "e3nn", "torch_scatter", "h5py", "lmdb", "tensorboard"]
+
+
+def _run(code, *flags):
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, check=True)
+
+
+def _cumulative_import_time(stderr, module):
+    # lines look like: "import time:   self [us] | cumulative | imported package"
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) * 1e-6
+    raise ValueError(f"module {module} not found in the importtime report.")
+
+
+@pytest.mark.parametrize("module", ["dptb.entrypoints.main", "dptb.entrypoints.config", "dptb.entrypoints.bond", "dptb.nn", "dptb.data", "dptb.postprocess"])
+def test_no_heavy_imports(module):
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    loaded = _run(code).stdout.strip()
+    assert loaded == "", f"importing {module} loads {loaded}"
+
+
+def test_cli_import_budget():
+    # take the best of a few runs to be robust against a busy machine.
+    timings = []
+    for _ in range(3):
+        stderr = _run("import dptb.entrypoints.main", "-X", "importtime").stderr
+        timings.append(_cumulative_import_time(stderr, "dptb.entrypoints.main"))
+    assert min(timings) < CLI_IMPORT_BUDGET
+
+
+def test_main_parser_without_torch():
+    code = "import sys; from dptb.entrypoints.main import parse_args; parse_args(['bond', 'POSCAR']); print('torch' in sys.modules)"
+    assert _run(code).stdout.strip() == "False"
+
+
+def test_lazy_attributes():
+    import dptb.nn
+    import dptb.data
+    import dptb.entrypoints
+    from dptb.nn.nnsk import NNSK
+    from dptb.data.AtomicData import AtomicData
+    from dptb.entrypoints.test import _test
+
+    assert dptb.nn.NNSK is NNSK
+    assert dptb.data.AtomicData is AtomicData
+    assert dptb.entrypoints.test is _test
+    assert callable(dptb.entrypoints.train)
+    assert "build_model" in dir(dptb.nn)
+    assert dptb.data.AtomicDataDict.__name__ == "dptb.data.AtomicDataDict"
+    with pytest.raises(AttributeError):
+        dptb.nn.not_a_model
@@ -0,0 +1,142 @@
+import os
+import pytest
+import numpy as np
+import scipy.sparse as sp
+from scipy.integrate import cumulative_trapezoid
+from ase.io import read
+
+from dptb.postprocess.unified.system import TBSystem
+from dptb.postprocess.unified.properties.kpm import KPM, chebyshev_t
+
+rootdir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../examples/ToW90_PythTB"))
+
+
+def random_hamiltonian(norb, density, seed):
+    a = sp.random(norb, norb, density=density, random_state=seed)
+    return (a + a.T).tocsr()
+
+
+def anderson_chain(norb, disorder, seed):
+    # a periodic chain with unit spacing, the velocity is -i [x, H].
+    rng = np.random.default_rng(seed)
+    i = np.arange(norb)
+    d = sp.coo_matrix((-np.ones(norb), (i, (i + 1) % norb)), shape=(norb, norb)).tocsr()
+    h = d + d.T + sp.diags(rng.uniform(-disorder, disorder, norb))
+    return h.tocsr(), (-1j * (d - d.T)).tocsr()
+
+
+@pytest.mark.parametrize("overlap", [False, True])
+def test_kpm_exact_moments(overlap):
+    h = random_hamiltonian(60, 0.1, 0)
+    s = None
+    dense = h.toarray()
+    if overlap:
+        s = sp.identity(60) + 0.1 * random_hamiltonian(60, 0.05, 1)
+        dense = np.linalg.solve(s.toarray(), dense)
+    kpm = KPM(h, s)
+
+    projector = np.arange(10, 25)
+    moments = kpm.dos_moments(32, num_random=None, projectors=[projector])
+
+    # the dense Chebyshev recursion of the rescaled S^-1 H.
+    ht = (dense - kpm.b * np.eye(60)) / kpm.a
+    t_prev, t = np.eye(60), ht
+    ref = [np.diag(t_prev), np.diag(t)]
+    for _ in range(30):
+        t_prev, t = t, 2 * ht @ t - t_prev
+        ref.append(np.diag(t))
+    ref = np.array(ref)
+    assert np.allclose(moments[0], ref.sum(axis=1), atol=1e-8)
+    assert np.allclose(moments[1], ref[:, projector].sum(axis=1), atol=1e-8)
+
+    eigs = np.linalg.eigvals(dense).real
+    assert np.abs(kpm.to_scaled(eigs)).max() < 1
+    assert np.allclose(moments[0], chebyshev_t(kpm.to_scaled(eigs), 32).sum(axis=1), atol=1e-8)
+
+
+def test_kpm_stochastic_trace():
+    h, _ = anderson_chain(2000, 1.0, 0)
+    kpm = KPM(h)
+    exact = kpm.dos_moments(64, num_random=None)
+    estimate = kpm.dos_moments(64, num_random=16, seed=0)
+    # random phase vectors give the exact trace of the identity.
+    assert np.isclose(estimate[0, 0], 2000)
+    assert np.abs(estimate - exact).max() < 0.05 * 2000
+
+    energies = np.linspace(-3, 3, 201)
+    dos = kpm.density(energies, exact)
+    assert np.isclose(np.trapz(dos, energies), 2000, rtol=1e-3)
+
+
+def test_kubo_bastin_greenwood_limit():
+    h, v = anderson_chain(200, 1.5, 0)
+    kpm = KPM(h)
+    moments = kpm.correlation_moments(v, v, 128, num_random=None)
+    # the moments are the same with a stochastic trace in blocks.
+    estimate = kpm.correlation_moments(v, v, 128, num_random=64, seed=0, max_elements=128 * 200 * 4)
+    assert np.abs(estimate - moments).max() < 0.1 * np.abs(moments).max()
+
+    mu = np.array([-1., 0., 1.])
+    bastin = kpm.kubo_bastin(moments, mu, temperature=1000)
+    # the static limit of the Kubo-Greenwood formula, with the prefactor 2 pi instead of 2.
+    greenwood = np.array([kpm.kubo_greenwood(moments, [0.005], m, temperature=1000)[0] for m in mu]) * np.pi
+    assert (bastin > 0).all()
+    assert np.allclose(bastin, greenwood, rtol=0.05)
+
+
+@pytest.fixture(scope="module")
+def si_system():
+    model_path = os.path.join(rootdir, "models", "nnsk.ep20.pth")
+    struct_path = os.path.join(rootdir, "silicon.vasp")
+    if not os.path.exists(model_path) or not os.path.exists(struct_path):
+        pytest.skip(f"Test files not found at {rootdir}")
+    return TBSystem(data=read(struct_path).repeat((2, 2, 2)), calculator=model_path)
+
+
+def test_kpm_silicon_dos(si_system):
+    kpm = si_system.kpm.build()
+    hk, _ = si_system.calculator.get_hk(si_system.data, k_points=[[0, 0, 0]])
+    hk = hk[0].detach().numpy()
+    assert np.abs(kpm.hamiltonian.toarray() - hk).max() < 1e-5
+
+    eigs = np.sort(np.linalg.eigvalsh(hk))
+    gap = (eigs[31] + eigs[32]) / 2
+    dos = si_system.kpm.compute_dos(erange=[-22, 18], npts=2001, num_moments=512, num_random=None,
+                                    pdos={"s": "3s", "p": "3p", "d": "d\\*", "atom0": "^0-"})
+    assert dos.pdos.shape == (2001, 4)
+    assert dos.pdos_labels == ["s", "p", "d", "atom0"]
+    assert np.allclose(dos.pdos[:, :3].sum(axis=1), dos.total_dos, atol=1e-8)
+
+    si_system.dos.set_kpoints([1, 1, 1])
+    si_system.dos.set_dos_config(erange=[-22, 18], npts=2001, sigma=0.1)
+    dense = si_system.dos.compute()
+    # 64 valence electrons fill 32 states below the gap.
+    counts = cumulative_trapezoid(dos.total_dos, dos.energy_grid, initial=0)
+    dense_counts = cumulative_trapezoid(dense.total_dos, dense.energy_grid, initial=0)
+    assert np.isclose(np.interp(gap, dos.energy_grid, counts), 32, atol=0.05)
+    assert np.isclose(np.interp(gap, dos.energy_grid, counts), np.interp(gap, dense.energy_grid, dense_counts), atol=0.05)
+    assert np.isclose(counts[-1], 144, atol=0.01)
+    # the 16 atoms are equivalent.
+    atom0 = cumulative_trapezoid(dos.pdos[:, 3], dos.energy_grid, initial=0)
+    assert np.isclose(atom0[-1], 9, atol=1e-3)
+    assert np.isclose(np.interp(gap, dos.energy_grid, atom0), 2, atol=0.01)
+
+
+def test_kpm_silicon_conductivity(si_system):
+    hk, _ = si_system.calculator.get_hk(si_system.data, k_points=[[0, 0, 0]])
+    eigs = np.sort(np.linalg.eigvalsh(hk[0].detach().numpy()))
+    si_system.set_efermi((eigs[31] + eigs[32]) / 2)
+
+    omegas = np.linspace(0.05, 30, 600)
+    sigma = si_system.kpm.compute_optical(omegas, direction="xx", num_moments=256, num_random=None)
+    ref = si_system.accond.compute(omegas=omegas, kmesh=[1, 1, 1], eta=0.05, direction="xx", broadening="gaussian").real.detach().numpy()
+    # the spectral weight is independent of the broadening.
+    assert np.isclose(np.trapz(sigma, omegas), np.trapz(ref, omegas), rtol=0.02)
+    assert abs(omegas[np.argmax(sigma)] - omegas[np.argmax(ref)]) < 0.2
+
+    mu, sigma_dc = si_system.kpm.compute_conductivity(erange=[-3, 0], npts=4, num_moments=128, num_random=None)
+    assert np.isclose(mu[-1], si_system.efermi)
+    kpm = si_system.kpm.build()
+    moments = kpm.correlation_moments(si_system.kpm.velocity(0), si_system.kpm.velocity(0), 128, num_random=None)
+    greenwood = np.array([kpm.kubo_greenwood(moments, [0.005], m)[0] for m in mu]) * 4 * np.pi / si_system.kpm._volume()
+    assert np.allclose(sigma_dc, greenwood, rtol=0.05, atol=1e-3 * greenwood.max())
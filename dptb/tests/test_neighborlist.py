@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import torch
+import ase.io
+from ase import Atoms
+from ase.build import bulk, molecule
+
+from dptb.data import AtomicData, AtomicDataDict
+from dptb.data.neighborlist import VerletNeighborList, iread_atomic_data
+
+
+def edge_set(data, index_key, shift_key):
+    index = data[index_key].numpy()
+    shifts = data[shift_key].numpy().round().astype(int)
+    edges = [tuple(e) for e in np.concatenate([index.T, shifts], axis=1)]
+    assert len(edges) == len(set(edges))
+    return set(edges)
+
+
+def assert_same_graphs(data, ref):
+    for index_key, shift_key in [
+        (AtomicDataDict.EDGE_INDEX_KEY, AtomicDataDict.EDGE_CELL_SHIFT_KEY),
+        (AtomicDataDict.ENV_INDEX_KEY, AtomicDataDict.ENV_CELL_SHIFT_KEY),
+        (AtomicDataDict.ONSITENV_INDEX_KEY, AtomicDataDict.ONSITENV_CELL_SHIFT_KEY),
+    ]:
+        if index_key in ref:
+            assert edge_set(data, index_key, shift_key) == edge_set(ref, index_key, shift_key)
+
+
+def md_frames(atoms, nframes, step, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(nframes):
+        atoms = atoms.copy()
+        atoms.positions += rng.normal(scale=step, size=atoms.positions.shape)
+        frames.append(atoms)
+    return frames
+
+
+@pytest.mark.parametrize("r_max", [5.0, {"Si": 4.0, "C": 5.0}, {"Si-Si": 4.0, "Si-C": 4.5, "C-C": 5.0}])
+def test_verlet_neighbor_list(r_max):
+    atoms = bulk("Si", "diamond", a=5.43, cubic=True).repeat(2)
+    atoms.symbols[::3] = "C"
+    frames = md_frames(atoms, 20, 0.02)
+    nlist = VerletNeighborList(r_max=r_max, er_max=4.0, oer_max=2.6, skin=0.5)
+    for atoms in frames:
+        data = nlist.atomic_data(atoms)
+        ref = AtomicData.from_ase(atoms, r_max=r_max, er_max=4.0, oer_max=2.6)
+        assert_same_graphs(data, ref)
+        assert data[AtomicDataDict.EDGE_INDEX_KEY].shape == ref[AtomicDataDict.EDGE_INDEX_KEY].shape
+    # the atoms move less than half the skin within the first frames.
+    assert 1 < nlist.n_build < len(frames)
+
+
+def test_verlet_neighbor_list_rebuild():
+    nlist = VerletNeighborList(r_max=3.0, skin=0.5)
+    atoms = molecule("C6H6")
+    atoms.center(vacuum=5.0)
+    nlist.atomic_data(atoms)
+    nlist.atomic_data(atoms)
+    assert nlist.n_build == 1
+
+    # a change of the cell invalidates the shifts of the list.
+    atoms.set_cell(atoms.cell * 1.01, scale_atoms=False)
+    nlist.atomic_data(atoms)
+    assert nlist.n_build == 2
+
+    # a displacement larger than half the skin.
+    atoms.positions[0] += [0.3, 0.0, 0.0]
+    data = nlist.atomic_data(atoms)
+    assert nlist.n_build == 3
+    assert_same_graphs(data, AtomicData.from_ase(atoms, r_max=3.0))
+
+
+def test_iread_atomic_data(tmp_path):
+    atoms = bulk("Si", "diamond", a=5.43, cubic=True)
+    frames = md_frames(atoms, 5, 0.05, seed=1)
+    ase.io.write(tmp_path / "traj.extxyz", frames, format="extxyz")
+
+    data_list = list(iread_atomic_data(str(tmp_path / "traj.extxyz"), r_max=5.0, er_max=3.0, skin=0.5))
+    assert len(data_list) == len(frames)
+    for data, atoms in zip(data_list, frames):
+        assert torch.allclose(data[AtomicDataDict.POSITIONS_KEY], torch.as_tensor(atoms.positions, dtype=torch.get_default_dtype()))
+        assert_same_graphs(data, AtomicData.from_ase(atoms, r_max=5.0, er_max=3.0))
+
+    # an iterable of frames is also accepted.
+    assert len(list(iread_atomic_data(frames, r_max=5.0))) == len(frames)
@@ -417,4 +417,29 @@ class TestNNSK_rmax_dict:
                     fij_old = 1/(1+torch.exp((rij-rs_old+5*w)/w))
                     fij_new = 1/(1+torch.exp((rij-rs+5*w)/w))
                 
-                assert torch.allclose(hopping_new[i] / fij_new, hopping_old[i] / fij_old, atol=1e-5)   
\ No newline at end of file
+                assert torch.allclose(hopping_new[i] / fij_new, hopping_old[i] / fij_old, atol=1e-5)   
+    def test_nnsk_symmetrize(self):
+        model_options = self.model_options
+        model_options["nnsk"]["onsite"]["method"] = "uniform"
+        model = NNSK(**model_options['nnsk'], **self.common_options, transform=False)
+
+        assert model.reflective_bonds.tolist() == [0, 2, 1, 3]
+        assert "reflective_bonds" not in model.state_dict() and "equal_orbpair" not in model.state_dict()
+        for orbpair_key, slices in model.idp_sk.orbpair_maps.items():
+            iorb, jorb = orbpair_key.split("-")
+            assert model.equal_orbpair[slices].all() == (iorb == jorb)
+
+        params = model.hopping_param.data.clone()
+        expected = params.clone()
+        for orbpair_key, slices in model.idp_sk.orbpair_maps.items():
+            iorb, jorb = orbpair_key.split("-")
+            if iorb == jorb:
+                expected[:, slices] = 0.5 * (params[:, slices] + params[[0, 2, 1, 3]][:, slices])
+        model.symmetrize(model.hopping_param)
+        assert torch.allclose(model.hopping_param.data, expected)
+
+        # the edge parameters are gathered from the parameters, the gradients flow back to them.
+        data = model(dict(self.batch))
+        data[AtomicDataDict.EDGE_FEATURES_KEY].sum().backward()
+        assert model.hopping_param.grad is not None
+        assert model.hopping_param.grad.abs().sum() > 0
@@ -30,8 +30,8 @@ class TestOpticalConductivity(unittest.TestCase):
         # 1. Calc Fermi level
         kmesh_efermi = [4, 4, 4] 
         efermi = system.get_efermi(kmesh=kmesh_efermi)
-        # Check reasonable Fermi level for Silicon (around -8.5 eV in this model)
-        assert abs(efermi - -8.5588) < 1e-5
+        # Check reasonable Fermi level for Silicon (around -8.5 eV in this model), the middle of the gap
+        assert abs(efermi - -8.5922) < 1e-4
         
         # 2. Calc Optical Conductivity
         omegas = np.linspace(0.1, 5.0, 50) # Coarse grid for speed
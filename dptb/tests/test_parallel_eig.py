@@ -0,0 +1,88 @@
+import os
+import pytest
+import torch
+import numpy as np
+from ase.io import read
+
+import dptb.nn.energy as energy
+from dptb.data import AtomicData, AtomicDataDict
+from dptb.nn.build import build_model
+from dptb.nn.energy import Eigenvalues, Eigh, parallel_chunk_size, parallel_eigvalsh, parallel_eigh
+
+
+@pytest.fixture(scope='session', autouse=True)
+def root_directory(request):
+    return str(request.config.rootdir)
+
+
+@pytest.fixture
+def small_tasks(monkeypatch):
+    # one k-point per task at least, so that the small matrices of the tests are split over the pool.
+    monkeypatch.setattr(energy, "PARALLEL_TASK_WORK", 1)
+
+
+def hermitian(nk, norb, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    h = torch.randn(nk, norb, norb, dtype=torch.complex128, generator=generator)
+    return h + h.mH
+
+
+def overlap(nk, norb, seed=1):
+    generator = torch.Generator().manual_seed(seed)
+    a = 0.1 * torch.randn(nk, norb, norb, dtype=torch.complex128, generator=generator)
+    return torch.eye(norb, dtype=torch.complex128) + a @ a.mH
+
+
+def test_parallel_chunk_size():
+    # the small matrices are batched, the large ones balanced over the workers.
+    assert parallel_chunk_size(1000, 8, 4) == 1000
+    assert parallel_chunk_size(1000, 50, 4) == 63
+    assert parallel_chunk_size(1000, 200, 4) == 63
+    assert parallel_chunk_size(1000, 400, 64) == 4
+    assert parallel_chunk_size(3, 1000, 64) == 1
+
+
+@pytest.mark.parametrize("with_overlap", [False, True])
+def test_parallel_eigvalsh(small_tasks, with_overlap):
+    h = hermitian(7, 10)
+    s = overlap(7, 10) if with_overlap else None
+    ref = torch.linalg.eigvalsh(h) if s is None else \
+        torch.tensor(np.stack([np.linalg.eigvals(np.linalg.solve(sk, hk)).real for hk, sk in zip(h.numpy(), s.numpy())]))
+    ref = ref.sort(dim=-1).values
+
+    assert torch.allclose(parallel_eigvalsh(h, s, num_workers=3), ref)
+    assert torch.allclose(parallel_eigvalsh(h, s, 2, 6, num_workers=3), ref[:, 2:6])
+    out = np.zeros((7, 3))
+    result = parallel_eigvalsh(h.numpy(), s.numpy() if s is not None else None, 1, 4, num_workers=3, out=out)
+    assert result is out and np.allclose(out, ref[:, 1:4].numpy())
+
+    eigvals, eigvecs = parallel_eigh(h, s, num_workers=3)
+    assert torch.allclose(eigvals, ref)
+    rhs = eigvecs if s is None else s @ eigvecs
+    assert torch.allclose(h @ eigvecs, rhs * eigvals.unsqueeze(1).type_as(eigvecs))
+
+
+@pytest.mark.parametrize("eig_solver", ["torch", "numpy"])
+def test_eigenvalues_num_workers(root_directory, small_tasks, eig_solver):
+    model = build_model(checkpoint=os.path.join(root_directory, "dptb/tests/data/silicon_1nn/nnsk.ep500.pth"))
+    atoms = read(os.path.join(root_directory, "dptb/tests/data/silicon_1nn/silicon.vasp"))
+    data = AtomicData.to_AtomicDataDict(AtomicData.from_ase(atoms, r_max=2.6, er_max=2.5, oer_max=2.5))
+    kpoints = torch.rand(9, 3, generator=torch.Generator().manual_seed(0)).to(model.dtype)
+    data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([kpoints])
+    with torch.no_grad():
+        data = model(model.idp(data))
+
+    eigv = Eigenvalues(idp=model.idp, dtype=model.dtype, device=model.device)
+    ref = eigv(dict(data), eig_solver=eig_solver)[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    out = eigv(dict(data), nk=4, eig_solver=eig_solver, num_workers=2)[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    assert torch.allclose(out, ref, atol=1e-5)
+    out = eigv(dict(data), eig_solver=eig_solver, band_window=(2, 6), num_workers=2)[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    assert torch.allclose(out, ref[:, 2:6], atol=1e-5)
+
+    eigh = Eigh(idp=model.idp, dtype=model.dtype, device=model.device)
+    ref = eigh(dict(data))
+    out = eigh(dict(data), nk=4, num_workers=2)
+    assert torch.allclose(out[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0], ref[AtomicDataDict.ENERGY_EIGENVALUE_KEY][0], atol=1e-5)
+    # the eigenvectors are defined up to a phase.
+    overlap = (ref[AtomicDataDict.EIGENVECTOR_KEY].mH @ out[AtomicDataDict.EIGENVECTOR_KEY]).diagonal(dim1=-2, dim2=-1).abs()
+    assert torch.allclose(overlap, torch.ones_like(overlap), atol=1e-3)
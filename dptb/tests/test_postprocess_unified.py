@@ -8,6 +8,7 @@ from dptb.postprocess.unified.system import TBSystem
 from dptb.postprocess.unified.properties.band import BandStructureData
 from dptb.postprocess.unified.properties.dos import DosData
 from dptb.data import AtomicDataDict
+from dptb.nn.energy import energy_window_bands
 
 # Paths to example data
 # Using relative paths from the project root (where tests are usually run from)
@@ -70,6 +71,22 @@ def test_band_calculation(silicon_system):
     if os.path.exists(plot_file):
         os.remove(plot_file)
 
+def test_band_window(silicon_system):
+    """Test the band structure of a band window and of an energy window."""
+    tbsys = silicon_system
+    tbsys.band.set_kpath(method="abacus", kpath=[[0.0, 0.0, 0.0, 10], [0.5, 0.0, 0.5, 1]], klabels=["G", "X"])
+    full = tbsys.band.compute().eigenvalues
+
+    bs = tbsys.band.compute(band_window=(2, 6))
+    assert np.allclose(bs.eigenvalues, full[:, 2:6], atol=1e-5)
+
+    efermi = tbsys._efermi or 0.0
+    emin, emax = full[:, 3].min() - efermi, full[:, 4].max() - efermi
+    bs = tbsys.band.compute(energy_window=(emin, emax))
+    band_min, band_max = energy_window_bands(torch.as_tensor(full), emin + efermi, emax + efermi)
+    assert band_min <= 3 and band_max >= 5
+    assert np.allclose(bs.eigenvalues, full[:, band_min:band_max], atol=1e-5)
+
 def test_dos_calculation(silicon_system):
     """Test DOS and PDOS calculation."""
     tbsys = silicon_system
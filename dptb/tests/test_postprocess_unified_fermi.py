@@ -77,3 +77,48 @@ def test_system_get_total_electrons(silicon_system):
     # Test missing element error
     with pytest.raises(KeyError):
         tbsys.set_electrons({'H': 1})
+
+
+def bisect_fermi_level(eigenvalues, weights, target, sigma, smearing_method):
+    # the reference: bisection on the charge of all the states.
+    from dptb.postprocess.unified.utils import smearing_occupation
+    lo, hi = eigenvalues.min() - 10.0, eigenvalues.max() + 10.0
+    for _ in range(200):
+        mu = 0.5 * (lo + hi)
+        q = (weights * smearing_occupation((eigenvalues - mu) / sigma, smearing_method)[0]).sum()
+        if q > target:
+            hi = mu
+        else:
+            lo = mu
+    return 0.5 * (lo + hi)
+
+@pytest.mark.parametrize("smearing_method", ['FD', 'Gaussian', 'MP', 'cold'])
+def test_fermi_level_newton(caplog, smearing_method):
+    """The Newton solver agrees with bisection on a metallic spectrum with k-weights, in a few iterations."""
+    from dptb.utils.constants import Boltzmann, eV2J
+    rng = np.random.default_rng(0)
+    eigenvalues = np.sort(rng.uniform(-6.0, 6.0, size=(50, 12)), axis=1)
+    weights = rng.uniform(0.5, 1.5, size=50)
+    weights /= weights.sum()
+    temperature = 2000
+    sigma = Boltzmann / eV2J * temperature
+
+    for total_electrons, spindeg in [(11.0, 2), (7.3, 1)]:
+        with caplog.at_level("INFO", logger="dptb.postprocess.unified.utils"):
+            caplog.clear()
+            ef = calculate_fermi_level(eigenvalues, total_electrons, spindeg=spindeg, weights=weights,
+                                       smearing_method=smearing_method, temperature=temperature)
+        ref = bisect_fermi_level(eigenvalues, weights.reshape(-1, 1), total_electrons / spindeg, sigma, smearing_method)
+        assert abs(ef - ref) < 1e-8
+        iterations = [int(r.message.split()[4]) for r in caplog.records if "converged after" in r.message]
+        assert iterations and iterations[0] < 10
+
+def test_fermi_level_elec_struc_cal():
+    """ElecStruCal.cal_E_fermi shares the solver of the unified postprocess."""
+    from dptb.postprocess.elec_struc_cal import ElecStruCal
+    rng = np.random.default_rng(1)
+    eigenvalues = np.sort(rng.uniform(-6.0, 6.0, size=(20, 8)), axis=1)
+    ef = ElecStruCal.cal_E_fermi(eigenvalues, 9, spindeg=2, smearing_method='Gaussian', temp=1000)
+    assert ef == calculate_fermi_level(eigenvalues, 9, spindeg=2, smearing_method='Gaussian', temperature=1000)
+    with pytest.raises(ValueError):
+        calculate_fermi_level(eigenvalues, 9, smearing_method='unknown')
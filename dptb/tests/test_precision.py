@@ -0,0 +1,104 @@
+import pytest
+import torch
+from ase.build import bulk
+
+from dptb.nn.build import build_model
+from dptb.nn.norm import SeperableLayerNorm
+from dptb.nn.precision import get_autocast_dtype, compile_options, benchmark_execution_modes
+from dptb.data import AtomicData, AtomicDataDict
+
+lem_options = {
+    "embedding": {
+        "method": "lem",
+        "r_max": {"Si": 5.0},
+        "irreps_hidden": "8x0e+8x1o+4x2e",
+        "n_layers": 2,
+        "avg_num_neighbors": 20,
+    },
+    "prediction": {"method": "e3tb", "neurons": [16]},
+}
+
+
+def get_data(model, repeat, seed):
+    atoms = bulk("Si", "diamond", a=5.43, cubic=True).repeat(repeat)
+    atoms.rattle(0.1, seed=seed)
+    data = AtomicData.to_AtomicDataDict(AtomicData.from_ase(atoms, r_max=5.0, er_max=5.0, oer_max=2.5, pbc=True))
+    return model.idp(data)
+
+
+@pytest.fixture(scope="module")
+def lem_model():
+    torch.manual_seed(0)
+    return build_model(model_options=lem_options, common_options={"basis": {"Si": "1s1p"}, "device": "cpu", "dtype": "float32", "overlap": False})
+
+
+def run(model, data):
+    return model({k: v.clone() for k, v in data.items()})
+
+
+def test_execution_options():
+    assert get_autocast_dtype(None) is None
+    assert get_autocast_dtype("none") is None
+    assert get_autocast_dtype("bf16") == torch.bfloat16
+    assert get_autocast_dtype("fp16") == torch.float16
+    with pytest.raises(ValueError):
+        get_autocast_dtype("fp8")
+    assert compile_options(False) is None
+    assert compile_options(True) == {"dynamic": True}
+    assert compile_options({"backend": "eager"}) == {"dynamic": True, "backend": "eager"}
+
+
+def test_norm_full_precision():
+    norm = SeperableLayerNorm(irreps="4x0e+2x1o")
+    x = torch.randn(5, 10)
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        out = norm(x.bfloat16())
+    assert out.dtype == torch.float32
+    assert torch.allclose(out, norm(x.bfloat16().float()))
+
+
+@pytest.mark.parametrize("autocast, rtol", [("fp16", 2e-2), ("bf16", 1e-1)])
+def test_autocast(lem_model, autocast, rtol):
+    data = get_data(lem_model, (1, 1, 1), 0)
+    ref = run(lem_model, data)
+    lem_model.set_execution_mode(autocast=autocast)
+    out = run(lem_model, data)
+    lem_model.set_execution_mode()
+
+    for field in [AtomicDataDict.EDGE_FEATURES_KEY, AtomicDataDict.NODE_FEATURES_KEY]:
+        # the Hamiltonian blocks are assembled in the model dtype.
+        assert out[field].dtype == torch.float32
+        assert (out[field] - ref[field]).abs().max() < rtol * ref[field].abs().max()
+
+
+def test_compile_dynamic_shapes(lem_model):
+    lem_model.set_execution_mode(compile={"backend": "eager"})
+    # structures with different numbers of atoms and edges go through the same compiled forward.
+    for repeat, seed in [((1, 1, 1), 0), ((1, 1, 2), 1)]:
+        data = get_data(lem_model, repeat, seed)
+        out = run(lem_model, data)
+        lem_model.set_execution_mode()
+        ref = run(lem_model, data)
+        lem_model.set_execution_mode(compile={"backend": "eager"})
+        assert torch.allclose(out[AtomicDataDict.EDGE_FEATURES_KEY], ref[AtomicDataDict.EDGE_FEATURES_KEY], atol=1e-5)
+    lem_model.set_execution_mode()
+    assert lem_model._compiled_embedding is None
+    assert not any("_compiled" in k for k in lem_model.state_dict())
+
+
+def test_benchmark_execution_modes(lem_model):
+    data = [get_data(lem_model, (1, 1, 1), 0)]
+    results = benchmark_execution_modes(lem_model, data, modes={"fp32": {}, "fp16": {"autocast": "fp16"}}, n_repeat=1)
+    assert results["fp32"]["max_abs_err"][AtomicDataDict.EDGE_FEATURES_KEY] == 0.
+    assert results["fp16"]["max_abs_err"][AtomicDataDict.EDGE_FEATURES_KEY] > 0.
+    assert results["fp16"]["structures_per_second"] > 0.
+    assert lem_model.autocast_dtype is None
+
+    # the execution mode of the model is restored after the benchmark.
+    lem_model.set_execution_mode(autocast="bf16")
+    try:
+        benchmark_execution_modes(lem_model, data, modes={"fp32": {}}, n_repeat=1)
+        assert lem_model.autocast_dtype == torch.bfloat16
+        assert lem_model.execution_mode == {"autocast": "bf16", "compile": False}
+    finally:
+        lem_model.set_execution_mode()
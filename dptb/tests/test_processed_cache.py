@@ -0,0 +1,107 @@
+import os
+import shutil
+import pytest
+import torch
+
+from dptb.data import AtomicDataDict
+from dptb.data.build import build_dataset
+from dptb.data.dataset import AtomicInMemoryDataset
+from dptb.data.AtomicData import _NESTED_FIELDS
+
+
+@pytest.fixture(scope='session', autouse=True)
+def root_directory(request):
+    return str(request.config.rootdir)
+
+
+@pytest.fixture
+def dataset_dir(root_directory, tmp_path):
+    # a copy of the dataset, so that its processed cache is built by the test.
+    root = tmp_path / "dataset"
+    shutil.copytree(os.path.join(root_directory, "dptb/tests/data/test_sktb/dataset/kpathmd25.0"), root / "kpathmd25.0")
+    return str(root)
+
+
+def build(root, **kwargs):
+    return build_dataset(root=root, prefix="kpathmd25", get_eigenvalues=True, r_max=5.0, er_max=5.0, oer_max=2.5,
+                         basis={"Si": ["3s", "3p"]}, **kwargs)
+
+
+def assert_same_frames(dataset, ref):
+    assert len(dataset) == len(ref)
+    for i in range(len(ref)):
+        data, expected = dataset[i], ref[i]
+        assert set(data.keys) == set(expected.keys)
+        for key in [AtomicDataDict.POSITIONS_KEY, AtomicDataDict.EDGE_INDEX_KEY, AtomicDataDict.EDGE_CELL_SHIFT_KEY,
+                    AtomicDataDict.ATOM_TYPE_KEY]:
+            assert torch.equal(data[key], expected[key])
+        for key in [AtomicDataDict.ENERGY_EIGENVALUE_KEY, AtomicDataDict.KPOINT_KEY]:
+            assert torch.equal(data[key][0], expected[key][0])
+
+
+def test_sharded_cache(dataset_dir, tmp_path, monkeypatch):
+    ref = build(dataset_dir)
+    assert len(ref.shards) == 1
+    assert ref.data is ref.shards[0]
+
+    # the same parameters and processed directory, whatever the number of workers.
+    assert "num_workers" not in ref._get_parameters()
+    other_dir = str(tmp_path / "other")
+    shutil.copytree(dataset_dir, other_dir, ignore=shutil.ignore_patterns("processed_dataset_*"))
+    monkeypatch.setattr(AtomicInMemoryDataset, "shard_frames", 3)
+    dataset = build(other_dir, num_workers=2)
+    assert os.path.basename(dataset.processed_dir) == os.path.basename(ref.processed_dir)
+    assert [shard.num_graphs for shard in dataset.shards] == [3, 3, 3, 1]
+    assert_same_frames(dataset, ref)
+
+    # the shards are batched together on demand.
+    assert torch.equal(dataset.data[AtomicDataDict.EDGE_INDEX_KEY], ref.data[AtomicDataDict.EDGE_INDEX_KEY])
+    assert torch.equal(dataset.data[AtomicDataDict.BATCH_KEY], ref.data[AtomicDataDict.BATCH_KEY])
+
+    # the cache is loaded from the memory mapped shards.
+    reloaded = build(other_dir)
+    assert len(reloaded.shards) == 4
+    assert_same_frames(reloaded, ref)
+
+
+def test_legacy_cache_migration(dataset_dir):
+    ref = build(dataset_dir)
+    data = ref.data.clone()
+    processed_dir = ref.processed_dir
+    del ref
+
+    # replace the cache by one in the format of `torch.save` of the whole batch.
+    for name in os.listdir(processed_dir):
+        if name.startswith("data."):
+            path = os.path.join(processed_dir, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    for k, v in data:
+        if k in _NESTED_FIELDS:
+            data[k] = list(v.unbind())
+    torch.save((data, None), os.path.join(processed_dir, "data.pth"))
+
+    migrated = build(dataset_dir)
+    assert not os.path.exists(os.path.join(processed_dir, "data.pth"))
+    assert os.path.exists(os.path.join(processed_dir, "data.index"))
+    assert_same_frames(migrated, build(dataset_dir))
+    assert torch.equal(migrated.data[AtomicDataDict.EDGE_INDEX_KEY], data[AtomicDataDict.EDGE_INDEX_KEY])
+
+    # the include_frames of the migrated cache are checked as those of a loaded one.
+    shutil.rmtree(processed_dir)
+    os.makedirs(processed_dir)
+    torch.save((data, [0, 1]), os.path.join(processed_dir, "data.pth"))
+    with pytest.raises(ValueError, match="include_frames"):
+        build(dataset_dir)
+
+
+def test_rebuild_removes_stale_shards(dataset_dir):
+    processed_dir = build(dataset_dir).processed_dir
+    (old,) = [name for name in os.listdir(processed_dir) if name.startswith("data.") and name != "data.index"]
+    # the shards of a build in progress are kept.
+    os.makedirs(os.path.join(processed_dir, "data.inflight.tmp"))
+    os.remove(os.path.join(processed_dir, "data.index"))
+
+    dataset = build(dataset_dir)
+    (new,) = [name for name in os.listdir(processed_dir) if name.startswith("data.") and name not in ["data.index", "data.inflight.tmp"]]
+    assert new != old and os.path.isdir(os.path.join(processed_dir, "data.inflight.tmp"))
+    assert len(dataset) == 10
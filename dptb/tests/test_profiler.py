@@ -0,0 +1,94 @@
+import os
+import json
+from pathlib import Path
+import pytest
+
+from dptb.nnops.trainer import Trainer
+from dptb.nn.build import build_model
+from dptb.data.build import build_dataset
+from dptb.utils.argcheck import normalize, collect_cutoffs
+from dptb.utils.tools import j_loader
+from dptb.utils.profiling import StageTimer, profile_stage, profile_iter, is_profiling
+from dptb.plugins.monitor import TrainLossMonitor, LearningRateMonitor, TensorBoardMonitor
+from dptb.plugins.profiler import Profiler
+
+rootdir = os.path.join(Path(os.path.abspath(__file__)).parent, "data")
+
+
+class FakeClock(object):
+    """The clock of the timers, advanced by ``sleep`` instead of the wall clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_stage_timer(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(StageTimer, "_now", lambda self: clock.perf_counter())
+    timer = StageTimer()
+    with profile_stage("outer"):
+        clock.sleep(0.01)
+    assert timer.reset() == {}
+
+    timer.activate()
+    try:
+        with profile_stage("outer"):
+            clock.sleep(0.02)
+            with profile_stage("inner"):
+                clock.sleep(0.03)
+        assert list(profile_iter([1, 2])) == [1, 2]
+    finally:
+        timer.deactivate()
+    assert not is_profiling()
+
+    # the time of the inner stage is not counted in the outer stage.
+    assert timer.counts["data_loading"] == 3
+    totals = timer.reset()
+    assert totals["outer"] == pytest.approx(0.02)
+    assert totals["inner"] == pytest.approx(0.03)
+
+
+def test_profiler_plugin(tmp_path, monkeypatch):
+    jdata = normalize(j_loader(f"{rootdir}/test_sktb/input/input_valence.json"))
+    jdata["train_options"]["num_epoch"] = 1
+    train_datasets = build_dataset(**collect_cutoffs(jdata), **jdata["data_options"]["train"], **jdata["common_options"])
+    model = build_model(None, model_options=jdata["model_options"], common_options=jdata["common_options"])
+    trainer = Trainer(
+        train_options=jdata["train_options"],
+        common_options=jdata["common_options"],
+        model=model,
+        train_datasets=train_datasets,
+        )
+
+    monkeypatch.chdir(tmp_path)
+    tensorboard = TensorBoardMonitor(interval=[(1, 'iteration'), (1, 'epoch')])
+    profiler = Profiler(log_freq=1, trace_steps=[1, 1], trace_path=str(tmp_path / "trace" / "trace.json"))
+    trainer.register_plugin(TrainLossMonitor())
+    trainer.register_plugin(LearningRateMonitor())
+    trainer.register_plugin(tensorboard)
+    trainer.register_plugin(profiler)
+    assert profiler.writer is tensorboard.writer
+
+    try:
+        trainer.run(1)
+    finally:
+        profiler.remove()
+    assert not is_profiling()
+
+    stats = trainer.stats["profile"]
+    for stage in ["step", "other", "data_loading", "model", "hamiltonian", "loss", "hr2hk", "eigensolver", "backward", "optimizer"]:
+        assert stage in stats["last"] and stage in stats["epoch_mean"], stage
+    # the stages are exclusive, and add up to the step.
+    step = stats["epoch_mean"].pop("step")
+    assert sum(stats["epoch_mean"].values()) == pytest.approx(step, rel=1e-6)
+    assert stats["peak_memory"] > 0
+
+    with open(tmp_path / "trace" / "trace.json") as f:
+        names = set(event.get("name") for event in json.load(f)["traceEvents"])
+    assert {"dptb::model", "dptb::hamiltonian", "dptb::eigensolver", "dptb::backward"} <= names
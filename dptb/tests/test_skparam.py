@@ -154,3 +154,59 @@ class TestSKParam:
 
         format_skparams = SKParam(basis={"C": ["2s", "2p"], "H": ["1s"]}, skdata=output)
         self.check_skdict(format_skparams)
+
+
+def read_skfile_by_line(filename, homo):
+    # the reference: the skf file parsed line by line, with the values converted one at a time.
+    from dptb.utils.tools import format_readline
+    with open(filename) as fr:
+        data = fr.readlines()
+    datline = format_readline(data[0])
+    ngrid = int(datline[1]) - 1
+    start = 3 if homo else 2
+    onsite = [float(val) for val in format_readline(data[1])[:10]] if homo else []
+    HSvals = [[float(val) for val in format_readline(data[il])[:20]] for il in range(start, start + ngrid)]
+    return float(datline[0]), onsite, torch.tensor(HSvals)
+
+
+def test_read_skfiles_cache(tmp_path, monkeypatch):
+    from dptb.nn.dftb.sk_param import skf_cache_file
+    monkeypatch.setenv("DPTB_CACHE_DIR", str(tmp_path / "cache"))
+    skdatapath = f"{rootdir}/hBN_dftb/slakos"
+    skfiles = {ifile.split('/')[-1].split('.')[0]: ifile for ifile in sorted(glob.glob(f"{skdatapath}/*.skf"))}
+
+    parsed = SKParam.read_skfiles(skfiles, num_workers=2)
+    assert all(os.path.isfile(skf_cache_file(ifile)) for ifile in skfiles.values())
+    cached = SKParam.read_skfiles(skfiles)
+    for key in ['Distance', 'Hopping', 'Overlap', 'OnsiteE', 'HubdU', 'Occu']:
+        assert list(parsed[key]) == list(cached[key])
+        for btype in parsed[key]:
+            assert torch.equal(parsed[key][btype], cached[key][btype])
+
+    for btype, ifile in skfiles.items():
+        atomtypes = btype.split('-')
+        gridDist, onsite, HSvals = read_skfile_by_line(ifile, atomtypes[0] == atomtypes[1])
+        assert torch.equal(parsed['Distance'][btype], torch.arange(1, HSvals.shape[0] + 1) * gridDist * 0.529177249)
+        assert torch.equal(parsed['Hopping'][btype], HSvals[:, :10].T * 13.605662285137 * 2)
+        assert torch.equal(parsed['Overlap'][btype], HSvals[:, 10:].T)
+        if atomtypes[0] == atomtypes[1]:
+            assert torch.equal(parsed['OnsiteE'][atomtypes[0]], torch.tensor(onsite[2::-1]) * 13.605662285137 * 2)
+            assert torch.equal(parsed['Occu'][atomtypes[0]], torch.tensor(onsite[:6:-1]))
+
+    # a modified file is parsed again.
+    copied = tmp_path / "H-H.skf"
+    copied.write_text(open(skfiles['H-H']).read())
+    old_cache = skf_cache_file(str(copied))
+    SKParam.read_skfiles({'H-H': str(copied)})
+    copied.write_text(open(skfiles['H-H']).read().replace("20*1.0", "20*2.0", 1))
+    assert skf_cache_file(str(copied)) != old_cache
+    assert not torch.equal(SKParam.read_skfiles({'H-H': str(copied)})['Hopping']['H-H'],
+                           parsed['Hopping']['H-H'])
+
+
+def test_read_skf_rows():
+    from dptb.nn.dftb.sk_param import read_skf_rows
+    rows = read_skf_rows(["1.0 2*0.5 3.0 T", "3*1.5 4.0", "4.0 3.0 2.0 1.0"], 4)
+    assert rows.tolist() == [[1.0, 0.5, 0.5, 3.0], [1.5, 1.5, 1.5, 4.0], [4.0, 3.0, 2.0, 1.0]]
+    with pytest.raises(ValueError):
+        read_skf_rows(["1.0 2.0"], 4)
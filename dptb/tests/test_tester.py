@@ -0,0 +1,136 @@
+import os
+import csv
+import json
+import shutil
+from pathlib import Path
+import pytest
+import torch
+from ase.io import read
+
+from dptb.entrypoints.test import _test
+from dptb.nnops.loss import HamilLossAnalysis
+from dptb.nnops.tester import StructureReport
+from dptb.data import AtomicData, AtomicDataDict
+from dptb.utils.torch_geometric import Batch
+
+rootdir = os.path.join(Path(os.path.abspath(__file__)).parent, "data")
+
+test_config = {
+    "common_options": {
+        "basis": {"Si": ["3s", "3p", "d*"]},
+        "device": "cpu",
+        "dtype": "float32",
+        "overlap": False,
+        "seed": 120468
+    },
+    "test_options": {
+        "batch_size": 3,
+        "band_window": [0, 8],
+        "loss_options": {"test": {"method": "eigvals"}}
+    },
+    "data_options": {
+        "test": {
+            "root": None,
+            "prefix": "kpathmd25",
+            "get_eigenvalues": True
+        }
+    }
+}
+
+
+def read_report(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_structure_report(tmp_path):
+    # the processed dataset is cached under the root.
+    shutil.copytree(f"{rootdir}/test_sktb/dataset/kpathmd25.0", tmp_path / "dataset" / "kpathmd25.0")
+    config = tmp_path / "input.json"
+    test_config["data_options"]["test"]["root"] = str(tmp_path / "dataset")
+    with open(config, "w") as f:
+        json.dump(test_config, f)
+    output = tmp_path / "out"
+    kwargs = dict(INPUT=str(config), init_model=f"{rootdir}/silicon_1nn/nnsk.ep500.pth", output=str(output), log_level=20, log_path=None, use_correction=None)
+
+    _test(**kwargs)
+    path = output / "results" / "structures.csv"
+    rows = read_report(path)
+    assert rows[0] == ["idx", "eig/mae", "eig/rmse", "eig/max"]
+    assert [int(row[0]) for row in rows[1:]] == list(range(10))
+    values = torch.tensor([[float(v) for v in row[1:]] for row in rows[1:]])
+    assert (values > 0).all()
+    assert (values[:, 0] <= values[:, 1]).all() and (values[:, 1] <= values[:, 2]).all()
+
+    # by default, a rerun overwrites the report.
+    text = path.read_text()
+    lines = text.splitlines(keepends=True)
+    path.write_text("".join(lines[:5]))
+    assert StructureReport(str(path)).finished == set()
+    _test(**kwargs)
+    assert read_report(path) == rows
+
+    # an interrupted run leaves a partial row, which is dropped and recomputed on resume.
+    path.write_text("".join(lines[:5]) + lines[5][:10])
+    assert StructureReport(str(path), resume=True).finished == {0, 1, 2, 3}
+    test_config["test_options"]["resume"] = True
+    with open(config, "w") as f:
+        json.dump(test_config, f)
+    _test(**kwargs)
+    resumed = read_report(path)
+    assert sorted(resumed[1:], key=lambda row: int(row[0])) == rows[1:]
+    test_config["test_options"].pop("resume")
+
+
+def test_hamilloss_per_structure():
+    la = HamilLossAnalysis(basis={"B": "1s1p", "N": "1s1p"}, decompose=False)
+    data_list, ref_list = [], []
+    for i, name in enumerate(["hBN.vasp", "hBN_2_2.vasp"]):
+        data = la.idp(AtomicData.from_ase(atoms=read(f"{rootdir}/hBN/{name}"), r_max=4.0).to_dict())
+        torch.manual_seed(i)
+        data[AtomicDataDict.NODE_FEATURES_KEY] = torch.randn(data[AtomicDataDict.ATOM_TYPE_KEY].shape[0], 13)
+        data[AtomicDataDict.EDGE_FEATURES_KEY] = torch.randn(data[AtomicDataDict.EDGE_INDEX_KEY].shape[1], 13)
+        ref = data.copy()
+        ref[AtomicDataDict.NODE_FEATURES_KEY] = torch.zeros_like(data[AtomicDataDict.NODE_FEATURES_KEY])
+        ref[AtomicDataDict.EDGE_FEATURES_KEY] = torch.zeros_like(data[AtomicDataDict.EDGE_FEATURES_KEY])
+        data_list.append(data)
+        ref_list.append(ref)
+
+    batch = AtomicData.to_AtomicDataDict(Batch.from_data_list([AtomicData.from_dict(d) for d in data_list]))
+    ref_batch = AtomicData.to_AtomicDataDict(Batch.from_data_list([AtomicData.from_dict(d) for d in ref_list]))
+    columns = la.per_structure(batch, ref_batch)
+    assert columns["hopping/B-N/1s-1p/mae"].shape == (2,)
+    assert "onsite/B/1s-1p/mae" in columns
+
+    # the errors of each structure are the same as the analysis of the structure alone.
+    for i in range(2):
+        stats = la(data_list[i], ref_list[i])
+        for name in ["onsite", "hopping"]:
+            for tn, stat in stats[name].items():
+                if stat["n_element"] == 0:
+                    assert torch.isnan(columns[f"{name}/{tn}/mae"][i])
+                    continue
+                assert torch.isclose(columns[f"{name}/{tn}/mae"][i], stat["mae"])
+                assert torch.isclose(columns[f"{name}/{tn}/rmse"][i], stat["rmse"])
+        err = data_list[i][AtomicDataDict.EDGE_FEATURES_KEY][data_list[i][AtomicDataDict.EDGE_TYPE_KEY].flatten() == la.idp.bond_to_type["B-N"]]
+        assert torch.isclose(columns["hopping/B-N/1s-1p/mae"][i], err[:, la.idp.orbpair_maps["1s-1p"]].abs().mean())
+
+
+def test_structure_errors_eigloss(tmp_path):
+    # the eigenvalue errors are those of the eigenvalue loss, whose diff_valence bands are excluded.
+    from dptb.nn.build import build_model
+    from dptb.data.build import build_dataset
+    from dptb.nnops.tester import Tester
+
+    shutil.copytree(f"{rootdir}/test_sktb/dataset/kpathmd25.0", tmp_path / "dataset" / "kpathmd25.0")
+    model = build_model(checkpoint=f"{rootdir}/silicon_1nn/nnsk.ep500.pth")
+    common_options = {**test_config["common_options"], "basis": model.idp.basis}
+    dataset = build_dataset.from_model(model, root=str(tmp_path / "dataset"), prefix="kpathmd25", get_eigenvalues=True, basis=model.idp.basis)
+    test_options = {"batch_size": 1, "loss_options": {"test": {"method": "eigvals", "diff_valence": {"Si": 2}}}}
+    tester = Tester(test_options, common_options, model, dataset, report_path=str(tmp_path / "structures.csv"))
+
+    losses = [float(tester.iteration(Batch.from_data_list([dataset[i]]), [i])) for i in range(3)]
+    rows = read_report(tmp_path / "structures.csv")
+    assert rows[0] == ["idx", "eig/mae", "eig/rmse", "eig/max"]
+    for row, loss in zip(rows[1:], losses):
+        assert float(row[2]) ** 2 == pytest.approx(loss, rel=1e-4)
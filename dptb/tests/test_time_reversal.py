@@ -0,0 +1,111 @@
+import os
+import pytest
+import torch
+import numpy as np
+
+from dptb.data import AtomicDataDict
+from dptb.nn.hr2hk import HR2HK, time_reversal_kset
+from dptb.nn.energy import Eigenvalues, Eigh
+from dptb.postprocess.unified import TBSystem
+from dptb.utils.make_kpoints import TimeReversalKSet, kmesh_sampling
+
+
+@pytest.fixture(scope='session', autouse=True)
+def root_directory(request):
+    return str(request.config.rootdir)
+
+
+@pytest.fixture(scope='module')
+def hamiltonian(root_directory):
+    system = TBSystem(
+        data=os.path.join(root_directory, "dptb/tests/data/silicon_1nn/silicon.vasp"),
+        calculator=os.path.join(root_directory, "dptb/tests/data/silicon_1nn/nnsk.ep500.pth"),
+        device="cpu",
+    )
+    with torch.no_grad():
+        data = system.calculator.model_forward(system.data.copy())
+    return system.model, data
+
+
+def with_kpoints(data, kpoints, dtype):
+    data = dict(data)
+    data[AtomicDataDict.KPOINT_KEY] = torch.nested.as_nested_tensor([torch.as_tensor(kpoints, dtype=dtype)])
+    return data
+
+
+def test_kset_pairs():
+    kpoints = [[0., 0., 0.], [0.1, 0., 0.], [0.9, 0., 0.], [0.3, 0., 0.], [1.1, 0., 0.], [0.5, 0.5, 0.]]
+    kset = TimeReversalKSet(kpoints)
+    assert kset.irreducible.tolist() == [0, 1, 3, 5]
+    assert kset.index.tolist() == [0, 1, 1, 2, 1, 3]
+    assert kset.conjugate.tolist() == [False, False, True, False, False, False]
+    assert np.allclose(kset.weights, np.array([1, 3, 1, 1]) / 6)
+    # the gamma and the TRIM point are self-conjugate, 0.3 has no partner.
+    assert kset.closed.tolist() == [True, True, False, True]
+
+    # without periodicity only the exact -k are partners.
+    kset = TimeReversalKSet([[0.1, 0., 0.], [-0.1, 0., 0.], [0.9, 0., 0.]], periodic=False)
+    assert kset.irreducible.tolist() == [0, 2]
+    assert kset.conjugate.tolist() == [False, True, False]
+
+    kset = TimeReversalKSet(kpoints, time_reversal=False)
+    assert kset.is_trivial and not kset.closed.any()
+
+    values = torch.randn(4, 2, 2, dtype=torch.complex128)
+    expanded = TimeReversalKSet(kpoints).expand(values, conjugate=True, sign=-1.0)
+    assert torch.equal(expanded[2], -values[1].conj())
+    assert torch.equal(expanded[4], values[1])
+
+
+@pytest.mark.parametrize("is_gamma_center", [True, False])
+def test_kset_mesh(is_gamma_center):
+    kset = TimeReversalKSet(kmesh_sampling([4, 4, 3], is_gamma_center=is_gamma_center))
+    # the gamma centered mesh has 4 TRIM points, the MP mesh none.
+    assert kset.num_irreducible == (26 if is_gamma_center else 24)
+    assert kset.closed.all()
+    assert np.isclose(kset.weights.sum(), 1.0)
+
+
+def test_kset_soc_switch(hamiltonian):
+    model, data = hamiltonian
+    kpoints = torch.as_tensor(kmesh_sampling([3, 3, 3]))
+    assert time_reversal_kset(data, kpoints) is not None
+    data = dict(data)
+    data[AtomicDataDict.NODE_SOC_SWITCH_KEY] = torch.ones_like(data[AtomicDataDict.NODE_SOC_SWITCH_KEY])
+    assert time_reversal_kset(data, kpoints) is None
+
+
+@pytest.mark.parametrize("gauge", [False, True])
+def test_hr2hk_time_reversal(hamiltonian, gauge):
+    model, data = hamiltonian
+    kpoints = kmesh_sampling([3, 2, 2], is_gamma_center=False)
+    out = []
+    for time_reversal in [False, True]:
+        h2k = HR2HK(idp=model.idp, dtype=model.dtype, device=model.device, derivative=gauge, time_reversal=time_reversal)
+        with torch.no_grad():
+            out.append(h2k(with_kpoints(data, kpoints, model.dtype)))
+    assert torch.allclose(out[0][AtomicDataDict.HAMILTONIAN_KEY], out[1][AtomicDataDict.HAMILTONIAN_KEY], atol=1e-6)
+    if gauge:
+        assert torch.allclose(out[0][AtomicDataDict.HAMILTONIAN_DERIV_KEY], out[1][AtomicDataDict.HAMILTONIAN_DERIV_KEY], atol=1e-6)
+
+
+def test_eigh_time_reversal(hamiltonian):
+    model, data = hamiltonian
+    kpoints = kmesh_sampling([3, 3, 2])
+    out = {}
+    for module in [Eigenvalues, Eigh]:
+        for time_reversal in [False, True]:
+            solver = module(idp=model.idp, dtype=model.dtype, device=model.device, time_reversal=time_reversal)
+            with torch.no_grad():
+                out[module, time_reversal] = solver(with_kpoints(data, kpoints, model.dtype))
+
+    ref = out[Eigenvalues, False][AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    hk = out[Eigenvalues, False][AtomicDataDict.HAMILTONIAN_KEY]
+    assert torch.allclose(out[Eigenvalues, True][AtomicDataDict.ENERGY_EIGENVALUE_KEY][0], ref, atol=1e-5)
+    assert torch.allclose(out[Eigenvalues, True][AtomicDataDict.HAMILTONIAN_KEY], hk, atol=1e-6)
+
+    # the eigenvectors of the partners are the conjugates, which are eigenvectors of H(-k).
+    eigvals = out[Eigh, True][AtomicDataDict.ENERGY_EIGENVALUE_KEY][0]
+    eigvecs = out[Eigh, True][AtomicDataDict.EIGENVECTOR_KEY]
+    assert torch.allclose(eigvals, ref, atol=1e-5)
+    assert torch.allclose(hk @ eigvecs, eigvecs * eigvals.unsqueeze(1).type_as(eigvecs), atol=1e-4)
@@ -1,3 +1,4 @@
+import pytest
 from ase.io import read
 from dptb.data import AtomicData, AtomicDataDict
 from dptb.nn.tensor_product import SO2_Linear
@@ -52,4 +53,45 @@ def test_so2_rotation(ir=Irreps("2x0e+3x1o+4x2e+5x3o+6x4e")):
         rot_mat_L = wigner_D(l, alpha, beta, torch.tensor(0., dtype=torch.float64))
         out[1][slices[i]] = (out[1][slices[i]].reshape(mul, 2*l+1) @ rot_mat_L).reshape(-1)
 
-    assert torch.allclose(out[1], out[0], atol=5e-5), "SO2 rotation test failed"
\ No newline at end of file
+    assert torch.allclose(out[1], out[0], atol=5e-5), "SO2 rotation test failed"
+
+def rotate(ir, x, alpha, beta):
+    x = x.clone()
+    for (mul, (l, p)), sl in zip(ir, ir.slices()):
+        rot_mat_L = wigner_D(l, alpha, beta, torch.tensor(0., dtype=torch.float64))
+        x[..., sl] = (x[..., sl].reshape(-1, mul, 2*l+1) @ rot_mat_L.T).reshape(x[..., sl].shape)
+    return x
+
+
+@pytest.mark.parametrize("ir_in, ir_out", [
+    ("8x0e+4x1o+2x2e", "16x0e+8x1o+4x2e"),
+    ("16x0e+8x1o+8x2e+4x3o", "8x0e+4x1o+2x2e"),
+    ])
+def test_so2_rotation_radial(ir_in, ir_out):
+    ir_in, ir_out = Irreps(ir_in), Irreps(ir_out)
+    so2l = SO2_Linear(ir_in, ir_out, radial_emb=True, latent_dim=4, radial_channels=[8], extra_m0_outsize=2).double()
+    assert so2l.front == (ir_in.dim <= so2l.irreps_out.dim)
+
+    a = torch.randn(5, ir_in.dim, dtype=torch.float64)
+    R = torch.randn(5, 3, dtype=torch.float64)
+    R = R / R.norm(dim=1, keepdim=True)
+    latents = torch.randn(5, 4, dtype=torch.float64)
+
+    vec = torch.randn(3, dtype=torch.float64)
+    vec /= vec.norm()
+    alpha, beta = xyz_to_angles(vec[[1,2,0]])
+    rot_mat = wigner_D(1, alpha, beta, torch.tensor(0., dtype=torch.float64))
+    R_rot = (R[:, [1,2,0]] @ rot_mat.T)[:, [2,0,1]]
+
+    out = so2l(a, R, latents)
+    out_rot = so2l(rotate(ir_in, a, alpha, beta), R_rot, latents)
+    assert torch.allclose(rotate(so2l.irreps_out, out, alpha, beta), out_rot, atol=5e-5)
+
+
+def test_so2_block_weight():
+    so2l = SO2_Linear(Irreps("4x0e+3x1o+2x2e"), Irreps("4x0e+3x1o+2x2e"))
+    weight = so2l.block_weight()
+    assert weight.shape == (so2l.irreps_out.dim, so2l.m_in_perm.numel())
+    assert torch.equal(weight[:so2l.fc_m0.out_features, :so2l.fc_m0.in_features], so2l.fc_m0.weight)
+    # every output component is written once.
+    assert torch.equal(so2l.m_out_inv_perm.sort().values, torch.arange(so2l.irreps_out.dim))
@@ -0,0 +1,83 @@
+import os
+from pathlib import Path
+import h5py
+import numpy as np
+import pytest
+import torch
+from ase.build import bulk
+
+from dptb.nn.build import build_model
+from dptb.postprocess.write_block import write_block, write_block_stream, receptive_hops
+from dptb.data.dataset._hdf5_dataset import unpack_blocks
+
+rootdir = os.path.join(Path(os.path.abspath(__file__)).parent, "data")
+
+lem_options = {
+    "embedding": {
+        "method": "lem",
+        "r_max": {"Si": 5.0},
+        "irreps_hidden": "8x0e+8x1o+4x2e",
+        "n_layers": 2,
+        "avg_num_neighbors": 20,
+    },
+    "prediction": {"method": "e3tb", "neurons": [16]},
+}
+
+
+def get_atoms(repeat):
+    atoms = bulk("Si", "diamond", a=5.43, cubic=True).repeat(repeat)
+    atoms.rattle(0.05, seed=1)
+    return atoms
+
+
+def read_stream(path):
+    with h5py.File(path, "r") as f:
+        return unpack_blocks(f["0"])
+
+
+def assert_same_blocks(ref, blocks):
+    assert set(ref.keys()) == set(blocks.keys())
+    for key, value in ref.items():
+        assert np.allclose(value.numpy(), blocks[key], atol=1e-6), key
+
+
+@pytest.fixture(scope="module")
+def lem_model():
+    torch.manual_seed(0)
+    return build_model(model_options=lem_options, common_options={"basis": {"Si": "1s1p"}, "device": "cpu", "dtype": "float32", "overlap": False})
+
+
+@pytest.mark.parametrize("chunk_atoms", [8, 1000])
+def test_write_block_stream_nnsk(tmp_path, chunk_atoms):
+    model = build_model(checkpoint=f"{rootdir}/silicon_1nn/nnsk.ep500.pth")
+    options = {"r_max": 2.6, "oer_max": 2.5, "pbc": True}
+    atoms = get_atoms((2, 2, 2))
+    assert receptive_hops(model) == 1
+
+    ref = write_block(atoms, model, options)
+    write_block_stream(atoms, model, str(tmp_path / "block.h5"), options, chunk_atoms=chunk_atoms)
+    assert_same_blocks(ref, read_stream(tmp_path / "block.h5"))
+
+
+def test_write_block_stream_nnenv(tmp_path, lem_model, caplog):
+    options = {"r_max": 5.0, "er_max": 5.0, "oer_max": 2.5, "pbc": True}
+    atoms = get_atoms((3, 3, 3))
+    assert receptive_hops(lem_model) == 3
+
+    ref = write_block(atoms, lem_model, options)
+    write_block_stream(atoms, lem_model, str(tmp_path / "block.h5"), options, chunk_atoms=32)
+    assert_same_blocks(ref, read_stream(tmp_path / "block.h5"))
+
+    # a halo smaller than the receptive field of the message passing changes the blocks at the chunk boundary.
+    write_block_stream(atoms, lem_model, str(tmp_path / "block.h5"), options, chunk_atoms=32, halo_hops=1)
+    assert "smaller than the receptive field" in caplog.text
+    blocks = read_stream(tmp_path / "block.h5")
+    assert set(ref.keys()) == set(blocks.keys())
+    assert max(np.abs(value.numpy() - blocks[key]).max() for key, value in ref.items()) > 1e-4
+
+
+def test_receptive_hops_default_layers():
+    # the layers are counted on the built embedding, whose constructor defaults to 3 layers.
+    options = {**lem_options, "embedding": {k: v for k, v in lem_options["embedding"].items() if k != "n_layers"}}
+    model = build_model(model_options=options, common_options={"basis": {"Si": "1s1p"}, "device": "cpu", "dtype": "float32", "overlap": False})
+    assert receptive_hops(model) == 4
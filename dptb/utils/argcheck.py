@@ -87,6 +87,14 @@ def common_options():
     doc_seed = "The random seed used to initialize the parameters and determine the shuffling order of datasets. Default: `3982377700`"
     doc_basis = "The atomic orbitals used to construct the basis. e.p. {'A':['2s','2p','s*'],'B':'[3s','3p']}"
     doc_overlap = "Whether to calculate the overlap matrix. Default: False"
+    doc_autocast = """Run the embedding and prediction layers of the neural network models in mixed precision, choose among:
+                    Default: `none`
+                        - `none`: run all layers in `dtype`
+                        - `bf16`: autocast to torch.bfloat16
+                        - `fp16`: autocast to torch.float16
+                    The Hamiltonian blocks are always assembled in `dtype`.
+                """
+    doc_compile = "Whether to compile the embedding forward with `torch.compile`, with dynamic shapes for the varying number of edges. A dict is passed to `torch.compile` as keyword arguments, e.g. {'backend': 'inductor', 'mode': 'max-autotune'}. Default: False"
 
     args = [
         Argument("basis", dict, optional=False, doc=doc_basis),
@@ -94,6 +102,8 @@ def common_options():
         Argument("device", str, optional = True, default="cpu", doc = doc_device),
         Argument("dtype", str, optional = True, default="float32", doc = doc_dtype),
         Argument("seed", int, optional=True, default=3982377700, doc=doc_seed),
+        Argument("autocast", str, optional=True, default="none", doc=doc_autocast),
+        Argument("compile", [bool, dict], optional=True, default=False, doc=doc_compile),
     ]
 
     doc_common_options = ""
@@ -143,6 +153,7 @@ def train_options():
         Argument("sliding_win_size", int, optional=True, default=50, doc=doc_sliding_win_size),
         Argument("max_ckpt", int, optional=True, default=4, doc=doc_max_ckpt),
         Argument("valid_fast", bool, optional=True, default=True, doc="Set True to valid on the first batch of validation dataset, set False to valid the whole dataset. Default: True"),
+        profiler_options(),
 
         loss_options()
     ]
@@ -154,17 +165,40 @@ def train_options():
 def test_options():
     doc_display_freq = "Frequency, or every how many iteration to display the training log to screem. Default: `1`"
     doc_batch_size = "The batch size used in testing, Default: 1"
+    doc_num_workers = "The number of worker processes loading the test data, Default: 0"
+    doc_band_window = "The [band_min, band_max] window of the eigenvalue errors in the structure report, counted as in the eigenvalue loss, after the bands excluded by its `diff_valence`. Default: None, which uses the band window of the dataset"
+    doc_resume = "Whether to continue the structure report in the output folder, skipping the structures already tested. Only resume the report of the same model and test dataset. Default: False"
 
     args = [
         Argument("batch_size", int, optional=True, default=1, doc=doc_batch_size),
         Argument("display_freq", int, optional=True, default=1, doc=doc_display_freq),
-        loss_options()
+        Argument("num_workers", int, optional=True, default=0, doc=doc_num_workers),
+        Argument("band_window", [list, None], optional=True, default=None, doc=doc_band_window),
+        Argument("resume", bool, optional=True, default=False, doc=doc_resume),
+        profiler_options(),
+        loss_options(test=True)
     ]
 
     doc_test_options = "Options that defines the testing behaviour of DeePTB."
 
     return Argument("test_options", dict, sub_fields=args, sub_variants=[], optional=False, doc=doc_test_options)
 
+def profiler_options():
+    doc_log_freq = "Every how many iterations to log the mean time per step of each stage and the peak memory. Default: 10"
+    doc_trace_steps = "The [first, last] iterations recorded in a Chrome trace, viewable in chrome://tracing or Perfetto. Default: None, no trace is recorded"
+    doc_trace_path = "The path of the Chrome trace. Default: None, profile_trace.json in the output folder"
+    doc_synchronize = "Whether to synchronize the cuda device around every stage, which gives accurate stage times but slows down the steps. Default: True"
+
+    args = [
+        Argument("log_freq", int, optional=True, default=10, doc=doc_log_freq),
+        Argument("trace_steps", [list, None], optional=True, default=None, doc=doc_trace_steps),
+        Argument("trace_path", [str, None], optional=True, default=None, doc=doc_trace_path),
+        Argument("synchronize", bool, optional=True, default=True, doc=doc_synchronize),
+    ]
+
+    doc_profiler = "The options of the profiler, which times the data loading, neighbor lists, embedding, prediction, Hamiltonian assembly, HR2HK, eigensolver, loss, backward and optimizer stages of each step. Default: None, the steps are not profiled"
+    return Argument("profiler", [dict, None], sub_fields=args, sub_variants=[], optional=True, default=None, doc=doc_profiler)
+
 
 def Adam():
     doc_lr = "learning rate. Default: 1e-3"
@@ -343,21 +377,33 @@ def lr_scheduler():
 def train_data_sub():
     doc_root = "This is where the dataset stores data files."
     doc_prefix = "The prefix of the folders under root, which will be loaded in dataset."
+    doc_manifest = "A manifest written by `dptb data --split` or `--collect`, listing the folders (or LMDB records) to load in place of the root and the prefix."
+    doc_split = "The split of the manifest to load, e.g. `train`, `val` or `test`. All the folders of the manifest are loaded if not provided."
     doc_ham = "Choose whether the Hamiltonian blocks (and overlap blocks, if provided) are loaded when building dataset."
     doc_eig = "Choose whether the eigenvalues and k-points are loaded when building dataset."
     doc_vlp = "Choose whether the overlap blocks are loaded when building dataset."
     doc_DM = "Choose whether the density matrix is loaded when building dataset."
     doc_separator = "the sepatator used to separate the prefix and suffix in the dataset directory. Default: '.'"
+    doc_lazy = "Only for HDF5Dataset, build the graph of each frame on demand with a LRU cache, instead of loading all frames in memory. Default: False"
+    doc_num_workers = "The number of worker processes building the shards of the processed dataset cache. Default: 1"
+    doc_statistics_num_workers = "The number of worker processes collecting the E3 irreps statistics of the dataset, which initialize the scale and shift of the e3tb model. Default: 1"
+    doc_statistics_chunk_size = "The number of frames processed together when collecting the E3 irreps statistics. Default: 32"
 
     args = [
         Argument("type", str, optional=True, default="DefaultDataset", doc="The type of dataset."),
-        Argument("root", str, optional=False, doc=doc_root),
+        Argument("root", str, optional=True, default=None, doc=doc_root),
         Argument("prefix", str, optional=True, default=None, doc=doc_prefix),
+        Argument("manifest", str, optional=True, default=None, doc=doc_manifest),
+        Argument("split", str, optional=True, default=None, doc=doc_split),
         Argument("separator", str, optional=True, default='.', doc=doc_separator),
         Argument("get_Hamiltonian", bool, optional=True, default=False, doc=doc_ham),
         Argument("get_overlap", bool, optional=True, default=False, doc=doc_vlp),
         Argument("get_DM", bool, optional=True, default=False, doc=doc_DM),
-        Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig)
+        Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig),
+        Argument("lazy", bool, optional=True, default=False, doc=doc_lazy),
+        Argument("num_workers", int, optional=True, default=1, doc=doc_num_workers),
+        Argument("statistics_num_workers", int, optional=True, default=1, doc=doc_statistics_num_workers),
+        Argument("statistics_chunk_size", int, optional=True, default=32, doc=doc_statistics_chunk_size)
     ]
 
     doc_train = "The dataset settings for training."
@@ -367,21 +413,29 @@ def train_data_sub():
 def validation_data_sub():
     doc_root = "This is where the dataset stores data files."
     doc_prefix = "The prefix of the folders under root, which will be loaded in dataset."
+    doc_manifest = "A manifest written by `dptb data --split` or `--collect`, listing the folders (or LMDB records) to load in place of the root and the prefix."
+    doc_split = "The split of the manifest to load, e.g. `train`, `val` or `test`. All the folders of the manifest are loaded if not provided."
     doc_ham = "Choose whether the Hamiltonian blocks (and overlap blocks, if provided) are loaded when building dataset."
     doc_eig = "Choose whether the eigenvalues and k-points are loaded when building dataset."
     doc_vlp = "Choose whether the overlap blocks are loaded when building dataset."
     doc_DM = "Choose whether the density matrix is loaded when building dataset."
     doc_separator = "the sepatator used to separate the prefix and suffix in the dataset directory. Default: '.'"
+    doc_lazy = "Only for HDF5Dataset, build the graph of each frame on demand with a LRU cache, instead of loading all frames in memory. Default: False"
+    doc_num_workers = "The number of worker processes building the shards of the processed dataset cache. Default: 1"
 
     args = [
         Argument("type", str, optional=True, default="DefaultDataset", doc="The type of dataset."),
-        Argument("root", str, optional=False, doc=doc_root),
+        Argument("root", str, optional=True, default=None, doc=doc_root),
         Argument("prefix", str, optional=True, default=None, doc=doc_prefix),
+        Argument("manifest", str, optional=True, default=None, doc=doc_manifest),
+        Argument("split", str, optional=True, default=None, doc=doc_split),
         Argument("separator", str, optional=True, default='.', doc=doc_separator),
         Argument("get_Hamiltonian", bool, optional=True, default=False, doc=doc_ham),
         Argument("get_overlap", bool, optional=True, default=False, doc=doc_vlp),
         Argument("get_DM", bool, optional=True, default=False, doc=doc_DM),
-        Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig)
+        Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig),
+        Argument("lazy", bool, optional=True, default=False, doc=doc_lazy),
+        Argument("num_workers", int, optional=True, default=1, doc=doc_num_workers)
     ]
 
     doc_validation = "The dataset settings for validation."
@@ -391,21 +445,29 @@ def validation_data_sub():
 def reference_data_sub():
     doc_root = "This is where the dataset stores data files."
     doc_prefix = "The prefix of the folders under root, which will be loaded in dataset."
+    doc_manifest = "A manifest written by `dptb data --split` or `--collect`, listing the folders (or LMDB records) to load in place of the root and the prefix."
+    doc_split = "The split of the manifest to load, e.g. `train`, `val` or `test`. All the folders of the manifest are loaded if not provided."
     doc_ham = "Choose whether the Hamiltonian blocks (and overlap blocks, if provided) are loaded when building dataset."
     doc_eig = "Choose whether the eigenvalues and k-points are loaded when building dataset."
     doc_vlp = "Choose whether the overlap blocks are loaded when building dataset."
     doc_DM = "Choose whether the density matrix is loaded when building dataset."
     doc_separator = "the sepatator used to separate the prefix and suffix in the dataset directory. Default: '.'"
+    doc_lazy = "Only for HDF5Dataset, build the graph of each frame on demand with a LRU cache, instead of loading all frames in memory. Default: False"
+    doc_num_workers = "The number of worker processes building the shards of the processed dataset cache. Default: 1"
 
     args = [
         Argument("type", str, optional=True, default="DefaultDataset", doc="The type of dataset."),
-        Argument("root", str, optional=False, doc=doc_root),
+        Argument("root", str, optional=True, default=None, doc=doc_root),
         Argument("prefix", str, optional=True, default=None, doc=doc_prefix),
+        Argument("manifest", str, optional=True, default=None, doc=doc_manifest),
+        Argument("split", str, optional=True, default=None, doc=doc_split),
         Argument("separator", str, optional=True, default='.', doc=doc_separator),
         Argument("get_Hamiltonian", bool, optional=True, default=False, doc=doc_ham),
         Argument("get_overlap", bool, optional=True, default=False, doc=doc_vlp),
         Argument("get_DM", bool, optional=True, default=False, doc=doc_DM),
-        Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig)
+        Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig),
+        Argument("lazy", bool, optional=True, default=False, doc=doc_lazy),
+        Argument("num_workers", int, optional=True, default=1, doc=doc_num_workers)
     ]
 
     doc_reference = "The dataset settings for reference."
@@ -415,21 +477,29 @@ def reference_data_sub():
 def test_data_sub():
     doc_root = "This is where the dataset stores data files."
     doc_prefix = "The prefix of the folders under root, which will be loaded in dataset."
+    doc_manifest = "A manifest written by `dptb data --split` or `--collect`, listing the folders (or LMDB records) to load in place of the root and the prefix."
+    doc_split = "The split of the manifest to load, e.g. `train`, `val` or `test`. All the folders of the manifest are loaded if not provided."
     doc_ham = "Choose whether the Hamiltonian blocks (and overlap blocks, if provided) are loaded when building dataset."
     doc_eig = "Choose whether the eigenvalues and k-points are loaded when building dataset."
     doc_vlp = "Choose whether the overlap blocks are loaded when building dataset."
     doc_DM = "Choose whether the density matrix is loaded when building dataset."
     doc_separator = "the sepatator used to separate the prefix and suffix in the dataset directory. Default: '.'"
+    doc_lazy = "Only for HDF5Dataset, build the graph of each frame on demand with a LRU cache, instead of loading all frames in memory. Default: False"
+    doc_num_workers = "The number of worker processes building the shards of the processed dataset cache. Default: 1"
 
     args = [
         Argument("type", str, optional=True, default="DefaultDataset", doc="The type of dataset."),
-        Argument("root", str, optional=False, doc=doc_root),
+        Argument("root", str, optional=True, default=None, doc=doc_root),
         Argument("prefix", str, optional=True, default=None, doc=doc_prefix),
+        Argument("manifest", str, optional=True, default=None, doc=doc_manifest),
+        Argument("split", str, optional=True, default=None, doc=doc_split),
         Argument("get_Hamiltonian", bool, optional=True, default=False, doc=doc_ham),
         Argument("get_eigenvalues", bool, optional=True, default=False, doc=doc_eig),
         Argument("get_overlap", bool, optional=True, default=False, doc=doc_vlp),
         Argument("get_DM", bool, optional=True, default=False, doc=doc_DM),
-        Argument("separator", str, optional=True, default='.', doc=doc_separator)
+        Argument("separator", str, optional=True, default='.', doc=doc_separator),
+        Argument("lazy", bool, optional=True, default=False, doc=doc_lazy),
+        Argument("num_workers", int, optional=True, default=1, doc=doc_num_workers)
     ]
 
     doc_test = "The dataset settings for testing."
@@ -825,7 +895,7 @@ def hopping():
     return Variant("method", args,optional=False, doc=doc_method)
 
 
-def loss_options():
+def loss_options(test: bool=False):
     doc_method = """The loss function type, defined by a string like `<fitting target>_<loss type>`, Default: `eigs_l2dsf`. supported loss functions includes:\n\n\
                     - `eigvals`: The mse loss predicted and labeled eigenvalues and Delta eigenvalues between different k.
                     - `hamil`: 
@@ -835,6 +905,7 @@ def loss_options():
     doc_train = "Loss options for training."
     doc_validation = "Loss options for validation."
     doc_reference = "Loss options for reference data in training."
+    doc_test = "Loss options for testing."
 
     hamil = [
         Argument("onsite_shift", bool, optional=True, default=False, doc="Whether to use onsite shift in loss function. Default: False"),
@@ -874,11 +945,16 @@ def loss_options():
 
 
 
-    args = [
-        Argument("train", dict, optional=False, sub_fields=[], sub_variants=[loss_args], doc=doc_train),
-        Argument("validation", dict, optional=True, sub_fields=[], sub_variants=[loss_args], doc=doc_validation),
-        Argument("reference", dict, optional=True, sub_fields=[], sub_variants=[loss_args], doc=doc_reference),
-    ]
+    if test:
+        args = [
+            Argument("test", dict, optional=False, sub_fields=[], sub_variants=[loss_args], doc=doc_test),
+        ]
+    else:
+        args = [
+            Argument("train", dict, optional=False, sub_fields=[], sub_variants=[loss_args], doc=doc_train),
+            Argument("validation", dict, optional=True, sub_fields=[], sub_variants=[loss_args], doc=doc_validation),
+            Argument("reference", dict, optional=True, sub_fields=[], sub_variants=[loss_args], doc=doc_reference),
+        ]
 
     doc_loss_options = ""
     return Argument("loss_options", dict, sub_fields=args, sub_variants=[], optional=False, doc=doc_loss_options)
@@ -962,7 +1038,7 @@ def normalize_test(data):
     da = test_data_options()
     to = test_options()
 
-    base = Argument("base", dict, [co, da, to, lo])
+    base = Argument("base", dict, [co, da, to])
     data = base.normalize_value(data)
     # data = base.normalize_value(data, trim_pattern="_*")
     base.check_value(data, strict=True)
@@ -1195,7 +1271,8 @@ def run_options():
         Argument("use_gui", bool, optional=True, default=False, doc = doc_gui),
         Argument("device", [str,None], optional = True, default=None, doc = doc_device),
         Argument("dtype", [str,None], optional = True, default=None, doc = doc_dtype),
-        AtomicData_options_sub()
+        AtomicData_options_sub(),
+        batch_options_sub()
     ]
 
     return Argument("run_op", dict, args)
@@ -1220,8 +1297,6 @@ def task_options():
                     - `negf`: for non-equilibrium green function calculation.
                     - `tbtrans_negf`: for non-equilibrium green function calculation with tbtrans.
                 '''
-    write_block = []
-
     return Variant("task", [
             Argument("band", dict, band()),
             Argument("dos", dict, dos()),
@@ -1232,7 +1307,7 @@ def task_options():
             Argument("ifermi", dict, ifermi()),
             Argument("negf", dict, negf()),
             Argument("tbtrans_negf", dict, tbtrans_negf()),
-            Argument("write_block", dict, write_block),
+            Argument("write_block", dict, write_block()),
         ],optional=False, doc=doc_task)
 
 def band():
@@ -1457,6 +1532,18 @@ def write_sk():
     ]
 
 
+def write_block():
+    doc_stream = "Whether to write the blocks chunk by chunk in the packed layout, which bounds the memory for large structures. Can also be set by `dptb run --stream`."
+    doc_chunk_atoms = "The number of atoms in each chunk of the streaming writer."
+    doc_halo_hops = "The graph hops of neighbours added around each chunk. By default it is the receptive field of the model, which makes the blocks exact."
+
+    return [
+        Argument("stream", bool, optional=True, default=False, doc=doc_stream),
+        Argument("chunk_atoms", int, optional=True, default=2048, doc=doc_chunk_atoms),
+        Argument("halo_hops", [int, None], optional=True, default=None, doc=doc_halo_hops),
+    ]
+
+
 def host_normalize(data):
 
     co = common_options()
@@ -1520,6 +1607,20 @@ def bandinfo_sub():
 
     return Argument("bandinfo", dict, optional=True, sub_fields=args, sub_variants=[], doc="")
 
+def batch_options_sub():
+    doc_max_atoms = "The largest number of atoms in a batch of structures. A larger structure makes a batch of its own."
+    doc_max_edges = "The largest number of edges in a batch of structures, not limited if None."
+    doc_num_workers = "The number of worker processes building the graphs of the structures."
+
+    args = [
+        Argument("max_atoms", int, optional=True, default=4096, doc=doc_max_atoms),
+        Argument("max_edges", [int, None], optional=True, default=None, doc=doc_max_edges),
+        Argument("num_workers", int, optional=True, default=0, doc=doc_num_workers),
+    ]
+
+    doc_batch = "The options to run the band or write_block task on many structures, when the structure is a directory, a glob pattern, an ASE database or a file of several frames."
+    return Argument("batch_options", dict, optional=True, sub_fields=args, sub_variants=[], default={}, doc=doc_batch)
+
 def AtomicData_options_sub():
     doc_r_max = "the cutoff value for bond considering in TB model."
     doc_er_max = "The cutoff value for environment for each site for env correction model. should set for nnsk+env correction model."
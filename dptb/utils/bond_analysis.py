@@ -0,0 +1,278 @@
+"""Bond length analysis of structures and trajectories, used by ``dptb bond``.
+
+This module only depends on numpy and ase, so that the bond analysis command does not
+need to import torch.
+"""
+
+import multiprocessing as mp
+from typing import Dict, List, Optional
+import numpy as np
+import ase
+import ase.io
+from ase.data import atomic_numbers, chemical_symbols
+from ase.neighborlist import neighbor_list
+from ase.io.trajectory import Trajectory
+
+# species pairs are encoded as heavier_Z * _PAIR_BASE + lighter_Z, so that they can be grouped with np.unique.
+_PAIR_BASE = 128
+
+
+def bond_symbol(symbol_i: str, symbol_j: str) -> str:
+    """The bond type name of two species, the heavier element goes first, e.g. "N-B"."""
+    if atomic_numbers[symbol_i] >= atomic_numbers[symbol_j]:
+        return symbol_i + "-" + symbol_j
+    else:
+        return symbol_j + "-" + symbol_i
+
+
+def pair_ids(numbers: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Encode the species pair of the bonds i-j as integers, consistent with ``bond_symbol``."""
+    zi, zj = numbers[i], numbers[j]
+    return np.maximum(zi, zj) * _PAIR_BASE + np.minimum(zi, zj)
+
+
+def pair_symbol(pair_id: int) -> str:
+    """The bond type name of an encoded species pair, e.g. "N-B"."""
+    return chemical_symbols[pair_id // _PAIR_BASE] + "-" + chemical_symbols[pair_id % _PAIR_BASE]
+
+
+def get_neighbours(atom: ase.Atom, cutoff: float =10., thr: float =1e-3):
+    """
+        Generating bond-wise distance dict, where key is the bond symbol such as "A-B", "A-A".
+        and the value is a list containing the first, second, third ... bond distance.
+
+    Args:
+        atom (ase.Atom): ase atom type structure
+        cutoff (float, optional): cutoff on bond distance, control how far the bonds need to be included. Defaults to 10..
+        thr (float, optional): control the threshold of bond length difference, within which we assume two bond are the same. Defaults to 1e-3.
+
+    Returns:
+        dict: a bond-wise distance dict
+    """
+    i, j, d = neighbor_list(quantities=["i","j","d"], a=atom, cutoff=cutoff)
+    pid = pair_ids(atom.numbers, i, j)
+
+    # sort by species pair, then by distance; the bonds closer than thr to their sorted predecessor form a cluster.
+    order = np.lexsort((d, pid))
+    pid, ds = pid[order], d[order]
+    new_pair = np.diff(pid, prepend=-1) != 0
+    cluster_start = np.flatnonzero(new_pair | (np.diff(ds, prepend=-np.inf) >= thr))
+    cluster_stop = np.append(cluster_start[1:], len(pid))
+
+    # a bond is a new distance if it is not within thr of the distances already found in the neighbour list
+    # order. The clusters are farther than thr apart, and all the bonds of a cluster narrower than thr are
+    # within thr of its first bond in the neighbour list, which is its only distance.
+    distances = []
+    if len(pid) > 0:
+        first = np.minimum.reduceat(order, cluster_start)
+        for start, stop, idx in zip(cluster_start, cluster_stop, first):
+            if ds[stop-1] - ds[start] < thr:
+                distances.append((pid[start], d[idx]))
+                continue
+            nns = []
+            for dd in d[np.sort(order[start:stop])]:
+                if not (np.abs(dd-np.array(nns)) < thr).any():
+                    nns.append(dd)
+            distances.extend((pid[start], dd) for dd in nns)
+
+    # the bond types are reported in the order they first appear in the neighbour list.
+    neighbours = {}
+    pair_start = np.flatnonzero(new_pair)
+    if len(pid) > 0:
+        pair_first = np.minimum.reduceat(order, pair_start)
+        for k in np.argsort(pair_first):
+            neighbours[pair_symbol(pid[pair_start[k]])] = []
+    for pair_id, dd in distances:
+        neighbours[pair_symbol(pair_id)].append(dd)
+    for kk in neighbours.keys():
+        neighbours[kk] = sorted(neighbours[kk])
+
+    return neighbours
+
+
+class BondLengthHistogram:
+    """Streaming histogram of the bond lengths of each species pair over the frames of a trajectory.
+
+    Only the counts and the sum of the bond lengths per bin are kept, so the memory does not grow
+    with the number of frames, and the histograms of different parts of a trajectory can be merged.
+
+    Args:
+        cutoff (float, optional): the largest bond length to include. Defaults to 6.0.
+        bin_width (float, optional): the width of the bond length bins. Defaults to 0.01.
+    """
+    def __init__(self, cutoff: float = 6.0, bin_width: float = 0.01):
+        self.cutoff = cutoff
+        self.bin_width = bin_width
+        self.n_bins = int(np.ceil(cutoff / bin_width))
+        self.n_frames = 0
+        # pair id -> per bin count of the (directed) bonds and sum of their lengths.
+        self.counts: Dict[int, np.ndarray] = {}
+        self.sums: Dict[int, np.ndarray] = {}
+
+    def _accumulate(self, pair_id: int, counts: np.ndarray, sums: np.ndarray):
+        if pair_id in self.counts:
+            self.counts[pair_id] += counts
+            self.sums[pair_id] += sums
+        else:
+            self.counts[pair_id] = counts.copy()
+            self.sums[pair_id] = sums.copy()
+
+    def update(self, atoms: ase.Atoms):
+        i, j, d = neighbor_list(quantities=["i","j","d"], a=atoms, cutoff=self.cutoff)
+        unique_pairs, inverse = np.unique(pair_ids(atoms.numbers, i, j), return_inverse=True)
+        bins = np.minimum((d / self.bin_width).astype(np.int64), self.n_bins - 1)
+
+        # a single bincount over the (pair, bin) index fills the histograms of all pairs at once.
+        flat = inverse * self.n_bins + bins
+        size = len(unique_pairs) * self.n_bins
+        counts = np.bincount(flat, minlength=size).reshape(-1, self.n_bins)
+        sums = np.bincount(flat, weights=d, minlength=size).reshape(-1, self.n_bins)
+        for k, pair_id in enumerate(unique_pairs):
+            self._accumulate(int(pair_id), counts[k], sums[k])
+        self.n_frames += 1
+
+    def merge(self, other: "BondLengthHistogram") -> "BondLengthHistogram":
+        assert self.n_bins == other.n_bins and self.bin_width == other.bin_width, "Only histograms with the same bins can be merged."
+        for pair_id in other.counts:
+            self._accumulate(pair_id, other.counts[pair_id], other.sums[pair_id])
+        self.n_frames += other.n_frames
+        return self
+
+    def shells(self, tol: float = 0.01, min_gap: float = 0.1) -> Dict[str, List[dict]]:
+        """Split the histogram of each species pair into coordination shells.
+
+        A shell is a run of occupied bins, two runs separated by less than ``min_gap`` belong to the same
+        shell. Bins holding less than ``tol`` times the count of the highest bin of the pair count as empty,
+        so that the tails of the thermal distributions do not bridge two shells.
+
+        Returns:
+            dict: per bond type, the list of shells with their mean ``distance``, the ``min`` and
+                ``max`` bond length bounds and the average number of bonds per frame ``count``.
+        """
+        shells = {}
+        gap_bins = int(round(min_gap / self.bin_width))
+        for pair_id in self.counts:
+            # the neighbour list counts every bond in both directions.
+            counts = self.counts[pair_id] / 2
+            occupied = np.concatenate([[False], counts >= tol * counts.max(), [False]])
+            edges = np.flatnonzero(np.diff(occupied.astype(np.int8)))
+            starts, stops = edges[::2], edges[1::2]
+            # sort + diff clustering of the occupied runs.
+            keep = np.concatenate([[True], starts[1:] - stops[:-1] >= gap_bins])
+            starts, stops = starts[keep], np.append(stops[np.flatnonzero(keep)[1:] - 1], stops[-1])
+
+            pair_shells = []
+            for start, stop in zip(starts, stops):
+                count = counts[start:stop].sum()
+                pair_shells.append({
+                    "distance": self.sums[pair_id][start:stop].sum() / (2 * count),
+                    "min": start * self.bin_width,
+                    "max": min(stop * self.bin_width, self.cutoff),
+                    "count": count / self.n_frames,
+                })
+            shells[pair_symbol(pair_id)] = pair_shells
+
+        return shells
+
+
+def suggest_cutoffs(shells: Dict[str, List[dict]], nshell: int = 1) -> Dict[str, Dict[str, Optional[float]]]:
+    """Suggest the ``r_max`` and ``er_max`` of each bond type from its coordination shells.
+
+    ``r_max`` includes the first ``nshell`` shells and ``er_max`` one more shell. The cutoff is put
+    in the middle of the gap to the next shell, or at the outer bound of the last shell found.
+    """
+    def cutoff_after(pair_shells, n):
+        if len(pair_shells) == 0:
+            return None
+        n = min(n, len(pair_shells))
+        if n < len(pair_shells):
+            return 0.5 * (pair_shells[n-1]["max"] + pair_shells[n]["min"])
+        return pair_shells[n-1]["max"]
+
+    return {
+        symbol: {"r_max": cutoff_after(pair_shells, nshell), "er_max": cutoff_after(pair_shells, nshell + 1)}
+        for symbol, pair_shells in shells.items()
+    }
+
+
+def _histogram_frames(traj_path: str, start: int, step: int, cutoff: float, bin_width: float) -> BondLengthHistogram:
+    histogram = BondLengthHistogram(cutoff=cutoff, bin_width=bin_width)
+    for atoms in ase.io.iread(traj_path, index=slice(start, None, step)):
+        histogram.update(atoms)
+    return histogram
+
+
+def bond_length_histogram(
+        traj_path: str,
+        cutoff: float = 6.0,
+        bin_width: float = 0.01,
+        stride: int = 1,
+        num_workers: int = 1,
+        ) -> BondLengthHistogram:
+    """Accumulate the bond length histogram over the frames of a trajectory.
+
+    The frames are streamed from any ase readable trajectory format. With ``num_workers > 1``, the
+    frames are dealt round-robin to a pool of processes, each reading the trajectory by itself, and
+    the partial histograms are merged at the end.
+
+    Args:
+        traj_path (str): the trajectory file, e.g. ``.traj``, ``.extxyz`` or ``XDATCAR``.
+        cutoff (float, optional): the largest bond length to include. Defaults to 6.0.
+        bin_width (float, optional): the width of the bond length bins. Defaults to 0.01.
+        stride (int, optional): only every ``stride``-th frame is analysed. Defaults to 1.
+        num_workers (int, optional): the number of worker processes. Defaults to 1.
+
+    Returns:
+        BondLengthHistogram: the histogram merged over all analysed frames.
+    """
+    if num_workers <= 1:
+        return _histogram_frames(traj_path, 0, stride, cutoff, bin_width)
+
+    tasks = [(traj_path, k * stride, num_workers * stride, cutoff, bin_width) for k in range(num_workers)]
+    with mp.get_context("fork").Pool(processes=num_workers) as pool:
+        partials = pool.starmap(_histogram_frames, tasks)
+
+    histogram = partials[0]
+    for partial in partials[1:]:
+        histogram.merge(partial)
+    return histogram
+
+
+def bn_stast(traj_path: str, cutoff: float =10., nns=[3.0, 4.5], first=False, remove_self=True):
+    """
+        Collect the bond lengths of all frames of a trajectory, and split them in the shells bounded by ``nns``.
+
+    Args:
+        traj_path (str): the ase trajectory file.
+        cutoff (float, optional): cutoff on bond distance, control how far the bonds need to be included. Defaults to 10..
+        nns (list, optional): the upper bounds of the shells. Defaults to [3.0, 4.5].
+        first (bool, optional): return all the bond lengths instead of the shells. Defaults to False.
+        remove_self (bool, optional): exclude the bonds between an atom and its periodic images. Defaults to True.
+
+    Returns:
+        list: the bond lengths in each shell.
+    """
+    from tqdm import tqdm
+
+    d = []
+    stast = []
+    xdat = Trajectory(filename=traj_path, mode='r')
+    for atom in tqdm(xdat):
+        i,j,S,new_d = neighbor_list(quantities=["i","j","S","d"], a=atom, cutoff=cutoff)
+        if remove_self:
+            d.append(new_d[i!=j])
+        else:
+            d.append(new_d)
+    # concatenate once at the end instead of growing the array in every frame.
+    d = np.concatenate(d) if len(d) > 0 else np.array([])
+
+    if first:
+        return d
+    
+    for i in range(len(nns)):
+        if i > 0:
+            stast.append(d[d.__gt__(nns[i-1]) * d.__lt__(nns[i])])
+        else:
+            stast.append(d[d.__lt__(nns[i])])
+    
+    return stast
@@ -111,7 +111,7 @@ TestFullConfigSKEnv= {
         "batch_size": 1,
         "display_freq": 1,
         "loss_options": {
-            "train": {
+            "test": {
                 "method": "eigvals",
                 "diff_on": False,
                 "eout_weight": 0.01,
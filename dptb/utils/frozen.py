@@ -0,0 +1,45 @@
+"""Load the TorchScript artifacts written by `dptb export --format torchscript`.
+
+This module only depends on torch, so that inference services can run the artifacts without the models of
+``dptb.nn``. The artifact takes the graph of a structure, as the tensors of ``AtomicData.from_ase`` with the
+cutoffs of the metadata, and returns the Hamiltonian (and overlap) features.
+"""
+
+import json
+from typing import Dict, Optional, Tuple, Union
+
+import torch
+
+# the version of the layout of the artifact, and the name of its metadata.
+FORMAT_VERSION = 1
+METADATA_FILE = "metadata.json"
+
+
+def load_frozen_model(
+        path: str,
+        map_location: Optional[Union[str, torch.device]]=None,
+        ) -> Tuple[torch.jit.ScriptModule, dict]:
+    """Load the artifact at ``path``, and its metadata: the basis, the cutoffs, the input and output fields,
+    and the orbital pair slices of the features."""
+    extra_files = {METADATA_FILE: ""}
+    module = torch.jit.load(path, map_location=map_location, _extra_files=extra_files)
+    if not extra_files[METADATA_FILE]:
+        raise ValueError(f"{path} is not a model exported by dptb, it has no {METADATA_FILE}.")
+    metadata = json.loads(extra_files[METADATA_FILE])
+    if metadata.get("format_version", 0) > FORMAT_VERSION:
+        raise ValueError(f"The artifact {path} has the format version {metadata['format_version']}, "
+                         f"newer than the supported version {FORMAT_VERSION}.")
+    return module.eval(), metadata
+
+
+def check_inputs(metadata: dict, data: Dict[str, torch.Tensor]):
+    """Raise a ValueError if ``data`` lacks an input field of the artifact, or has an unknown element."""
+    missing = [field for field in metadata["input_fields"] if field not in data]
+    if len(missing) > 0:
+        raise ValueError(f"The input lacks the fields {missing} of the exported model.")
+
+    # the elements are compared by atomic number, the table of the basis being in the metadata.
+    unknown = set(data["atomic_numbers"].flatten().tolist()) - set(metadata["atomic_numbers"])
+    if len(unknown) > 0:
+        raise ValueError(f"The elements of atomic numbers {sorted(unknown)} are not in the basis of the exported model, "
+                         f"which has {metadata['chemical_symbols']}.")
@@ -1,11 +1,9 @@
-from dptb.nn.build import build_model
 import json
 import logging
 from dptb.utils.config_sk import TrainFullConfigSK, TestFullConfigSK
 from dptb.utils.config_skenv import TrainFullConfigSKEnv, TestFullConfigSKEnv
 from dptb.utils.config_e3 import TrainFullConfigE3, TestFullConfigE3
 import os
-import torch
 
 def gen_inputs(mode, task='train', model=None):
     assert task in ['train', 'test'], 'task should be train or test'
@@ -28,6 +26,9 @@ def gen_inputs(mode, task='train', model=None):
     
     if model is not None:
         # if model provided, update the input template
+        # torch is only needed when a model is given, keep `dptb config` cheap otherwise.
+        import torch
+        from dptb.nn.build import build_model
         if isinstance(model, str):
             model = build_model(model)
         if model.name == 'nnsk':
@@ -0,0 +1,75 @@
+"""Helpers to defer heavy imports in package ``__init__`` modules.
+
+Importing ``dptb.nn`` or ``dptb.data`` eagerly pulls in torch, e3nn, torch_scatter,
+h5py, lmdb, ase and scipy. The command line interface only needs those once a
+subcommand is dispatched, so the package namespaces resolve their public names
+on first attribute access instead (PEP 562).
+"""
+
+import sys
+import types
+import importlib
+from typing import Dict, List
+
+
+class _LazyModule(types.ModuleType):
+    """Keep the lazily exported objects bound when a same-named submodule gets imported.
+
+    The import system binds ``package.train`` to the submodule ``package.train`` once it is
+    loaded, which would shadow the ``train`` function exported by the package.
+    """
+
+    def __setattr__(self, name, value):
+        spec = self.__dict__.get("_lazy_attrs", {}).get(name)
+        if spec is not None and isinstance(value, types.ModuleType) and value.__name__ == f"{self.__name__}.{name}":
+            value = getattr(value, spec.partition(":")[2] or name)
+        super().__setattr__(name, value)
+
+
+def lazy_attach(package: str, attrs: Dict[str, str]):
+    """Build the ``__getattr__``/``__dir__``/``__all__`` triple of a lazy package.
+
+    Parameters
+    ----------
+    package : str
+        the ``__name__`` of the package whose namespace is made lazy.
+    attrs : Dict[str, str]
+        map from public attribute name to the (relative or absolute) module defining it,
+        optionally followed by ``:name`` when the object is named differently there.
+
+    Returns
+    -------
+    tuple
+        ``(__getattr__, __dir__, __all__)`` to be assigned in the package ``__init__``.
+
+    Examples
+    --------
+    >>> __getattr__, __dir__, __all__ = lazy_attach(__name__, {"build_model": ".build"})
+    """
+    __all__: List[str] = list(attrs.keys())
+    module = sys.modules[package]
+    module._lazy_attrs = {
+        name: spec for name, spec in attrs.items() if spec.partition(":")[0] == f".{name}"
+    }
+    module.__class__ = _LazyModule
+
+    def __getattr__(name: str):
+        if name in attrs:
+            module_name, _, attr = attrs[name].partition(":")
+            module = importlib.import_module(module_name, package)
+            value = getattr(module, attr or name)
+        else:
+            # fall back to submodules, e.g. ``dptb.data.AtomicDataDict``.
+            try:
+                value = importlib.import_module(f"{package}.{name}")
+            except ModuleNotFoundError as e:
+                if e.name != f"{package}.{name}":
+                    raise
+                raise AttributeError(f"module {package!r} has no attribute {name!r}") from None
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(__all__) | set(vars(sys.modules[package])))
+
+    return __getattr__, __dir__, __all__
@@ -1,4 +1,5 @@
 import numpy as np
+import torch
 import ase
 import logging
 log = logging.getLogger(__name__)
@@ -284,6 +285,102 @@ def time_symmetry_reduce_correct(k_points):
     return ir_k_points_arr, ir_weights_arr
 
 
+class TimeReversalKSet(object):
+    """The ±k pairs of a list of k-points, for the Hamiltonians with time-reversal symmetry, H(-k) = H(k)*.
+
+    The k-points equal up to the sign, and with ``periodic`` up to a reciprocal lattice vector, form a class, whose
+    first k-point is its representative. The quantities are only computed at the representatives, and are expanded
+    to the full list with `expand`, which conjugates them at the partners -k. The self-conjugate points, such as the
+    TRIM points 2k = G of a periodic list, are their own partners.
+
+    Without ``time_reversal``, e.g. with spin-orbit coupling, every k-point is its own representative.
+
+    Attributes:
+        irreducible: the indices of the representatives in the k-points, [nirr].
+        index: the position of the representative of each k-point in ``irreducible``, [nk].
+        conjugate: whether each k-point is the partner -k of its representative, [nk].
+        weights: the summed weights of the classes, [nirr].
+        closed: whether each class holds the partner of its representative, or it is self-conjugate, [nirr].
+    """
+
+    def __init__(self, kpoints, weights=None, periodic: bool=True, time_reversal: bool=True, tol: float=1e-6):
+        if isinstance(kpoints, torch.Tensor):
+            kpoints = kpoints.detach().cpu().numpy()
+        kpoints = np.asarray(kpoints, dtype=np.float64).reshape(-1, 3)
+        nk = kpoints.shape[0]
+        if weights is None:
+            weights = np.ones(nk) / max(nk, 1)
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+        assert weights.shape[0] == nk, "The number of weights should be the number of kpoints."
+
+        if not time_reversal or nk == 0:
+            self.irreducible = np.arange(nk)
+            self.index = np.arange(nk)
+            self.conjugate = np.zeros(nk, dtype=bool)
+            self.weights = weights
+            self.closed = np.zeros(nk, dtype=bool)
+            self.kpoints = kpoints
+            return
+
+        # the k-points on an integer grid of spacing tol, and their partners.
+        plus = np.rint(kpoints / tol).astype(np.int64)
+        minus = -plus
+        if periodic:
+            period = int(round(1 / tol))
+            plus, minus = plus % period, minus % period
+        # the key of a class is the lexicographically smaller of k and -k.
+        diff = plus - minus
+        first = (diff != 0).argmax(axis=1)
+        flip = diff[np.arange(nk), first] > 0
+        keys = np.where(flip[:, None], minus, plus)
+        _, irreducible, index = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        index = index.reshape(-1)
+
+        # the classes in the order of their representatives.
+        order = np.argsort(irreducible)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.shape[0])
+        self.irreducible = irreducible[order]
+        self.index = rank[index]
+        self.conjugate = (plus != plus[self.irreducible[self.index]]).any(axis=1)
+        self.weights = np.bincount(self.index, weights=weights, minlength=self.irreducible.shape[0])
+        self_conjugate = (plus == minus).all(axis=1)[self.irreducible]
+        self.closed = self_conjugate | (np.bincount(self.index, weights=self.conjugate) > 0)
+        self.kpoints = kpoints
+
+    @property
+    def num_k(self) -> int:
+        return self.index.shape[0]
+
+    @property
+    def num_irreducible(self) -> int:
+        return self.irreducible.shape[0]
+
+    @property
+    def is_trivial(self) -> bool:
+        """Whether every k-point is its own representative."""
+        return self.num_irreducible == self.num_k
+
+    @property
+    def irreducible_kpoints(self) -> np.ndarray:
+        return self.kpoints[self.irreducible]
+
+    def expand(self, values, conjugate: bool=False, sign: float=1.0):
+        """Expand ``values`` [nirr, ...], a numpy array or a tensor, computed at the representatives to all the
+        k-points. With ``conjugate``, the values at the partners are ``sign * values.conj()``, e.g. the
+        eigenvectors with ``sign=1`` and the derivatives dH/dk with ``sign=-1``."""
+        if self.is_trivial:
+            return values
+        index, mask = self.index, self.conjugate
+        if isinstance(values, torch.Tensor):
+            index = torch.as_tensor(index, device=values.device)
+            mask = torch.as_tensor(mask, device=values.device)
+        out = values[index]
+        if conjugate:
+            out[mask] = sign * out[mask].conj()
+        return out
+
+
 def kgrid_spacing(structase,kspacing:float,sampling='MP'):
     """Generate k-points based on the given k-spacing and sampling method.
     
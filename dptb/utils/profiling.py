@@ -0,0 +1,117 @@
+"""Named stage ranges and wall-clock timers for profiling the training and inference steps.
+
+The stages are marked with `profile_stage`, which opens a ``torch.profiler.record_function`` range named
+``dptb::<stage>`` and times the stage in every active `StageTimer`. Nothing is recorded while no timer is
+active, so the marks cost a list lookup outside of profiling.
+"""
+
+import time
+import contextlib
+import collections
+from typing import Dict, Iterable, List, Optional
+import torch
+
+# the timers recording the stages, activated by the `Profiler` plugin.
+_ACTIVE_TIMERS: List["StageTimer"] = []
+
+
+class StageTimer(object):
+    """The wall-clock time spent in each stage, exclusive of the stages nested in it.
+
+    Args:
+        synchronize: synchronize the cuda device at the start and the end of every stage, so that the
+            asynchronous kernels are counted in the stage that launched them.
+    """
+
+    def __init__(self, synchronize: bool=False):
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self.totals = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        # the open stages, as [name, start time, time spent in the nested stages].
+        self._stack = []
+
+    def _now(self) -> float:
+        if self.synchronize:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def start(self, name: str):
+        self._stack.append([name, self._now(), 0.0])
+
+    def stop(self, name: str):
+        if name not in [entry[0] for entry in self._stack]:
+            return
+        now = self._now()
+        # the stages left open by an exception are closed with ``name``.
+        while True:
+            stage, start, nested = self._stack.pop()
+            elapsed = now - start
+            self.totals[stage] += elapsed - nested
+            self.counts[stage] += 1
+            if len(self._stack) > 0:
+                self._stack[-1][2] += elapsed
+            if stage == name:
+                break
+
+    def reset(self) -> Dict[str, float]:
+        """Return the total seconds of each stage since the last reset, and restart the totals."""
+        totals = dict(self.totals)
+        self.totals.clear()
+        self.counts.clear()
+        return totals
+
+    def activate(self):
+        if self not in _ACTIVE_TIMERS:
+            _ACTIVE_TIMERS.append(self)
+
+    def deactivate(self):
+        if self in _ACTIVE_TIMERS:
+            _ACTIVE_TIMERS.remove(self)
+
+
+def is_profiling() -> bool:
+    return len(_ACTIVE_TIMERS) > 0
+
+
+@contextlib.contextmanager
+def profile_stage(name: str):
+    """Mark the enclosed code, or the decorated function, as the stage ``name``."""
+    if len(_ACTIVE_TIMERS) == 0:
+        yield
+        return
+
+    timers = list(_ACTIVE_TIMERS)
+    with torch.profiler.record_function(f"dptb::{name}"):
+        for timer in timers:
+            timer.start(name)
+        try:
+            yield
+        finally:
+            for timer in timers:
+                timer.stop(name)
+
+
+def profile_iter(iterable: Iterable, name: str="data_loading"):
+    """Iterate over ``iterable``, marking the wait for each item as the stage ``name``."""
+    iterator = iter(iterable)
+    while True:
+        with profile_stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def peak_memory(device: Optional[torch.device]=None) -> Optional[float]:
+    """The peak memory in MB: the allocated cuda memory since the last reset on a cuda device, or the
+    resident memory of the process on cpu. None if it is not available."""
+    device = torch.device(device) if device is not None else torch.device("cpu")
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kB on linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
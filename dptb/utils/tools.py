@@ -23,6 +23,8 @@ import logging
 import random
 from ase.neighborlist import neighbor_list
 from ase.io.trajectory import Trajectory
+# kept here for backward compatibility, the bond analysis lives in a torch-free module.
+from dptb.utils.bond_analysis import get_neighbours, bn_stast
 import ase
 import ssl
 import os.path as osp
@@ -657,80 +659,6 @@ def write_skparam(
 
     return True
 
-def get_neighbours(atom: ase.Atom, cutoff: float =10., thr: float =1e-3):
-    """
-        Generating bond-wise distance dict, where key is the bond symbol such as "A-B", "A-A".
-        and the value is a list containing the first, second, third ... bond distance.
-
-    Args:
-        atom (ase.Atom): ase atom type structure
-        cutoff (float, optional): cutoff on bond distance, control how far the bonds need to be included. Defaults to 10..
-        thr (float, optional): control the threshold of bond length difference, within which we assume two bond are the same. Defaults to 1e-3.
-
-    Returns:
-        dict: a bond-wise distance dict
-    """
-
-    neighbours = {}
-    i,j,d = neighbor_list(quantities=["i","j","d"], a=atom, cutoff=cutoff)
-    atom_symbols = np.array(atom.get_chemical_symbols(), dtype=str)
-    for idx in range(len(i)):
-        symbol = get_uniq_symbol([atom_symbols[i[idx]], atom_symbols[j[idx]]])
-        if len(symbol) == 2:
-            symbol = symbol[0]+"-"+symbol[1]
-        else:
-            symbol = symbol[0]+"-"+symbol[0]
-
-        nns = neighbours.setdefault(symbol, [])
-        if len(nns) >= 1:
-            if not (np.abs(d[idx]-np.array(nns)) < thr).any():
-                nns.append(d[idx])
-        else:
-            nns.append(d[idx])
-
-    for kk in neighbours.keys():
-        neighbours[kk] = sorted(neighbours[kk])
-    
-    return neighbours
-
-def bn_stast(traj_path: str, cutoff: float =10., nns=[3.0, 4.5], first=False, remove_self=True):
-    """
-        Generating bond-wise distance dict, where key is the bond symbol such as "A-B", "A-A".
-        and the value is a list containing the first, second, third ... bond distance.
-
-    Args:
-        atom (ase.Atom): ase atom type structure
-        cutoff (float, optional): cutoff on bond distance, control how far the bonds need to be included. Defaults to 10..
-        thr (float, optional): control the threshold of bond length difference, within which we assume two bond are the same. Defaults to 1e-3.
-
-    Returns:
-        dict: a bond-wise distance dict
-    """
-    from tqdm import tqdm
-
-    d = []
-
-
-    stast = []
-    xdat = Trajectory(filename=traj_path, mode='r')
-    for atom in tqdm(xdat):
-        i,j,S,new_d = neighbor_list(quantities=["i","j","S","d"], a=atom, cutoff=cutoff)
-        if remove_self:
-            d = np.append(d, new_d[i!=j])
-        else:
-            d = np.append(d, new_d)
-
-    if first:
-        return d
-    
-    for i in range(len(nns)):
-        if i > 0:
-            stast.append(d[d.__gt__(nns[i-1]) * d.__lt__(nns[i])])
-        else:
-            stast.append(d[d.__lt__(nns[i])])
-    
-    return stast
-
 def makedirs(dir):
     os.makedirs(dir, exist_ok=True)
 